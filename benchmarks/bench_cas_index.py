@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Compare selecting the named entity, event and event argument annotations of a CAS as XMIProcessor used to do, with
+a scan over all annotations of the view per selection, versus building a CasTypeIndex once and looking them up,
+and check that both select the same annotations.
+
+The XMI is the text of a test fixture repeated, with its tokens, sentences, named entities, semantic arguments and
+events copied to every repetition.
+
+Run from the project root: poetry run python benchmarks/bench_cas_index.py --repeats 200
+"""
+import argparse
+import time
+import warnings
+from pathlib import Path
+
+import cassis
+
+from globalise_tools.cas_index import CasTypeIndex
+from globalise_tools.events import EVENT_LAYER_NAME, NAMED_ENTITY_LAYER_NAME
+
+FIXTURE_XMI = Path(__file__).parent.parent / "tests" / "data" / "xmi" / "NL-HaNA_1.04.02_1092_0017.xmi"
+SELECTED_TYPES = [NAMED_ENTITY_LAYER_NAME, EVENT_LAYER_NAME, "webanno.custom.SemPredGLOBArgumentsLink"]
+COPIED_FEATURES = {NAMED_ENTITY_LAYER_NAME: ["value"], EVENT_LAYER_NAME: ["category", "relationtype"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark selecting CAS annotations by type")
+    parser.add_argument("--repeats", type=int, default=200, help="The number of copies of the fixture's annotations")
+    parser.add_argument("--rounds", type=int, default=5, help="The number of times to time every selection")
+    args = parser.parse_args()
+    # the scan is what XMIProcessor used to do, with the now deprecated get_all_annotations()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    with open("data/typesystem.xml", "rb") as f:
+        typesystem = cassis.load_typesystem(f)
+    xmi = synthetic_xmi(typesystem, args.repeats)
+    tic = time.perf_counter()
+    cas = cassis.load_cas_from_xmi(xmi, typesystem=typesystem)
+    load_seconds = time.perf_counter() - tic
+    print(f"{len(cas.views[0].get_all_annotations())} annotations, loaded in {load_seconds:.3f}s")
+
+    scanned, scan_seconds = best_of(args.rounds, lambda: scan(cas))
+    indexed, index_seconds = best_of(args.rounds, lambda: look_up(cas))
+    if scanned != indexed:
+        raise Exception("the selections differ")
+    print(f"selected {[len(s) for s in scanned]} (identical selections)")
+    print(f"scan per type    : {1000 * scan_seconds:8.2f} ms")
+    print(f"type index       : {1000 * index_seconds:8.2f} ms (including building the index)")
+    print(f"speedup          : {scan_seconds / index_seconds:8.1f}x")
+
+
+def scan(cas: cassis.Cas) -> list[list]:
+    return [[a for a in cas.views[0].get_all_annotations() if a.type.name == type_name]
+            for type_name in SELECTED_TYPES]
+
+
+def look_up(cas: cassis.Cas) -> list[list]:
+    index = CasTypeIndex(cas)
+    return [index.select(type_name) for type_name in SELECTED_TYPES]
+
+
+def best_of(rounds: int, selection) -> tuple[list[list], float]:
+    best = float("inf")
+    result = None
+    for _ in range(rounds):
+        tic = time.perf_counter()
+        result = selection()
+        best = min(best, time.perf_counter() - tic)
+    return result, best
+
+
+def synthetic_xmi(typesystem: cassis.TypeSystem, repeats: int) -> str:
+    with open(FIXTURE_XMI, "rb") as f:
+        fixture = cassis.load_cas_from_xmi(f, typesystem=typesystem)
+    text = fixture.sofa_string + "\n"
+    cas = cassis.Cas(typesystem=typesystem, sofa_string=text * repeats)
+    for a in fixture.views[0].get_all_annotations():
+        annotation_type = typesystem.get_type(a.type.name)
+        features = {f: a.get(f) for f in COPIED_FEATURES.get(a.type.name, [])}
+        for n in range(repeats):
+            shift = n * len(text)
+            cas.add(annotation_type(begin=a.begin + shift, end=a.end + shift, **features))
+    return cas.to_xmi()
+
+
+if __name__ == '__main__':
+    main()
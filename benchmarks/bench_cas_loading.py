@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare loading the XMI test fixtures (and a large synthetic XMI) with cassis.load_cas_from_xmi versus the fast
+path of globalise_tools.cas_loading, and check that both load the same CAS. Also compares parsing the typesystem
+for every factory (as XMIProcessorFactory used to do) with getting the one parsed once per process.
+
+Run from the project root: poetry run python benchmarks/bench_cas_loading.py --rounds 200
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import cassis
+from loguru import logger
+
+from benchmarks.bench_cas_index import synthetic_xmi
+from globalise_tools.cas_loading import CasLoader, load_typesystem
+
+XMI_DIR = Path(__file__).parent.parent / "tests" / "data" / "xmi"
+TYPESYSTEM_PATH = "data/typesystem.xml"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading XMI files")
+    parser.add_argument("--rounds", type=int, default=200, help="The number of times to load every fixture")
+    parser.add_argument("--repeats", type=int, default=200,
+                        help="The number of copies of a fixture's annotations in the synthetic XMI")
+    args = parser.parse_args()
+    logger.remove()
+
+    parse_seconds = timed(lambda: cassis_typesystem(), 20)
+    typesystem = load_typesystem(TYPESYSTEM_PATH)
+    cached_seconds = timed(lambda: load_typesystem(TYPESYSTEM_PATH), 20)
+    print(f"typesystem: parsed {1000 * parse_seconds:.2f} ms, from the process cache {1000 * cached_seconds:.4f} ms")
+
+    loader = CasLoader(typesystem)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_path = Path(tmp_dir) / f"synthetic-{args.repeats}.xmi"
+        synthetic_path.write_text(synthetic_xmi(typesystem, args.repeats))
+        xmi_paths = [(p, args.rounds) for p in sorted(XMI_DIR.glob("*.xmi"))] + [(synthetic_path, 5)]
+        print(f"{'xmi':38s} {'cassis':>10s} {'fast path':>10s} {'speedup':>8s}")
+        for xmi_path, rounds in xmi_paths:
+            path = str(xmi_path)
+            if loader.load(path).to_xmi() != cassis_load(path, typesystem).to_xmi():
+                raise Exception(f"{xmi_path.name}: the loaded CASes differ")
+            cassis_seconds = timed(lambda: cassis_load(path, typesystem), rounds)
+            fast_seconds = timed(lambda: loader.load(path), rounds)
+            print(f"{xmi_path.name:38s} {1000 * cassis_seconds:7.2f} ms {1000 * fast_seconds:7.2f} ms"
+                  f" {cassis_seconds / fast_seconds:7.1f}x")
+
+
+def cassis_typesystem() -> cassis.TypeSystem:
+    with open(TYPESYSTEM_PATH, "rb") as f:
+        return cassis.load_typesystem(f)
+
+
+def cassis_load(xmi_path: str, typesystem: cassis.TypeSystem) -> cassis.Cas:
+    with open(xmi_path, "rb") as f:
+        return cassis.load_cas_from_xmi(f, typesystem=typesystem)
+
+
+def timed(load, rounds: int) -> float:
+    """the mean time of a load, in seconds"""
+    tic = time.perf_counter()
+    for _ in range(rounds):
+        load()
+    return (time.perf_counter() - tic) / rounds
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Compare classifying the languages of the lines, regions and pages in a synthetic *-lines.lang.tsv one row at a time
+(as gt_classify_language used to do) versus column-wise, and check that both produce the same output.
+
+Run from the project root: poetry run python benchmarks/bench_classify_language.py
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import TextIO
+
+from scripts.gt_classify_language import LANGS, classify_file, to_iso639_3
+
+HEADER = ["inv_nr", "page_no", "textregion_id", "textregion_type", "line_id", "lang", "confidence", "line_text",
+          "nl_voc", "nl", "en", "de", "da", "fr", "la", "it", "es", "pt", "id", "total"]
+WORDS = ["de", "van", "het", "een", "schip", "Compagnie", "gouverneur", "the", "ship", "and", "le", "vaisseau",
+         "et", "navis", "cum", "das", "Schiff", "und", "½", "1687", "rsd:", "Batavia", "Ao", "f", "Jan"]
+CHARMODEL_LANGS = ["nl", "nl", "nl", "nl", "en", "fr", "de", "la", "it", "pt", "es", "da", "id"]
+SCORES = ["0", "0", "0", "0.25", "0.3333333333333333", "0.5", "0.6666666666666666", "0.75", "1"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark line, region and page language classification")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="The number of lines in the synthetic TSV")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "9999-lines.lang.tsv")
+        write_synthetic_lines_tsv(path, args.lines)
+
+        row_wise_out = io.StringIO()
+        tic = time.perf_counter()
+        classify_file_rowwise(path, row_wise_out)
+        row_wise_time = time.perf_counter() - tic
+
+        columnar_out = io.StringIO()
+        tic = time.perf_counter()
+        classify_file(path, columnar_out)
+        columnar_time = time.perf_counter() - tic
+
+    if columnar_out.getvalue() != row_wise_out.getvalue():
+        raise Exception("the outputs differ")
+    print(f"{args.lines} lines, {columnar_out.getvalue().count(chr(10))} output rows (identical output)")
+    print(f"row-wise         : {row_wise_time:8.3f} s")
+    print(f"column-wise      : {columnar_time:8.3f} s")
+    print(f"speedup          : {row_wise_time / columnar_time:8.1f}x")
+
+
+def write_synthetic_lines_tsv(path: str, lines: int, seed: int = 42) -> None:
+    """a *-lines.lang.tsv like the langdetect pipeline produces, with paragraph and non-paragraph regions"""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("\t".join(HEADER) + "\n")
+        page_no, region_no, line_no = 1, 0, 0
+        while line_no < lines:
+            if rng.random() < 0.1:
+                page_no += 1
+            region_no += 1
+            region_type = rng.choice(["paragraph", "paragraph", "paragraph", "marginalia", "header"])
+            for _ in range(min(rng.randint(1, 25), lines - line_no)):
+                line_no += 1
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.choice([1, 2, 4, 6, 8, 10])))
+                scores = [rng.choice(SCORES) for _ in LANGS]
+                row = ["9999", f"{page_no:04d}", f"r{region_no}", region_type, f"l{line_no}",
+                       rng.choice(CHARMODEL_LANGS), f"{rng.random():.2f}", text, *scores, "10"]
+                f.write("\t".join(row) + "\n")
+
+
+# the row-wise classification that gt_classify_language used to do, as the reference for its output
+def classify_line_language(row: dict) -> str:
+    if count_alphabetic(row['line_text']) <= 6:
+        # too short to classify
+        return "unknown"
+
+    confidence_charmodel = float(row['confidence'])
+    lang_charmodel = row['lang']
+
+    lex_score = 0
+    for lang in LANGS:
+        score = float(row[lang])
+        if score > lex_score and score > 0:
+            lex_score = score
+
+    # if multiple languages are tied for the lexicon, we list them all
+    lang_lex = []
+    if lex_score > 0:
+        for lang in LANGS:
+            if float(row[lang]) == lex_score and lang[:2] not in lang_lex:
+                lang_lex.append(lang[:2])
+
+    if lang_charmodel in lang_lex and confidence_charmodel >= 0.5:
+        # easiest case, models are in agreement
+        return lang_charmodel
+    elif "nl" in lang_lex and lex_score >= 0.5:
+        # lexical says this is dutch, character model thinks otherwise
+        return "nl"
+    elif lang_charmodel == "nl" and lex_score <= 0.5:
+        # character model says this is dutch, lexical model thinks otherwise but  not sufficient confidence
+        return lang_charmodel
+    elif "nl" not in lang_lex and ' ' not in row['line_text']:
+        # this is just a single non-dutch word, refuse to classify as non-dutch
+        return "unknown"
+    elif confidence_charmodel >= 0.9 and confidence_charmodel > lex_score:
+        # character model has very high confidence
+        return lang_charmodel
+    elif lex_score >= 0.5 and lex_score >= confidence_charmodel:
+        # favour lexical model
+        return lang_lex[0]
+    else:
+        # give up
+        return "unknown"
+
+
+def classify_region_language(line_langs: Counter) -> list:
+    region_langs = []
+    linecount = line_langs.total()
+    for lang, count in line_langs.items():
+        freq = count / linecount
+        if (lang == 'nl' or count >= 3) and freq >= 0.25 and lang != 'unknown':
+            region_langs.append(lang)
+    return region_langs
+
+
+def count_alphabetic(s: str):
+    return sum((c.isalpha() for c in s))
+
+
+def print_langs(inv_nr, page_no, textregion_id, textregion_type, line_id, page_langs: list, text: str,
+                out: TextIO = sys.stdout) -> None:
+    if page_langs:
+        langs = ",".join(sorted((to_iso639_3(l) for l in page_langs)))
+    else:
+        langs = "unknown"
+    print(f"{inv_nr}\t{page_no}\t{textregion_id}\t{textregion_type}\t{line_id}\t{langs}\t{text}", file=out)
+
+
+def classify_file_rowwise(filename: str, out: TextIO = sys.stdout) -> None:
+    """classify the lines, regions and pages in filename one row at a time, and print them to out"""
+    prev = (None, None, None, None)
+    line_langs = Counter()
+    page_langs = []
+    with open(filename, mode='r') as file:
+        reader = csv.DictReader(file, delimiter="\t", quoting=csv.QUOTE_NONE)
+        for row in reader:
+            current = (row['inv_nr'], row['page_no'], row['textregion_id'], row['textregion_type'])
+            if current != prev:
+                region_langs = classify_region_language(line_langs)
+                for lang in region_langs:
+                    if lang not in page_langs:
+                        page_langs.append(lang)
+                inv_nr, page_no, textregion_id, textregion_type = prev
+                if inv_nr:
+                    print_langs(inv_nr, page_no, textregion_id, textregion_type, "", region_langs, "", out)
+                line_langs.clear()
+            if current[0:2] != prev[:2]:
+                # new page
+                inv_nr, page_no = prev[:2]
+                if inv_nr:
+                    print_langs(inv_nr, page_no, "", "", "", page_langs, "", out)
+                    page_langs.clear()
+            if row['textregion_type'] == 'paragraph':
+                lang = classify_line_language(row)
+                line_langs[lang] += 1
+                print_langs(row['inv_nr'], row['page_no'], row['textregion_id'], row['textregion_type'],
+                            row['line_id'], [lang], row['line_text'], out)
+            prev = current
+
+        # wrap up after last one
+        inv_nr, page_no, textregion_id, textregion_type = prev
+        if inv_nr:
+            region_langs = classify_region_language(line_langs)
+            for lang in region_langs:
+                if lang not in page_langs:
+                    page_langs.append(lang)
+            print_langs(inv_nr, page_no, "", "", "", page_langs, "", out)
+
+
+if __name__ == '__main__':
+    main()
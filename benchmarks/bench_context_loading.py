@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Compare the throughput of converting Web Annotations to N-Quads with pyld when the JSON-LD contexts are fetched
+over http (pyld's default document loader) versus served by the ContextRegistry, for increasing server latencies.
+
+The contexts are served from a local http server that waits `latency` ms before every response. Every batch starts
+with empty caches, like a new worker process would.
+
+Run from the project root: poetry run python benchmarks/bench_context_loading.py
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from pyld import jsonld
+
+from globalise_tools.jsonld_contexts import CONTEXTS_DIR, PACKAGED_CONTEXTS, ContextRegistry
+
+CONTEXTS = [
+    "https://linked.art/ns/v1/linked-art.json",
+    "https://ns.huc.knaw.nl/globalise.jsonld",
+    "http://www.w3.org/ns/anno.jsonld",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON-LD context loading")
+    parser.add_argument("--batches", type=int, default=5, help="The number of batches (fresh caches per batch)")
+    parser.add_argument("--annotations", type=int, default=50, help="The number of annotations per batch")
+    parser.add_argument("--latencies", type=int, nargs="+", default=[0, 50, 200], help="The server latencies in ms")
+    args = parser.parse_args()
+
+    original_loader = jsonld.get_document_loader()
+    try:
+        for latency in args.latencies:
+            server = DelayingContextServer(latency / 1000)
+            try:
+                remote = timed_conversion(server.document_loader(), args.batches, args.annotations)
+            finally:
+                server.close()
+            local = timed_conversion(None, args.batches, args.annotations)
+            total = args.batches * args.annotations
+            print(f"latency {latency:4d} ms: remote loader {total / remote:8.1f} annotations/s,"
+                  f" context registry {total / local:8.1f} annotations/s")
+    finally:
+        jsonld.set_document_loader(original_loader)
+
+
+def timed_conversion(loader, batches: int, annotations: int) -> float:
+    tic = time.perf_counter()
+    for b in range(batches):
+        jsonld._resolved_context_cache.clear()
+        jsonld.set_document_loader(loader or ContextRegistry(allow_remote=False).document_loader)
+        for i in range(annotations):
+            jsonld.to_rdf(annotation(f"{b}-{i}"), {"format": "application/n-quads"})
+    return time.perf_counter() - tic
+
+
+def annotation(n: str) -> dict:
+    return {
+        "@context": CONTEXTS + [{"iiif": "http://iiif.io/api/presentation/3#"}],
+        "id": f"urn:anno:{n}",
+        "type": "Annotation",
+        "motivation": "classifying",
+        "body": {"id": f"urn:body:{n}", "type": "SpecificResource", "source": "urn:person:1"},
+        "target": {"source": "urn:text:1", "type": "Text",
+                   "selector": {"type": "TextPositionSelector", "start": 10, "end": 20}},
+    }
+
+
+class DelayingContextServer:
+    """serves the packaged contexts by url path, after a delay"""
+
+    def __init__(self, delay: float) -> None:
+        documents = {urlparse(url).path: (CONTEXTS_DIR / file_name).read_bytes()
+                     for url, file_name in PACKAGED_CONTEXTS.items()}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay)
+                body = documents[self.path]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/ld+json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def document_loader(self):
+        """pyld's requests loader, with the context urls pointing at this server"""
+        requests_loader = jsonld.requests_document_loader()
+
+        def loader(url, options=None):
+            remote = requests_loader(f"{self.url}{urlparse(url).path}", options or {})
+            return {**remote, "documentUrl": url}
+
+        return loader
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
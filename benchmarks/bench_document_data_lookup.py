@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compare the per-page cost of finding a page's document_data entry by the md5 of its text:
+the linear scan XMIProcessor used to do versus the md5 index kept by XMIProcessorFactory.
+
+Run from the project root: poetry run python benchmarks/bench_document_data_lookup.py
+"""
+import argparse
+import hashlib
+import time
+
+from loguru import logger
+
+from scripts.gt_ner_xmi_to_wa import XMIProcessorFactory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document_data lookup by md5")
+    parser.add_argument("--pages", type=int, default=2000, help="The number of synthetic pages in the inventory")
+    parser.add_argument("--buckets", type=int, default=10, help="The number of buckets to report per-page times for")
+    args = parser.parse_args()
+    logger.remove()
+
+    for label, lookup in [("linear scan", linear_scan_lookup), ("md5 index", indexed_lookup)]:
+        xpf = XMIProcessorFactory("data/typesystem.xml", {}, {}, git_commit_id="benchmark")
+        bucket_times = run(xpf, lookup, args.pages, args.buckets)
+        print(f"{label}:")
+        bucket_size = args.pages // args.buckets
+        for i, t in enumerate(bucket_times):
+            print(f"  pages {i * bucket_size + 1:5}-{(i + 1) * bucket_size:5}: {1e6 * t / bucket_size:10.2f} µs/page")
+        print(f"  total: {sum(bucket_times):.3f} seconds")
+        print()
+
+
+def run(xpf: XMIProcessorFactory, lookup, pages: int, buckets: int) -> list[float]:
+    bucket_size = pages // buckets
+    bucket_times = []
+    tic = time.perf_counter()
+    for n in range(1, pages + 1):
+        page_id = f"NL-HaNA_1.04.02_9999_{n:04d}"
+        text = f"synthetic text of page {n}\n" * 40
+        md5 = hashlib.md5(text.encode()).hexdigest()
+        xpf.put_document_data(page_id, {
+            "plain_text_source": f"urn:example:{page_id}#page-normalized",
+            "plain_text_md5": md5,
+            "text_intervals": []
+        })
+        if lookup(xpf, md5) != page_id:
+            raise Exception(f"lookup failed for {page_id}")
+        if n % bucket_size == 0:
+            toc = time.perf_counter()
+            bucket_times.append(toc - tic)
+            tic = toc
+    return bucket_times
+
+
+def linear_scan_lookup(xpf: XMIProcessorFactory, md5: str) -> str:
+    found = None
+    for k, v in xpf.document_data.items():
+        if v['plain_text_md5'] == md5:
+            found = k
+    return found
+
+
+def indexed_lookup(xpf: XMIProcessorFactory, md5: str) -> str:
+    return xpf.document_key_for_md5.get(md5)
+
+
+if __name__ == '__main__':
+    main()
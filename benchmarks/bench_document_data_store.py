@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Compare XMIProcessorFactory with document_data loaded from the json file (as it used to be) versus read from the
+sharded document data store: the startup time of the factory, and the time and memory of a pool of workers that
+get the factory with their task, as in run_in_parallel, and look up documents in it.
+
+The documents are those in data/document_data.json, repeated under new ids and md5s. Every loader runs in a fresh
+process; the worker memory is its peak RSS and its private (unshared) memory at the end of the task.
+
+Run from the project root: poetry run python benchmarks/bench_document_data_store.py --documents 2000
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import multiprocess as mp
+import orjson
+from loguru import logger
+
+from globalise_tools.document_data_store import migrate_document_data
+from scripts.gt_ner_xmi_to_wa import DOCUMENT_DATA_PATH, XMIProcessorFactory
+
+WORKERS = 5
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the document data json loader versus the store")
+    parser.add_argument("--documents", type=int, default=500, help="The number of documents in document_data")
+    parser.add_argument("--lookups", type=int, default=500, help="The number of documents each worker looks up")
+    args = parser.parse_args()
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = f"{tmp_dir}/document_data.json"
+        store_path = f"{tmp_dir}/document_data"
+        md5s = write_synthetic_document_data(json_path, args.documents)
+        tic = time.perf_counter()
+        migrate_document_data(json_path, store_path)
+        migrate_seconds = time.perf_counter() - tic
+        print(f"{args.documents} documents, {os.path.getsize(json_path) / 1024 / 1024:.0f} MB of json,"
+              f" migrated in {migrate_seconds:.2f}s")
+        print(f"{'loader':8s} {'startup':>9s} {'pool':>9s} {'worker peak RSS':>16s} {'worker private':>15s}")
+        for label, path in [("json", json_path), ("store", store_path)]:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                r = executor.submit(run, path, md5s, args.lookups).result()
+            print(f"{label:8s} {r['startup_seconds']:8.3f}s {r['pool_seconds']:8.3f}s"
+                  f" {r['worker_max_rss']:13.0f} MB {r['worker_private']:12.0f} MB")
+
+
+def run(document_data_path: str, md5s: list[str], lookups: int) -> dict:
+    tic = time.perf_counter()
+    xpf = XMIProcessorFactory("data/typesystem.xml", {}, {}, git_commit_id="benchmark",
+                              document_data_path=document_data_path)
+    startup_seconds = time.perf_counter() - tic
+
+    rng = random.Random(42)
+    tasks = [(xpf, rng.sample(md5s, min(lookups, len(md5s)))) for _ in range(WORKERS)]
+    tic = time.perf_counter()
+    with mp.Pool(WORKERS) as p:
+        worker_stats = p.map(look_up, tasks)
+    pool_seconds = time.perf_counter() - tic
+    return {
+        "startup_seconds": startup_seconds,
+        "pool_seconds": pool_seconds,
+        "worker_max_rss": max(s[0] for s in worker_stats),
+        "worker_private": max(s[1] for s in worker_stats)
+    }
+
+
+def look_up(task: tuple[XMIProcessorFactory, list[str]]) -> tuple[float, float]:
+    """look up the documents with the md5s, as XMIProcessor does; the peak RSS and private memory, in MB"""
+    xpf, md5s = task
+    for md5 in md5s:
+        document_id = xpf.document_key_for_md5[md5]
+        if xpf.document_data[document_id]["plain_text_md5"] != md5:
+            raise Exception(f"wrong document for {md5}")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, private_megabytes()
+
+
+def private_megabytes() -> float:
+    with open("/proc/self/smaps_rollup") as f:
+        kilobytes = sum(int(line.split()[1]) for line in f if line.startswith(("Private_Clean", "Private_Dirty")))
+    return kilobytes / 1024
+
+
+def write_synthetic_document_data(path: str, documents: int) -> list[str]:
+    """document_data with the documents of DOCUMENT_DATA_PATH repeated under new ids and md5s; the md5s"""
+    with open(DOCUMENT_DATA_PATH, "rb") as f:
+        templates = list(orjson.loads(f.read()).values())
+    document_data = {}
+    for n in range(documents):
+        data = dict(templates[n % len(templates)])
+        data["plain_text_md5"] = f"{n:032x}"
+        document_data[f"NL-HaNA_1.04.02_9999_{n:04d}"] = data
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(document_data))
+    return [d["plain_text_md5"] for d in document_data.values()]
+
+
+if __name__ == '__main__':
+    main()
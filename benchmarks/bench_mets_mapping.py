@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare resolving the IIIF base url of every record div in a METS document with a findall over the whole document
+per div (as gt_map_pagexml_to_iiif_url used to do) versus a file ID -> FLocat dictionary built in one pass.
+
+Run from the project root: poetry run python benchmarks/bench_mets_mapping.py
+"""
+import argparse
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+from scripts.gt_map_pagexml_to_iiif_url import get_mappings, to_div, base_name, METS_NS, XLINK_HREF
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark METS file ID resolution")
+    parser.add_argument("--pages", type=int, default=5_000, help="The number of pages in the synthetic METS file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "NL-HaNA_1.04.02_9999.xml")
+        with open(path, "w") as f:
+            f.write(synthetic_mets(args.pages))
+
+        tic = time.perf_counter()
+        scanned = get_mappings_by_scanning(path)
+        scan_time = time.perf_counter() - tic
+
+        tic = time.perf_counter()
+        indexed = get_mappings(path)
+        index_time = time.perf_counter() - tic
+
+    if indexed != scanned:
+        raise Exception("the mappings differ")
+    print(f"{args.pages} pages, {len(indexed)} mappings (identical results)")
+    print(f"find per div     : {scan_time:8.3f} s")
+    print(f"file ID dict     : {index_time:8.3f} s")
+    print(f"speedup          : {scan_time / index_time:8.1f}x")
+
+
+def get_mappings_by_scanning(file_path: str) -> list:
+    # the lookup gt_map_pagexml_to_iiif_url used before
+    root = ET.parse(file_path).getroot()
+    divs = [to_div(e) for e in root.findall(f".//{METS_NS}div[@ORDERLABEL='record (item)']")]
+    mappings = []
+    for d in divs:
+        url = root.find(f".//{METS_NS}file[@ID='{d.id}IIP']") \
+            .find(f".//{METS_NS}FLocat") \
+            .get(XLINK_HREF) \
+            .replace('/info.json', '')
+        mappings.append((base_name(d.label), url))
+    return mappings
+
+
+def synthetic_mets(pages: int) -> str:
+    """a METS document shaped like the ones from the Nationaal Archief, with a master, a thumbnail and an IIIF file per page"""
+    ns = 'xmlns:mets="http://www.loc.gov/METS/" xmlns:xlink="http://www.w3.org/1999/xlink"'
+    file_groups = []
+    for use, suffix in [("MASTER", "M"), ("THUMB", "T"), ("IIIF", "IIP")]:
+        files = "".join(
+            f'<mets:file ID="FID{p:05d}{suffix}" MIMETYPE="image/jpeg">'
+            f'<mets:FLocat LOCTYPE="URL" xlink:href="https://service.archief.nl/iip/{p:05d}-{use.lower()}/info.json"/>'
+            f'</mets:file>'
+            for p in range(pages))
+        file_groups.append(f'<mets:fileGrp USE="{use}">{files}</mets:fileGrp>')
+    divs = "".join(
+        f'<mets:div ID="FID{p:05d}" ORDER="{p + 1}" ORDERLABEL="record (item)" '
+        f'LABEL="NL-HaNA_1.04.02_9999_{p + 1:04d}.tif"/>'
+        for p in range(pages))
+    return (f'<mets:mets {ns}><mets:fileSec>{"".join(file_groups)}</mets:fileSec>'
+            f'<mets:structMap><mets:div>{divs}</mets:div></mets:structMap></mets:mets>')
+
+
+if __name__ == '__main__':
+    main()
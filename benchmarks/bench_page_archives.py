@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compare storing (and reading back) the annotation pages of an inventory as loose files, as loose files that are
+then moved into a zip (as remote/Makefile does with `zip -m`), and directly in a zip, tar.gz or jsonl archive.
+
+The pages are those built from the test fixtures in tests/data, repeated under new page ids. Every layout runs in a
+fresh process, where an audit hook counts the file system operations (open, mkdir, remove, listdir, ...) that
+python does; the number of inodes is that of the files left in the output directory.
+
+Run from the project root: poetry run python benchmarks/bench_page_archives.py --pages 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+import globalise_tools.io_tools as rw
+import globalise_tools.provenance as provenance
+import scripts.gt_ner_xmi_to_wa as nx
+from globalise_tools.annotation_page_factory import AnnotationPageFactory
+from globalise_tools.page_archives import PageFormat, open_page_sink, open_page_source, page_archive_path, page_name
+from globalise_tools.url_factory import AnnotationPageType
+
+TEST_DATA_DIR = Path(__file__).parent.parent / "tests" / "data"
+INVENTORY_NUMBER = "1092"
+LAYOUTS = ["dir", "dir + zip -m", "zip", "tar.gz", "jsonl"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the annotation page archive formats")
+    parser.add_argument("--pages", type=int, default=2000, help="The number of pages (scans) in the inventory")
+    args = parser.parse_args()
+    logger.remove()
+
+    pages = synthetic_pages(args.pages)
+    megabytes = sum(len(p) for p in pages.values()) / 1024 / 1024
+    print(f"{args.pages} scans, {len(pages)} annotation pages, {megabytes:.0f} MB")
+    print(f"{'layout':14s} {'write':>9s} {'read':>9s} {'fs ops write':>13s} {'fs ops read':>12s} {'inodes':>7s}"
+          f" {'size':>9s}")
+    for layout in LAYOUTS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                r = executor.submit(run, layout, pages, tmp_dir).result()
+        print(f"{layout:14s} {r['write_seconds']:8.2f}s {r['read_seconds']:8.2f}s {r['write_ops']:13d}"
+              f" {r['read_ops']:12d} {r['inodes']:7d} {r['megabytes']:7.0f}MB")
+
+
+def run(layout: str, pages: dict[tuple[AnnotationPageType, str], bytes], output_dir: str) -> dict:
+    fs_ops = Counter()
+    sys.addaudithook(lambda event, _args: fs_ops.update([event]) if _is_fs_op(event) else None)
+
+    tic = time.perf_counter()
+    path = write(layout, pages, output_dir)
+    write_seconds = time.perf_counter() - tic
+    write_ops = sum(fs_ops.values())
+
+    tic = time.perf_counter()
+    with open_page_source(path) as source:
+        for page_type, page_id in pages:
+            if source.read(page_type, page_id) is None:
+                raise Exception(f"{layout}: page {page_name(page_type, page_id)} not found")
+    read_seconds = time.perf_counter() - tic
+
+    files = [os.path.join(d, f) for d, _, fs in os.walk(output_dir) for f in fs]
+    return {
+        "write_seconds": write_seconds,
+        "read_seconds": read_seconds,
+        "write_ops": write_ops,
+        "read_ops": sum(fs_ops.values()) - write_ops,
+        "inodes": len(files),
+        "megabytes": sum(os.path.getsize(f) for f in files) / 1024 / 1024
+    }
+
+
+def write(layout: str, pages: dict[tuple[AnnotationPageType, str], bytes], output_dir: str) -> str:
+    """store the pages in the layout, and return the path to read them from"""
+    page_format = PageFormat.DIRECTORY if layout.startswith("dir") else PageFormat(layout)
+    with open_page_sink(output_dir, INVENTORY_NUMBER, page_format) as sink:
+        for (page_type, page_id), page in pages.items():
+            sink.write(page_type, page_id, page)
+    if layout != "dir + zip -m":
+        return page_archive_path(output_dir, INVENTORY_NUMBER, page_format)
+
+    zip_path = page_archive_path(output_dir, INVENTORY_NUMBER, PageFormat.ZIP)
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for page_type, page_id in pages:
+            page_path = f"{output_dir}/{page_name(page_type, page_id)}"
+            z.write(page_path, page_name(page_type, page_id))
+            os.remove(page_path)
+    for page_type in AnnotationPageType:
+        if os.path.isdir(f"{output_dir}/{page_type.value}"):
+            os.rmdir(f"{output_dir}/{page_type.value}")
+    return zip_path
+
+
+def _is_fs_op(event: str) -> bool:
+    return event == "open" or event.startswith("os.") or event.startswith("shutil.")
+
+
+def synthetic_pages(scans: int) -> dict[tuple[AnnotationPageType, str], bytes]:
+    """the annotation pages built from the test fixtures, repeated under new page ids"""
+    provenance.start_run(commit_id="benchmark", timestamp="2024-01-01T00:00:00")
+    xpf = nx.XMIProcessorFactory("data/typesystem.xml", {}, rw.read_json(str(TEST_DATA_DIR / "eventmapping.json")),
+                                 "benchmark")
+    apf = AnnotationPageFactory(INVENTORY_NUMBER, str(TEST_DATA_DIR / "pagexml"), str(TEST_DATA_DIR / "xmi"), xpf,
+                                str(TEST_DATA_DIR / "manifests" / f"{INVENTORY_NUMBER}.json"),
+                                "scripts/gt_create_annotation_lists_for_inventory_number.py")
+    apf.build_annotation_pages()
+    templates = sorted(apf.transcription_pages)
+    pages = {}
+    for scan in range(1, scans + 1):
+        template_id = templates[scan % len(templates)]
+        page_id = f"NL-HaNA_1.04.02_{INVENTORY_NUMBER}_{scan:04d}"
+        for page_type, built_pages in [(AnnotationPageType.TRANSCRIPTIONS, apf.transcription_pages),
+                                       (AnnotationPageType.ENTITIES, apf.entity_pages),
+                                       (AnnotationPageType.EVENTS, apf.event_pages)]:
+            if template_id in built_pages:
+                pages[(page_type, page_id)] = built_pages[template_id].replace(template_id.encode(),
+                                                                               page_id.encode())
+    return pages
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Time the stages behind gt-create-annotation-lists-for-inventory-number, gt-make-inventory-index,
+gt-classify-language and gt-annotations-as-ttl on a synthetic inventory (see pipeline_fixtures.py), and record the
+wall time, peak memory (max rss) and the cProfile top functions of every stage as json, for comparison across commits.
+
+Every stage runs twice, each time in a fresh process: once to measure the wall time and max rss, and once under
+cProfile (so the profiler overhead doesn't end up in the timings). The max rss includes the imported modules;
+with --workers > 1, the profile only covers the main process.
+The stages run in pipeline order, as the later ones read the annotation pages written by the first.
+
+Run from the project root: poetry run python benchmarks/bench_pipelines.py --pages 500 --compare <earlier results>.json
+"""
+import argparse
+import contextlib
+import cProfile
+import glob
+import json
+import os
+import platform
+import pstats
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable
+
+import orjson
+from loguru import logger
+
+import globalise_tools.git_tools as git
+import globalise_tools.io_tools as rw
+import globalise_tools.provenance as provenance
+import scripts.gt_ner_xmi_to_wa as nx
+from globalise_tools.annotation_page_factory import AnnotationPageFactory
+from globalise_tools.fuzzy_index import FuzzyIndex
+from globalise_tools.jsonld_contexts import ContextRegistry, register_document_loader
+from globalise_tools.page_archives import DirectoryPageSink
+from globalise_tools.url_factory import AnnotationPageType
+from pipeline_fixtures import INVENTORY_NUMBER, write_inventory_fixtures
+from scripts.gt_annotations_as_ttl import export_in_nquads, export_in_ttl
+from scripts.gt_classify_language import classify_file
+from scripts.gt_make_inventory_index import InventoryProcessor
+
+PLACENAME_ALTERNATIVES = "data/placename-alternatives.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and profile the core pipeline stages")
+    parser.add_argument("--pages", type=int, default=200, help="The number of pages in the synthetic inventory")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="The number of workers for gt-create-annotation-lists-for-inventory-number")
+    parser.add_argument("--profile-top", type=int, default=25,
+                        help="The number of functions (by cumulative time) to record per stage")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="The stages to run (the inventory index and rdf stages need the annotation lists)")
+    parser.add_argument("-o", "--output", type=str,
+                        help="The json file to write the results to (default: bench-pipelines-<commit>.json)")
+    parser.add_argument("--compare", type=str, help="The json results of an earlier run, to compare with")
+    args = parser.parse_args()
+
+    commit_id = git.read_current_commit_id()
+    results = {
+        "commit": commit_id,
+        "uncommitted_changes": git.there_are_uncommitted_changes(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": {"pages": args.pages, "workers": args.workers},
+        "stages": {}
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = write_inventory_fixtures(tmp_dir, args.pages)
+        paths["workers"] = args.workers
+        for name in args.stages:
+            seconds, max_rss = run_isolated(timed, name, paths)
+            profile = run_isolated(profiled, name, paths, args.profile_top)
+            results["stages"][name] = {"wall_seconds": seconds, "max_rss_mb": max_rss, "profile": profile}
+            print(f"{name:28s}: {seconds:8.2f} s, max rss {max_rss:8.0f} MB")
+
+    output = args.output or f"bench-pipelines-{commit_id[:10]}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+def run_isolated(function, *args):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(function, *args).result()
+
+
+def timed(stage_name: str, paths: dict[str, Any]) -> tuple[float, float]:
+    stage = _prepared_stage(stage_name, paths)
+    tic = time.perf_counter()
+    stage()
+    return time.perf_counter() - tic, max_rss_mb()
+
+
+def profiled(stage_name: str, paths: dict[str, Any], top: int) -> list[dict[str, Any]]:
+    stage = _prepared_stage(stage_name, paths)
+    profiler = cProfile.Profile()
+    profiler.runcall(stage)
+    return top_functions(pstats.Stats(profiler), top)
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def top_functions(stats: pstats.Stats, top: int) -> list[dict[str, Any]]:
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return [
+        {
+            "function": f"{_project_relative(file)}:{line}({function_name})",
+            "ncalls": ncalls,
+            "primitive_calls": primitive_calls,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6),
+        }
+        for (file, line, function_name), (primitive_calls, ncalls, tottime, cumtime, _callers) in rows
+    ]
+
+
+def _project_relative(path: str) -> str:
+    # so the profiles of checkouts in different directories can be compared
+    return os.path.relpath(path, PROJECT_DIR) if path.startswith(PROJECT_DIR) else path
+
+
+def compare(earlier: dict[str, Any], results: dict[str, Any]) -> None:
+    print(f"compared with {earlier['commit'][:10]}:")
+    if earlier["parameters"] != results["parameters"]:
+        print(f"(note: run with {earlier['parameters']} instead of {results['parameters']})")
+    for name, stage in results["stages"].items():
+        if name in earlier["stages"]:
+            before = earlier["stages"][name]
+            print(f"{name:28s}: {before['wall_seconds']:8.2f} -> {stage['wall_seconds']:8.2f} s"
+                  f" ({stage['wall_seconds'] / before['wall_seconds']:5.2f}x),"
+                  f" max rss {before['max_rss_mb']:6.0f} -> {stage['max_rss_mb']:6.0f} MB")
+
+
+def _prepared_stage(stage_name: str, paths: dict[str, Any]) -> Callable[[], None]:
+    """the stage, with the setup that isn't part of the timing (logging, provenance) done"""
+    logger.remove()
+    logger.add(sink=sys.stderr, level="ERROR")
+    provenance.start_run(commit_id="benchmark", timestamp="2024-01-01T00:00:00")
+    return lambda: STAGES[stage_name](paths)
+
+
+def create_annotation_lists(paths: dict[str, Any]) -> None:
+    xpf = nx.XMIProcessorFactory("data/typesystem.xml", {}, rw.read_json(paths["event_mapping"]),
+                                 "benchmark")
+    apf = AnnotationPageFactory(
+        inventory_number=INVENTORY_NUMBER,
+        pagexml_dir=paths["pagexml_dir"],
+        xmi_dir=paths["xmi_dir"],
+        xmi_processor_factory=xpf,
+        manifest_path=paths["manifest"],
+        script_path="scripts/gt_create_annotation_lists_for_inventory_number.py",
+        workers=paths["workers"]
+    )
+    output_dir = _inventory_work_dir(paths)
+    with DirectoryPageSink(output_dir) as sink:
+        apf.build_annotation_pages(sink)
+    if apf.errors:
+        raise Exception(f"creating the annotation lists failed: {apf.errors}")
+    _write_rdf_input(output_dir)
+
+
+def _write_rdf_input(output_dir: str) -> None:
+    # pages without entities or events get empty pages, as PageStore would otherwise fetch them from the url,
+    # and the entity annotations are collected as the input for gt-annotations-as-ttl
+    annotations = []
+    for transcription_path in sorted(glob.glob(f"{output_dir}/{AnnotationPageType.TRANSCRIPTIONS.value}/*.json")):
+        file_name = os.path.basename(transcription_path)
+        for page_type in [AnnotationPageType.ENTITIES, AnnotationPageType.EVENTS]:
+            page_path = f"{output_dir}/{page_type.value}/{file_name}"
+            if os.path.exists(page_path):
+                if page_type == AnnotationPageType.ENTITIES:
+                    annotations.extend(rw.read_json(page_path, quiet=True)["items"])
+            else:
+                os.makedirs(os.path.dirname(page_path), exist_ok=True)
+                with open(page_path, "wb") as f:
+                    f.write(orjson.dumps({"items": []}))
+    with open(f"{output_dir}/annotations.json", "wb") as f:
+        f.write(orjson.dumps(annotations))
+
+
+def make_inventory_index(paths: dict[str, Any]) -> None:
+    preferred_placenames = rw.read_json(PLACENAME_ALTERNATIVES, quiet=True)
+    document_definitions = rw.read_json(paths["document_definitions"], quiet=True)[INVENTORY_NUMBER]
+    inventory = rw.read_json(paths["inventory"], quiet=True)
+    # gt-make-inventory-index reads and writes work/<inventory_number> relative to the working directory
+    os.chdir(paths["work_dir"])
+    with open(os.devnull, "w") as out, contextlib.redirect_stdout(out):
+        InventoryProcessor(INVENTORY_NUMBER, inventory, document_definitions, preferred_placenames,
+                           FuzzyIndex(preferred_placenames)).process()
+
+
+def classify_language(paths: dict[str, Any]) -> None:
+    with open(os.devnull, "w") as out:
+        classify_file(paths["lines_tsv"], out)
+
+
+def annotations_as_nquads(paths: dict[str, Any]) -> None:
+    json_path = f"{_inventory_work_dir(paths)}/annotations.json"
+    registry = register_document_loader(ContextRegistry())
+    with open(json_path) as f:
+        annotations = json.load(f)
+    export_in_nquads(annotations, json_path.replace(".json", ".nq.gz"), registry)
+
+
+def annotations_as_turtle(paths: dict[str, Any]) -> None:
+    json_path = f"{_inventory_work_dir(paths)}/annotations.json"
+    registry = register_document_loader(ContextRegistry())
+    with open(json_path) as f:
+        annotations = json.load(f)
+    export_in_ttl(annotations, json_path.replace(".json", ".ttl"), registry)
+
+
+def _inventory_work_dir(paths: dict[str, Any]) -> str:
+    return f"{paths['work_dir']}/work/{INVENTORY_NUMBER}"
+
+
+PROJECT_DIR = os.getcwd()
+STAGES = {
+    "create-annotation-lists": create_annotation_lists,
+    "make-inventory-index": make_inventory_index,
+    "classify-language": classify_language,
+    "annotations-as-nq": annotations_as_nquads,
+    "annotations-as-ttl": annotations_as_turtle,
+}
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare matching Place NER records against the preferred placenames by scanning all placenames
+(as gt_make_inventory_index used to do) versus querying a FuzzyIndex (bigram candidate filter) built once per run.
+
+Run from the project root: poetry run python benchmarks/bench_placename_matching.py
+"""
+import argparse
+import random
+import string
+import time
+
+from Levenshtein import distance
+
+from globalise_tools.fuzzy_index import FuzzyIndex
+
+MAX_DISTANCE = 4
+ONSETS = ["", "b", "d", "g", "h", "j", "k", "l", "m", "n", "p", "r", "s", "t", "w", "ng", "tj", "kr", "st", "br"]
+VOWELS = ["a", "e", "i", "o", "u", "oe", "aa", "ee"]
+CODAS = ["", "", "", "n", "ng", "r", "k", "m", "s", "t"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy placename matching")
+    parser.add_argument("--placenames", type=int, default=50_000, help="The size of the synthetic gazetteer")
+    parser.add_argument("--records", type=int, default=500, help="The number of Place records to match")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    placenames = {}
+    while len(placenames) < args.placenames:
+        placenames[synthetic_placename(rng)] = True
+    placenames = list(placenames)
+    queries = [mutated(rng, rng.choice(placenames)) if rng.random() < 0.8 else synthetic_placename(rng)
+               for _ in range(args.records)]
+
+    tic = time.perf_counter()
+    index = FuzzyIndex(placenames)
+    build_time = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    indexed = [index.closest(q, MAX_DISTANCE) for q in queries]
+    index_time = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    scanned = [brute_force_closest(q, placenames) for q in queries]
+    scan_time = time.perf_counter() - tic
+
+    if indexed != scanned:
+        mismatches = sum(1 for a, b in zip(indexed, scanned) if a != b)
+        raise Exception(f"{mismatches} queries matched differently")
+    matched = sum(1 for m in indexed if m)
+    print(f"{len(placenames)} placenames, {len(queries)} records, {matched} matched (identical results)")
+    print(f"brute force scan : {1e3 * scan_time / len(queries):8.3f} ms/record")
+    print(f"fuzzy index      : {1e3 * index_time / len(queries):8.3f} ms/record"
+          f" (+ {build_time:.2f} s to build the index once)")
+    print(f"speedup          : {scan_time / index_time:8.1f}x")
+
+
+def brute_force_closest(key: str, placenames: list[str]) -> str | None:
+    # the scan from DocumentProcessor._matching_preferred_placename
+    if key in placenames:
+        return key
+    original_length = len(key)
+    best_match = None
+    best_distance = MAX_DISTANCE + 1
+    for k in placenames:
+        other_length = len(k)
+        d = distance(key, k, score_cutoff=best_distance - 1)
+        if d < best_distance and d < min(original_length, other_length):
+            best_match = k
+            best_distance = d
+    return best_match
+
+
+def synthetic_placename(rng: random.Random) -> str:
+    name = synthetic_word(rng, rng.randint(1, 4))
+    if rng.random() < 0.2:
+        name += " " + synthetic_word(rng, rng.randint(1, 2))
+    return name
+
+
+def synthetic_word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for _ in range(syllables))
+
+
+def mutated(rng: random.Random, name: str) -> str:
+    chars = list(name)
+    for _ in range(rng.randint(0, 3)):
+        i = rng.randrange(len(chars))
+        op = rng.choice("sid")
+        if op == "s":
+            chars[i] = rng.choice(string.ascii_lowercase)
+        elif op == "i":
+            chars.insert(i, rng.choice(string.ascii_lowercase))
+        elif len(chars) > 1:
+            del chars[i]
+    return "".join(chars)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Compare reading a generated INCEpTION WebAnno TSV export with readlines() (as read_webanno_tsv used to do) versus
+the incremental WebAnnoTsvParser, both into a Document and as a stream that doesn't keep the items.
+
+Every reader runs in a fresh process, so the peak memory (max rss) is that of the reader alone. The Documents are
+compared by a digest of their sentences, tokens, annotations and links.
+
+Run from the project root: poetry run python benchmarks/bench_webanno_tsv_reader.py --megabytes 500
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Tuple
+
+from globalise_tools.events import EVENT_LAYER_NAME, NAMED_ENTITY_LAYER_NAME
+from globalise_tools.webanno_tsv_reader import (MULTILINE_SPLIT_CHAR, NO_LABEL_ID, PREFIX_CHAIN_LAYER, PREFIX_FORMAT,
+                                                PREFIX_RELATION_LAYER, PREFIX_SPAN_LAYER, PREFIX_TEXT, SENTENCE_RE,
+                                                LINK_FEATURE_NAME, Annotation, Document, Layer, Sentence, Token,
+                                                _is_slot_feature, _layer_field_names, _link_annotations,
+                                                _read_label_and_id, _read_span_layer, _split_dict, _todo, _unescape,
+                                                iter_webanno_tsv, read_webanno_tsv)
+
+ARGUMENT_LAYER_NAME = "webanno.custom.SemArgGLOB"
+HEADER = f"""#FORMAT=WebAnno TSV 3.3
+#T_SP={NAMED_ENTITY_LAYER_NAME}|identifier|value
+#T_SP={EVENT_LAYER_NAME}|ROLE_{EVENT_LAYER_NAME}:Argument_{EVENT_LAYER_NAME}ArgumentLink|{ARGUMENT_LAYER_NAME}|category
+#T_SP={ARGUMENT_LAYER_NAME}|
+
+
+"""
+WORDS = ["de", "van", "het", "een", "schip", "Compagnie", "gouverneur", "Batavia", "rsd:", "f", "1687", "Jan",
+         "pepel", "kaneel", "_", "[1]", "a|b", "->", ";", "*"]
+ENTITIES = ["CMTY", "LOC", "PER", "ORG", "SHIP", "DATE"]
+ROLES = ["agent", "patient", "location", "time"]
+EVENTS = ["Transfer", "Arriving", "Departing", "Damaging"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the WebAnno TSV readers")
+    parser.add_argument("--megabytes", type=int, default=50, help="The size of the generated export")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "NL-HaNA_1.04.02_9999_0001_0100.tsv")
+        lines = write_inception_export(path, args.megabytes * 1024 * 1024)
+        print(f"{os.path.getsize(path) / 1024 / 1024:.0f} MB, {lines} lines")
+
+        digests = set()
+        for name in READERS:
+            result = run_isolated(read_into_document, name, path)
+            if result:
+                seconds, max_rss, digest = result
+                digests.add(digest)
+                print(f"{name:12s} Document: {seconds:8.2f} s, max rss {max_rss:8.0f} MB")
+        result = run_isolated(stream, "incremental", path)
+        if result:
+            seconds, max_rss, items = result
+            print(f"{'incremental':12s} stream  : {seconds:8.2f} s, max rss {max_rss:8.0f} MB ({items} items)")
+    if len(digests) > 1:
+        raise Exception("the Documents differ")
+
+
+def run_isolated(function, *args):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            print(f"{args[0]:12s} {function.__name__}: out of memory")
+            return None
+
+
+def read_into_document(reader_name: str, path: str) -> tuple[float, float, str]:
+    tic = time.perf_counter()
+    doc = READERS[reader_name](path)
+    seconds = time.perf_counter() - tic
+    return seconds, max_rss_mb(), digest(doc)
+
+
+def stream(_reader_name: str, path: str) -> tuple[float, float, int]:
+    tic = time.perf_counter()
+    items = sum(1 for _ in iter_webanno_tsv(path))
+    return time.perf_counter() - tic, max_rss_mb(), items
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def digest(doc: Document) -> str:
+    h = hashlib.sha256()
+    h.update(repr((doc.format, doc.layers, doc.sentences)).encode())
+    for t in doc.tokens:
+        h.update(repr(t).encode())
+    for a in doc.annotations:
+        linked = [(al.label, doc.get_annotation_by_id(al.annotation_id).id) for al in a.linked_annotations]
+        h.update(repr((a.id, a.layer, a.features, a.label_id, a.token_texts, linked)).encode())
+    return h.hexdigest()
+
+
+def write_inception_export(path: str, size: int, seed: int = 42) -> int:
+    """
+    a WebAnno TSV 3.3 export like INCEpTION writes for the GLOBALISE event annotation project: named entities
+    (single- and multi-token, sometimes stacked), events with links to their arguments, and escaped characters
+    """
+    rng = random.Random(seed)
+    lines = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        sentence_num = 0
+        offset = 0
+        while f.tell() < size:
+            sentence_num += 1
+            words = [rng.choice(WORDS) for _ in range(rng.randint(3, 30))]
+            f.write(f"#Text={escape(' '.join(words))}\n")
+            lines += 1
+            columns = [["_"] * 6 for _ in words]
+            label_id = sentence_num * 100
+            i = 0
+            while i < len(words):
+                r = rng.random()
+                if r < 0.1 and i + 2 < len(words):
+                    label_id += 1
+                    for j in range(i, i + rng.randint(2, 3)):
+                        columns[j][0:2] = [f"*[{label_id}]", f"{rng.choice(ENTITIES)}[{label_id}]"]
+                    i += 3
+                elif r < 0.2:
+                    columns[i][0:2] = ["*", rng.choice(ENTITIES)]
+                    i += 1
+                elif r < 0.23:
+                    columns[i][0:2] = ["*|*", f"{rng.choice(ENTITIES)}|{rng.choice(ENTITIES)}"]
+                    i += 1
+                elif r < 0.28 and i + 3 < len(words):
+                    label_id += 1
+                    columns[i + 1][5] = "*"
+                    columns[i + 2][5] = f"*[{label_id}]"
+                    columns[i + 3][5] = f"*[{label_id}]"
+                    columns[i][2:5] = [f"{rng.choice(ROLES)};{rng.choice(ROLES)}",
+                                       f"{sentence_num}-{i + 2};{sentence_num}-{i + 3}[{label_id}]",
+                                       rng.choice(EVENTS)]
+                    i += 4
+                else:
+                    i += 1
+            for token_num, (word, token_columns) in enumerate(zip(words, columns), start=1):
+                f.write("\t".join([f"{sentence_num}-{token_num}", f"{offset}-{offset + len(word)}", escape(word),
+                                   *token_columns]) + "\t\n")
+                offset += len(word) + 1
+            f.write("\n")
+            lines += len(words) + 1
+    return lines + HEADER.count("\n")
+
+
+def escape(text: str) -> str:
+    for s in ["\\", "[", "]", "|", "_", "->", ";", "*"]:
+        text = text.replace(s, "\\" + s)
+    return text
+
+
+# the readlines() reader that read_webanno_tsv used to be, as the baseline for the incremental parser
+@dataclass
+class ParseContext:
+    layer_field_names: list[Tuple[str, str]] = field(default_factory=list)
+    multi_token_annotations: dict[str, Annotation] = field(default_factory=dict)
+
+
+def read_webanno_tsv_eagerly(path: str) -> Document:
+    """
+    Read the webanno_tsv file at `path` in one go (as read_webanno_tsv used to do),
+    and return a Document containing the tokens and annotations
+    """
+    doc = Document()
+    with open(path, mode='r', encoding='utf-8') as f:
+        lines = f.readlines()
+
+    doc.sentences = [Sentence(idx=i + 1, text=text) for i, text in enumerate(_filter_sentences(lines))]
+
+    context = ParseContext()
+
+    for i, line in enumerate(lines):
+        line = _unescape(line.strip())
+        if line.startswith(PREFIX_FORMAT):
+            doc.format = line.replace(PREFIX_FORMAT, "")
+        elif line.startswith(PREFIX_SPAN_LAYER):
+            _handle_span_layer(line, doc)
+        elif line.startswith(PREFIX_CHAIN_LAYER):
+            _todo()
+        elif line.startswith(PREFIX_RELATION_LAYER):
+            _todo()
+        elif line.startswith(PREFIX_TEXT):
+            pass  # already processed
+        elif "\t" in line:
+            _handle_annotation_line(line, doc, context)
+        elif not line:
+            pass  # skip empty lines
+        else:
+            raise Exception(f"unexpected line at {i + 1} : {line}")
+    _process_slot_features(doc)
+    return doc
+
+
+def _handle_annotation_line(line: str, doc: Document, context: ParseContext) -> None:
+    if not context.layer_field_names:
+        context.layer_field_names = _layer_field_names(doc.layers)
+    token, raw_feature_values = _parse_line(line)
+    raw_feature_value = defaultdict(dict)
+    for i, rfv in enumerate(raw_feature_values):
+        if rfv not in ["_"]:
+            layer_name, field_name = context.layer_field_names[i]
+            raw_feature_value[layer_name][field_name] = rfv
+    if len(raw_feature_value) > 0:
+        # ic(raw_feature_value)
+        for layer_name, feature_dict in raw_feature_value.items():
+            split_feature_values = _split_dict(feature_dict)
+            # ic(split_feature_values)
+            for d in split_feature_values:
+                features = {}
+                label_id = NO_LABEL_ID
+                for key, val in d.items():
+                    label, label_id = _read_label_and_id(val, key == LINK_FEATURE_NAME)
+                    if label:
+                        features[key] = label
+                multi_token_key = f"{layer_name}/{label_id}"
+                annotation_is_multi_token = label_id != NO_LABEL_ID
+                if annotation_is_multi_token and multi_token_key in context.multi_token_annotations:
+                    annotation = context.multi_token_annotations[multi_token_key]
+                    annotation.tokens.append(token)
+                else:
+                    annotation_id = f"{token.sentence_num}-{token.token_num}"
+                    if annotation_is_multi_token:
+                        annotation_id += f"[{label_id}]"
+                    annotation = Annotation(
+                        id=annotation_id,
+                        tokens=[token],
+                        layer=layer_name,
+                        features=features,
+                        label_id=label_id
+                    )
+                    if annotation_is_multi_token:
+                        context.multi_token_annotations[multi_token_key] = annotation
+                    doc.annotations.append(annotation)
+    doc.tokens.append(token)
+
+
+def _parse_line(line) -> tuple:
+    parts = line.split("\t")
+    (sentence_num, token_num) = parts[0].split("-")
+    (start_offset, end_offset) = parts[1].split("-")
+    value = parts[2]
+    token = Token(
+        sentence_num=int(sentence_num),
+        token_num=token_num,
+        start_offset=int(start_offset),
+        end_offset=int(end_offset),
+        text=value,
+    )
+
+    raw_feature_values = parts[3:]
+    return token, raw_feature_values
+
+
+def _filter_sentences(lines: list[str]) -> list[str]:
+    """
+    Filter lines beginning with 'Text=', if multiple such lines are
+    following each other, concatenate them.
+    """
+    matches = [SENTENCE_RE.match(line) for line in lines]
+    match_groups = [list(ms) for is_m, ms in itertools.groupby(matches, key=lambda m: m is not None) if is_m]
+    text_groups = [[m.group(1) for m in group] for group in match_groups]
+    return [MULTILINE_SPLIT_CHAR.join(group) for group in text_groups]
+
+
+def _handle_span_layer(line: str, doc: Document) -> None:
+    doc.layers.append(_read_span_layer(line))
+
+
+def _has_slot_feature(layer: Layer) -> bool:
+    return any([_is_slot_feature(f) for f in layer.features])
+
+
+def _process_slot_features(doc: Document) -> None:
+    layers_with_slot_features = [_layer.name for _layer in doc.layers if _has_slot_feature(_layer)]
+    layer_idx = {_layer.name: _layer for _layer in doc.layers}
+    annotations_with_slot_features = [a for a in doc.annotations
+                                      if a.layer in layers_with_slot_features]
+    slot_features_per_layer = {
+        _layer_name: [_feature for _feature in layer_idx[_layer_name].features
+                      if _is_slot_feature(_feature)]
+        for _layer_name in layers_with_slot_features}
+    for a in annotations_with_slot_features:
+        _link_annotations(a, slot_features_per_layer[a.layer])
+
+
+READERS = {
+    "readlines": read_webanno_tsv_eagerly,
+    "incremental": read_webanno_tsv,
+}
+
+
+if __name__ == '__main__':
+    main()
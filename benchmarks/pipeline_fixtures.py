@@ -0,0 +1,150 @@
+"""
+Synthetic inventories for bench_pipelines.py: PageXML, XMI, an IIIF manifest, a *-lines.lang.tsv and the inputs of
+gt-make-inventory-index, of a configurable number of pages.
+
+The PageXML and XMI are the test fixtures in tests/data, repeated under new page ids, so every page goes through the
+same code paths as in the tests: pages with entities, and pages without an XMI.
+"""
+import json
+import os
+import random
+import re
+from pathlib import Path
+from typing import Any
+
+from bench_classify_language import write_synthetic_lines_tsv
+
+TEST_DATA_DIR = Path(__file__).parent.parent / "tests" / "data"
+INVENTORY_NUMBER = "1092"
+TEMPLATE_PAGE_NUMBERS = [17, 18, 19]
+SETTLEMENTS = ["Batavia", "Ambon", "Banda", "Malakka", "Colombo", "Cochin"]
+PROFESSIONS = ["koopman", "schipper", "boekhouder", "predikant", "soldaat"]
+LINES_PER_PAGE = 40
+
+
+def page_id(page_number: int) -> str:
+    return f"NL-HaNA_1.04.02_{INVENTORY_NUMBER}_{page_number:04d}"
+
+
+def write_inventory_fixtures(fixture_dir: str, pages: int, seed: int = 42) -> dict[str, str]:
+    """
+    write a synthetic inventory of the given number of pages to fixture_dir,
+    and return the paths of its parts (as passed to the stages of bench_pipelines.py)
+    """
+    rng = random.Random(seed)
+    paths = {
+        "pagexml_dir": f"{fixture_dir}/pagexml",
+        "xmi_dir": f"{fixture_dir}/xmi",
+        "manifest": f"{fixture_dir}/manifests/{INVENTORY_NUMBER}.json",
+        "event_mapping": str(TEST_DATA_DIR / "eventmapping.json"),
+        "lines_tsv": f"{fixture_dir}/{INVENTORY_NUMBER}-lines.lang.tsv",
+        "work_dir": fixture_dir,
+        "inventory": f"{fixture_dir}/inventory.json",
+        "document_definitions": f"{fixture_dir}/document-definitions.json",
+    }
+    for d in [paths["pagexml_dir"], paths["xmi_dir"], os.path.dirname(paths["manifest"]),
+              f"{fixture_dir}/work/{INVENTORY_NUMBER}"]:
+        os.makedirs(d, exist_ok=True)
+
+    page_numbers = list(range(1, pages + 1))
+    _write_pages(paths["pagexml_dir"], paths["xmi_dir"], page_numbers)
+    _write_json(paths["manifest"], _manifest(page_numbers))
+    write_synthetic_lines_tsv(paths["lines_tsv"], pages * LINES_PER_PAGE, seed)
+
+    document_definitions = _document_definitions(rng, page_numbers)
+    _write_json(paths["inventory"], _inventory(page_numbers))
+    _write_json(paths["document_definitions"], {INVENTORY_NUMBER: document_definitions})
+    _write_json(f"{fixture_dir}/work/{INVENTORY_NUMBER}/entity_hierarchy.json",
+                _entity_hierarchy(rng, page_numbers))
+    _write_json(f"{fixture_dir}/work/{INVENTORY_NUMBER}/annotation_enhancements.json", {})
+    return paths
+
+
+def _write_pages(pagexml_dir: str, xmi_dir: str, page_numbers: list[int]) -> None:
+    templates = {}
+    for n in TEMPLATE_PAGE_NUMBERS:
+        xmi_path = TEST_DATA_DIR / "xmi" / f"{page_id(n)}.xmi"
+        templates[n] = (
+            (TEST_DATA_DIR / "pagexml" / f"{page_id(n)}.xml").read_text(encoding="utf-8"),
+            xmi_path.read_bytes() if xmi_path.exists() else None
+        )
+    for page_number in page_numbers:
+        template_number = TEMPLATE_PAGE_NUMBERS[page_number % len(TEMPLATE_PAGE_NUMBERS)]
+        pagexml, xmi = templates[template_number]
+        with open(f"{pagexml_dir}/{page_id(page_number)}.xml", "w", encoding="utf-8") as f:
+            f.write(pagexml.replace(page_id(template_number), page_id(page_number)))
+        if xmi is not None:
+            with open(f"{xmi_dir}/{page_id(page_number)}.xmi", "wb") as f:
+                f.write(xmi)
+
+
+def _manifest(page_numbers: list[int]) -> dict[str, Any]:
+    with open(TEST_DATA_DIR / "manifests" / f"{INVENTORY_NUMBER}.json") as f:
+        manifest = json.load(f)
+    template_items = {n: json.dumps(item) for n, item in zip(TEMPLATE_PAGE_NUMBERS, manifest["items"])}
+    items = []
+    for page_number in page_numbers:
+        template_number = TEMPLATE_PAGE_NUMBERS[page_number % len(TEMPLATE_PAGE_NUMBERS)]
+        item = template_items[template_number].replace(page_id(template_number), page_id(page_number))
+        item = re.sub(rf"/canvas/p{template_number}\b", f"/canvas/p{page_number}", item)
+        item = item.replace(f"(scan {template_number})", f"(scan {page_number})")
+        items.append(json.loads(item))
+    manifest["items"] = items
+    return manifest
+
+
+def _inventory(page_numbers: list[int]) -> dict[str, Any]:
+    return {
+        "inventory_number": INVENTORY_NUMBER,
+        "title": "Synthetic inventory",
+        "date_start": "1687-01-01",
+        "date_end": "1688-12-31",
+        "hierarchies": [{"name": "EAD", "paths": [[{"identifier": "ead:1.04.02"},
+                                                   {"identifier": f"ead:1.04.02:{INVENTORY_NUMBER}"}]]}],
+        "documents": [{"page_ids": [page_id(n) for n in page_numbers]}]
+    }
+
+
+def _document_definitions(rng: random.Random, page_numbers: list[int]) -> list[dict[str, Any]]:
+    """documents of 1 to 10 consecutive pages, some without dates or title"""
+    definitions = []
+    first = 0
+    while first < len(page_numbers):
+        last = min(first + rng.randint(1, 10), len(page_numbers)) - 1
+        n = len(definitions) + 1
+        definitions.append({
+            "id": f"{INVENTORY_NUMBER}-{n}",
+            "name": f"{INVENTORY_NUMBER}-{n}",
+            "title": "" if rng.random() < 0.1 else f"Missive {n}",
+            "settlement": rng.choice(SETTLEMENTS),
+            "method": "synthetic",
+            "date_start": "" if rng.random() < 0.2 else "1687-03-01",
+            "date_end": "" if rng.random() < 0.2 else "1687-05-31",
+            "start_scan": f"{page_id(page_numbers[first])}",
+            "end_scan": f"{page_id(page_numbers[last])}",
+            "number_of_scans": last - first + 1,
+        })
+        first = last + 1
+    return definitions
+
+
+def _entity_hierarchy(rng: random.Random, page_numbers: list[int]) -> dict[str, list[dict[str, Any]]]:
+    """profession concepts for about half of the pages"""
+    hierarchy = {}
+    for page_number in page_numbers:
+        if rng.random() < 0.5:
+            profession = rng.choice(PROFESSIONS)
+            hierarchy[page_id(page_number)] = [{
+                "uri": f"https://id.globalise.huygens.knaw.nl/professions/{profession}",
+                "label": profession,
+                "hierarchies": [{"scheme": "Beroepen", "elements": [
+                    {"identifier": "professions:handel", "label": "handel"},
+                    {"identifier": f"professions:{profession}", "label": profession}
+                ]}]
+            }]
+    return hierarchy
+
+
+def _write_json(path: str, data: Any) -> None:
+    with open(path, "w") as f:
+        json.dump(data, f)
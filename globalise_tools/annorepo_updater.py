@@ -0,0 +1,242 @@
+import copy
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import orjson
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from globalise_tools.logger_tools import log_writing_file
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class UpdateFailed(Exception):
+    """An AnnoRepo request that still failed after all attempts"""
+
+
+@dataclass
+class UpdateStats:
+    pages_searched: int = 0
+    annotations_found: int = 0
+    annotations_updated: int = 0
+    conflicts: int = 0
+    retries: int = 0
+    dead_lettered: int = 0
+
+
+class BulkAnnotationUpdater:
+    """
+    Updates the annotations of many pages in an AnnoRepo container:
+    the annotations are found with one search per inventory (of at most `search_batch_size` pages), and read
+    (with their ETag) and updated (with If-Match) by `concurrency` threads while the search results are being read.
+    Requests that fail with a connection error, a timeout or a 429/5xx are retried with bounded exponential backoff
+    (honouring Retry-After); an update that conflicts with a concurrent change (412) is applied again to a fresh read.
+    Annotations that still can't be updated after `max_attempts`, or whose update fails otherwise, are written to the
+    dead letter file (json lines), and their pages are not reported as done; so are the pages whose search fails.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            container_name: str,
+            dead_letter_path: str,
+            api_key: Optional[str] = None,
+            concurrency: int = 8,
+            search_batch_size: int = 500,
+            max_attempts: int = 6,
+            backoff_factor: float = 0.5,
+            max_backoff: float = 30,
+            timeout: float = 60
+    ) -> None:
+        self.base_url = base_url.strip("/")
+        self.container_name = container_name
+        self.dead_letter_path = dead_letter_path
+        self.concurrency = concurrency
+        self.search_batch_size = search_batch_size
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.stats = UpdateStats()
+        self.api_key = api_key
+        self._lock = threading.Lock()
+        # a requests.Session is not thread-safe: as in HttpClient, every thread gets a session of its own, and all
+        # of them share the one adapter, with its connection pool.
+        # The retries are done here, not by urllib3, so they can be counted, bounded and dead-lettered
+        self._adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=0)
+        self._local = threading.local()
+        self._sessions: list[requests.Session] = []
+
+    def update_pages(
+            self,
+            page_ids: Iterable[str],
+            update: Callable[[dict[str, Any]], bool],
+            page_id_field: str = "body.metadata.document",
+            on_page_done: Optional[Callable[[str], None]] = None
+    ) -> UpdateStats:
+        """
+        Apply update to the annotations of the given pages (those with the page id in page_id_field).
+        update changes the annotation in place and returns whether it changed anything; it is first applied to
+        (a copy of) the search result, to skip reading the annotations that need no update,
+        and then to the annotation as read, which is only written back when it changed.
+        on_page_done is called (from the calling thread) for every page whose annotations are all up to date.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for batch in self._search_batches(page_ids):
+                self._update_batch(executor, batch, update, page_id_field, on_page_done)
+        return self.stats
+
+    @property
+    def session(self) -> requests.Session:
+        """the session of the current thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.trust_env = False
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            if self.api_key:
+                session.headers["Authorization"] = f"Bearer {self.api_key}"
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._adapter.close()
+
+    def __enter__(self) -> "BulkAnnotationUpdater":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _search_batches(self, page_ids: Iterable[str]) -> Iterator[list[str]]:
+        """the page ids, per inventory, in batches of at most search_batch_size"""
+        for _, inventory_page_ids in itertools.groupby(sorted(page_ids), key=inventory_number):
+            inventory_page_ids = list(inventory_page_ids)
+            for i in range(0, len(inventory_page_ids), self.search_batch_size):
+                yield inventory_page_ids[i:i + self.search_batch_size]
+
+    def _update_batch(self, executor: ThreadPoolExecutor, page_ids: list[str],
+                      update: Callable[[dict[str, Any]], bool], page_id_field: str,
+                      on_page_done: Optional[Callable[[str], None]]) -> None:
+        logger.info(f"searching the annotations of {len(page_ids)} pages of inventory {inventory_number(page_ids[0])}")
+        futures: dict[Future, str] = {}
+        # at most a few tasks per thread are queued, so a large search result isn't held in memory
+        slots = threading.BoundedSemaphore(self.concurrency * 4)
+        try:
+            for annotation in self._search(page_id_field, page_ids):
+                self.stats.annotations_found += 1
+                if update(copy.deepcopy(annotation)):
+                    slots.acquire()
+                    future = executor.submit(self._update_annotation, annotation["id"], update)
+                    future.add_done_callback(lambda _: slots.release())
+                    futures[future] = _field_value(annotation, page_id_field)
+        except Exception as e:
+            self._dead_letter({"page_ids": page_ids, "error": _error_message(e)})
+            wait(futures)
+            return
+        wait(futures)
+        self.stats.pages_searched += len(page_ids)
+        failed_pages = {page_id for future, page_id in futures.items() if not future.result()}
+        if on_page_done:
+            for page_id in page_ids:
+                if page_id not in failed_pages:
+                    on_page_done(page_id)
+
+    def _search(self, page_id_field: str, page_ids: list[str]) -> Iterator[dict[str, Any]]:
+        response = self._request("POST", f"{self.base_url}/services/{self.container_name}/search",
+                                 json={page_id_field: {":isIn": page_ids}})
+        location = response.headers["Location"]
+        for page in itertools.count():
+            result_page = self._request("GET", location, params={"page": page}).json()
+            yield from result_page["items"]
+            if "next" not in result_page:
+                break
+
+    def _update_annotation(self, annotation_url: str, update: Callable[[dict[str, Any]], bool]) -> bool:
+        """read, update and write back the annotation; False if it was dead-lettered"""
+        url = f"{self.base_url}/w3c/{self.container_name}/{annotation_url.split('/')[-1]}"
+        try:
+            for _ in range(self.max_attempts):
+                response = self._request("GET", url)
+                annotation = response.json()
+                if not update(annotation):
+                    return True
+                response = self._request("PUT", url, json=annotation, headers={"If-Match": response.headers["ETag"]},
+                                         accept=(200, 412))
+                if response.status_code == 200:
+                    with self._lock:
+                        self.stats.annotations_updated += 1
+                    return True
+                # changed since it was read: update the current version
+                with self._lock:
+                    self.stats.conflicts += 1
+            raise UpdateFailed(f"PUT {url}: still conflicting after {self.max_attempts} attempts")
+        except Exception as e:
+            # whatever goes wrong with one annotation (a malformed response, an error in update, ...) doesn't stop
+            # the updates of the others
+            self._dead_letter({"annotation_id": annotation_url, "error": _error_message(e)})
+            return False
+
+    def _request(self, method: str, url: str, accept: tuple[int, ...] = (200, 201), **kwargs) -> requests.Response:
+        for attempt in range(self.max_attempts):
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                if response.status_code in accept:
+                    return response
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise UpdateFailed(f"{method} {url}: {response.status_code} {response.text[:200]}")
+                error = f"{response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+                retry_after = None
+            if attempt + 1 < self.max_attempts:
+                with self._lock:
+                    self.stats.retries += 1
+                time.sleep(self._backoff(attempt, retry_after))
+        raise UpdateFailed(f"{method} {url}: {error} after {self.max_attempts} attempts")
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        # full jitter, so the threads that were throttled together don't retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def _dead_letter(self, record: dict[str, Any]) -> None:
+        logger.warning(f"giving up on {record}")
+        with self._lock:
+            if self.stats.dead_lettered == 0:
+                log_writing_file(self.dead_letter_path)
+            self.stats.dead_lettered += 1
+            with open(self.dead_letter_path, "ab") as f:
+                f.write(orjson.dumps(record) + b"\n")
+
+
+def inventory_number(page_id: str) -> str:
+    """the inventory number in a page id like NL-HaNA_1.04.02_1092_0017"""
+    return page_id.split("_")[-2]
+
+
+def _error_message(e: Exception) -> str:
+    return str(e) if isinstance(e, UpdateFailed) else f"{type(e).__name__}: {e}"
+
+
+def _field_value(annotation: dict[str, Any], field: str) -> Any:
+    value = annotation
+    for key in field.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
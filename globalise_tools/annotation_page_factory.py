@@ -1,18 +1,23 @@
 import os
 import sys
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import multiprocess as mp
 import orjson
 from loguru import logger
 
+import globalise_tools.page_model as pm
 import globalise_tools.pagexml_tools as pt
+import globalise_tools.provenance as provenance
 import globalise_tools.url_factory as uf
 import scripts.gt_ner_xmi_to_wa as nx
+from globalise_tools.build_manifest import BuildManifest, data_digest, file_digest
 from globalise_tools.creator import CreatorFactory
 from globalise_tools.logger_tools import log_reading_file
 from globalise_tools.model import Dimensions
+from globalise_tools.page_archives import PageSink
+from globalise_tools.page_model import PageModel
 from scripts.gt_ner_xmi_to_wa import XMIProcessorFactory
 
 
@@ -24,7 +29,10 @@ class AnnotationPageFactory:
             xmi_dir: str,
             xmi_processor_factory: nx.XMIProcessorFactory,
             manifest_path: str,
-            script_path: str
+            script_path: str,
+            workers: int = 1,
+            build_manifest: Optional[BuildManifest] = None,
+            shared_inputs: Optional[dict[str, Optional[str]]] = None
     ) -> None:
         self.errors = []
         self.inventory_number = inventory_number
@@ -35,52 +43,138 @@ class AnnotationPageFactory:
         self.transcription_pages = {}
         self.xmi_processor_factory = xmi_processor_factory
         self.script_path = script_path
+        self.workers = workers
+        self.build_manifest = build_manifest
+        # the hashes of the inputs all pages are built from (typesystem, document data, event mapping, ...)
+        self.shared_inputs_digest = data_digest(shared_inputs or {})
+        self.page_inputs: dict[str, dict[str, Optional[str]]] = {}
+        self.skipped_pages: list[str] = []
+        # the types of the annotation pages built, per page id
+        self.built_pages: dict[str, list[uf.AnnotationPageType]] = {}
+        self.creator = CreatorFactory(script_paths=[script_path], commit_id=xmi_processor_factory.commit_id).creator(
+            label="Creation of Web Annotations from NER output in XMI format (generated by the GLOBALISE NER model).")
         self._load_manifest(manifest_path)
 
-    def build_annotation_pages(self) -> None:
+    def build_annotation_pages(self, page_sink: Optional[PageSink] = None) -> None:
+        """
+        Build the transcription, entity and event annotation pages for all pagexml files in pagexml_dir.
+        With a page_sink, every page is written to the sink as soon as it is built, and not kept;
+        otherwise the pages are stored serialized (as json bytes), keyed by page id, in sorted page id order.
+        With workers > 1 the pages are processed by a pool of that many worker processes.
+        With a build_manifest, the pages that are up to date with their inputs are skipped (see skipped_pages).
+        """
         if not self.errors:
             pagexml_paths = sorted(Path(self.pagexml_dir).glob("*.xml"))
-            # self._run_in_parallel(pagexml_paths)
-            self._run_sequentially(pagexml_paths)
-
-    def _run_in_parallel(self, pagexml_paths: list[Path], pool_size: int = 5):
-        with mp.Pool(pool_size) as p:
-            results = p.map(func=self._process_pagexml, iterable=pagexml_paths)
-        for page_id, transcription_annotation_page, entity_annotation_page, event_annotation_page in results:
-            self.transcription_pages[page_id] = transcription_annotation_page
-            if entity_annotation_page:
-                self.entity_pages[page_id] = entity_annotation_page
-            if event_annotation_page:
-                self.event_pages[page_id] = event_annotation_page
-
-    def _run_sequentially(self, pagexml_paths: list[Path]):
+            if self.build_manifest:
+                pagexml_paths = self._pages_to_build(pagexml_paths)
+            if self.workers > 1 and len(pagexml_paths) > 1:
+                self._run_in_parallel(pagexml_paths, page_sink)
+            else:
+                self._run_sequentially(pagexml_paths, page_sink)
+
+    def record_built_pages(self) -> None:
+        """
+        record the pages built in the build manifest, remove the outputs the pages no longer have
+        and those of pages whose pagexml is gone, and save the manifest
+        """
+        page_ids = [p.stem for p in Path(self.pagexml_dir).glob("*.xml")]
+        stale_outputs = self.build_manifest.retain(page_ids)
+        for page_id, page_types in self.built_pages.items():
+            outputs = [f"{page_type.value}/{page_id}.json" for page_type in page_types]
+            stale_outputs.extend(self.build_manifest.record(page_id, self.page_inputs[page_id], outputs))
+        self.build_manifest.remove_outputs(stale_outputs)
+        self.build_manifest.save()
+
+    def _pages_to_build(self, pagexml_paths: list[Path]) -> list[Path]:
+        to_build = []
         for pagexml_path in pagexml_paths:
-            page_id, transcription_annotation_page, entity_annotation_page, event_annotation_page = self._process_pagexml(
-                pagexml_path)
-            self.transcription_pages[page_id] = transcription_annotation_page
-            if entity_annotation_page:
-                self.entity_pages[page_id] = entity_annotation_page
-            if event_annotation_page:
-                self.event_pages[page_id] = event_annotation_page
+            page_id = pagexml_path.stem
+            inputs = self._page_inputs(page_id, pagexml_path)
+            if self.build_manifest.is_up_to_date(page_id, inputs):
+                self.skipped_pages.append(page_id)
+            else:
+                self.page_inputs[page_id] = inputs
+                to_build.append(pagexml_path)
+        logger.info(f"{len(self.skipped_pages)} pages up to date, {len(to_build)} to build")
+        return to_build
+
+    def _page_inputs(self, page_id: str, pagexml_path: Path) -> dict[str, Optional[str]]:
+        manifest_item = self.manifest["items"][self.manifest_item_idx[page_id]] \
+            if page_id in self.manifest_item_idx else None
+        return {
+            "pagexml": file_digest(str(pagexml_path)),
+            "xmi": file_digest(f"{self.xmi_dir}/{page_id}.xmi"),
+            "canvas": data_digest(manifest_item),
+            "shared": self.shared_inputs_digest
+        }
+
+    def _run_in_parallel(self, pagexml_paths: list[Path], page_sink: Optional[PageSink]):
+        pool_size = min(self.workers, len(pagexml_paths))
+        logger.info(f"processing {len(pagexml_paths)} pages with {pool_size} workers")
+        with mp.Pool(pool_size, initializer=_init_worker, initargs=(self, provenance.current_run())) as p:
+            # imap returns the results in the order of pagexml_paths, as they come in
+            for result in p.imap(_process_pagexml_in_worker, pagexml_paths, chunksize=1):
+                self._store_result(page_sink, *result)
+
+    def _run_sequentially(self, pagexml_paths: list[Path], page_sink: Optional[PageSink]):
+        for pagexml_path in pagexml_paths:
+            self._store_result(page_sink, *self._process_pagexml(pagexml_path))
+
+    def _store_result(
+            self,
+            page_sink: Optional[PageSink],
+            page_id: str,
+            transcription_annotation_page: bytes,
+            entity_annotation_page: Optional[bytes],
+            event_annotation_page: Optional[bytes],
+            xpf_errors: list[str]
+    ):
+        page_types = []
+        for page_type, page, pages in [
+            (uf.AnnotationPageType.TRANSCRIPTIONS, transcription_annotation_page, self.transcription_pages),
+            (uf.AnnotationPageType.ENTITIES, entity_annotation_page, self.entity_pages),
+            (uf.AnnotationPageType.EVENTS, event_annotation_page, self.event_pages)
+        ]:
+            if page:
+                page_types.append(page_type)
+                if page_sink:
+                    page_sink.write(page_type, page_id, page)
+                else:
+                    pages[page_id] = page
+        self.built_pages[page_id] = page_types
+        # in a worker process, the errors were added to the worker's copy of the XMIProcessorFactory
+        for error in xpf_errors:
+            if error not in self.xmi_processor_factory.errors:
+                self.xmi_processor_factory.errors.append(error)
 
     def _process_pagexml(
             self,
             pagexml_path: Path
-    ):
+    ) -> tuple[str, bytes, Optional[bytes], Optional[bytes], list[str]]:
         page_id = pagexml_path.name.split("/")[-1].replace(".xml", "")
         xmi_path = Path(f"{self.xmi_dir}/{page_id}.xmi")
+        xpf = self.xmi_processor_factory
+        errors_before = len(xpf.errors)
         dp = DocumentPageProcessor(
             page_id=page_id,
             pagexml_path=pagexml_path,
             xmi_path=xmi_path,
-            xpf=self.xmi_processor_factory,
+            xpf=xpf,
             iiif_base_uri_idx=self.iiif_base_uri_idx,
             canvas_id_idx=self.canvas_id_idx,
             script_path=self.script_path,
             manifest_item_idx=self.manifest_item_idx,
-            manifest=self.manifest
+            manifest=self.manifest,
+            canvas_dimensions=self.canvas_dimensions,
+            creator=self.creator
+        )
+        return (
+            page_id,
+            orjson.dumps(dp.transcription_annotation_page),
+            orjson.dumps(dp.entity_annotation_page) if dp.entity_annotation_page else None,
+            orjson.dumps(dp.event_annotation_page) if dp.event_annotation_page else None,
+            xpf.errors[errors_before:]
         )
-        return page_id, dp.transcription_annotation_page, dp.entity_annotation_page, dp.event_annotation_page
 
     def _load_manifest(self, manifest_path: str) -> None:
         if os.path.exists(manifest_path):
@@ -88,11 +182,28 @@ class AnnotationPageFactory:
             with open(manifest_path) as f:
                 manifest = orjson.loads(f.read())
             self.manifest_item_idx, self.iiif_base_uri_idx, self.canvas_id_idx = nx.index_manifest_items(manifest)
+            self.canvas_dimensions = {DocumentPageProcessor.canvas_page_id(c): Dimensions(c["width"], c["height"])
+                                      for c in manifest["items"]}
             self.manifest = manifest
         else:
             self.errors.append(f"No manifest found at {manifest_path}")
 
 
+_worker_page_factory: Optional[AnnotationPageFactory] = None
+
+
+def _init_worker(page_factory: AnnotationPageFactory, run: provenance.RunProvenance) -> None:
+    # runs once per worker process, so the factory (with its manifest indexes and typesystem)
+    # is sent to each worker once, instead of once per page
+    global _worker_page_factory
+    _worker_page_factory = page_factory
+    provenance.set_current_run(run)
+
+
+def _process_pagexml_in_worker(pagexml_path: Path):
+    return _worker_page_factory._process_pagexml(pagexml_path)
+
+
 class DocumentPageProcessor:
 
     def __init__(
@@ -105,24 +216,22 @@ class DocumentPageProcessor:
             canvas_id_idx,
             script_path: str,
             manifest_item_idx,
-            manifest
+            manifest,
+            canvas_dimensions: dict[str, Dimensions],
+            creator: dict[str, Any]
     ):
         self.page_id = page_id
         self.pagexml_path = pagexml_path
         self.xmi_path = xmi_path
-        xml_string = self._read_page_xml(pagexml_path)
+        page = self._read_page_xml(pagexml_path)
         self.transcription_annotation_page = {}
         self.entity_annotation_page = None
         self.event_annotation_page = None
-        creator = CreatorFactory(script_paths=[script_path], commit_id=xpf.commit_id) \
-            .creator(
-            label="Creation of Web Annotations from NER output in XMI format (generated by the GLOBALISE NER model).")
-
         normalized_page_text = ""
         canvas_id = uf.canvas_url(page_id)
         annotation_page_builder = pt.TranscriptionAnnotationPageBuilder(
             page_id=page_id,
-            xml_string=xml_string,
+            page=page,
             canvas_id=canvas_id,
             script_path=script_path,
             commit_id=xpf.commit_id
@@ -130,28 +239,31 @@ class DocumentPageProcessor:
         if xmi_path.exists():
             htr_word_offsets = annotation_page_builder.htr_word_offsets
             log_reading_file(xmi_path)
-            plain_text_source = nx.handle_page_xml(
-                xmi_path=str(xmi_path),
-                page_xml_path=str(pagexml_path),
-                xpf=xpf,
-                iiif_base_uri_for_base_name=iiif_base_uri_idx,
-                canvas_id_for_base_name=canvas_id_idx,
-            )
-
-            ner_annotations, event_annotations, normalized_page_text, normalized_word_offsets = nx.handle_xmi(
-                xmi_path=str(xmi_path),
-                ner_annotations=[],
-                event_annotations=[],
-                xpf=xpf,
-                plain_text_source=plain_text_source,
-                manifest=manifest,
-                manifest_item_idx=manifest_item_idx,
-                htr_offset=htr_word_offsets,
-                presentation_version=3
-            )
-
-            canvas_dimensions = {self._page_id(c): Dimensions(c["width"], c["height"]) for c in
-                                 manifest["items"]}
+            try:
+                plain_text_source = nx.handle_page_xml(
+                    xmi_path=str(xmi_path),
+                    page_xml_path=str(pagexml_path),
+                    xpf=xpf,
+                    iiif_base_uri_for_base_name=iiif_base_uri_idx,
+                    canvas_id_for_base_name=canvas_id_idx,
+                    page=page
+                )
+
+                ner_annotations, event_annotations, normalized_page_text, normalized_word_offsets = nx.handle_xmi(
+                    xmi_path=str(xmi_path),
+                    ner_annotations=[],
+                    event_annotations=[],
+                    xpf=xpf,
+                    plain_text_source=plain_text_source,
+                    manifest=manifest,
+                    manifest_item_idx=manifest_item_idx,
+                    htr_offset=htr_word_offsets,
+                    presentation_version=3
+                )
+            finally:
+                # the document data of this page is only needed to process its xmi
+                xpf.evict_document_data(nx.get_base_name(str(xmi_path)))
+
             if ner_annotations:
                 self.entity_annotation_page = self._make_annotation_page(
                     page_id=page_id,
@@ -177,7 +289,7 @@ class DocumentPageProcessor:
         self.transcription_annotation_page = annotation_page_builder.build()
 
     @staticmethod
-    def _page_id(canvas_item: dict[str, Any]) -> str:
+    def canvas_page_id(canvas_item: dict[str, Any]) -> str:
         return canvas_item["label"]["en"][0].split(" ")[0]
 
     @staticmethod
@@ -217,12 +329,10 @@ class DocumentPageProcessor:
         return page
 
     @staticmethod
-    def _read_page_xml(pagexml_path: Path) -> str:
+    def _read_page_xml(pagexml_path: Path) -> PageModel:
         try:
-            log_reading_file(pagexml_path)
-            with open(pagexml_path, "r", encoding="utf-8") as f:
-                xml_string = f.read()
+            page = pm.read_page_xml(pagexml_path)
         except FileNotFoundError:
             logger.error(f"Input file not found: {pagexml_path}")
             sys.exit(1)
-        return xml_string
+        return page
@@ -0,0 +1,93 @@
+import hashlib
+import os
+from typing import Any, Iterable, Optional
+
+import orjson
+
+import globalise_tools.io_tools as rw
+
+BUILD_MANIFEST_FILE = "build-manifest.{tool}.json"
+
+# the tools that keep a build manifest; each has a manifest file of its own, so that the tools writing into the same
+# directory don't forget (and remove) each other's outputs
+ANNOTATION_PAGES = "annotation-pages"
+INVENTORY_INDEX = "inventory-index"
+ANNOTATIONS_AS_RDF = "annotations-as-rdf"
+
+
+class BuildManifest:
+    """
+    Records, per output directory and tool, what each output (a page, or an artifact like index.json) was built from:
+    the content hashes of its inputs, the commit id of the code, and the files it wrote (relative to the directory).
+    An output is up to date when it was built by the same commit, from inputs with the same hashes,
+    and the files it wrote still exist.
+    """
+
+    def __init__(self, directory: str, commit_id: str, tool: str) -> None:
+        self.directory = directory
+        self.commit_id = commit_id
+        self.tool = tool
+        self.path = os.path.join(directory, BUILD_MANIFEST_FILE.format(tool=tool))
+        if os.path.exists(self.path):
+            self.entries: dict[str, dict[str, Any]] = rw.read_json(self.path)["entries"]
+        else:
+            self.entries = {}
+
+    def is_up_to_date(self, name: str, inputs: dict[str, Optional[str]]) -> bool:
+        entry = self.entries.get(name)
+        return (entry is not None
+                and entry["commit_id"] == self.commit_id
+                and entry["inputs"] == inputs
+                and all(os.path.exists(os.path.join(self.directory, o)) for o in entry["outputs"]))
+
+    def record(self, name: str, inputs: dict[str, Optional[str]], outputs: list[str]) -> list[str]:
+        """record the build of name, and return the outputs of its previous build that it didn't write this time"""
+        previous_outputs = self.entries.get(name, {}).get("outputs", [])
+        self.entries[name] = {"commit_id": self.commit_id, "inputs": inputs, "outputs": outputs}
+        return [o for o in previous_outputs if o not in outputs]
+
+    def retain(self, names: Iterable[str]) -> list[str]:
+        """forget the entries of this tool not in names (whose inputs are gone), and return the outputs they wrote"""
+        names = set(names)
+        stale_outputs = []
+        for name in [n for n in self.entries if n not in names]:
+            stale_outputs.extend(self.entries.pop(name)["outputs"])
+        return stale_outputs
+
+    def digest(self, names: Iterable[str]) -> Optional[str]:
+        """
+        the combined hash of the builds of names, as input for the artifacts that depend on them,
+        or None if not all of them are in the manifest
+        """
+        h = hashlib.sha256()
+        for name in names:
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            h.update(orjson.dumps([name, entry["commit_id"], entry["inputs"]], option=orjson.OPT_SORT_KEYS))
+        return h.hexdigest()
+
+    def remove_outputs(self, outputs: list[str]) -> None:
+        for output in outputs:
+            path = os.path.join(self.directory, output)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save(self) -> None:
+        # write to a temporary file first, so an interrupted save doesn't leave a truncated manifest
+        tmp_path = f"{self.path}.tmp"
+        rw.write_json(tmp_path, {"entries": self.entries}, clean_nones=False, quiet=True)
+        os.replace(tmp_path, self.path)
+
+
+def file_digest(path: str) -> Optional[str]:
+    """the sha256 of the file's contents, or None if there is no such file"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def data_digest(data: Any) -> str:
+    """the sha256 of the data as json, with the keys sorted"""
+    return hashlib.sha256(orjson.dumps(data, option=orjson.OPT_SORT_KEYS)).hexdigest()
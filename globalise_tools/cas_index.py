@@ -0,0 +1,31 @@
+from cassis import Cas
+from cassis.typesystem import Annotation, is_annotation
+
+
+class CasTypeIndex:
+    """
+    The annotations of the current view of a CAS by (exact) type name, each list sorted by offset (begin, end), as
+    cassis keeps them. The annotations of a type are selected with Cas.select, which only visits the feature
+    structures of the type and its subtypes, the first time they are asked for, instead of a scan over all feature
+    structures of the view, with the type name compared for every one of them, for every selection.
+    """
+
+    def __init__(self, cas: Cas) -> None:
+        self._cas = cas
+        self._annotations: dict[str, list[Annotation]] = {}
+
+    def select(self, type_name: str) -> list[Annotation]:
+        """the annotations of the type, sorted by offset; the same as filtering get_all_annotations() by type name"""
+        annotations = self._annotations.get(type_name)
+        if annotations is None:
+            if self._cas.typesystem.contains_type(type_name, match_exactly=True):
+                # Cas.select adds the feature structures of every subtype after those of the type, each sorted
+                annotations = [fs for fs in self._cas.select(type_name)
+                               if fs.type.name == type_name and is_annotation(fs)]
+            else:
+                annotations = []
+            self._annotations[type_name] = annotations
+        return annotations
+
+    def __len__(self) -> int:
+        return len(self._cas.select_all_annotations())
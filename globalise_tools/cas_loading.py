@@ -0,0 +1,236 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import cassis
+from cassis import Cas, TypeSystem
+from cassis.typesystem import (TYPE_NAME_BOOLEAN, TYPE_NAME_BYTE, TYPE_NAME_DOUBLE, TYPE_NAME_FLOAT,
+                               TYPE_NAME_FS_ARRAY, TYPE_NAME_FS_LIST, TYPE_NAME_INTEGER, TYPE_NAME_LONG,
+                               TYPE_NAME_SHORT, TYPE_NAME_STRING, FeatureStructure, Type, TypeNotFoundError)
+from loguru import logger
+from lxml import etree
+
+from globalise_tools.logger_tools import log_reading_file
+
+NS_XMI = "{http://www.omg.org/XMI}"
+NS_CAS = "{http:///uima/cas.ecore}"
+TAG_XMI = f"{NS_XMI}XMI"
+TAG_NULL = f"{NS_CAS}NULL"
+TAG_SOFA = f"{NS_CAS}Sofa"
+TAG_VIEW = f"{NS_CAS}View"
+ATTRIBUTE_ID = f"{NS_XMI}id"
+INITIAL_VIEW = "_InitialView"
+
+# the typesystems parsed in this process, by absolute path; workers forked after loading one inherit it
+_typesystems: dict[str, TypeSystem] = {}
+# the attribute of a typesystem that holds its loader, so the loader lives as long as the typesystem does
+LOADER_ATTRIBUTE = "_globalise_cas_loader"
+# the private parts of cassis the fast path sets, as cassis' own deserializer does; dkpro-cassis is only pinned to a
+# minor version, so without them the fast path is off and every XMI is loaded by cassis
+_IdGenerator = getattr(cassis.cas, "IdGenerator", None)
+_ID_GENERATOR_ATTRIBUTES = ("_xmi_id_generator", "_sofa_num_generator")
+
+
+def load_typesystem(path: str) -> TypeSystem:
+    """
+    the typesystem in the file, parsed once per process: the same instance is returned on every call, so it must
+    be treated as read-only (make a typesystem with extra types with cassis.load_typesystem instead)
+    """
+    key = os.path.abspath(path)
+    typesystem = _typesystems.get(key)
+    if typesystem is None:
+        log_reading_file(path)
+        with open(path, "rb") as f:
+            typesystem = cassis.load_typesystem(f)
+        _typesystems[key] = typesystem
+    return typesystem
+
+
+def load_cas(xmi_path: str, typesystem: TypeSystem) -> Cas:
+    """load the XMI file, like cassis.load_cas_from_xmi, with the fast path for the XMI layout of this project"""
+    loader = getattr(typesystem, LOADER_ATTRIBUTE, None)
+    if loader is None:
+        loader = CasLoader(typesystem)
+        setattr(typesystem, LOADER_ATTRIBUTE, loader)
+    return loader.load(xmi_path)
+
+
+class UnsupportedXmi(Exception):
+    """the XMI has something the fast path doesn't handle; cassis is used instead"""
+
+
+@dataclass
+class _TypePlan:
+    """how to read the attributes of the XMI elements of a type"""
+    type: Type
+    # attribute -> function that converts its value, for primitive features
+    primitives: dict[str, Callable[[str], Any]] = field(default_factory=dict)
+    # attribute -> whether it is an inline FSArray of references (else a single reference)
+    references: dict[str, bool] = field(default_factory=dict)
+
+
+class CasLoader:
+    """
+    Loads XMI files with a single view, whose feature structures are elements without children, with primitive
+    features, references and inline arrays of references as attributes: the layout of the XMI that INCEpTION exports
+    and gt-import-document makes. The type of every element is looked up in the typesystem once (instead of for every
+    feature of every feature structure, as cassis does); anything else (more views, multiple-valued features as child
+    elements, lists, offsets beyond the Basic Multilingual Plane, unknown types, ...) is loaded by cassis.
+
+    The resulting CAS is the same as the one cassis makes, and serializes to the same XMI.
+    """
+
+    def __init__(self, typesystem: TypeSystem) -> None:
+        self.typesystem = typesystem
+        self._plans: dict[str, _TypePlan] = {}
+
+    def load(self, xmi_path: str) -> Cas:
+        log_reading_file(xmi_path)
+        try:
+            return self._load(xmi_path)
+        except UnsupportedXmi as e:
+            logger.debug(f"{xmi_path}: {e}; loading it with cassis")
+        with open(xmi_path, "rb") as f:
+            return cassis.load_cas_from_xmi(f, typesystem=self.typesystem)
+
+    def _load(self, xmi_path: str) -> Cas:
+        if _IdGenerator is None:
+            raise UnsupportedXmi("this version of cassis has no IdGenerator")
+        feature_structures: dict[int, FeatureStructure] = {}
+        # the ids of the feature structures with a sofa
+        on_sofa: list[int] = []
+        unresolved: list[tuple[FeatureStructure, str, str, bool]] = []
+        sofa: Optional[dict[str, str]] = None
+        members: Optional[list[int]] = None
+        for _, elem in etree.iterparse(xmi_path, events=("end",)):
+            tag = elem.tag
+            if tag == TAG_XMI:
+                continue
+            if len(elem) or elem.getparent().tag != TAG_XMI:
+                raise UnsupportedXmi(f"nested element {tag}")
+            if tag == TAG_SOFA:
+                if sofa is not None:
+                    raise UnsupportedXmi("more than one sofa")
+                sofa = dict(elem.attrib)
+            elif tag == TAG_VIEW:
+                if members is not None:
+                    raise UnsupportedXmi("more than one view")
+                members = [int(m) for m in elem.get("members", "").split()]
+            elif tag != TAG_NULL:
+                fs = self._feature_structure(elem, unresolved)
+                feature_structures[fs.xmiID] = fs
+                if "sofa" in elem.attrib:
+                    on_sofa.append(fs.xmiID)
+            # free the elements that have been read
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+        if sofa is None or sofa.get("sofaID") != INITIAL_VIEW or sofa.get("sofaNum") != "1" \
+                or set(sofa) - {ATTRIBUTE_ID, "sofaNum", "sofaID", "mimeType", "sofaString"}:
+            raise UnsupportedXmi("not a single initial view sofa with a sofa string")
+        text = sofa.get("sofaString")
+        # the offsets in XMI count UTF-16 code units: only without surrogate pairs are they the python offsets
+        if text and len(text.encode("utf-16-le")) != 2 * len(text):
+            raise UnsupportedXmi("text beyond the Basic Multilingual Plane")
+        for fs, name, value, is_array in unresolved:
+            try:
+                targets = [feature_structures[int(r)] for r in value.split()]
+            except KeyError as e:
+                raise UnsupportedXmi(f"reference to unknown feature structure {e}")
+            if is_array:
+                fs[name] = self.typesystem.get_type(TYPE_NAME_FS_ARRAY)(elements=targets)
+            else:
+                fs[name] = targets[0]
+
+        cas = Cas(typesystem=self.typesystem)
+        cas.get_sofa().xmiID = int(sofa[ATTRIBUTE_ID])
+        cas.sofa_string = text
+        cas.sofa_mime = sofa.get("mimeType")
+        members = members or []
+        if not feature_structures.keys() >= set(members):
+            raise UnsupportedXmi("view with unknown members")
+        for member in members:
+            cas.add(feature_structures[member], keep_id=True)
+        for xmi_id in set(on_sofa) - set(members):
+            feature_structures[xmi_id].sofa = cas.get_sofa()
+        # as cassis' own deserializer does, so feature structures added later get new ids
+        if not all(hasattr(cas, a) for a in _ID_GENERATOR_ATTRIBUTES):
+            raise UnsupportedXmi("this version of cassis keeps its id generators elsewhere")
+        cas._xmi_id_generator = _IdGenerator(max([cas.get_sofa().xmiID, *feature_structures]) + 1)
+        cas._sofa_num_generator = _IdGenerator(2)
+        return cas
+
+    def _feature_structure(self, elem, unresolved: list) -> FeatureStructure:
+        plan = self._plan(elem.tag)
+        values = {}
+        for name, value in elem.attrib.items():
+            if name == ATTRIBUTE_ID:
+                values["xmiID"] = int(value)
+            elif name == "sofa":
+                # there is only the one sofa
+                continue
+            elif name in plan.primitives:
+                values[name] = plan.primitives[name](value)
+            elif name not in plan.references:
+                raise UnsupportedXmi(f"attribute {name} of {plan.type.name}")
+        if "xmiID" not in values:
+            raise UnsupportedXmi(f"{plan.type.name} without an id")
+        fs = plan.type(**values)
+        for name, is_array in plan.references.items():
+            value = elem.get(name)
+            if value is not None:
+                unresolved.append((fs, name, value, is_array))
+        return fs
+
+    def _plan(self, tag: str) -> _TypePlan:
+        plan = self._plans.get(tag)
+        if plan is None:
+            plan = self._plans[tag] = self._make_plan(tag)
+        return plan
+
+    def _make_plan(self, tag: str) -> _TypePlan:
+        # the type name from the namespace and tag, as cassis does: {http:///a/b.ecore}C -> a.b.C
+        type_name = tag[9:].replace("/", ".").replace("ecore}", "").strip()
+        if type_name.startswith("uima.noNamespace."):
+            type_name = type_name[17:]
+        try:
+            plan = _TypePlan(self.typesystem.get_type(type_name))
+        except TypeNotFoundError:
+            raise UnsupportedXmi(f"unknown type {type_name}")
+        for feature in plan.type.all_features:
+            if feature.name in ("sofa", "self", "type"):
+                # the sofa is set when the CAS is made; self and type are renamed to self_ and type_ by cassis
+                continue
+            range_name = feature.rangeType.name
+            if range_name in PRIMITIVE_PARSERS:
+                plan.primitives[feature.name] = PRIMITIVE_PARSERS[range_name]
+            elif range_name == TYPE_NAME_FS_ARRAY and not feature.multipleReferencesAllowed:
+                plan.references[feature.name] = True
+            elif not (self.typesystem.is_primitive(feature.rangeType)
+                      or self.typesystem.is_primitive_array(feature.rangeType)
+                      or self.typesystem.is_primitive_list(feature.rangeType)
+                      or range_name in (TYPE_NAME_FS_ARRAY, TYPE_NAME_FS_LIST)):
+                plan.references[feature.name] = False
+            # any other feature, when present, makes the element unsupported
+        return plan
+
+
+def _parse_bool(value: str) -> bool:
+    if value == "true":
+        return True
+    if value == "false":
+        return False
+    raise UnsupportedXmi(f"not a boolean: {value}")
+
+
+PRIMITIVE_PARSERS: dict[str, Callable[[str], Any]] = {
+    TYPE_NAME_STRING: str,
+    TYPE_NAME_INTEGER: int,
+    TYPE_NAME_SHORT: int,
+    TYPE_NAME_LONG: int,
+    TYPE_NAME_BYTE: int,
+    TYPE_NAME_FLOAT: float,
+    TYPE_NAME_DOUBLE: float,
+    TYPE_NAME_BOOLEAN: _parse_bool,
+}
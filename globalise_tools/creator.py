@@ -1,40 +1,42 @@
-from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+import globalise_tools.provenance as provenance
 
 GLOBALISE_TEAM = "https://globalise.huygens.knaw.nl/team/"
 
 
 class CreatorFactory:
-    def __init__(self, script_paths: list[str], commit_id: str):
+    def __init__(self, script_paths: list[str], commit_id: Optional[str] = None):
         self.script_paths = script_paths
-        self.commit_id = commit_id
+        self.commit_id = commit_id if commit_id else provenance.current_run().commit_id
 
     def creator(self, label: str) -> dict[str, str]:
-        ts = datetime.today().isoformat()
-        return {
-            "type": "DigitalMachineEvent",
-            "_label": label,
-            "carried_out_by": GLOBALISE_TEAM,
-            "timespan": {
-                "type": "TimeSpan",
-                "end_of_the_begin": ts,
-                "begin_of_the_end": ts,
-            },
-            "used_software_or_firmware": self._used_software_or_firmware()
-        }
+        # the same dict is returned for every annotation of the run with this label, so don't modify it
+        return _creator(tuple(self.script_paths), self.commit_id, provenance.current_run().timestamp, label)
 
     def generator(self) -> dict[str, str]:
-        return {
-            "id": f"https://github.com/knaw-huc/globalise-tools/blob/{self.commit_id}/{self.script_path}",
-            "type": "Software",
-            "name": self.script_path
-        }
-
-    def _used_software_or_firmware(self):
-        return [self._software(sp) for sp in self.script_paths]
-
-    def _software(self, script_path: str) -> dict[str, str]:
-        return {
-            "id": f"https://github.com/knaw-huc/globalise-tools/blob/{self.commit_id}/{script_path}",
-            "type": "Software",
-            "name": script_path,
-        }
+        return _software(self.commit_id, self.script_paths[0])
+
+
+@lru_cache(maxsize=64)
+def _creator(script_paths: tuple[str, ...], commit_id: str, timestamp: str, label: str) -> dict[str, str]:
+    return {
+        "type": "DigitalMachineEvent",
+        "_label": label,
+        "carried_out_by": GLOBALISE_TEAM,
+        "timespan": {
+            "type": "TimeSpan",
+            "end_of_the_begin": timestamp,
+            "begin_of_the_end": timestamp,
+        },
+        "used_software_or_firmware": [_software(commit_id, sp) for sp in script_paths]
+    }
+
+
+def _software(commit_id: str, script_path: str) -> dict[str, str]:
+    return {
+        "id": f"{provenance.REPOSITORY_URL}/blob/{commit_id}/{script_path}",
+        "type": "Software",
+        "name": script_path,
+    }
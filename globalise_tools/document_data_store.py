@@ -0,0 +1,255 @@
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+from collections.abc import Mapping
+from typing import Any, Iterator, Optional
+
+import orjson
+from loguru import logger
+
+from globalise_tools.logger_tools import log_reading_file, log_writing_file
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+# an index record: the 16 byte key hash, and the shard, offset and length of the entry in that shard's data file
+INDEX_RECORD = struct.Struct("<16sHQI")
+
+
+class DocumentDataStore:
+    """
+    A read-only, sharded on-disk version of document_data.json, for looking up a document's data by its id,
+    or the id of the document with a given text by the text's md5, without loading all documents.
+
+    Every shard has a data file, with the entries (the document id, a newline and the json data) one after another,
+    and two indexes of fixed size records sorted by key hash: one by document id, one by plain_text_md5.
+    The shard of a key is given by the first byte of its hash. The files are memory mapped when a shard is first
+    used, so a process only reads (and holds) the pages of the shards it looks up, and processes share them through
+    the page cache. A pickled store only holds its directory, so it is cheap to send to worker processes.
+
+    by_id and id_for_md5 are read-only mappings, for use where document_data and its md5 index were dicts.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.manifest_path = f"{directory}/{MANIFEST_FILE}"
+        log_reading_file(self.manifest_path)
+        with open(self.manifest_path, "rb") as f:
+            self.manifest = orjson.loads(f.read())
+        if self.manifest["format"] != FORMAT_VERSION:
+            raise ValueError(f"{directory}: unsupported document data store format {self.manifest['format']}")
+        self.shards: int = self.manifest["shards"]
+        self._maps: dict[str, mmap.mmap] = {}
+        self.by_id = DocumentsById(self)
+        self.id_for_md5 = DocumentIdsByMd5(self)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(f"{directory}/{MANIFEST_FILE}")
+
+    def is_stale(self, json_path: str) -> bool:
+        """
+        whether the content of the json file differs from that this store was made from; timestamps are not used,
+        as copying or checking out the file changes them. The digest is only computed when the sizes are equal.
+        """
+        if not os.path.exists(json_path):
+            return False
+        source = self.manifest.get("source", {})
+        if os.path.getsize(json_path) != source.get("size"):
+            return True
+        return _file_md5(json_path) != source.get("md5")
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"directory": self.directory}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["directory"])
+
+    def __len__(self) -> int:
+        return self.manifest["documents"]
+
+    def close(self) -> None:
+        for m in self._maps.values():
+            m.close()
+        self._maps.clear()
+
+    def _entry(self, index: str, key_hash: bytes) -> Optional[tuple[int, int, int]]:
+        """the (shard, offset, length) of the entry with the key hash in the index, by binary search"""
+        records = self._map(f"{key_hash[0] % self.shards:02x}.{index}")
+        lo, hi = 0, len(records) // INDEX_RECORD.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mid * INDEX_RECORD.size
+            mid_hash = records[start:start + 16]
+            if mid_hash < key_hash:
+                lo = mid + 1
+            elif mid_hash > key_hash:
+                hi = mid
+            else:
+                return INDEX_RECORD.unpack_from(records, start)[1:]
+        return None
+
+    def _records(self, index: str) -> Iterator[tuple[int, int, int]]:
+        for shard in range(self.shards):
+            records = self._map(f"{shard:02x}.{index}")
+            for start in range(0, len(records), INDEX_RECORD.size):
+                yield INDEX_RECORD.unpack_from(records, start)[1:]
+
+    def _document_id(self, shard: int, offset: int, length: int) -> str:
+        data = self._map(f"{shard:02x}.dat")
+        return data[offset:data.find(b"\n", offset, offset + length)].decode()
+
+    def _document_data(self, shard: int, offset: int, length: int) -> dict[str, Any]:
+        data = self._map(f"{shard:02x}.dat")
+        return orjson.loads(data[data.find(b"\n", offset, offset + length) + 1:offset + length])
+
+    def _map(self, name: str):
+        m = self._maps.get(name)
+        if m is None:
+            path = f"{self.directory}/{name}"
+            if os.path.getsize(path) == 0:
+                return b""
+            with open(path, "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[name] = m
+        return m
+
+
+class DocumentsById(Mapping):
+    """document id -> document data"""
+
+    def __init__(self, store: DocumentDataStore) -> None:
+        self.store = store
+
+    def __getitem__(self, document_id: str) -> dict[str, Any]:
+        entry = self.store._entry("ids", _id_hash(document_id))
+        # the entry starts with its id, which also rules out a hash collision
+        if entry is None or self.store._document_id(*entry) != document_id:
+            raise KeyError(document_id)
+        return self.store._document_data(*entry)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.store._document_id(*entry) for entry in self.store._records("ids"))
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+
+class DocumentIdsByMd5(Mapping):
+    """
+    plain_text_md5 -> the id of the (last) document with that text. A key that is not a hex md5 can't be in the
+    store (write_document_data_store refuses those), so looking one up raises a KeyError, like any missing key.
+    """
+
+    def __init__(self, store: DocumentDataStore) -> None:
+        self.store = store
+
+    def __getitem__(self, md5: str) -> str:
+        try:
+            entry = self.store._entry("md5", _md5_hash(md5))
+        except ValueError:
+            entry = None
+        if entry is None:
+            raise KeyError(md5)
+        return self.store._document_id(*entry)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.store._document_data(*entry)["plain_text_md5"] for entry in self.store._records("md5"))
+
+    def __len__(self) -> int:
+        return self.store.manifest["md5s"]
+
+
+def write_document_data_store(document_data: dict[str, dict[str, Any]], directory: str, shards: int = 16,
+                              source: Optional[dict[str, Any]] = None) -> None:
+    """
+    write document_data as a store in directory, replacing the store that may be there: it is written next to it,
+    and moved in place when complete. Raises a ValueError for a document whose plain_text_md5 is not a hex md5,
+    as its text could not be looked up.
+    """
+    if not 0 < shards <= 256:
+        raise ValueError(f"the number of shards must be between 1 and 256, not {shards}")
+    tmp_directory = f"{directory}.tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    log_writing_file(directory)
+
+    id_records: list[list[tuple[bytes, int, int, int]]] = [[] for _ in range(shards)]
+    entry_for_md5: dict[bytes, tuple[int, int, int]] = {}
+    data_files = [open(f"{tmp_directory}/{shard:02x}.dat", "wb") for shard in range(shards)]
+    try:
+        for document_id, data in document_data.items():
+            key_hash = _id_hash(document_id)
+            shard = key_hash[0] % shards
+            f = data_files[shard]
+            entry = document_id.encode() + b"\n" + orjson.dumps(data)
+            position = (shard, f.tell(), len(entry))
+            f.write(entry)
+            id_records[shard].append((key_hash, *position))
+            try:
+                md5_hash = _md5_hash(data.get("plain_text_md5", ""))
+            except ValueError as e:
+                raise ValueError(f"{document_id}: {e}") from None
+            # when several documents share a text, the last one wins, as in XMIProcessorFactory
+            entry_for_md5[md5_hash] = position
+    finally:
+        for f in data_files:
+            f.close()
+
+    md5_records: list[list[tuple[bytes, int, int, int]]] = [[] for _ in range(shards)]
+    for md5_hash, position in entry_for_md5.items():
+        md5_records[md5_hash[0] % shards].append((md5_hash, *position))
+    for index, records_per_shard in [("ids", id_records), ("md5", md5_records)]:
+        for shard, records in enumerate(records_per_shard):
+            with open(f"{tmp_directory}/{shard:02x}.{index}", "wb") as f:
+                for record in sorted(records):
+                    f.write(INDEX_RECORD.pack(*record))
+
+    with open(f"{tmp_directory}/{MANIFEST_FILE}", "wb") as f:
+        f.write(orjson.dumps({
+            "format": FORMAT_VERSION,
+            "shards": shards,
+            "documents": len(document_data),
+            "md5s": len(entry_for_md5),
+            "source": source or {}
+        }, option=orjson.OPT_INDENT_2))
+    old_directory = f"{directory}.old"
+    if os.path.exists(directory):
+        os.replace(directory, old_directory)
+    os.replace(tmp_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
+
+
+def migrate_document_data(json_path: str, directory: str, shards: int = 16) -> None:
+    """write the document_data json file as a store in directory"""
+    log_reading_file(json_path)
+    with open(json_path, "rb") as f:
+        content = f.read()
+    document_data = orjson.loads(content)
+    write_document_data_store(document_data, directory, shards,
+                              source={"path": json_path, "size": len(content), "md5": hashlib.md5(content).hexdigest()})
+    logger.info(f"stored {len(document_data)} documents in {shards} shards in {directory}")
+
+
+def _id_hash(document_id: str) -> bytes:
+    return hashlib.md5(document_id.encode()).digest()
+
+
+def _md5_hash(md5: str) -> bytes:
+    """the 16 bytes of a hex md5"""
+    try:
+        md5_hash = bytes.fromhex(md5)
+    except (TypeError, ValueError):
+        md5_hash = b""
+    if len(md5_hash) != 16:
+        raise ValueError(f"plain_text_md5 {md5!r} is not a hex md5")
+    return md5_hash
+
+
+def _file_md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
@@ -0,0 +1,86 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from Levenshtein import distance
+
+_PAD = "\x00"
+
+
+class FuzzyIndex:
+    """
+    An index over a list of words, for finding the word closest to a query by Levenshtein distance
+    without computing the distance to every word.
+
+    Words are indexed by their (padded) bigrams. A query of n distinct bigrams shares at least n - 2k of them with
+    any word within edit distance k, so every such word contains at least one of the 2k + 1 rarest bigrams of the
+    query. Only those words get their distance computed, for k = 1, 2, ... up to the maximum distance, until a match
+    is found. When a query has too few bigrams for this to work, all words of a suitable length are checked.
+    No word within the distance is ever skipped, so results are identical to a full scan.
+
+    Build it once (e.g. per run, for a gazetteer), and query it for every record.
+    """
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self.words: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        self._by_length: dict[int, list[int]] = defaultdict(list)
+        for w in words:
+            self.add(w)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._positions
+
+    def add(self, word: str) -> None:
+        if word in self._positions:
+            return
+        position = len(self.words)
+        self.words.append(word)
+        self._positions[word] = position
+        self._by_length[len(word)].append(position)
+        for bigram in _bigrams(word):
+            self._postings[bigram].append(position)
+
+    def closest(self, query: str, max_distance: int) -> Optional[str]:
+        """
+        The word with the smallest distance to query, with distance <= max_distance and smaller than the lengths of
+        both query and word (so short words can't match anything). On ties, the word that was added first wins.
+        This gives the same result as scanning all words in the order they were added.
+        """
+        if query in self._positions:
+            return query
+        for radius in range(1, min(max_distance, len(query) - 1) + 1):
+            best_match = None
+            best_distance = radius + 1
+            for position in self._candidates(query, radius):
+                word = self.words[position]
+                d = distance(query, word, score_cutoff=best_distance - 1)
+                if d < best_distance and d < len(word):
+                    best_match = word
+                    best_distance = d
+            if best_match is not None:
+                return best_match
+        return None
+
+    def _candidates(self, query: str, radius: int) -> list[int]:
+        """the positions of all words that can be within radius of query, in the order they were added"""
+        lengths = range(len(query) - radius, len(query) + radius + 1)
+        query_bigrams = sorted(_bigrams(query), key=lambda b: len(self._postings.get(b, ())))
+        if len(query_bigrams) <= 2 * radius:
+            candidates = set()
+            for length in lengths:
+                candidates.update(self._by_length.get(length, ()))
+        else:
+            candidates = set()
+            for bigram in query_bigrams[:2 * radius + 1]:
+                candidates.update(self._postings.get(bigram, ()))
+            candidates = {p for p in candidates if len(self.words[p]) in lengths}
+        return sorted(candidates)
+
+
+def _bigrams(word: str) -> set[str]:
+    padded = f"{_PAD}{word}{_PAD}"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
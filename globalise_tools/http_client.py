@@ -0,0 +1,154 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    A pooled, retrying HTTP client for all remote reads: requests are sent over a pool of at most `max_connections`
+    keep-alive connections per host, with at most `max_connections` requests in flight, and are retried with
+    exponential backoff on connection errors and on 429/5xx responses.
+    With a `cache_dir`, the bodies of successful GET responses are cached on disk, keyed by url.
+
+    A requests.Session is not thread-safe, so every thread gets a session of its own; all of them (and those of other
+    clients mounted with mount_on) share the one adapter, and with it the connection pool, which is thread-safe.
+    Requests done by other clients count against the in-flight limit when done within `slot()`.
+    """
+
+    def __init__(
+            self,
+            max_connections: int = 8,
+            retries: int = 5,
+            backoff_factor: float = 0.5,
+            timeout: float = 60,
+            cache_dir: Optional[str] = None
+    ) -> None:
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False
+        )
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._adapter = HTTPAdapter(
+            pool_connections=self.max_connections,
+            pool_maxsize=self.max_connections,
+            max_retries=self._retry
+        )
+        self._local = threading.local()
+        self._sessions: list[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """the session of the current thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.trust_env = False
+            self.mount_on(session)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def mount_on(self, session: requests.Session) -> None:
+        """
+        send the requests of the given session (e.g. of a TextRepoClient) over this client's connection pool,
+        with its retry policy
+        """
+        session.mount("http://", self._adapter)
+        session.mount("https://", self._adapter)
+
+    def slot(self) -> threading.BoundedSemaphore:
+        """
+        one of the `max_connections` in-flight slots, to hold (with `with`) while doing requests with a session
+        mounted with mount_on; not to be held while calling get, which takes one itself
+        """
+        return self._slots
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        with self._slots:
+            return self.session.get(url, **kwargs)
+
+    def get_bytes(self, url: str) -> Optional[bytes]:
+        """the body of the response to GET url, or None if the response was not a 200"""
+        cache_path = self._cache_path(url)
+        if cache_path and cache_path.is_file():
+            return cache_path.read_bytes()
+        response = self.get(url)
+        if response.status_code != 200:
+            return None
+        if cache_path:
+            tmp_path = cache_path.parent / f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp_path.write_bytes(response.content)
+            tmp_path.replace(cache_path)
+        return response.content
+
+    def get_text(self, url: str) -> Optional[str]:
+        content = self.get_bytes(url)
+        return content.decode("utf-8") if content is not None else None
+
+    def get_json(self, url: str) -> Any:
+        content = self.get_bytes(url)
+        return orjson.loads(content) if content is not None else None
+
+    def map(self, func: Callable[[T], R], items: Iterable[T], max_workers: Optional[int] = None) -> Iterator[R]:
+        """
+        apply func (which typically does one or more requests with this client) to all items concurrently,
+        with at most max_workers (default: max_connections) at a time; the results are returned in the order of items
+        """
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_connections) as executor:
+            yield from executor.map(func, items)
+
+    def close(self) -> None:
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._adapter.close()
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _cache_path(self, url: str) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        return Path(self.cache_dir) / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+_default_client: Optional[HttpClient] = None
+_default_client_pid: Optional[int] = None
+_default_client_lock = threading.Lock()
+
+
+def default_client() -> HttpClient:
+    """the process-wide shared client (a new one after a fork, since connections can't be shared across processes)"""
+    global _default_client, _default_client_pid
+    with _default_client_lock:
+        if _default_client is None or _default_client_pid != os.getpid():
+            _default_client = HttpClient()
+            _default_client_pid = os.getpid()
+        return _default_client
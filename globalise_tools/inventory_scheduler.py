@@ -0,0 +1,192 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+import orjson
+from loguru import logger
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Stage:
+    """
+    One step of processing an inventory: run(inventory_number) raises on failure.
+    At most max_concurrent inventories are in this stage at the same time (like the hucdrive-gate in remote/Makefile,
+    which keeps the downloads from the hucdrive sequential).
+    """
+    name: str
+    run: Callable[[str], None]
+    max_concurrent: Optional[int] = None
+
+
+class StageStateStore:
+    """The state of every (inventory, stage) in a SQLite file, so an interrupted run can resume where it stopped"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS stage_state ("
+            " inventory TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " started REAL,"
+            " finished REAL,"
+            " error TEXT,"
+            " PRIMARY KEY (inventory, stage))")
+
+    def status(self, inventory_number: str, stage: str) -> str:
+        with self._lock:
+            row = self._connection.execute("SELECT status FROM stage_state WHERE inventory = ? AND stage = ?",
+                                           (inventory_number, stage)).fetchone()
+        return row[0] if row else PENDING
+
+    def mark_running(self, inventory_number: str, stage: str) -> None:
+        self._set(inventory_number, stage, RUNNING, started=time.time())
+
+    def mark_done(self, inventory_number: str, stage: str) -> None:
+        self._set(inventory_number, stage, DONE, finished=time.time())
+
+    def mark_failed(self, inventory_number: str, stage: str, error: str) -> None:
+        self._set(inventory_number, stage, FAILED, finished=time.time(), error=error)
+
+    def counts(self) -> dict[tuple[str, str], int]:
+        """the number of inventories per (stage, status)"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT stage, status, count(*) FROM stage_state GROUP BY stage, status").fetchall()
+        return {(stage, status): n for stage, status, n in rows}
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "StageStateStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _set(self, inventory_number: str, stage: str, status: str, started: Optional[float] = None,
+             finished: Optional[float] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO stage_state (inventory, stage, status, started, finished, error)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (inventory, stage) DO UPDATE SET status = excluded.status,"
+                " started = coalesce(excluded.started, started), finished = excluded.finished, error = excluded.error",
+                (inventory_number, stage, status, started, finished, error))
+
+
+@dataclass
+class ScheduleResult:
+    makespan: float = 0.0
+    completed: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+
+
+class InventoryScheduler:
+    """
+    Runs the stages of many inventories on a pool of workers. Each worker takes the next inventory from one shared
+    queue and runs its unfinished stages in order, so a worker that finishes early picks up more work instead of
+    waiting for the slowest inventory of a fixed batch. The queue is ordered longest job first (by estimated size),
+    so the huge inventories start early and the small ones fill up the gaps at the end.
+    """
+
+    def __init__(self, stages: list[Stage], state: StageStateStore, workers: int = 3) -> None:
+        self.stages = stages
+        self.state = state
+        self.workers = workers
+        self._stage_slots = {s.name: threading.BoundedSemaphore(s.max_concurrent)
+                             for s in stages if s.max_concurrent}
+
+    def run(self, inventory_sizes: dict[str, int], longest_first: bool = True,
+            on_inventory_done: Optional[Callable[[str, int, int], None]] = None) -> ScheduleResult:
+        """
+        Process the inventories (inventory number -> estimated size), skipping the stages that are done already.
+        on_inventory_done(inventory_number, done, total) is called as every inventory is finished (or failed).
+        """
+        inventories = sorted(inventory_sizes, key=lambda i: -inventory_sizes[i]) if longest_first \
+            else list(inventory_sizes)
+        jobs = queue.SimpleQueue()
+        for inventory_number in inventories:
+            jobs.put(inventory_number)
+        result = ScheduleResult()
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                try:
+                    inventory_number = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                error = self._process(inventory_number)
+                with lock:
+                    if error:
+                        result.failed[inventory_number] = error
+                    else:
+                        result.completed.append(inventory_number)
+                    done = len(result.completed) + len(result.failed)
+                if on_inventory_done:
+                    on_inventory_done(inventory_number, done, len(inventories))
+
+        tic = time.perf_counter()
+        threads = [threading.Thread(target=work, name=f"worker-{i}") for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result.makespan = time.perf_counter() - tic
+        return result
+
+    def _process(self, inventory_number: str) -> Optional[str]:
+        """run the unfinished stages of the inventory; the error, if a stage failed"""
+        for stage in self.stages:
+            if self.state.status(inventory_number, stage.name) == DONE:
+                continue
+            slot = self._stage_slots.get(stage.name)
+            if slot:
+                slot.acquire()
+            try:
+                self.state.mark_running(inventory_number, stage.name)
+                stage.run(inventory_number)
+                self.state.mark_done(inventory_number, stage.name)
+            except Exception as e:
+                error = f"{stage.name}: {e}"
+                logger.error(f"inventory {inventory_number} failed in {error}")
+                self.state.mark_failed(inventory_number, stage.name, str(e))
+                return error
+            finally:
+                if slot:
+                    slot.release()
+        return None
+
+
+def manifest_page_count(manifest_path: str) -> Optional[int]:
+    """the number of canvases in the IIIF manifest, or None if there is no manifest"""
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "rb") as f:
+        return len(orjson.loads(f.read()).get("items", []))
+
+
+def estimate_sizes(inventory_numbers: Iterable[str], manifest_dir: str) -> dict[str, int]:
+    """
+    the page count of every inventory, from its manifest in manifest_dir;
+    inventories without a manifest get the largest size, so their (unknown) cost doesn't end up at the tail
+    """
+    counts = {i: manifest_page_count(f"{manifest_dir}/{i}.json") for i in inventory_numbers}
+    missing = [i for i, c in counts.items() if c is None]
+    if missing:
+        logger.warning(f"no manifest for {len(missing)} inventories: {missing[:10]}")
+    largest = max((c for c in counts.values() if c is not None), default=0)
+    return {i: largest if c is None else c for i, c in counts.items()}
@@ -1,11 +1,15 @@
 import csv
 import json
+import os
+import time
+from enum import Enum
 from json import JSONEncoder
-from typing import Any
+from typing import Any, Callable, Iterator
 
 import orjson
-import requests
+from loguru import logger
 
+from globalise_tools.http_client import default_client
 from globalise_tools.logger_tools import log_reading_file, log_writing_file
 
 
@@ -20,14 +24,7 @@ def read_json(path: str, quiet: bool = False) -> Any:
 def get_json(url: str, quiet: bool = False) -> Any:
     if not quiet:
         log_reading_file(url)
-    s = requests.Session()
-    s.trust_env = False
-    result = s.get(url)
-    if result.status_code != 200:
-        return None
-    json_data = result.text
-    data = orjson.loads(json_data)
-    return data
+    return default_client().get_json(url)
 
 
 def write_json(path: str, data: Any, clean_nones: bool = True, quiet: bool = False,
@@ -77,6 +74,95 @@ def write_csv(path: str, headers: list[str], records: list[Any], quiet: bool = F
         writer.writerows(records)
 
 
+class FsyncPolicy(Enum):
+    ALWAYS = "always"
+    INTERVAL = "interval"
+    NEVER = "never"
+
+
+class CheckpointJournal:
+    """
+    An append-only journal of JSON records, one per line, for checkpointing long-running batch scripts.
+
+    Every append writes one line and flushes it, so the cost of a checkpoint does not grow with the number of records,
+    and a crash loses at most the record that was being written. A torn last line is dropped when the journal is
+    reopened. Whether appends are also fsynced (which guards against losing records when the machine goes down) is
+    set by the fsync policy: after every record, at most every fsync_interval seconds, or never.
+
+    With resume=True the records of an existing journal (from a run that did not finish) are available as
+    `records`; otherwise the journal starts empty. Closing the journal without errors (also when used as a context
+    manager) calls compact (if given) with all records, so it can write a snapshot, after which the journal is
+    removed. When the run fails, the journal is kept to resume from.
+    """
+
+    def __init__(self, path: str, resume: bool = True, fsync: FsyncPolicy = FsyncPolicy.ALWAYS,
+                 fsync_interval: float = 1.0, compact: Callable[[Iterator[Any]], None] | None = None,
+                 encoder: type[JSONEncoder] = JSONEncoder) -> None:
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact = compact
+        self.encoder = encoder
+        self.records: list[Any] = self._recover() if resume else []
+        self._file = open(path, "ab" if resume else "wb")
+        self._last_sync = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(compact=exc_type is None)
+
+    def append(self, record: Any) -> None:
+        if self.encoder != JSONEncoder:
+            line = json.dumps(record, ensure_ascii=False, cls=self.encoder).encode("utf-8")
+        else:
+            line = orjson.dumps(record)
+        self._file.write(line + b"\n")
+        self._file.flush()
+        if self.fsync == FsyncPolicy.ALWAYS:
+            os.fsync(self._file.fileno())
+        elif self.fsync == FsyncPolicy.INTERVAL and time.monotonic() - self._last_sync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_sync = time.monotonic()
+
+    def close(self, compact: bool = True) -> None:
+        if self._file.closed:
+            return
+        if self.fsync != FsyncPolicy.NEVER:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        if compact and self.compact:
+            self.compact(self._read_records())
+            os.remove(self.path)
+
+    def _recover(self) -> list[Any]:
+        if not os.path.exists(self.path):
+            return []
+        log_reading_file(self.path)
+        records = []
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    logger.warning(f"{self.path}: dropping incomplete last record")
+                    break
+                try:
+                    records.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    logger.warning(f"{self.path}: dropping unreadable record at byte {valid_size} and all after it")
+                    break
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self.path):
+            os.truncate(self.path, valid_size)
+        return records
+
+    def _read_records(self) -> Iterator[Any]:
+        with open(self.path, "rb") as f:
+            for line in f:
+                yield orjson.loads(line)
+
+
 def _clean_nones(value: Any) -> Any:
     """
     Recursively remove all None values from dictionaries and lists, and returns
@@ -0,0 +1,163 @@
+"""
+The JSON-LD contexts the project's annotations refer to, for pyld and rdflib, so that converting annotations does
+not depend on fetching contexts over the network.
+
+Contexts are looked up in memory (an LRU of parsed contexts), then in the copies that ship with the package
+(globalise_tools/contexts), then in an optional disk cache, and only then fetched, after which they are stored
+in the disk cache.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+import orjson
+from loguru import logger
+
+from globalise_tools.http_client import HttpClient, default_client
+
+CONTEXTS_DIR = Path(__file__).parent / "contexts"
+
+PACKAGED_CONTEXTS = {
+    "http://www.w3.org/ns/anno.jsonld": "anno.jsonld",
+    "http://iiif.io/api/presentation/3/context.json": "iiif.io-api-presentation-3-context.json",
+    "http://iiif.io/api/annex/openannotation/context.json": "iiif.io-api-annex-openannotation-context.json",
+    "http://iiif.io/api/image/1/context.json": "iiif.io-api-image-1-context.json",
+    "http://iiif.io/api/image/2/context.json": "iiif.io-api-image-2-context.json",
+    "http://iiif.io/api/image/3/context.json": "iiif.io-api-image-3-context.json",
+    "http://iiif.io/api/search/1/context.json": "iiif.io-api-search-1-context.json",
+    "http://iiif.io/api/auth/1/context.json": "iiif.io-api-auth-1-context.json",
+    "http://iiif.io/api/registry/selectors/context.json": "iiif.io-api-registry-selectors-context.json",
+    "https://linked.art/ns/v1/linked-art.json": "linked-art.json",
+    "https://ns.huc.knaw.nl/globalise.jsonld": "globalise.jsonld",
+    "https://objectstore.surf.nl/87435b768620494e8e911c83d1997f24:globalise-data/contexts/globalise.json":
+        "glob.json",
+}
+
+
+class ContextRegistry:
+    """
+    Serves JSON-LD context documents by url. Use `document_loader` as the pyld document loader
+    (see `register_document_loader`), and `inline_contexts` to prepare documents for rdflib.
+    With allow_remote=False, only the packaged and disk cached contexts are available.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, allow_remote: bool = True, max_in_memory: int = 64,
+                 client: Optional[HttpClient] = None) -> None:
+        self.cache_dir = cache_dir
+        self.allow_remote = allow_remote
+        self.max_in_memory = max_in_memory
+        self.remote_fetches = 0
+        self._client = client
+        self._in_memory: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, url: str) -> Any:
+        """the context document at url (a dict with an @context), raises a LookupError when it is not available"""
+        key = _normalized(url)
+        with self._lock:
+            if key in self._in_memory:
+                self._in_memory.move_to_end(key)
+                return self._in_memory[key]
+        document = self._load(url, key)
+        with self._lock:
+            self._in_memory[key] = document
+            if len(self._in_memory) > self.max_in_memory:
+                self._in_memory.popitem(last=False)
+        return document
+
+    def document_loader(self, url: str, options: Optional[dict] = None) -> dict:
+        from pyld.jsonld import JsonLdError
+        try:
+            document = self.get(url)
+        except LookupError as e:
+            raise JsonLdError(str(e), "jsonld.LoadDocumentError", code="loading document failed") from e
+        return {"contentType": "application/ld+json", "contextUrl": None, "documentUrl": url, "document": document}
+
+    def inline_contexts(self, value: Any) -> Any:
+        """a copy of value with every @context url replaced by the context it refers to, for rdflib"""
+        if isinstance(value, list):
+            return [self.inline_contexts(v) for v in value]
+        if isinstance(value, dict):
+            result = {k: self.inline_contexts(v) for k, v in value.items()}
+            if "@context" in value:
+                result["@context"] = self._inlined_context(value["@context"])
+            return result
+        return value
+
+    def _inlined_context(self, context: Any, inlining: tuple[str, ...] = ()) -> Any:
+        if isinstance(context, str):
+            if context in inlining:
+                # the iiif image and presentation contexts refer to each other in scoped contexts
+                return {}
+            return self._inlined_context(self.get(context)["@context"], inlining + (context,))
+        if isinstance(context, list):
+            return [self._inlined_context(c, inlining) for c in context]
+        if isinstance(context, dict):
+            # term definitions can have a (scoped) context of their own
+            return {k: self._inlined_context(v, inlining) if k == "@context" or isinstance(v, dict) else v
+                    for k, v in context.items()}
+        return context
+
+    def _load(self, url: str, key: str) -> Any:
+        file_name = PACKAGED_CONTEXTS.get(key)
+        if file_name:
+            return _read(CONTEXTS_DIR / file_name)
+        cache_path = self._cache_path(key)
+        if cache_path and cache_path.exists():
+            return _read(cache_path)
+        if not self.allow_remote:
+            raise LookupError(f"no local copy of the JSON-LD context {url}")
+        logger.info(f"fetching JSON-LD context {url}")
+        client = self._client or default_client()
+        content = client.get_bytes(url)
+        if content is None:
+            raise LookupError(f"could not fetch the JSON-LD context {url}")
+        self.remote_fetches += 1
+        document = orjson.loads(content)
+        if cache_path:
+            tmp_path = cache_path.parent / f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp_path.write_bytes(content)
+            tmp_path.replace(cache_path)
+        return document
+
+    def _cache_path(self, key: str) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        return Path(self.cache_dir) / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+
+_default_registry: Optional[ContextRegistry] = None
+
+
+def default_registry() -> ContextRegistry:
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ContextRegistry(cache_dir=os.environ.get("GLOBALISE_CONTEXT_CACHE"))
+    return _default_registry
+
+
+def register_document_loader(registry: Optional[ContextRegistry] = None) -> ContextRegistry:
+    """make pyld load all contexts through registry (default: the default registry), and return it"""
+    from pyld import jsonld
+    registry = registry or default_registry()
+    jsonld.set_document_loader(registry.document_loader)
+    return registry
+
+
+def _normalized(url: str) -> str:
+    url = url.split("#", 1)[0]
+    if url.startswith("https://") and url.replace("https://", "http://", 1) in PACKAGED_CONTEXTS:
+        return url.replace("https://", "http://", 1)
+    if url.startswith("http://") and url.replace("http://", "https://", 1) in PACKAGED_CONTEXTS:
+        return url.replace("http://", "https://", 1)
+    return url
+
+
+def _read(path: Path) -> Any:
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
@@ -0,0 +1,444 @@
+"""
+Convert the project's Web Annotation dicts to N-Quads without a JSON-LD processor.
+
+Only the part of JSON-LD these annotations use is supported: (embedded) contexts with prefixes, terms, keyword aliases,
+@vocab/@base, and type coercion to @id, @vocab or a datatype; @list and @set containers; value objects;
+nested and blank nodes. A document with anything else (scoped contexts, language maps, ...) is converted by pyld
+instead, so the result is always the triples a JSON-LD processor would produce.
+
+Remote contexts are served by a ContextRegistry (the packaged contexts, a disk cache, then the network) and compiled
+once per process. A context that the registry cannot provide raises a LookupError.
+"""
+import gzip
+import hashlib
+import re
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+from urllib.parse import urljoin
+
+import orjson
+from loguru import logger
+
+from globalise_tools.jsonld_contexts import ContextRegistry, default_registry
+
+GLOBALISE_NS = "http://globalise.nl/ns/"
+
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+XSD_BOOLEAN = f"{XSD}boolean"
+XSD_DOUBLE = f"{XSD}double"
+XSD_INTEGER = f"{XSD}integer"
+XSD_STRING = f"{XSD}string"
+
+_RDF_TYPE = f"<{RDF}type>"
+_RDF_FIRST = f"<{RDF}first>"
+_RDF_REST = f"<{RDF}rest>"
+_RDF_NIL = f"<{RDF}nil>"
+_GEN_DELIMS = (":", "/", "?", "#", "[", "]", "@")
+_UNSUPPORTED_TERM_KEYS = ("@reverse", "@context", "@language", "@direction", "@index", "@nest")
+_UNSUPPORTED_CONTEXT_KEYS = ("@import", "@propagate", "@direction")
+_LITERAL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+_LITERAL_NEEDS_ESCAPES = re.compile(r'[\\"\n\r]')
+_IRI_ESCAPES = str.maketrans({c: f"\\u{ord(c):04X}" for c in '<>"{}|^`\\' + "".join(chr(i) for i in range(0x21))})
+_IRI_NEEDS_ESCAPES = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+
+class UnsupportedJsonLd(Exception):
+    """the document uses a part of JSON-LD this converter doesn't support; pyld converts it instead"""
+
+
+class TermDefinition(NamedTuple):
+    iri: Optional[str]
+    type: Optional[str] = None
+    container: Optional[str] = None
+    prefix: bool = False
+
+
+class JsonLdContext:
+    """
+    An active JSON-LD context with its term definitions compiled. Contexts derived from it (by an embedded @context
+    or a remote context url) are compiled once and cached, so the contexts that every annotation repeats cost a dict
+    lookup.
+    """
+
+    def __init__(self, base: Optional[str] = GLOBALISE_NS, registry: Optional[ContextRegistry] = None) -> None:
+        self.base = base
+        self.vocab: Optional[str] = None
+        self.language: Optional[str] = None
+        self.terms: dict[str, TermDefinition] = {}
+        self.registry = registry or default_registry()
+        self._initial = self
+        self._derived: dict[bytes, "JsonLdContext"] = {}
+        # the reasons why local contexts can't be processed, so documents with them fail fast
+        self._unsupported: dict[bytes, str] = {}
+
+    def with_context(self, local_context: Any) -> "JsonLdContext":
+        key = orjson.dumps(local_context, option=orjson.OPT_SORT_KEYS)
+        derived = self._derived.get(key)
+        if derived is None:
+            if key in self._unsupported:
+                raise UnsupportedJsonLd(self._unsupported[key])
+            try:
+                derived = self._derived[key] = self._processed(local_context)
+            except UnsupportedJsonLd as e:
+                self._unsupported[key] = str(e)
+                raise
+        return derived
+
+    def expand_iri(self, value: Optional[str], vocab: bool = False, document_relative: bool = False,
+                   local: Optional[dict] = None, defined: Optional[dict[str, bool]] = None) -> Optional[str]:
+        if value is None or value.startswith("@"):
+            return value
+        if local is not None and value in local and defined.get(value) is not True:
+            self._define(local, value, defined)
+        if vocab and value in self.terms:
+            return self.terms[value].iri
+        if ":" in value:
+            prefix, suffix = value.split(":", 1)
+            if prefix == "_" or suffix.startswith("//"):
+                return value
+            if local is not None and prefix in local and defined.get(prefix) is not True:
+                self._define(local, prefix, defined)
+            definition = self.terms.get(prefix)
+            if definition and definition.iri and definition.prefix:
+                return definition.iri + suffix
+            return value
+        if vocab and self.vocab is not None:
+            return self.vocab + value
+        if document_relative and self.base:
+            return urljoin(self.base, value)
+        return value
+
+    def _processed(self, local_context: Any, remote: tuple[str, ...] = ()) -> "JsonLdContext":
+        result = self
+        for context in (local_context if isinstance(local_context, list) else [local_context]):
+            if context is None:
+                result = self._initial
+            elif isinstance(context, str):
+                if context in remote:
+                    raise ValueError(f"recursive context inclusion: {context}")
+                result = result._processed(self.registry.get(context)["@context"], remote + (context,))
+            elif isinstance(context, dict):
+                if remote and "@base" in context:
+                    # as in JSON-LD 1.1, the @base of a remote context is ignored
+                    context = {k: v for k, v in context.items() if k != "@base"}
+                result = result._with_definitions(context)
+            else:
+                raise ValueError(f"invalid @context: {context!r}")
+        return result
+
+    def _with_definitions(self, local: dict) -> "JsonLdContext":
+        unsupported = [k for k in _UNSUPPORTED_CONTEXT_KEYS if k in local]
+        if unsupported:
+            raise UnsupportedJsonLd(f"unsupported in @context: {', '.join(unsupported)}")
+        context = JsonLdContext.__new__(JsonLdContext)
+        context.__dict__.update(self.__dict__)
+        context.terms = dict(self.terms)
+        context._derived = {}
+        context._unsupported = {}
+        if "@base" in local:
+            context.base = None if local["@base"] is None else urljoin(self.base or "", local["@base"])
+        if "@vocab" in local:
+            context.vocab = context.expand_iri(local["@vocab"], vocab=True, document_relative=True)
+        if "@language" in local:
+            context.language = local["@language"]
+        defined = {}
+        for term in local:
+            if not term.startswith("@"):
+                context._define(local, term, defined)
+        return context
+
+    def _define(self, local: dict, term: str, defined: dict[str, bool]) -> None:
+        if term in defined:
+            if defined[term]:
+                return
+            raise ValueError(f"cyclic IRI mapping for {term!r}")
+        defined[term] = False
+        value = local[term]
+        if value is None:
+            self.terms[term] = TermDefinition(None)
+            defined[term] = True
+            return
+        simple = isinstance(value, str)
+        if simple:
+            value = {"@id": value}
+        elif not isinstance(value, dict):
+            raise ValueError(f"invalid term definition for {term!r}: {value!r}")
+        unsupported = [k for k in _UNSUPPORTED_TERM_KEYS if k in value]
+        if unsupported:
+            raise UnsupportedJsonLd(f"unsupported in the definition of {term!r}: {', '.join(unsupported)}")
+
+        if "@id" in value:
+            iri = self.expand_iri(value["@id"], vocab=True, local=local, defined=defined)
+        elif ":" in term:
+            iri = self.expand_iri(term, local=local, defined=defined)
+        elif self.vocab is not None:
+            iri = self.vocab + term
+        else:
+            raise ValueError(f"term {term!r} has no IRI mapping")
+
+        type_mapping = value.get("@type")
+        if type_mapping in ("@json", "@none"):
+            raise UnsupportedJsonLd(f"unsupported type mapping for {term!r}: {type_mapping}")
+        if type_mapping is not None and type_mapping not in ("@id", "@vocab"):
+            type_mapping = self.expand_iri(type_mapping, vocab=True, local=local, defined=defined)
+
+        container = value.get("@container")
+        if isinstance(container, list) and len(container) == 1:
+            container = container[0]
+        if container not in (None, "@list", "@set"):
+            raise UnsupportedJsonLd(f"unsupported container for {term!r}: {container}")
+
+        prefix = value.get("@prefix", simple and iri is not None and iri.endswith(_GEN_DELIMS))
+        self.terms[term] = TermDefinition(iri, type_mapping, container, prefix)
+        defined[term] = True
+
+
+class NQuadsEmitter:
+    """
+    Turns JSON-LD documents (a node object, or a list of them) into N-Quads lines, in the default graph unless a
+    graph IRI is given. Blank node labels are unique over all documents converted by the same emitter. Documents with
+    JSON-LD features outside the supported subset are converted by pyld.
+    """
+
+    def __init__(self, context: Optional[JsonLdContext] = None, graph: Optional[str] = None) -> None:
+        self.context = context or JsonLdContext()
+        self._graph_suffix = f" {_iri(graph)} .\n" if graph else " .\n"
+        self._vocab_terms: dict[tuple[JsonLdContext, str], Optional[str]] = {}
+        self._blank_node_count = 0
+        self._blank_nodes: dict[str, str] = {}
+        self._quads: list[str] = []
+        self._fallback_reasons: set[str] = set()
+
+    def quads(self, document: Any) -> list[str]:
+        self._blank_nodes = {}
+        self._quads = []
+        try:
+            for node in (document if isinstance(document, list) else [document]):
+                self._node(node, self.context)
+        except UnsupportedJsonLd as e:
+            if str(e) not in self._fallback_reasons:
+                self._fallback_reasons.add(str(e))
+                logger.info(f"{e}: documents that use it are converted by pyld")
+            self._blank_nodes = {}
+            self._quads = []
+            self._processor_quads(document)
+        return self._quads
+
+    def _processor_quads(self, document: Any) -> None:
+        from pyld import jsonld
+        dataset = jsonld.to_rdf(document, {"base": self.context.base,
+                                           "documentLoader": self.context.registry.document_loader})
+        graphs = set(dataset) - {"@default"}
+        if graphs:
+            raise ValueError(f"named graphs are not supported: {', '.join(sorted(graphs))}")
+        for triple in dataset.get("@default", []):
+            self._emit(self._processor_term(triple["subject"]), _iri(triple["predicate"]["value"]),
+                       self._processor_term(triple["object"]))
+
+    def _processor_term(self, term: dict) -> str:
+        if term["type"] == "IRI":
+            return _iri(term["value"])
+        if term["type"] == "blank node":
+            return self._resource(term["value"])
+        return _literal(term["value"], term.get("datatype"), term.get("language"))
+
+    def _node(self, node: dict, context: JsonLdContext) -> Optional[str]:
+        if "@context" in node:
+            context = context.with_context(node["@context"])
+        subject = None
+        types = []
+        properties = []
+        for key, value in node.items():
+            if key == "@context":
+                continue
+            definition = context.terms.get(key)
+            predicate = definition.iri if definition else context.expand_iri(key, vocab=True)
+            if predicate == "@id":
+                subject = self._resource(context.expand_iri(value, document_relative=True))
+            elif predicate == "@type":
+                types = value if isinstance(value, list) else [value]
+            elif predicate is None or predicate.startswith("_:") or ":" not in predicate:
+                continue
+            elif predicate.startswith("@"):
+                raise UnsupportedJsonLd(f"unsupported in a node object: {predicate}")
+            else:
+                properties.append((predicate, definition, value))
+        if subject is None:
+            subject = self._new_blank_node()
+        for t in types:
+            self._emit(subject, _RDF_TYPE, self._vocab_term(t, context))
+        for predicate, definition, value in properties:
+            iri = _iri(predicate)
+            if definition and definition.container == "@list":
+                self._emit(subject, iri, self._list(value, definition, context))
+            else:
+                for o in self._objects(value, definition, context):
+                    self._emit(subject, iri, o)
+        return subject
+
+    def _objects(self, value: Any, definition: Optional[TermDefinition], context: JsonLdContext) -> Iterator[str]:
+        if value is None:
+            return
+        if isinstance(value, list):
+            for v in value:
+                yield from self._objects(v, definition, context)
+        elif isinstance(value, dict):
+            keywords = {self._keyword(k, context): v for k, v in value.items()}
+            if "@value" in keywords:
+                o = self._value_object(keywords, context)
+                if o is not None:
+                    yield o
+            elif "@list" in keywords:
+                yield self._list(keywords["@list"], definition, context)
+            elif "@set" in keywords:
+                yield from self._objects(keywords["@set"], definition, context)
+            else:
+                yield self._node(value, context)
+        else:
+            o = self._scalar(value, definition, context)
+            if o is not None:
+                yield o
+
+    def _list(self, value: Any, definition: Optional[TermDefinition], context: JsonLdContext) -> str:
+        items = []
+        for v in (value if isinstance(value, list) else [value]):
+            if isinstance(v, list):
+                raise UnsupportedJsonLd("lists of lists are not supported")
+            items.extend(self._objects(v, definition, context))
+        head = _RDF_NIL
+        for item in reversed(items):
+            node = self._new_blank_node()
+            self._emit(node, _RDF_FIRST, item)
+            self._emit(node, _RDF_REST, head)
+            head = node
+        return head
+
+    def _scalar(self, value: Any, definition: Optional[TermDefinition], context: JsonLdContext) -> Optional[str]:
+        type_mapping = definition.type if definition else None
+        if isinstance(value, str):
+            if type_mapping == "@id":
+                return self._resource(context.expand_iri(value, document_relative=True))
+            if type_mapping == "@vocab":
+                return self._vocab_term(value, context)
+            if type_mapping is None and context.language:
+                return _literal(value, language=context.language)
+            return _literal(value, type_mapping)
+        return _native_literal(value, None if type_mapping in ("@id", "@vocab") else type_mapping)
+
+    def _value_object(self, value: dict, context: JsonLdContext) -> Optional[str]:
+        literal = value["@value"]
+        datatype = value.get("@type")
+        if datatype is not None:
+            datatype = context.expand_iri(datatype, vocab=True, document_relative=True)
+        if literal is None:
+            return None
+        if isinstance(literal, str):
+            return _literal(literal, datatype, value.get("@language"))
+        return _native_literal(literal, datatype)
+
+    def _keyword(self, key: str, context: JsonLdContext) -> str:
+        definition = context.terms.get(key)
+        if definition and definition.iri and definition.iri.startswith("@"):
+            return definition.iri
+        return key
+
+    def _resource(self, iri: Optional[str]) -> Optional[str]:
+        if iri is None:
+            return None
+        if iri.startswith("_:"):
+            node = self._blank_nodes.get(iri)
+            if node is None:
+                node = self._blank_nodes[iri] = self._new_blank_node()
+            return node
+        if ":" not in iri:
+            return None
+        return _iri(iri)
+
+    def _vocab_term(self, value: str, context: JsonLdContext) -> Optional[str]:
+        # types and @vocab values come from a small set, so their expansion is cached
+        if value.startswith("_:"):
+            return self._resource(value)
+        key = (context, value)
+        if key not in self._vocab_terms:
+            self._vocab_terms[key] = self._resource(context.expand_iri(value, vocab=True, document_relative=True))
+        return self._vocab_terms[key]
+
+    def _new_blank_node(self) -> str:
+        self._blank_node_count += 1
+        return f"_:b{self._blank_node_count}"
+
+    def _emit(self, subject: str, predicate: str, obj: Optional[str]) -> None:
+        if obj is not None:
+            self._quads.append(f"{subject} {predicate} {obj}{self._graph_suffix}")
+
+
+class NQuadsWriter:
+    """
+    Streams the quads of JSON-LD documents into a gzipped N-Quads file, skipping quads that were already written.
+    Written quads are remembered by a 16-byte digest, to keep the memory needed for the dedup modest.
+    """
+
+    def __init__(self, path: str, emitter: Optional[NQuadsEmitter] = None, compresslevel: int = 6,
+                 registry: Optional[ContextRegistry] = None) -> None:
+        self.path = path
+        self.emitter = emitter or NQuadsEmitter(JsonLdContext(registry=registry))
+        self.quads_written = 0
+        self.duplicates_skipped = 0
+        self._seen: set[bytes] = set()
+        self._file = gzip.open(path, "wb", compresslevel=compresslevel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, document: Any) -> int:
+        lines = []
+        for quad in self.emitter.quads(document):
+            line = quad.encode("utf-8")
+            digest = hashlib.blake2b(line, digest_size=16).digest()
+            if digest in self._seen:
+                self.duplicates_skipped += 1
+            else:
+                self._seen.add(digest)
+                lines.append(line)
+        self._file.write(b"".join(lines))
+        self.quads_written += len(lines)
+        return len(lines)
+
+    def write_all(self, documents: Iterable[Any]) -> int:
+        return sum(self.write(d) for d in documents)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _iri(iri: str) -> str:
+    if _IRI_NEEDS_ESCAPES.search(iri):
+        iri = iri.translate(_IRI_ESCAPES)
+    return f"<{iri}>"
+
+
+def _literal(lexical: str, datatype: Optional[str] = None, language: Optional[str] = None) -> str:
+    if _LITERAL_NEEDS_ESCAPES.search(lexical):
+        lexical = lexical.translate(_LITERAL_ESCAPES)
+    if language:
+        return f'"{lexical}"@{language}'
+    if datatype and datatype != XSD_STRING:
+        return f'"{lexical}"^^{_iri(datatype)}'
+    return f'"{lexical}"'
+
+
+def _native_literal(value: Any, datatype: Optional[str]) -> str:
+    if isinstance(value, bool):
+        return _literal("true" if value else "false", datatype or XSD_BOOLEAN)
+    if isinstance(value, float) and (not value.is_integer() or abs(value) >= 1e21) or datatype == XSD_DOUBLE:
+        return _literal(_canonical_double(value), datatype or XSD_DOUBLE)
+    if isinstance(value, (int, float)):
+        return _literal(str(int(value)), datatype or XSD_INTEGER)
+    raise ValueError(f"not a JSON-LD value: {value!r}")
+
+
+def _canonical_double(value: float) -> str:
+    return re.sub(r"(\d)0*E\+?(-)?0*(\d)", r"\1E\2\3", f"{value:1.15E}")
@@ -0,0 +1,237 @@
+import io
+import os
+import tarfile
+import zipfile
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, Optional
+
+import orjson
+
+from globalise_tools.logger_tools import log_reading_file, log_writing_file
+from globalise_tools.url_factory import AnnotationPageType
+
+
+class PageFormat(Enum):
+    """how the annotation pages of an inventory are stored"""
+    DIRECTORY = "dir"  # one {page_type}/{page_id}.json file per page
+    ZIP = "zip"  # the same layout, in {inventory_number}-annotation-lists.zip
+    TAR_GZ = "tar.gz"  # the same layout, in {inventory_number}-annotation-lists.tar.gz
+    JSONL = "jsonl"  # one page per line, in {inventory_number}-annotation-lists.jsonl, with an offset index
+
+
+def page_archive_path(output_dir: str, inventory_number: str, page_format: PageFormat) -> str:
+    """where the pages of the inventory are stored in the given format"""
+    if page_format == PageFormat.DIRECTORY:
+        return output_dir
+    return f"{output_dir}/{inventory_number}-annotation-lists.{page_format.value}"
+
+
+def page_name(page_type: AnnotationPageType, page_id: str) -> str:
+    """the path of the page, relative to the directory or archive"""
+    return f"{page_type.value}/{page_id}.json"
+
+
+def index_path(jsonl_path: str) -> str:
+    return f"{jsonl_path}.index.json"
+
+
+class PageSink(ABC):
+    """Stores serialized annotation pages; use as a context manager, or close() when done"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.pages_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, page_type: AnnotationPageType, page_id: str, page: bytes) -> None:
+        self._write(page_name(page_type, page_id), page)
+        self.pages_written += 1
+
+    @abstractmethod
+    def _write(self, name: str, page: bytes) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class DirectoryPageSink(PageSink):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._dirs_made = set()
+
+    def _write(self, name: str, page: bytes) -> None:
+        page_path = f"{self.path}/{name}"
+        page_dir = os.path.dirname(page_path)
+        if page_dir not in self._dirs_made:
+            os.makedirs(page_dir, exist_ok=True)
+            self._dirs_made.add(page_dir)
+        log_writing_file(page_path)
+        with open(page_path, "wb") as f:
+            f.write(page)
+
+
+class ZipPageSink(PageSink):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        log_writing_file(path)
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def _write(self, name: str, page: bytes) -> None:
+        self._zip.writestr(name, page)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class TarGzPageSink(PageSink):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        log_writing_file(path)
+        self._tar = tarfile.open(path, "w:gz")
+
+    def _write(self, name: str, page: bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(page)
+        self._tar.addfile(info, io.BytesIO(page))
+
+    def close(self) -> None:
+        self._tar.close()
+
+
+class JsonLinesPageSink(PageSink):
+    """
+    Writes every page as one line (orjson output has no newlines), and on close the index: a json object with
+    the [offset, length] of every page by name, next to the jsonl file.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        log_writing_file(path)
+        self._file = open(path, "wb")
+        self._index: dict[str, list[int]] = {}
+
+    def _write(self, name: str, page: bytes) -> None:
+        self._index[name] = [self._file.tell(), len(page)]
+        self._file.write(page)
+        self._file.write(b"\n")
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            with open(index_path(self.path), "wb") as f:
+                f.write(orjson.dumps(self._index))
+
+
+_SINKS = {
+    PageFormat.DIRECTORY: DirectoryPageSink,
+    PageFormat.ZIP: ZipPageSink,
+    PageFormat.TAR_GZ: TarGzPageSink,
+    PageFormat.JSONL: JsonLinesPageSink,
+}
+
+
+def open_page_sink(output_dir: str, inventory_number: str, page_format: PageFormat) -> PageSink:
+    """a sink for the pages of the inventory, in the given format, in output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    return _SINKS[page_format](page_archive_path(output_dir, inventory_number, page_format))
+
+
+class PageSource(ABC):
+    """Reads the annotation pages stored by a PageSink; use as a context manager, or close() when done"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def read(self, page_type: AnnotationPageType, page_id: str) -> Optional[bytes]:
+        """the serialized page, or None if there is no such page"""
+        return self._read(page_name(page_type, page_id))
+
+    def read_json(self, page_type: AnnotationPageType, page_id: str) -> Optional[Any]:
+        page = self.read(page_type, page_id)
+        return orjson.loads(page) if page is not None else None
+
+    @abstractmethod
+    def _read(self, name: str) -> Optional[bytes]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class DirectoryPageSource(PageSource):
+    def _read(self, name: str) -> Optional[bytes]:
+        try:
+            with open(f"{self.path}/{name}", "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class ZipPageSource(PageSource):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        log_reading_file(path)
+        self._zip = zipfile.ZipFile(path)
+        self._names = set(self._zip.namelist())
+
+    def _read(self, name: str) -> Optional[bytes]:
+        return self._zip.read(name) if name in self._names else None
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class TarGzPageSource(PageSource):
+    """A gzipped tar can't be read at random, so all pages are read into memory when the source is opened"""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        log_reading_file(path)
+        with tarfile.open(path, "r:gz") as tar:
+            self._pages = {m.name: tar.extractfile(m).read() for m in tar if m.isfile()}
+
+    def _read(self, name: str) -> Optional[bytes]:
+        return self._pages.get(name)
+
+
+class JsonLinesPageSource(PageSource):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        log_reading_file(path)
+        with open(index_path(path), "rb") as f:
+            self._index: dict[str, list[int]] = orjson.loads(f.read())
+        self._file = open(path, "rb")
+
+    def _read(self, name: str) -> Optional[bytes]:
+        if name not in self._index:
+            return None
+        offset, length = self._index[name]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def open_page_source(path: str) -> PageSource:
+    """a source for the pages in path: a .zip, .tar.gz or .jsonl archive, or else a directory"""
+    if path.endswith(".zip"):
+        return ZipPageSource(path)
+    if path.endswith(".tar.gz"):
+        return TarGzPageSource(path)
+    if path.endswith(".jsonl"):
+        return JsonLinesPageSource(path)
+    return DirectoryPageSource(path)
@@ -0,0 +1,182 @@
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from globalise_tools.logger_tools import log_reading_file
+
+_RE_STRUCTURE_TYPE = re.compile(r"\bstructure {(.*?)}")
+
+
+@dataclass(slots=True)
+class PageCoords:
+    point_string: str
+
+    @property
+    def points(self) -> list[tuple[int, int]]:
+        points = [p.split(',') for p in self.point_string.split()]
+        return [(int(p[0]), int(p[1])) for p in points if len(p) == 2]
+
+
+@dataclass(slots=True)
+class PageWord:
+    id: Optional[str]
+    text: Optional[str]
+    coords: Optional[PageCoords]
+
+
+@dataclass(slots=True)
+class PageLine:
+    id: Optional[str]
+    text: Optional[str]
+    coords: Optional[PageCoords]
+    words: list[PageWord] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class PageRegion:
+    id: Optional[str]
+    custom: Optional[str]
+    text: Optional[str]
+    coords: Optional[PageCoords]
+    lines: list[PageLine] = field(default_factory=list)
+
+    @property
+    def structure_type(self) -> Optional[str]:
+        return structure_type(self.custom)
+
+    @property
+    def type(self) -> list[str]:
+        # mirrors pagexml-tools, where the structure type (if any) is the last type
+        structure_type = self.structure_type
+        return ["text_region", structure_type] if structure_type else ["text_region"]
+
+
+@dataclass(slots=True)
+class PageModel:
+    """
+    The parts of a PageXML file the annotation pipeline needs: the page dimensions, the text regions
+    (in document order) with their lines and words, and the reading order of the regions.
+    Parse a file once with `read_page_xml` and pass the result to every consumer.
+    """
+    image_filename: Optional[str]
+    image_width: int
+    image_height: int
+    regions: list[PageRegion] = field(default_factory=list)
+    reading_order: list[str] = field(default_factory=list)
+
+    def get_text_regions_in_reading_order(self) -> list[PageRegion]:
+        if not self.reading_order:
+            return self.regions
+        region_idx = {r.id: r for r in self.regions}
+        return [region_idx[region_id] for region_id in self.reading_order if region_id in region_idx]
+
+    def words(self) -> list[PageWord]:
+        return [w for r in self.regions for line in r.lines for w in line.words]
+
+
+def structure_type(custom: Optional[str]) -> Optional[str]:
+    """the type in the structure {type:...;} part of a PageXML custom attribute, if any"""
+    if not custom:
+        return None
+    m = _RE_STRUCTURE_TYPE.search(custom)
+    if not m:
+        return None
+    for part in m.group(1).split(';'):
+        key, _, value = part.partition(':')
+        if key.strip() == 'type':
+            return value.strip()
+    return None
+
+
+def read_page_xml(path: str | Path) -> PageModel:
+    log_reading_file(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_page_xml(f.read())
+
+
+def parse_page_xml(xml_string: str) -> PageModel:
+    root = ET.fromstring(xml_string)
+    page = _first_child(root, "Page")
+    if page is None:
+        raise ValueError("Not a PageXML document: no Page element found")
+    return PageModel(
+        image_filename=page.get("imageFilename"),
+        image_width=int(page.get("imageWidth") or 0),
+        image_height=int(page.get("imageHeight") or 0),
+        regions=[_region(r) for r in _children(page, "TextRegion")],
+        reading_order=_reading_order(page)
+    )
+
+
+def _region(element: ET.Element) -> PageRegion:
+    return PageRegion(
+        id=element.get("id"),
+        custom=element.get("custom"),
+        text=_text(element),
+        coords=_coords(element),
+        lines=[_line(e) for e in _children(element, "TextLine")]
+    )
+
+
+def _line(element: ET.Element) -> PageLine:
+    return PageLine(
+        id=element.get("id"),
+        text=_text(element),
+        coords=_coords(element),
+        words=[_word(e) for e in _children(element, "Word")]
+    )
+
+
+def _word(element: ET.Element) -> PageWord:
+    return PageWord(
+        id=element.get("id"),
+        text=_text(element),
+        coords=_coords(element)
+    )
+
+
+def _reading_order(page: ET.Element) -> list[str]:
+    ordered_group = _first_child(_first_child(page, "ReadingOrder"), "OrderedGroup")
+    indexed_refs = []
+    for ref in _children(ordered_group, "RegionRefIndexed"):
+        region_ref = ref.get("regionRef")
+        if region_ref:
+            indexed_refs.append((int(ref.get("index")), region_ref))
+    indexed_refs.sort(key=lambda x: x[0])
+    return list(dict.fromkeys(region_ref for _, region_ref in indexed_refs))
+
+
+def _coords(element: ET.Element) -> Optional[PageCoords]:
+    coords = _first_child(element, "Coords")
+    if coords is None:
+        return None
+    points = coords.get("points")
+    return PageCoords(points) if points else None
+
+
+def _text(element: ET.Element) -> Optional[str]:
+    unicode_element = _first_child(_first_child(element, "TextEquiv"), "Unicode")
+    if unicode_element is None or not unicode_element.text:
+        return None
+    return unicode_element.text.strip() or None
+
+
+def _local_name(element: ET.Element) -> str:
+    return element.tag.rpartition('}')[2] if isinstance(element.tag, str) else ""
+
+
+def _children(element: Optional[ET.Element], name: str) -> list[ET.Element]:
+    if element is None:
+        return []
+    return [c for c in element if _local_name(c) == name]
+
+
+def _first_child(element: Optional[ET.Element], name: str) -> Optional[ET.Element]:
+    if element is None:
+        return None
+    for c in element:
+        if _local_name(c) == name:
+            return c
+    return None
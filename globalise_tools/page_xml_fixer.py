@@ -1,49 +1,83 @@
+import os
 from datetime import datetime
-from typing import Optional
-from xml.dom.minidom import Document, parseString
+from typing import Iterable, Optional
 
 import lxml
-import pagexml.parser as px
+import multiprocess as mp
 from loguru import logger
 from lxml import etree
 
-import globalise_tools.git_tools as git
-from globalise_tools.logger_tools import log_writing_file
+import globalise_tools.provenance as provenance
+from globalise_tools.io_tools import CheckpointJournal, write_tsv
+from globalise_tools.logger_tools import log_reading_file, log_writing_file
+from globalise_tools.page_model import PageCoords, structure_type
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+MANIFEST_HEADERS = ["pagexml_path", "status", "error_codes", "export_path", "message"]
+# the statuses of the files a resumed run doesn't fix again
+DONE_STATUSES = {"fixed", "unchanged"}
+
+# without the whitespace between the elements, lxml can (re)indent the modified tree when writing it
+_PARSER = etree.XMLParser(remove_blank_text=True)
 
 
 class PageXmlFixer:
+    """
+    Fixes the reading order of the paragraphs (by y, per half of the scan for landscape scans), and the order of the
+    lines in the text regions (by y), of a PageXML file. The file is parsed once, with lxml, and the fixes are made
+    in (and written from) that tree. The modified file is only written when something was fixed.
+    """
+
     def __init__(self, import_path: str, output_directory: str, quality_check: str, script: str) -> None:
         self.import_path = import_path
         self.output_directory = output_directory
         self.quality_check = quality_check
-        self.scan_doc = px.parse_pagexml_file(self.import_path)
+        self.tree = etree.parse(self.import_path, _PARSER)
+        self.page = self._get_page_element(self.tree.getroot())
         self.error_codes = set()
         self.script = script
 
-    def fix(self) -> None:
+    def fix(self) -> set[str]:
+        """fix the file, and return the codes of the errors that were fixed"""
         filename = self.import_path.split("/")[-1]
         export_path = f"{self.output_directory}/{filename}"
-        current_reading_order = self.scan_doc.reading_order
-        new_reading_order = self._order_paragraphs_by_y()
+        current_reading_order = self._reading_order()
+        new_reading_order = self._order_paragraphs_by_y(current_reading_order)
         if current_reading_order != new_reading_order:
             if self._is_portrait():
                 self.error_codes.add("3.1.1")
             else:
                 self.error_codes.add("3.1.2")
         self._modify_page_xml(export_path, new_reading_order)
+        return self.error_codes
+
+    def _reading_order(self) -> dict[int, str]:
+        reading_order = _first_child(self.page, 'ReadingOrder')
+        ordered_group = _first_child(reading_order, 'OrderedGroup') if reading_order is not None else None
+        if ordered_group is None:
+            return {}
+        return {int(ref.get('index')): ref.get('regionRef')
+                for ref in _children(ordered_group, 'RegionRefIndexed') if ref.get('regionRef')}
 
-    def _order_paragraphs_by_y(self) -> dict:
-        current_reading_order = self.scan_doc.reading_order
-        paragraphs = [tr for tr in self.scan_doc.get_text_regions_in_reading_order() if
-                      'paragraph' in self._defining_types(tr)]
+    def _text_regions_in_reading_order(self, reading_order: dict[int, str]) -> list:
+        text_regions = _children(self.page, 'TextRegion')
+        if not reading_order:
+            return text_regions
+        text_region_idx = {tr.get('id'): tr for tr in text_regions}
+        region_ids = dict.fromkeys(region_id for _, region_id in sorted(reading_order.items()))
+        return [text_region_idx[region_id] for region_id in region_ids if region_id in text_region_idx]
+
+    def _order_paragraphs_by_y(self, current_reading_order: dict[int, str]) -> dict:
+        paragraphs = [(tr.get('id'), box) for tr in self._text_regions_in_reading_order(current_reading_order)
+                      if structure_type(tr.get('custom')) == 'paragraph' and (box := _box(tr))]
         replacements = {}
         if self._is_portrait():
             local_replacements = self._ref_id_replacement_dict(paragraphs)
             replacements.update(local_replacements)
         else:
-            middle_x = self.scan_doc.coords.box['w'] / 2
-            left_paragraphs = [tr for tr in paragraphs if tr.coords.box['x'] < middle_x]
-            right_paragraphs = [tr for tr in paragraphs if tr.coords.box['x'] >= middle_x]
+            middle_x = self._image_size()[0] / 2
+            left_paragraphs = [p for p in paragraphs if p[1]['x'] < middle_x]
+            right_paragraphs = [p for p in paragraphs if p[1]['x'] >= middle_x]
             if len(left_paragraphs) > 1:
                 local_replacements = self._ref_id_replacement_dict(left_paragraphs)
                 replacements.update(local_replacements)
@@ -58,19 +92,16 @@ class PageXmlFixer:
                 new_reading_order[i] = ref_id
         return new_reading_order
 
-    @staticmethod
-    def _defining_types(tr):
-        return sorted(tr.types - {'pagexml_doc', 'physical_structure_doc', 'structure_doc', 'text_region'})
+    def _image_size(self) -> tuple[int, int]:
+        return int(self.page.get('imageWidth')), int(self.page.get('imageHeight'))
 
     def _is_portrait(self) -> bool:
-        box = self.scan_doc.coords.box
-        w = box['w']
-        h = box['h']
+        w, h = self._image_size()
         return (w / h) < 0.9
 
     @staticmethod
-    def _ref_id_replacement_dict(paragraphs) -> dict:
-        par_y_list = [(tr.id, tr.coords.box['y']) for tr in paragraphs]
+    def _ref_id_replacement_dict(paragraphs: list[tuple[str, dict]]) -> dict:
+        par_y_list = [(tr_id, box['y']) for tr_id, box in paragraphs]
         sorted_par_y_list = sorted(par_y_list, key=lambda t: t[1])
         zipped = zip(par_y_list, sorted_par_y_list)
         local_replacements = {}
@@ -82,16 +113,15 @@ class PageXmlFixer:
         return local_replacements
 
     def _modify_page_xml(self, out_path: str, new_reading_order: dict[int, str]) -> None:
-        tree = etree.parse(self.import_path)
-        root = tree.getroot()
-        page = self._get_page_element(root)
+        root = self.tree.getroot()
+        page = self.page
         self._set_new_reading_order(page, new_reading_order)
         metadata = self._get_metadata_element(root)
         self._update_last_change(metadata)
         self._reorder_text_regions(page, new_reading_order)
         self._add_processing_step(metadata)
         if self.error_codes:
-            self._write_to_xml(tree, out_path)
+            self._write_to_xml(self.tree, out_path)
 
     def _get_page_element(self, root):
         page_index = self._element_index(root, 'Page')
@@ -99,7 +129,7 @@ class PageXmlFixer:
         return page
 
     def _add_processing_step(self, metadata) -> None:
-        commit_id = git.read_current_commit_id(warn_on_uncommitted_changes=True)
+        run = provenance.current_run()
         metadata_item = etree.Element(
             "MetadataItem",
             attrib={
@@ -109,8 +139,8 @@ class PageXmlFixer:
             }
         )
         labels = etree.SubElement(metadata_item, "Labels")
-        labels.append(self._label_element("githash", commit_id))
-        script_permalink = f"https://github.com/knaw-huc/globalise-tools/blob/{commit_id}/scripts/{self.script}"
+        labels.append(self._label_element("githash", run.commit_id))
+        script_permalink = run.script_url(f"scripts/{self.script}")
         labels.append(self._label_element("url", script_permalink))
         # labels.append(self._label_element("fixed_error_codes", error_codes))
         metadata[-1].addprevious(metadata_item)
@@ -120,23 +150,16 @@ class PageXmlFixer:
         return etree.Element("Label", attrib={"type": label_type, "value": label_value})
 
     @staticmethod
-    def _write_to_xml(doc: Document, path: str) -> None:
-        xml_str = etree.tostring(doc, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-        pretty_xml_lines = parseString(xml_str).toprettyxml(indent="  ").split('\n')
-        clean_xml = "\n".join([l for l in pretty_xml_lines if l.strip()])
+    def _write_to_xml(tree: etree._ElementTree, path: str) -> None:
         log_writing_file(path)
-        with open(path, 'w') as xml_file:
-            xml_file.write(
-                clean_xml.replace('<?xml version="1.0" ?>', '<?xml version="1.0" encoding="UTF-8"?>').replace('\n"',
-                                                                                                              '"')
-            )
+        with open(path, 'wb') as xml_file:
+            xml_file.write(XML_DECLARATION)
+            xml_file.write(etree.tostring(tree, pretty_print=True, encoding="UTF-8"))
 
     @staticmethod
     def _element_index(element: lxml.etree._Element, sub_element_name: str) -> Optional[int]:
         for i, sub_element in enumerate(list(element)):
-            tag_prefix = '{' + sub_element.nsmap[sub_element.prefix] + '}'
-            expected_tag = tag_prefix + sub_element_name
-            if sub_element.tag == expected_tag:
+            if _local_name(sub_element) == sub_element_name:
                 return i
         return None
 
@@ -183,16 +206,13 @@ class PageXmlFixer:
     def _reorder_lines(self, text_region_element: lxml.etree._Element) -> None:
         coords = []
         text_line_element_dict = {}
-        text_region_id = text_region_element.attrib['id']
-        text_region = [tr for tr in self.scan_doc.text_regions if tr.id == text_region_id][0]
-        text_lines = text_region.lines
-        sorted_text_lines = sorted(text_lines, key=lambda l: l.coords.box['y'])
+        text_lines = [(tl.get('id'), _box(tl)['y']) for tl in _children(text_region_element, 'TextLine')]
+        sorted_text_lines = sorted(text_lines, key=lambda l: l[1])
         if text_lines == sorted_text_lines:
             return
 
-        self.pagexml_has_changed = True
         self.error_codes.add("3.2")
-        sorted_text_line_ids = [l.id for l in sorted_text_lines]
+        sorted_text_line_ids = [line_id for line_id, _ in sorted_text_lines]
         for child in text_region_element:
             if 'TextLine' in child.tag:
                 tl_id = child.attrib['id']
@@ -206,3 +226,113 @@ class PageXmlFixer:
             text_region_element.append(c)
         for line_id in sorted_text_line_ids:
             text_region_element.append(text_line_element_dict[line_id])
+
+
+def fix_pagexml_files(
+        pagexml_paths: Iterable[str],
+        output_directory: str,
+        script: str,
+        quality_checks: Optional[dict[str, str]] = None,
+        workers: int = 1,
+        manifest_path: Optional[str] = None
+) -> list[dict]:
+    """
+    Fix the reading order of the given PageXML files, writing the fixed files to output_directory, with a pool of
+    `workers` processes. Returns a record per file, with its status (fixed, unchanged, missing or failed), the
+    error codes that were fixed, the export path and the error message (if any).
+
+    The records are also written to manifest_path (default: reading-order-fixes.tsv in output_directory), through
+    a journal next to it, so an interrupted run continues with the files it had not finished: those that were not
+    fixed or unchanged (missing or failed, perhaps on a transient error) are tried again, and their new record
+    replaces the old one, so there is one record per file.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    manifest_path = manifest_path or f"{output_directory}/reading-order-fixes.tsv"
+    quality_checks = quality_checks or {}
+    # pagexml_path -> its latest record
+    records: dict[str, dict] = {}
+    journal = CheckpointJournal(
+        f"{manifest_path}.journal.jsonl",
+        compact=lambda _: write_tsv(manifest_path, MANIFEST_HEADERS,
+                                    [[r[h] for h in MANIFEST_HEADERS] for r in records.values()])
+    )
+    for record in journal.records:
+        records[record["pagexml_path"]] = record
+    done = {path for path, record in records.items() if record["status"] in DONE_STATUSES}
+    tasks = [(path, output_directory, quality_checks.get(path, ""), script)
+             for path in pagexml_paths if path not in done]
+    total = len(tasks)
+    with journal:
+        if workers > 1 and total > 1:
+            pool_size = min(workers, total)
+            run = provenance.current_run()
+            # the commit id is resolved here, so the workers (which get a copy of the run) don't each resolve it
+            logger.info(f"fixing {total} files with {pool_size} workers, at commit {run.commit_id}")
+            with mp.Pool(pool_size, initializer=provenance.set_current_run, initargs=(run,)) as pool:
+                results = pool.imap(_fix_pagexml_file, tasks, chunksize=4)
+                _store_records(results, records, journal, total)
+        else:
+            _store_records(map(_fix_pagexml_file, tasks), records, journal, total)
+    return list(records.values())
+
+
+def _store_records(results: Iterable[dict], records: dict[str, dict], journal: CheckpointJournal,
+                   total: int) -> None:
+    for i, record in enumerate(results):
+        log_reading_file(record["pagexml_path"], f" ({i + 1}/{total}): {record['status']}")
+        records[record["pagexml_path"]] = record
+        journal.append(record)
+
+
+def _fix_pagexml_file(task: tuple[str, str, str, str]) -> dict:
+    import_path, output_directory, quality_check, script = task
+    record = {"pagexml_path": import_path, "status": "unchanged", "error_codes": "", "export_path": "", "message": ""}
+    if not os.path.exists(import_path):
+        logger.warning(f"missing file: {import_path}")
+        record["status"] = "missing"
+        return record
+    try:
+        error_codes = PageXmlFixer(import_path, output_directory, quality_check, script).fix()
+    except Exception as e:
+        logger.error(f"{import_path}: {e}")
+        record.update(status="failed", message=str(e))
+        return record
+    if error_codes:
+        record.update(status="fixed", error_codes=",".join(sorted(error_codes)),
+                      export_path=f"{output_directory}/{import_path.split('/')[-1]}")
+    return record
+
+
+def _box(element: lxml.etree._Element) -> Optional[dict]:
+    """
+    the bounding box of the Coords of the element, or (as pagexml-tools derives it)
+    of the coords of its lines and text regions when it has none
+    """
+    points = _points(element)
+    if not points:
+        return None
+    x = min(p[0] for p in points)
+    y = min(p[1] for p in points)
+    return {"x": x, "y": y, "w": max(p[0] for p in points) - x, "h": max(p[1] for p in points) - y}
+
+
+def _points(element: lxml.etree._Element) -> list[tuple[int, int]]:
+    coords = _first_child(element, 'Coords')
+    if coords is not None and coords.get('points'):
+        return PageCoords(coords.get('points')).points
+    return [p for child in element if _local_name(child) in ('TextLine', 'TextRegion') for p in _points(child)]
+
+
+def _local_name(element: lxml.etree._Element) -> str:
+    return etree.QName(element).localname if isinstance(element.tag, str) else ""
+
+
+def _children(element: lxml.etree._Element, name: str) -> list:
+    return [c for c in element if _local_name(c) == name]
+
+
+def _first_child(element: lxml.etree._Element, name: str) -> Optional[lxml.etree._Element]:
+    for c in element:
+        if _local_name(c) == name:
+            return c
+    return None
@@ -1,27 +1,24 @@
 import re
-import xml.etree.ElementTree as ET
-from typing import Any, Dict, List, Optional, Iterator
+from typing import Any, Dict, List, Optional
 
-import globalise_tools.git_tools as git
+import globalise_tools.provenance as provenance
 import globalise_tools.url_factory as uf
 from globalise_tools.creator import CreatorFactory
 from globalise_tools.model import Offset, TextQuote
-
-ns = {
-    'ns': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'
-}
+from globalise_tools.page_model import PageCoords, PageModel, parse_page_xml
 
 
 class TranscriptionAnnotationPageBuilder:
 
     def __init__(
             self,
-            xml_string: str,
+            xml_string: str = "",
             page_id: str = "",
             canvas_id: str = "",
             page_text: str = "",
             script_path: str = "",
-            commit_id: Optional[str] = None
+            commit_id: Optional[str] = None,
+            page: Optional[PageModel] = None
     ) -> None:
         self.page_id = page_id
         self.xml_string = xml_string
@@ -29,10 +26,10 @@ class TranscriptionAnnotationPageBuilder:
         self.normalized_page_text = page_text
         self.script_path = script_path
         if not commit_id:
-            self.commit_id = git.read_current_commit_id(warn_on_uncommitted_changes=True)
+            self.commit_id = provenance.current_run().commit_id
         else:
             self.commit_id = commit_id
-        self.xml_doc = ET.fromstring(self.xml_string)
+        self.page = page if page else parse_page_xml(self.xml_string)
         self.htr_word_offsets = self._get_word_offsets()
         self.max_fix_len = 20
 
@@ -40,11 +37,9 @@ class TranscriptionAnnotationPageBuilder:
     def build(self) -> Dict[str, Any]:
         annotations = []
 
-        # Root elements
-        page = self._find_first(self.xml_doc, "Page")
-        page_filename = self._get_attr(page, "imageFilename")
-        width = int(self._get_attr(page, "imageWidth") or 0) or None
-        height = int(self._get_attr(page, "imageHeight") or 0) or None
+        page_filename = self.page.image_filename
+        width = self.page.image_width or None
+        height = self.page.image_height or None
 
         base = re.sub(r"\.[a-zA-Z]+$", "", page_filename or "page")
         ap_uri = uf.annotation_page_url(uf.AnnotationPageType.TRANSCRIPTIONS, base)
@@ -54,20 +49,18 @@ class TranscriptionAnnotationPageBuilder:
         page_anno_id = f"{ap_uri}#page-normalized"
 
         text_lines: List[str] = []
-        for region in self._find_all(page, "TextRegion"):
-            for line in self._find_all(region, "TextLine"):
-                line_text = self._extract_text(line)
+        for region in self.page.regions:
+            for line in region.lines:
+                line_text = self._normalized_text(line.text)
                 if line_text:
                     text_lines.append(line_text)
         htr_text = "\n".join(text_lines)
 
         # Regions
-        for region in self._find_all(page, "TextRegion"):
+        for region in self.page.regions:
             block_idx += 1
-            region_coords = self._find_first(region, "Coords")
-            region_points = self._get_attr(region_coords, "points")
-            region_svg = self._points_to_svg_path(region_points)
-            region_id_raw = self._get_attr(region, "id") or f"block{block_idx}"
+            region_svg = self._points_to_svg_path(self._point_string(region.coords))
+            region_id_raw = region.id or f"block{block_idx}"
             block_anno_id = f"{ap_uri}#{region_id_raw}"
 
             if region_svg:
@@ -76,19 +69,17 @@ class TranscriptionAnnotationPageBuilder:
                         anno_id=block_anno_id,
                         granularity="block",
                         svg_path=region_svg,
-                        body_classification=self._get_region_type(region),
+                        body_classification=self._get_region_type(region.custom),
                         annotation_targets=[page_anno_id],
                     )
                 )
 
             # Lines
-            for line in self._find_all(region, "TextLine"):
+            for line in region.lines:
                 line_idx += 1
-                line_coords = self._find_first(line, "Coords")
-                line_points = self._get_attr(line_coords, "points")
-                line_svg = self._points_to_svg_path(line_points)
-                line_text = self._extract_text(line)
-                line_id_raw = self._get_attr(line, "id") or f"line{line_idx}"
+                line_svg = self._points_to_svg_path(self._point_string(line.coords))
+                line_text = self._normalized_text(line.text)
+                line_id_raw = line.id or f"line{line_idx}"
                 line_anno_id = f"{ap_uri}#{line_id_raw}"
 
                 if line_svg or line_text:
@@ -103,13 +94,11 @@ class TranscriptionAnnotationPageBuilder:
                     )
 
                 # Words
-                for w in self._find_all(line, "Word"):
+                for w in line.words:
                     word_idx += 1
-                    w_coords = self._find_first(w, "Coords")
-                    w_points = self._get_attr(w_coords, "points")
-                    word_svg = self._points_to_svg_path(w_points)
-                    w_text = self._extract_text(w)
-                    word_id_raw = self._get_attr(w, "id") or f"word{word_idx}"
+                    word_svg = self._points_to_svg_path(self._point_string(w.coords))
+                    w_text = self._normalized_text(w.text)
+                    word_id_raw = w.id or f"word{word_idx}"
                     word_anno_id = f"{ap_uri}#{word_id_raw}"
 
                     if word_svg or w_text:
@@ -183,19 +172,17 @@ class TranscriptionAnnotationPageBuilder:
     # ---------------- Annotation builder ----------------
 
     def _get_word_offsets(self) -> Dict[str, Offset]:
-        # Root elements
-        page = self._find_first(self.xml_doc, "Page")
         word_idx = 0
         htr_word_offset = {}
         offset = 0
 
-        for region in self._find_all(page, "TextRegion"):
-            for line in self._find_all(region, "TextLine"):
-                for w in self._find_all(line, "Word"):
+        for region in self.page.regions:
+            for line in region.lines:
+                for w in line.words:
                     word_idx += 1
-                    w_text = self._extract_text(w)
+                    w_text = self._normalized_text(w.text) or ""
                     w_len = len(w_text)
-                    word_id_raw = self._get_attr(w, "id") or f"word{word_idx}"
+                    word_id_raw = w.id or f"word{word_idx}"
                     htr_word_offset[word_id_raw] = Offset(offset, offset + w_len)
                     offset += w_len + 1
 
@@ -295,31 +282,11 @@ class TranscriptionAnnotationPageBuilder:
             ]
         }
 
-    # ---------------- XML helpers ----------------
+    # ---------------- PageModel helpers ----------------
 
     @staticmethod
-    def _is_element(node: Optional[ET.Element]) -> bool:
-        return node is not None and isinstance(node.tag, str)
-
-    def _child_elements(self, node: Optional[ET.Element]) -> Iterator[ET.Element]:
-        if node is None:
-            return (c for c in [])
-        return (c for c in node if self._is_element(c))
-
-    def _find_first(self, node: Optional[ET.Element], name: str) -> Optional[ET.Element]:
-        for c in self._child_elements(node):
-            if c.tag == f"{{{ns['ns']}}}{name}":
-                return c
-        return None
-
-    def _find_all(self, node: Optional[ET.Element], name: str) -> List[ET.Element]:
-        return [c for c in self._child_elements(node) if c.tag == f"{{{ns['ns']}}}{name}"]
-
-    @staticmethod
-    def _get_attr(node: Optional[ET.Element], key: str) -> Optional[str]:
-        if node is None:
-            return None
-        return node.attrib.get(key)
+    def _point_string(coords: Optional[PageCoords]) -> Optional[str]:
+        return coords.point_string if coords else None
 
     @staticmethod
     def _points_to_svg_path(points: Optional[str]) -> Optional[str]:
@@ -328,11 +295,9 @@ class TranscriptionAnnotationPageBuilder:
         trimmed = re.sub(r"\s+", " ", points.strip())
         return f'<path d="M{trimmed}z"/>'
 
-    def _get_region_type(self, region: Optional[ET.Element]) -> Optional[str]:
+    @staticmethod
+    def _get_region_type(custom: Optional[str]) -> Optional[str]:
         """Extracts the 'type' from a custom attribute like: structure {type:page-number;}"""
-        if region is None:
-            return None
-        custom = self._get_attr(region, "custom")
         if not custom:
             return None
         m = re.search(r"structure\s*\{([^}]*)}", custom, re.I)
@@ -340,17 +305,11 @@ class TranscriptionAnnotationPageBuilder:
         t = re.search(r"\btype\s*:\s*([^;\s}]+)", inside, re.I)
         return t.group(1).strip() if t else None
 
-    def _extract_text(self, node: Optional[ET.Element]) -> Optional[str]:
-        if node is None:
-            return None
-        text_equiv = self._find_first(node, "TextEquiv")
-        unicode_el = self._find_first(text_equiv, "Unicode")
-        text=None
-        if unicode_el is not None and unicode_el.text:
-            text= unicode_el.text.strip()
+    @staticmethod
+    def _normalized_text(text: Optional[str]) -> Optional[str]:
         if text:
-            text =re.sub(r"\s+", " ", text).strip()
-        return text
+            text = re.sub(r"\s+", " ", text).strip()
+        return text or None
 
     def _text_quote(self, text: str, text_position: Offset) -> TextQuote:
         start = text_position.begin
@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+
+import globalise_tools.git_tools as git
+
+REPOSITORY_URL = "https://github.com/knaw-huc/globalise-tools"
+
+
+class RunProvenance:
+    """
+    The provenance shared by everything a single run of a script produces: the git commit id of the code
+    and the timestamp of the run. The commit id is resolved (with `git rev-parse`) at most once per run.
+    """
+
+    def __init__(self, commit_id: Optional[str] = None, timestamp: Optional[str] = None) -> None:
+        self._commit_id = commit_id
+        self.timestamp = timestamp if timestamp else datetime.today().isoformat()
+
+    @property
+    def commit_id(self) -> str:
+        if not self._commit_id:
+            self._commit_id = git.read_current_commit_id(warn_on_uncommitted_changes=True)
+        return self._commit_id
+
+    def script_url(self, script_path: str) -> str:
+        return f"{REPOSITORY_URL}/blob/{self.commit_id}/{script_path}"
+
+
+_current_run: Optional[RunProvenance] = None
+
+
+def start_run(commit_id: Optional[str] = None, timestamp: Optional[str] = None) -> RunProvenance:
+    """
+    Start a new run, with the given commit id (resolved from git when needed, if omitted)
+    and timestamp (now, if omitted). Call this once, at the start of a script's main().
+    """
+    return set_current_run(RunProvenance(commit_id=commit_id, timestamp=timestamp))
+
+
+def set_current_run(run: RunProvenance) -> RunProvenance:
+    # forked worker processes inherit the current run; spawned ones should be handed it in their initializer
+    global _current_run
+    _current_run = run
+    return run
+
+
+def current_run() -> RunProvenance:
+    """the current run, started implicitly on first use if no script started one"""
+    if _current_run is None:
+        return start_run()
+    return _current_run
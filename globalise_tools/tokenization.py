@@ -0,0 +1,87 @@
+"""
+Tokenization and sentence splitting with spaCy, shared by the scripts that turn text into CAS or token annotations.
+
+The spaCy pipeline is loaded once per process, with only the components needed for sentence boundaries, and texts
+are processed in batches through `nlp.pipe`.
+"""
+from functools import cache
+from typing import Iterable, Iterator, NamedTuple, Optional, TypeVar
+
+import spacy
+from loguru import logger
+from spacy import Language
+
+SPACY_CORE = "nl_core_news_lg"
+
+# the components of nl_core_news_lg that tokens and (parser) sentence boundaries don't depend on
+UNUSED_PIPES = ("tagger", "morphologizer", "attribute_ruler", "lemmatizer", "ner")
+
+C = TypeVar("C")
+
+
+class Token(NamedTuple):
+    text: str
+    text_with_ws: str
+    begin: int
+
+    @property
+    def end(self) -> int:
+        return self.begin + len(self.text)
+
+
+class Sentence(NamedTuple):
+    begin: int
+    end: int
+    # the tokens of the sentence, without the newline tokens
+    tokens: list[Token]
+
+
+class Tokenizer:
+    """
+    Splits texts into sentences and tokens, as (character offset) Sentence and Token tuples.
+    `tokenize` processes many texts in batches of batch_size, in n_process processes.
+    """
+
+    def __init__(self, nlp: Optional[Language] = None, batch_size: int = 64, n_process: int = 1) -> None:
+        self.nlp = nlp if nlp is not None else load_pipeline()
+        if not {"parser", "senter", "sentencizer"} & set(self.nlp.pipe_names):
+            self.nlp.add_pipe("sentencizer")
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+    def tokenize(self, texts: Iterable[str]) -> Iterator[list[Sentence]]:
+        """the sentences of each of the texts, in the order of texts"""
+        for doc in self.nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process):
+            yield to_sentences(doc)
+
+    def tokenize_with_context(self, items: Iterable[tuple[str, C]]) -> Iterator[tuple[list[Sentence], C]]:
+        """the sentences of each text in items of (text, context), with the context"""
+        docs = self.nlp.pipe(items, as_tuples=True, batch_size=self.batch_size, n_process=self.n_process)
+        for doc, context in docs:
+            yield to_sentences(doc), context
+
+    def tokenize_text(self, text: str) -> list[Sentence]:
+        return next(self.tokenize([text]))
+
+
+def to_sentences(doc) -> list[Sentence]:
+    return [
+        Sentence(
+            begin=sentence.start_char,
+            end=sentence.end_char,
+            tokens=[Token(t.text, t.text_with_ws, t.idx) for t in sentence if t.text != "\n"]
+        )
+        for sentence in doc.sents
+    ]
+
+
+@cache
+def load_pipeline(name: str = SPACY_CORE) -> Language:
+    """the spaCy pipeline, loaded once per process, without the components in UNUSED_PIPES"""
+    logger.info(f"loading {name}")
+    return spacy.load(name, exclude=list(UNUSED_PIPES))
+
+
+@cache
+def default_tokenizer() -> Tokenizer:
+    return Tokenizer()
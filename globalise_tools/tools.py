@@ -16,6 +16,8 @@ from globalise_tools.lang_deduction import LangDeduction
 from globalise_tools.logger_tools import log_reading_file
 from globalise_tools.model import Document, DocumentMetadata, WebAnnotation
 from globalise_tools.nav_provider import NavProvider
+from globalise_tools.page_model import PageModel, PageWord
+from globalise_tools.word_span_index import WordSpanIndex
 
 PAGE_TYPE = "px:Page"
 
@@ -775,21 +777,21 @@ class TextPair:
 SEARCH_WINDOW = 10000
 
 
-def make_word_interval_tree(
+def make_word_span_index(
         text: str,
         iiif_base_uri: str,
         canvas_id: str,
-        text_words: list[PageXMLWord],
+        text_words: list[PageXMLWord | PageWord],
         debug: bool = False
-) -> IntervalTree:
+) -> WordSpanIndex:
     if debug:
         text_from_words = " ".join([w.text for w in text_words])
         ic(text, text_from_words)
-    itree = IntervalTree()
+    word_span_index = WordSpanIndex()
     find_start = 0
     for w in text_words:
         # if len(w.text) > 1:
-        substring = w.text.strip(WORD_BREAK_CHARACTERS)
+        substring = (w.text or "").strip(WORD_BREAK_CHARACTERS)
         # else:
         #     substring = w.text
         # if len(substring) == 0:
@@ -814,14 +816,9 @@ def make_word_interval_tree(
                 end_exc = offset + len(substring)
                 if debug:
                     print(f"[{offset:4}:{end_exc:4}]{notice} <{substring}> | <{text[offset:end_exc]}>")
-                itree[offset:end_exc] = {
-                    "word_id": w.id,
-                    "iiif_base_uri": iiif_base_uri,
-                    "canvas_id": canvas_id,
-                    "coords": w.coords.points
-                }
+                word_span_index.add(offset, end_exc, w.id, iiif_base_uri, canvas_id, w.coords.points)
                 find_start = end_exc
-    return itree
+    return word_span_index
 
 
 def needs_finding(substring) -> bool:
@@ -860,11 +857,11 @@ def make_word_interval_tree0(text: str, text_words: list[PageXMLWord]) -> Interv
 
 
 def extract_paragraph_text(
-        scan_doc: PageXMLScan,
+        scan_doc: PageXMLScan | PageModel,
         iiif_base_uri: str = "<missing iiif_base_uri>",
         canvas_id: str = "<missing canvas_id>",
         verbose: bool = False,
-) -> Tuple[str, list[Tuple[int, int]], Tuple[int, int], list[Tuple[int, int]], IntervalTree]:
+) -> Tuple[str, list[Tuple[int, int]], Tuple[int, int], list[Tuple[int, int]], WordSpanIndex]:
     paragraphs = []
     headers = []
     marginalia = []
@@ -916,11 +913,11 @@ def extract_paragraph_text(
         paragraph_ranges.append((offset, text_len))
         offset = text_len
         text_words.extend(m.words)
-    itree = make_word_interval_tree(text=text, text_words=text_words, iiif_base_uri=iiif_base_uri, canvas_id=canvas_id,
-                                    debug=False)
+    word_span_index = make_word_span_index(text=text, text_words=text_words, iiif_base_uri=iiif_base_uri,
+                                           canvas_id=canvas_id, debug=False)
     # if '  ' in text:
     #     logger.error('double space in text')
-    return text, marginalia_ranges, header_range, paragraph_ranges, itree
+    return text, marginalia_ranges, header_range, paragraph_ranges, word_span_index
 
 
 _RE_COMBINE_WHITESPACE = re.compile(r"\s+")
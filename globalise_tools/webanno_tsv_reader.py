@@ -1,8 +1,6 @@
-import itertools
 import re
-from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Sequence, Tuple
+from typing import Iterable, Iterator, Sequence, Tuple, Union
 
 # Strings that need to be escaped with a single backslash according to Webanno Appendix B
 RESERVED_STRS = ['\\', '[', ']', '|', '_', '->', ';', '\t', '\n', '*']
@@ -10,6 +8,7 @@ SENTENCE_RE = re.compile('^#Text=(.*)')
 FIELD_EMPTY_RE = re.compile('^[_*]')
 FIELD_WITH_ID_RE = re.compile(r'(.*)\[([0-9]*)]$')
 NO_LABEL_ID = -1
+UNESCAPE_RE = re.compile('\\\\(' + '|'.join(re.escape(s) for s in RESERVED_STRS) + ')')
 
 # Multiline sentences are split on this character per Webanno Appendix B
 MULTILINE_SPLIT_CHAR = '\f'
@@ -101,58 +100,183 @@ class Document:
     tokens: list[Token] = field(default_factory=list)
     annotations: list[Annotation] = field(default_factory=list)
     _annotation_idx: dict[str, Annotation] = field(default_factory=dict)
+    # the number of annotations _annotation_idx was built from
+    _indexed_annotations: int = 0
 
     def get_annotation_by_id(self, annotation_id: str) -> Annotation:
         annotation_idx = self.__annotation_idx()
         return annotation_idx[annotation_id]
 
     def __annotation_idx(self) -> dict:
-        if not (self._annotation_idx and len(self._annotation_idx) == len(self.annotations)):
+        if self._indexed_annotations != len(self.annotations):
             self._annotation_idx = {a.id: a for a in self.annotations}
+            self._indexed_annotations = len(self.annotations)
         return self._annotation_idx
 
 
-@dataclass
-class ParseContext:
-    layer_field_names: list[Tuple[str, str]] = field(default_factory=list)
-    multi_token_annotations: dict[str, Annotation] = field(default_factory=dict)
-
-
 def read_webanno_tsv(path: str) -> Document:
     """
     Read the webanno_tsv file at `path`
     and return a Document containing the tokens and annotations
     """
     doc = Document()
+    parser = WebAnnoTsvParser()
     with open(path, mode='r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    doc.sentences = [Sentence(idx=i + 1, text=text) for i, text in enumerate(_filter_sentences(lines))]
-
-    context = ParseContext()
-
-    for i, line in enumerate(lines):
-        line = _unescape(line.strip())
-        if line.startswith(PREFIX_FORMAT):
-            doc.format = line.replace(PREFIX_FORMAT, "")
-        elif line.startswith(PREFIX_SPAN_LAYER):
-            _handle_span_layer(line, doc)
-        elif line.startswith(PREFIX_CHAIN_LAYER):
-            _todo()
-        elif line.startswith(PREFIX_RELATION_LAYER):
-            _todo()
-        elif line.startswith(PREFIX_TEXT):
-            pass  # already processed
-        elif "\t" in line:
-            _handle_annotation_line(line, doc, context)
-        elif not line:
-            pass  # skip empty lines
-        else:
-            raise Exception(f"unexpected line at {i + 1} : {line}")
-    _process_slot_features(doc)
+        for item in parser.parse(f):
+            if isinstance(item, Token):
+                doc.tokens.append(item)
+            elif isinstance(item, Annotation):
+                doc.annotations.append(item)
+            else:
+                doc.sentences.append(item)
+    doc.format = parser.format
+    doc.layers = parser.layers
     return doc
 
 
+def iter_webanno_tsv(path: str) -> Iterator[Union[Sentence, Token, Annotation]]:
+    """
+    Read the webanno_tsv file at `path` line by line,
+    yielding its sentences, tokens and annotations as they are parsed
+    """
+    with open(path, mode='r', encoding='utf-8') as f:
+        yield from WebAnnoTsvParser().parse(f)
+
+
+class WebAnnoTsvParser:
+    """
+    Incremental WebAnno TSV parser: `parse` yields every Sentence, Token and Annotation as soon as it has been read.
+
+    A Sentence is yielded after its (last) #Text= line, a Token after its line, and an Annotation after the token it
+    starts on. The tokens of a multi-token annotation are appended to it while the following lines are parsed; once
+    a line doesn't continue it, the parser forgets it. The format and the layer definitions are kept on the parser,
+    and with index_annotations, also the annotations by id (which keeps all annotations in memory).
+    """
+
+    def __init__(self, index_annotations: bool = False) -> None:
+        self.format = ""
+        self.layers: list[Layer] = []
+        self.index_annotations = index_annotations
+        self.annotation_idx: dict[str, Annotation] = {}
+        self._layer_fields: list[Tuple[str, list[Tuple[int, str]]]] = []
+        self._slot_features: dict[str, list[SlotFeature]] = {}
+        self._multi_token_annotations: dict[str, Annotation] = {}
+
+    def parse(self, lines: Iterable[str]) -> Iterator[Union[Sentence, Token, Annotation]]:
+        sentence_texts = []
+        sentence_count = 0
+        for i, raw_line in enumerate(lines):
+            if raw_line.startswith(PREFIX_TEXT):
+                sentence_texts.append(raw_line[len(PREFIX_TEXT):].split('\n', 1)[0])
+            elif sentence_texts:
+                sentence_count += 1
+                yield Sentence(idx=sentence_count, text=MULTILINE_SPLIT_CHAR.join(sentence_texts))
+                sentence_texts = []
+            line = raw_line.strip()
+            if '\\' in line:
+                line = _unescape_once(line)
+            if not line:
+                pass  # skip empty lines
+            elif line[0] != '#' and "\t" in line:
+                token, annotations = self._read_annotation_line(line)
+                yield token
+                yield from annotations
+            elif line.startswith(PREFIX_FORMAT):
+                self.format = line.replace(PREFIX_FORMAT, "")
+            elif line.startswith(PREFIX_SPAN_LAYER):
+                self._add_span_layer(line)
+            elif line.startswith(PREFIX_CHAIN_LAYER):
+                _todo()
+            elif line.startswith(PREFIX_RELATION_LAYER):
+                _todo()
+            elif line.startswith(PREFIX_TEXT):
+                pass  # already processed
+            elif "\t" in line:
+                token, annotations = self._read_annotation_line(line)
+                yield token
+                yield from annotations
+            else:
+                raise Exception(f"unexpected line at {i + 1} : {line}")
+        if sentence_texts:
+            yield Sentence(idx=sentence_count + 1, text=MULTILINE_SPLIT_CHAR.join(sentence_texts))
+
+    def _add_span_layer(self, line: str) -> None:
+        layer = _read_span_layer(line)
+        self.layers.append(layer)
+        slot_features = [f for f in layer.features if _is_slot_feature(f)]
+        if slot_features:
+            self._slot_features[layer.name] = slot_features
+        self._layer_fields = []
+        for field_idx, (layer_name, field_name) in enumerate(_layer_field_names(self.layers)):
+            if not self._layer_fields or self._layer_fields[-1][0] != layer_name:
+                self._layer_fields.append((layer_name, []))
+            self._layer_fields[-1][1].append((field_idx, field_name))
+
+    def _read_annotation_line(self, line: str) -> Tuple[Token, list[Annotation]]:
+        """the token on the line, and the annotations that start on it"""
+        parts = line.split("\t")
+        sentence_num, token_num = parts[0].split("-")
+        start_offset, end_offset = parts[1].split("-")
+        token = Token(
+            sentence_num=int(sentence_num),
+            token_num=token_num,
+            start_offset=int(start_offset),
+            end_offset=int(end_offset),
+            text=parts[2],
+        )
+        raw_feature_values = parts[3:]
+        # a sub-token line doesn't end the multi-token annotations of its token
+        continues_spans = "." not in token_num
+        if raw_feature_values.count("_") == len(raw_feature_values):
+            if continues_spans:
+                self._multi_token_annotations.clear()
+            return token, []
+        annotations = []
+        continued = {}
+        for layer_name, fields in self._layer_fields:
+            feature_dict = {field_name: raw_feature_values[field_idx] for field_idx, field_name in fields
+                            if raw_feature_values[field_idx] != "_"}
+            if not feature_dict:
+                continue
+            for d in _split_dict(feature_dict) if "|" in line else (feature_dict,):
+                features = {}
+                label_id = NO_LABEL_ID
+                for key, val in d.items():
+                    label, label_id = _read_label_and_id(val, key == LINK_FEATURE_NAME)
+                    if label:
+                        features[key] = label
+                if label_id != NO_LABEL_ID:
+                    multi_token_key = f"{layer_name}/{label_id}"
+                    annotation = self._multi_token_annotations.get(multi_token_key)
+                    if annotation is not None:
+                        annotation.tokens.append(token)
+                        continued[multi_token_key] = annotation
+                        continue
+                    annotation_id = f"{token.sentence_num}-{token_num}[{label_id}]"
+                else:
+                    multi_token_key = None
+                    annotation_id = f"{token.sentence_num}-{token_num}"
+                annotation = Annotation(
+                    id=annotation_id,
+                    tokens=[token],
+                    layer=layer_name,
+                    features=features,
+                    label_id=label_id
+                )
+                if multi_token_key:
+                    continued[multi_token_key] = annotation
+                if layer_name in self._slot_features:
+                    _link_annotations(annotation, self._slot_features[layer_name])
+                if self.index_annotations:
+                    self.annotation_idx[annotation_id] = annotation
+                annotations.append(annotation)
+        if continues_spans:
+            self._multi_token_annotations = continued
+        else:
+            self._multi_token_annotations.update(continued)
+        return token, annotations
+
+
 def _todo() -> None:
     raise Exception("this function is not implemented yet!")
 
@@ -172,78 +296,11 @@ def _unescape(text: str) -> str:
     return text
 
 
-def _handle_annotation_line(line: str, doc: Document, context: ParseContext) -> None:
-    if not context.layer_field_names:
-        context.layer_field_names = _layer_field_names(doc)
-    token, raw_feature_values = _parse_line(line)
-    raw_feature_value = defaultdict(dict)
-    for i, rfv in enumerate(raw_feature_values):
-        if rfv not in ["_"]:
-            layer_name, field_name = context.layer_field_names[i]
-            raw_feature_value[layer_name][field_name] = rfv
-    if len(raw_feature_value) > 0:
-        # ic(raw_feature_value)
-        for layer_name, feature_dict in raw_feature_value.items():
-            split_feature_values = _split_dict(feature_dict)
-            # ic(split_feature_values)
-            for d in split_feature_values:
-                features = {}
-                label_id = NO_LABEL_ID
-                for key, val in d.items():
-                    label, label_id = _read_label_and_id(val, key == LINK_FEATURE_NAME)
-                    if label:
-                        features[key] = label
-                multi_token_key = f"{layer_name}/{label_id}"
-                annotation_is_multi_token = label_id != NO_LABEL_ID
-                if annotation_is_multi_token and multi_token_key in context.multi_token_annotations:
-                    annotation = context.multi_token_annotations[multi_token_key]
-                    annotation.tokens.append(token)
-                else:
-                    annotation_id = f"{token.sentence_num}-{token.token_num}"
-                    if annotation_is_multi_token:
-                        annotation_id += f"[{label_id}]"
-                    annotation = Annotation(
-                        id=annotation_id,
-                        tokens=[token],
-                        layer=layer_name,
-                        features=features,
-                        label_id=label_id
-                    )
-                    if annotation_is_multi_token:
-                        context.multi_token_annotations[multi_token_key] = annotation
-                    doc.annotations.append(annotation)
-    doc.tokens.append(token)
-
-
-def _parse_line(line) -> tuple:
-    parts = line.split("\t")
-    (sentence_num, token_num) = parts[0].split("-")
-    (start_offset, end_offset) = parts[1].split("-")
-    value = parts[2]
-    token = Token(
-        sentence_num=int(sentence_num),
-        token_num=token_num,
-        start_offset=int(start_offset),
-        end_offset=int(end_offset),
-        text=value,
-    )
-
-    raw_feature_values = parts[3:]
-    return token, raw_feature_values
-
-
-def _filter_sentences(lines: list[str]) -> list[str]:
-    """
-    Filter lines beginning with 'Text=', if multiple such lines are
-    following each other, concatenate them.
-    """
-    matches = [SENTENCE_RE.match(line) for line in lines]
-    match_groups = [list(ms) for is_m, ms in itertools.groupby(matches, key=lambda m: m is not None) if is_m]
-    text_groups = [[m.group(1) for m in group] for group in match_groups]
-    return [MULTILINE_SPLIT_CHAR.join(group) for group in text_groups]
+def _unescape_once(text: str) -> str:
+    return UNESCAPE_RE.sub(r'\1', text)
 
 
-def _handle_span_layer(line: str, doc: Document) -> None:
+def _read_span_layer(line: str) -> Layer:
     parts = line.replace(PREFIX_SPAN_LAYER, "").split('|')
     features = []
     i = 1
@@ -260,12 +317,12 @@ def _handle_span_layer(line: str, doc: Document) -> None:
             features.append(SlotFeature(name=name, link_layer_name=link_layer_name))
             i += 1
         i += 1
-    doc.layers.append(Layer(name=(parts[0]), features=features))
+    return Layer(name=(parts[0]), features=features)
 
 
-def _layer_field_names(doc) -> list:
+def _layer_field_names(layers: list[Layer]) -> list:
     layer_field_names = []
-    for _layer in doc.layers:
+    for _layer in layers:
         for _feature in _layer.features:
             if isinstance(_feature, SimpleFeature):
                 layer_field_names.append((_layer.name, _feature.name))
@@ -295,9 +352,11 @@ def _read_label_and_id(feature_value: str, is_slot_feature: bool) -> Tuple[str,
     """
 
     def handle_label(s: str):
-        return '' if FIELD_EMPTY_RE.match(s) else _unescape(s)
+        if s[:1] in ('_', '*'):  # FIELD_EMPTY_RE
+            return ''
+        return _unescape(s) if '\\' in s else s
 
-    match = FIELD_WITH_ID_RE.match(feature_value)
+    match = FIELD_WITH_ID_RE.match(feature_value) if feature_value.endswith(']') else None
     if match and not is_slot_feature:
         return handle_label(match.group(1)), int(match.group(2))
     else:
@@ -308,29 +367,16 @@ def _is_slot_feature(f) -> bool:
     return isinstance(f, SlotFeature)
 
 
-def _has_slot_feature(layer: Layer) -> bool:
-    return any([_is_slot_feature(f) for f in layer.features])
-
-
-def _process_slot_features(doc: Document) -> None:
-    layers_with_slot_features = [_layer.name for _layer in doc.layers if _has_slot_feature(_layer)]
-    layer_idx = {_layer.name: _layer for _layer in doc.layers}
-    annotations_with_slot_features = [a for a in doc.annotations
-                                      if a.layer in layers_with_slot_features]
-    slot_features_per_layer = {
-        _layer_name: [_feature for _feature in layer_idx[_layer_name].features
-                      if _is_slot_feature(_feature)]
-        for _layer_name in layers_with_slot_features}
-    for a in annotations_with_slot_features:
-        slot_features = slot_features_per_layer[a.layer]
-        if len(slot_features) > 1:
-            raise Exception(f">1 SlotFeature in {a}")
-        if LINK_FEATURE_NAME in a.features:
-            linked_anno_refs = a.features[LINK_FEATURE_NAME].split(";")
-            name = slot_features[0].name
-            link_labels = a.features[name].split(";")
-
-            for label, annotation_id in zip(link_labels, linked_anno_refs):
-                a.linked_annotations.append(AnnotationLink(label, annotation_id))
-            a.features.pop(LINK_FEATURE_NAME)
-            a.features.pop(name)
+def _link_annotations(a: Annotation, slot_features: list[SlotFeature]) -> None:
+    """move the slot feature of `a` and its linked_anno_refs into a.linked_annotations"""
+    if len(slot_features) > 1:
+        raise Exception(f">1 SlotFeature in {a}")
+    if LINK_FEATURE_NAME in a.features:
+        linked_anno_refs = a.features[LINK_FEATURE_NAME].split(";")
+        name = slot_features[0].name
+        link_labels = a.features[name].split(";")
+
+        for label, annotation_id in zip(link_labels, linked_anno_refs):
+            a.linked_annotations.append(AnnotationLink(label, annotation_id))
+        a.features.pop(LINK_FEATURE_NAME)
+        a.features.pop(name)
@@ -0,0 +1,137 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Any, Iterable, NamedTuple, Optional
+
+
+class WordSpan(NamedTuple):
+    begin: int
+    end: int
+    data: dict[str, Any]
+
+
+class WordSpanIndex:
+    """
+    The character spans of the words of a page text, with for every word its id, coords and the iiif base uri and
+    canvas id of its image.
+
+    A replacement for an IntervalTree with one dict payload per word: the spans are kept sorted by begin in parallel
+    begin/end arrays, and overlap queries are answered with bisect. Word ids and coords are kept in side tables,
+    the (iiif_base_uri, canvas_id) pairs are interned, so an index is a handful of flat arrays and lists
+    that are cheap to pickle, and to store in and load from document_data.
+
+    `index[begin:end]` returns the WordSpans overlapping [begin, end), sorted by begin, like `IntervalTree[begin:end]`
+    returns the overlapping Intervals.
+    """
+
+    __slots__ = ("begins", "ends", "_max_ends", "word_ids", "sources", "_source_number", "source_idx", "coords",
+                 "coords_offsets")
+
+    def __init__(self) -> None:
+        self.begins = array('i')
+        self.ends = array('i')
+        self._max_ends = array('i')
+        self.word_ids: list[Optional[str]] = []
+        self.sources: list[tuple[str, str]] = []
+        self.source_idx = array('i')
+        self.coords = array('i')
+        self.coords_offsets = array('i', [0])
+        self._source_number = {}
+
+    def add(self, begin: int, end: int, word_id: Optional[str], iiif_base_uri: str, canvas_id: str,
+            coords: Iterable[tuple[int, int]]) -> None:
+        if self.begins and begin < self.begins[-1]:
+            raise ValueError(f"spans must be added in order of begin: {begin} < {self.begins[-1]}")
+        self.begins.append(begin)
+        self.ends.append(end)
+        self._max_ends.append(max(end, self._max_ends[-1]) if self._max_ends else end)
+        self.word_ids.append(word_id)
+        self.source_idx.append(self._intern_source(iiif_base_uri, canvas_id))
+        for x, y in coords:
+            self.coords.append(x)
+            self.coords.append(y)
+        self.coords_offsets.append(len(self.coords))
+
+    def __len__(self) -> int:
+        return len(self.begins)
+
+    def __iter__(self):
+        return (self._span(i) for i in range(len(self.begins)))
+
+    def __getitem__(self, key: slice) -> list[WordSpan]:
+        if not isinstance(key, slice):
+            raise TypeError("WordSpanIndex only supports slice queries: index[begin:end]")
+        return self.overlap(key.start, key.stop)
+
+    def overlap(self, begin: int, end: int) -> list[WordSpan]:
+        """the spans that overlap [begin, end), sorted by begin"""
+        if begin >= end:
+            return []
+        first = bisect_right(self._max_ends, begin)
+        last = bisect_left(self.begins, end)
+        return [self._span(i) for i in range(first, last) if self.ends[i] > begin]
+
+    def to_dict(self) -> dict[str, list]:
+        return {
+            "begins": self.begins.tolist(),
+            "ends": self.ends.tolist(),
+            "word_ids": self.word_ids,
+            "sources": [list(s) for s in self.sources],
+            "source_idx": self.source_idx.tolist(),
+            "coords": self.coords.tolist(),
+            "coords_offsets": self.coords_offsets.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict[str, list]) -> 'WordSpanIndex':
+        index = cls()
+        index.begins = array('i', d["begins"])
+        index.ends = array('i', d["ends"])
+        index._max_ends = array('i', accumulate(d["ends"], max))
+        index.word_ids = list(d["word_ids"])
+        index.sources = [tuple(s) for s in d["sources"]]
+        index._source_number = {s: i for i, s in enumerate(index.sources)}
+        index.source_idx = array('i', d["source_idx"])
+        index.coords = array('i', d["coords"])
+        index.coords_offsets = array('i', d["coords_offsets"])
+        return index
+
+    @classmethod
+    def from_intervals(cls, intervals: Iterable) -> 'WordSpanIndex':
+        """build an index from (begin, end, data) triples, as stored in document_data by earlier versions"""
+        index = cls()
+        for begin, end, data in sorted(intervals, key=lambda iv: (iv[0], iv[1])):
+            index.add(begin, end, data["word_id"], data["iiif_base_uri"], data["canvas_id"], data["coords"])
+        return index
+
+    @classmethod
+    def of(cls, text_intervals: Any) -> 'WordSpanIndex':
+        """the index for the text_intervals of a document_data entry, in any of the forms it can be stored in"""
+        if isinstance(text_intervals, WordSpanIndex):
+            return text_intervals
+        if isinstance(text_intervals, dict):
+            return cls.from_dict(text_intervals)
+        return cls.from_intervals(text_intervals)
+
+    def _intern_source(self, iiif_base_uri: str, canvas_id: str) -> int:
+        source = (iiif_base_uri, canvas_id)
+        number = self._source_number.get(source)
+        if number is None:
+            number = len(self.sources)
+            self.sources.append(source)
+            self._source_number[source] = number
+        return number
+
+    def _span(self, i: int) -> WordSpan:
+        iiif_base_uri, canvas_id = self.sources[self.source_idx[i]]
+        flat_coords = self.coords[self.coords_offsets[i]:self.coords_offsets[i + 1]]
+        return WordSpan(
+            self.begins[i],
+            self.ends[i],
+            {
+                "word_id": self.word_ids[i],
+                "iiif_base_uri": iiif_base_uri,
+                "canvas_id": canvas_id,
+                "coords": list(zip(flat_coords[::2], flat_coords[1::2]))
+            }
+        )
@@ -9,4 +9,5 @@ poetry run gt-create-annotation-lists-for-inventory-number \
   --manifest     data/manifests/$inv.json \
   --type-system  data/typesystem.xml \
   --event-mapping data/eventmapping.json \
+  "${@:2}" \
   $inv
\ No newline at end of file
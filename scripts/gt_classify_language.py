@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
 import csv
+import sys
 from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
-from collections import Counter
+from functools import cache
+from typing import TextIO
+
+import numpy as np
+import pandas as pd
 
 # order matters in case of ties in lines, first match wins
 LANGS = ('nl_voc', 'nl', 'fr', 'la', 'en', 'de', 'it', 'pt', 'es', 'id', 'da')
@@ -11,6 +16,12 @@ LANGS3 = ('nld_voc', 'nld', 'fra', 'lat', 'eng', 'deu', 'ita', 'por', 'spa', 'ms
 
 # ^-- make sure these match up exactly or things will go wrong
 
+# the languages a line can be classified as, as indexes for the column-wise classification
+LINE_LANGS = LANGS + ("unknown",)
+LINE_LANG_CODES = {lang: i for i, lang in enumerate(LINE_LANGS)}
+KEY_COLUMNS = ('inv_nr', 'page_no', 'textregion_id', 'textregion_type')
+
+
 def to_iso639_3(lang):
     if lang == "unknown":
         return lang
@@ -20,70 +31,161 @@ def to_iso639_3(lang):
     raise Exception(f"Invalid language: {lang}")
 
 
-def classify_line_language(row: dict) -> str:
-    if count_alphabetic(row['line_text']) <= 6:
-        # too short to classify
-        return "unknown"
-
-    confidence_charmodel = float(row['confidence'])
-    lang_charmodel = row['lang']
-
-    lex_score = 0
-    for lang in LANGS:
-        score = float(row[lang])
-        if score > lex_score and score > 0:
-            lex_score = score
-
-    # if multiple languages are tied for the lexicon, we list them all
-    lang_lex = []
-    if lex_score > 0:
-        for lang in LANGS:
-            if float(row[lang]) == lex_score and lang[:2] not in lang_lex:
-                lang_lex.append(lang[:2])
-
-    if lang_charmodel in lang_lex and confidence_charmodel >= 0.5:
-        # easiest case, models are in agreement
-        return lang_charmodel
-    elif "nl" in lang_lex and lex_score >= 0.5:
-        # lexical says this is dutch, character model thinks otherwise
-        return "nl"
-    elif lang_charmodel == "nl" and lex_score <= 0.5:
-        # character model says this is dutch, lexical model thinks otherwise but  not sufficient confidence
-        return lang_charmodel
-    elif "nl" not in lang_lex and ' ' not in row['line_text']:
-        # this is just a single non-dutch word, refuse to classify as non-dutch
-        return "unknown"
-    elif confidence_charmodel >= 0.9 and confidence_charmodel > lex_score:
-        # character model has very high confidence
-        return lang_charmodel
-    elif lex_score >= 0.5 and lex_score >= confidence_charmodel:
-        # favour lexical model
-        return lang_lex[0]
-    else:
-        # give up
-        return "unknown"
-
-
-def classify_region_language(line_langs: Counter) -> list:
-    region_langs = []
-    linecount = line_langs.total()
-    for lang, count in line_langs.items():
-        freq = count / linecount
-        if (lang == 'nl' or count >= 3) and freq >= 0.25 and lang != 'unknown':
-            region_langs.append(lang)
-    return region_langs
-
-
-def count_alphabetic(s: str):
-    return sum((c.isalpha() for c in s))
-
-
-def print_langs(inv_nr, page_no, textregion_id, textregion_type, line_id, page_langs: list, text: str) -> None:
-    if page_langs:
-        langs = ",".join(sorted((to_iso639_3(l) for l in page_langs)))
-    else:
-        langs = "unknown"
-    print(f"{inv_nr}\t{page_no}\t{textregion_id}\t{textregion_type}\t{line_id}\t{langs}\t{text}")
+def classify_file(filename: str, out: TextIO = sys.stdout) -> None:
+    """
+    classify the lines, regions and pages in filename and print them to out: the line decisions are computed over
+    numeric arrays, the region and page langs with group-bys over runs of rows
+    """
+    try:
+        df = pd.read_csv(filename, sep="\t", quoting=csv.QUOTE_NONE, dtype=object, keep_default_na=False,
+                         na_filter=False)
+    except pd.errors.EmptyDataError:
+        return
+    if df.empty:
+        return
+    columns = {name: df[name].to_numpy(dtype=object) for name in df.columns}
+    inv_nr, page_no, textregion_id, textregion_type = (columns[c] for c in KEY_COLUMNS)
+
+    # runs of consecutive rows in the same region / on the same page
+    new_region = _starts_of_runs([inv_nr, page_no, textregion_id, textregion_type])
+    new_page = _starts_of_runs([inv_nr, page_no])
+    region_of_row = np.cumsum(new_region) - 1
+    region_starts = np.flatnonzero(new_region)
+    page_of_region = (np.cumsum(new_page) - 1)[region_starts]
+    page_starts = np.flatnonzero(new_page)
+
+    line_rows = np.flatnonzero(textregion_type == 'paragraph')
+    line_langs = classify_line_languages({name: values[line_rows] for name, values in columns.items()})
+
+    # region langs: the line lang counts per region
+    n_langs = len(LINE_LANGS)
+    counts = np.bincount(region_of_row[line_rows] * n_langs + line_langs,
+                         minlength=len(region_starts) * n_langs).reshape(len(region_starts), n_langs)
+    with np.errstate(invalid='ignore'):
+        freq = counts / counts.sum(axis=1, keepdims=True)
+    is_nl = np.arange(n_langs) == LINE_LANG_CODES['nl']
+    region_langs = ((is_nl | (counts >= 3)) & (freq >= 0.25))
+    region_langs[:, LINE_LANG_CODES['unknown']] = False
+    region_bits = region_langs @ (1 << np.arange(n_langs))
+
+    # page langs: pages with an empty inv_nr are not printed, their langs carry over to the next page
+    page_printed = inv_nr[page_starts] != ""
+    flush_group = np.concatenate(([0], np.cumsum(page_printed)[:-1]))
+    group_bits = np.zeros(len(page_starts), dtype=region_bits.dtype)
+    np.bitwise_or.at(group_bits, flush_group[page_of_region], region_bits)
+    page_bits = group_bits[flush_group]
+
+    # the summary of the last region is not printed
+    region_printed = inv_nr[region_starts] != ""
+    region_printed[-1] = False
+    region_rows = region_starts[region_printed]
+    page_rows = page_starts[page_printed]
+
+    # at every region boundary: the summary of the previous region, then that of the previous page, then the line
+    positions = [
+        line_rows * 3 + 2,
+        region_starts[1:][region_printed[:-1]] * 3,
+        np.append(page_starts[1:], len(df))[page_printed] * 3 + 1
+    ]
+    texts = [
+        _tsv_rows(inv_nr[line_rows], page_no[line_rows], textregion_id[line_rows], textregion_type[line_rows],
+                  columns['line_id'][line_rows], _langs_strings(1 << line_langs), columns['line_text'][line_rows]),
+        _tsv_rows(inv_nr[region_rows], page_no[region_rows], textregion_id[region_rows],
+                  textregion_type[region_rows], "", _langs_strings(region_bits[region_printed]), ""),
+        _tsv_rows(inv_nr[page_rows], page_no[page_rows], "", "", "", _langs_strings(page_bits[page_printed]), "")
+    ]
+    order = np.argsort(np.concatenate(positions), kind='stable')
+    out.write("".join(np.concatenate(texts)[order]))
+
+
+def classify_line_languages(lines: dict[str, np.ndarray]) -> np.ndarray:
+    """classify all lines (given as columns) at once, as indexes in LINE_LANGS"""
+    unknown = LINE_LANG_CODES['unknown']
+    line_langs = np.full(len(lines['line_text']), unknown)
+    # lines with 6 or fewer alphabetic characters are too short to classify
+    classified = np.flatnonzero(_count_alphabetic(lines['line_text']) > 6)
+    if not len(classified):
+        return line_langs
+
+    line_text = lines['line_text'][classified]
+    confidence = lines['confidence'][classified].astype(np.float64)
+    lang_charmodel = lines['lang'][classified]
+    lang_charmodel_code = np.array([LINE_LANG_CODES.get(lang, -1) for lang in lang_charmodel])
+    scores = np.column_stack([lines[lang][classified].astype(np.float64) for lang in LANGS])
+    lex_score = np.where(scores > 0, scores, 0).max(axis=1)
+    # the lexicon languages tied for the highest score
+    lang_lex = (scores == lex_score[:, None]) & (lex_score > 0)[:, None]
+    lang_lex_first = np.array([LINE_LANG_CODES[lang[:2]] for lang in LANGS])[lang_lex.argmax(axis=1)]
+    charmodel_in_lex = np.zeros(len(classified), dtype=bool)
+    for prefix in dict.fromkeys(lang[:2] for lang in LANGS):
+        columns = [i for i, lang in enumerate(LANGS) if lang[:2] == prefix]
+        charmodel_in_lex |= (lang_charmodel == prefix) & lang_lex[:, columns].any(axis=1)
+    nl_in_lex = lang_lex[:, [i for i, lang in enumerate(LANGS) if lang[:2] == 'nl']].any(axis=1)
+    single_word = np.fromiter((' ' not in text for text in line_text), dtype=bool, count=len(line_text))
+
+    # the first case that applies decides, else the language is unknown
+    decided = np.select(
+        [
+            # easiest case, models are in agreement
+            charmodel_in_lex & (confidence >= 0.5),
+            # lexical says this is dutch, character model thinks otherwise
+            nl_in_lex & (lex_score >= 0.5),
+            # character model says this is dutch, lexical model thinks otherwise but not sufficient confidence
+            (lang_charmodel == 'nl') & (lex_score <= 0.5),
+            # this is just a single non-dutch word, refuse to classify as non-dutch
+            ~nl_in_lex & single_word,
+            # character model has very high confidence
+            (confidence >= 0.9) & (confidence > lex_score),
+            # favour lexical model
+            (lex_score >= 0.5) & (lex_score >= confidence)
+        ],
+        [lang_charmodel_code, LINE_LANG_CODES['nl'], lang_charmodel_code, unknown, lang_charmodel_code,
+         lang_lex_first],
+        default=unknown
+    )
+    invalid = np.flatnonzero(decided < 0)
+    if len(invalid):
+        raise Exception(f"Invalid language: {lang_charmodel[invalid[0]]}")
+    line_langs[classified] = decided
+    return line_langs
+
+
+def _starts_of_runs(columns: list[np.ndarray]) -> np.ndarray:
+    starts = np.zeros(len(columns[0]), dtype=bool)
+    starts[0] = True
+    for values in columns:
+        starts[1:] |= values[1:] != values[:-1]
+    return starts
+
+
+def _langs_strings(bits: np.ndarray) -> np.ndarray:
+    """the printed langs for every bitset of indexes in LINE_LANGS: their sorted ISO 639-3 codes, or unknown"""
+    distinct, inverse = np.unique(bits, return_inverse=True)
+    printed = [",".join(sorted(to_iso639_3(lang) for i, lang in enumerate(LINE_LANGS) if b >> i & 1)) or "unknown"
+               for b in distinct.tolist()]
+    return np.array(printed, dtype=object)[inverse]
+
+
+def _tsv_rows(*columns) -> np.ndarray:
+    rows = columns[0]
+    for column in columns[1:]:
+        rows = rows + "\t" + column
+    return rows + "\n"
+
+
+def _count_alphabetic(texts: np.ndarray) -> np.ndarray:
+    """the number of alphabetic characters in every text, by looking up their code points in a table of str.isalpha()"""
+    code_points = np.frombuffer("".join(texts).encode('utf-32-le'), dtype=np.uint32)
+    # a table up to the next power of two of the highest code point, mostly just Latin
+    table_size = 1 << int(code_points.max(initial=0)).bit_length()
+    alphabetic = np.concatenate(([0], np.cumsum(_is_alphabetic(table_size)[code_points])))
+    ends = np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)))
+    return alphabetic[ends] - alphabetic[np.concatenate(([0], ends[:-1]))]
+
+
+@cache
+def _is_alphabetic(size: int) -> np.ndarray:
+    return np.array([chr(c).isalpha() for c in range(size)], dtype=np.int64)
 
 
 def main() -> None:
@@ -99,43 +201,7 @@ def main() -> None:
     print("inv_nr\tpage_no\ttextregion_id\ttextregion_type\tline_id\tlangs\tline_text")
 
     for filename in args.inputfiles:
-        prev = (None, None, None, None)
-        line_langs = Counter()
-        page_langs = []
-        with open(filename, mode='r') as file:
-            reader = csv.DictReader(file, delimiter="\t", quoting=csv.QUOTE_NONE)
-            for row in reader:
-                current = (row['inv_nr'], row['page_no'], row['textregion_id'], row['textregion_type'])
-                if current != prev:
-                    region_langs = classify_region_language(line_langs)
-                    for lang in region_langs:
-                        if lang not in page_langs:
-                            page_langs.append(lang)
-                    inv_nr, page_no, textregion_id, textregion_type = prev
-                    if inv_nr:
-                        print_langs(inv_nr, page_no, textregion_id, textregion_type, "", region_langs, "")
-                    line_langs.clear();
-                if current[0:2] != prev[:2]:
-                    # new page
-                    inv_nr, page_no = prev[:2]
-                    if inv_nr:
-                        print_langs(inv_nr, page_no, "", "", "", page_langs, "")
-                        page_langs.clear()
-                if row['textregion_type'] == 'paragraph':
-                    lang = classify_line_language(row)
-                    line_langs[lang] += 1
-                    print_langs(row['inv_nr'], row['page_no'], row['textregion_id'], row['textregion_type'],
-                                row['line_id'], [lang], row['line_text'])
-                prev = current
-
-            # wrap up after last one
-            inv_nr, page_no, textregion_id, textregion_type = prev
-            if inv_nr:
-                region_langs = classify_region_language(line_langs)
-                for lang in region_langs:
-                    if lang not in page_langs:
-                        page_langs.append(lang)
-                print_langs(inv_nr, page_no, "", "", "", page_langs, "")
+        classify_file(filename)
 
 
 if __name__ == '__main__':
@@ -5,16 +5,15 @@ import sys
 import time
 from argparse import Namespace
 from pathlib import Path
-from typing import Any
 
-import orjson
 from loguru import logger
 
 import globalise_tools.io_tools as rw
+import globalise_tools.provenance as provenance
 import scripts.gt_ner_xmi_to_wa as nx
 from globalise_tools.annotation_page_factory import AnnotationPageFactory
-from globalise_tools.logger_tools import log_writing_file
-from globalise_tools.url_factory import AnnotationPageType
+from globalise_tools.build_manifest import ANNOTATION_PAGES, BuildManifest, file_digest
+from globalise_tools.page_archives import PageFormat, open_page_sink
 
 THIS_SCRIPT_PATH = "scripts/" + os.path.basename(__file__)
 
@@ -66,6 +65,23 @@ def get_arguments() -> Namespace:
                         help="The git commit to use for the provenance (will be calculated if omitted)",
                         type=str
                         )
+    parser.add_argument("-w",
+                        "--workers",
+                        help="The number of worker processes to process the pages with",
+                        type=int,
+                        default=1
+                        )
+    parser.add_argument("-f", "--output-format",
+                        help="How to store the annotation pages: as one file per page (dir), or in one zip, tar.gz or"
+                             " jsonl (with an offset index) archive per inventory (rebuilds all pages)",
+                        choices=[f.value for f in PageFormat],
+                        default=PageFormat.DIRECTORY.value
+                        )
+    parser.add_argument("--force",
+                        help="Rebuild all pages, also those whose inputs are unchanged since the last build",
+                        action="store_true",
+                        default=False
+                        )
     parser.add_argument("inventory_number",
                         help="The inventory number to process",
                         type=str,
@@ -85,9 +101,16 @@ def main():
     for path in [args.pagexml_dir, args.xmi_dir, args.output_dir]:
         Path(path).mkdir(parents=True, exist_ok=True)
 
+    provenance.start_run(commit_id=args.git_commit)
     timespan4inventory = nx.load_timespan_dict()
     event_mapping = rw.read_json(args.event_mapping)
     xpf = nx.XMIProcessorFactory(args.type_system, timespan4inventory, event_mapping, args.git_commit)
+    page_format = PageFormat(args.output_format)
+    # pages are only skipped when stored as files, as the archives are written anew on every run
+    build_manifest = BuildManifest(args.output_dir, commit_id=xpf.commit_id, tool=ANNOTATION_PAGES) \
+        if page_format == PageFormat.DIRECTORY else None
+    if build_manifest and args.force:
+        build_manifest.entries.clear()
 
     logger.info(f"processing inventory number {args.inventory_number}")
     apf = AnnotationPageFactory(
@@ -96,18 +119,29 @@ def main():
         xmi_dir=args.xmi_dir,
         xmi_processor_factory=xpf,
         manifest_path=args.manifest,
-        script_path=THIS_SCRIPT_PATH
+        script_path=THIS_SCRIPT_PATH,
+        workers=args.workers,
+        build_manifest=build_manifest,
+        shared_inputs={
+            "type_system": file_digest(args.type_system),
+            "event_mapping": file_digest(args.event_mapping),
+            "document_data": file_digest(xpf.document_data_path),
+            "timespans": file_digest(nx.TIMESPAN_PATH),
+        }
     )
-    apf.build_annotation_pages()
-    store_annotation_pages(apf.transcription_pages, args.output_dir, AnnotationPageType.TRANSCRIPTIONS)
-    store_annotation_pages(apf.entity_pages, args.output_dir, AnnotationPageType.ENTITIES)
-    store_annotation_pages(apf.event_pages, args.output_dir, AnnotationPageType.EVENTS)
+    # the pages are written as they are built, so only one page at a time is held in memory
+    with open_page_sink(args.output_dir, args.inventory_number, page_format) as sink:
+        apf.build_annotation_pages(sink)
+    errors = xpf.errors + apf.errors
+    # a failed run is not recorded, so all its pages are built again by the next run
+    if build_manifest and not errors:
+        apf.record_built_pages()
 
     toc = time.perf_counter()
     print(
-        f"created {len(apf.transcription_pages) + len(apf.entity_pages)} annotation pages in {toc - tic:0.4f} seconds")
+        f"created {sink.pages_written} annotation pages in {toc - tic:0.4f} seconds"
+        f" ({len(apf.skipped_pages)} pages were up to date)")
 
-    errors = xpf.errors + apf.errors
     if errors:
         print(f"{len(errors)} errors occurred:")
         for error in errors:
@@ -115,14 +149,5 @@ def main():
         exit(1)
 
 
-def store_annotation_pages(pages_dict: dict[str, dict[str, Any]], output_dir: str, type: AnnotationPageType) -> None:
-    for (page_id, page) in pages_dict.items():
-        os.makedirs(f"{output_dir}/{type.value}", exist_ok=True)
-        page_path = f"{output_dir}/{type.value}/{page_id}.json"
-        log_writing_file(page_path)
-        with open(page_path, "wb") as f:
-            f.write(orjson.dumps(page))
-
-
 if __name__ == '__main__':
     main()
@@ -5,10 +5,11 @@ import os
 from argparse import Namespace
 from pathlib import Path
 
-import requests
 from loguru import logger
 from tqdm import tqdm
 
+from globalise_tools.http_client import HttpClient
+
 
 def to_mets_id(url: str) -> str:
     return url.split('/')[-1]
@@ -23,36 +24,35 @@ def print_failed_urls(failed_urls) -> None:
 
 
 @logger.catch
-def download_mets(data_dir: str) -> None:
+def download_mets(data_dir: str, max_connections: int = 8) -> None:
     mets_csv = f'{data_dir}/NL-HaNA_1.04.02_mets.csv'
     print(f"reading {mets_csv}...")
     with open(mets_csv) as f:
         records = [r for r in csv.DictReader(f) if r['METS link'] != '']
 
-    bar = tqdm(range(len(records)))
-    failed_urls = []
-
     os.makedirs(os.path.join(data_dir, "mets"), exist_ok=True)
+    urls = [r['METS link'] for r in records if not Path(mets_path(data_dir, r['METS link'])).is_file()]
+    print(f"{len(records) - len(urls)} of {len(records)} mets files already downloaded")
+
+    with HttpClient(max_connections=max_connections) as client:
+        def download(url: str) -> bool:
+            xml = client.get_text(url)
+            if xml is None:
+                return False
+            with open(mets_path(data_dir, url), 'w') as f:
+                f.write(xml)
+            return True
 
-    for i in bar:
-        url = records[i]['METS link']
-        mets_id = to_mets_id(url)
-        path = f'{data_dir}/mets/{mets_id}.xml'
-        if not Path(path).is_file():
-            bar.set_description(f"reading {url}...")
-            r = requests.get(url)
-            if r.ok:
-                xml = r.text
-                path = f'{data_dir}/mets/{mets_id}.xml'
-                with open(path, 'w') as f:
-                    bar.set_description(f"writing to {path}...")
-                    f.write(xml)
-            else:
-                failed_urls.append(url)
+        results = tqdm(client.map(download, urls), total=len(urls), desc="downloading mets")
+        failed_urls = [url for url, ok in zip(urls, results) if not ok]
 
     print_failed_urls(failed_urls)
 
 
+def mets_path(data_dir: str, url: str) -> str:
+    return f'{data_dir}/mets/{to_mets_id(url)}.xml'
+
+
 @logger.catch
 def get_arguments() -> Namespace:
     parser = argparse.ArgumentParser(
@@ -64,13 +64,18 @@ def get_arguments() -> Namespace:
                         help="The data directory.",
                         type=str,
                         metavar="data_dir")
+    parser.add_argument("-c",
+                        "--max-connections",
+                        default=8,
+                        help="The maximum number of concurrent downloads.",
+                        type=int)
     return parser.parse_args()
 
 
 def main():
     args = get_arguments()
     if args.data_dir:
-        download_mets(args.data_dir)
+        download_mets(args.data_dir, args.max_connections)
 
 
 if __name__ == '__main__':
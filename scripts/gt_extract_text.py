@@ -4,10 +4,9 @@ import csv
 import itertools
 import json
 import os
-from typing import AnyStr, Tuple
+from typing import AnyStr, Optional, Tuple
 
 import pagexml.parser as pxp
-import spacy
 from icecream import ic
 from loguru import logger
 from pagexml.model.physical_document_model import PageXMLScan
@@ -15,8 +14,7 @@ from pagexml.model.physical_document_model import PageXMLScan
 import globalise_tools.tools as gt
 from globalise_tools.model import (AnnotationEncoder, GTToken, TRVersions,
                                    WebAnnotation)
-
-spacy_core = "nl_core_news_lg"
+from globalise_tools.tokenization import Tokenizer
 
 metadata_csv = "data/metadata_1618-1793_2022-08-30.csv"
 ground_truth_csv = "data/globalise-word-joins-MH.csv"
@@ -25,7 +23,7 @@ textrepo_version_csv = "data/tr-versions.csv"
 metadata_records = []
 ground_truth = []
 tr_versions: dict[str, TRVersions] = {}
-nlp = None
+tokenizer: Optional[Tokenizer] = None
 
 
 def list_pagexml_files(directory: str):
@@ -158,11 +156,10 @@ def tokenize(all_pars: list[str]) -> (list[str], list[int]):
     tokens = []
     offsets = []
     text = ''.join(all_pars)
-    doc = nlp(text)
-    for sentence in doc.sents:
-        for token in [t for t in sentence if t.text != "\n"]:
+    for sentence in tokenizer.tokenize_text(text):
+        for token in sentence.tokens:
             tokens.append(token.text)
-            offsets.append(token.idx)
+            offsets.append(token.begin)
         tokens.append("")
         offsets.append(-1)
     return tokens, offsets
@@ -171,11 +168,10 @@ def tokenize(all_pars: list[str]) -> (list[str], list[int]):
 def tokenize_per_paragraph(all_pars: list[str]) -> list[GTToken]:
     tokens = []
     text_offset = 0
-    for par in all_pars:
-        doc = nlp(par)
-        for sentence in doc.sents:
-            for token in [t for t in sentence if t.text != "\n"]:
-                offset = text_offset + token.idx
+    for par, sentences in zip(all_pars, tokenizer.tokenize(all_pars)):
+        for sentence in sentences:
+            for token in sentence.tokens:
+                offset = text_offset + token.begin
                 tokens.append(GTToken(token.text, token.text_with_ws, offset))
         tokens.append(GTToken("", "", -1))
         text_offset += len(par)
@@ -364,8 +360,8 @@ def add_tr_versions(all_annotations, external_id) -> None:
 
 
 def init_spacy() -> None:
-    global nlp
-    nlp = spacy.load(spacy_core)
+    global tokenizer
+    tokenizer = Tokenizer()
 
 
 def load_metadata() -> None:
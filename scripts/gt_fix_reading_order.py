@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 import argparse
-import os.path
 
 from loguru import logger
 
 import globalise_tools.document_metadata as DM
+import globalise_tools.provenance as provenance
 from globalise_tools.document_metadata import DocumentMetadata
-from globalise_tools.logger_tools import log_reading_file
-from globalise_tools.page_xml_fixer import PageXmlFixer
+from globalise_tools.page_xml_fixer import fix_pagexml_files
 
 fixable_error_codes = ['3.1.1', '3.1.2', '3.2']
 
@@ -37,6 +36,11 @@ def get_arguments() -> Namespace:
                         help="The path(s) to the document_metadata.csv file(s) containing the document definitions.",
                         nargs="+",
                         type=str)
+    parser.add_argument("-w",
+                        "--workers",
+                        help="The number of worker processes to fix the files with",
+                        type=int,
+                        default=1)
     # parser.add_argument("pagexml_path",
     #                     help="The path to the pagexml file",
     #                     nargs="*",
@@ -45,7 +49,8 @@ def get_arguments() -> Namespace:
 
 
 @logger.catch
-def fix_reading_order(input_directory: str, output_directory: str, document_metadata_paths: list[str]) -> None:
+def fix_reading_order(input_directory: str, output_directory: str, document_metadata_paths: list[str],
+                      workers: int = 1) -> None:
     relevant_documents = [r for r in DM.read_document_selection(document_metadata_paths) if is_relevant(r)]
     pagexml_paths = []
     quality_check = {}
@@ -55,13 +60,8 @@ def fix_reading_order(input_directory: str, output_directory: str, document_meta
             pagexml_path = f"{pagexml_dir}/{pid}.xml"
             pagexml_paths.append(pagexml_path)
             quality_check[pagexml_path] = dm.quality_check
-    total = len(pagexml_paths)
-    for i, import_path in enumerate(pagexml_paths):
-        log_reading_file(import_path, f" ({i + 1}/{total})")
-        if os.path.exists(import_path):
-            PageXmlFixer(import_path, output_directory, quality_check[import_path]).fix()
-        else:
-            logger.warning(f"missing file: {import_path}")
+    fix_pagexml_files(pagexml_paths, output_directory, "gt_fix_reading_order.py", quality_checks=quality_check,
+                      workers=workers)
 
 
 def is_relevant(document_metadata: DocumentMetadata) -> bool:
@@ -102,8 +102,9 @@ def is_relevant(document_metadata: DocumentMetadata) -> bool:
 
 def main() -> None:
     args = get_arguments()
+    provenance.start_run()
     if args.document_metadata_path:
-        fix_reading_order(args.input_directory, args.output_directory, args.document_metadata_path)
+        fix_reading_order(args.input_directory, args.output_directory, args.document_metadata_path, args.workers)
 
 
 if __name__ == '__main__':
@@ -5,8 +5,8 @@ from argparse import Namespace
 
 from loguru import logger
 
-from globalise_tools.logger_tools import log_reading_file
-from globalise_tools.page_xml_fixer import PageXmlFixer
+import globalise_tools.provenance as provenance
+from globalise_tools.page_xml_fixer import fix_pagexml_files
 
 
 @logger.catch
@@ -26,6 +26,11 @@ def get_arguments() -> Namespace:
                         required=True,
                         help="The directory to store the modified PageXML files in.",
                         type=str)
+    parser.add_argument("-w",
+                        "--workers",
+                        help="The number of worker processes to fix the files with",
+                        type=int,
+                        default=1)
     parser.add_argument("inventory_numbers",
                         nargs='+',
                         help="The inventory numbers to process.",
@@ -34,25 +39,13 @@ def get_arguments() -> Namespace:
 
 
 @logger.catch
-def fix_reading_order(input_directory: str, output_directory: str, inventory_numbers: list[str]) -> None:
-    os.makedirs(output_directory, exist_ok=True)
+def fix_reading_order(input_directory: str, output_directory: str, inventory_numbers: list[str],
+                      workers: int = 1) -> None:
     pagexml_paths = []
-    quality_check = {}
     for inv in inventory_numbers:
         pagexml_dir = f"{input_directory}/{inv}"
-        pagexml_paths = list_pagexml_files(pagexml_dir)
-    total = len(pagexml_paths)
-    for i, import_path in enumerate(pagexml_paths):
-        log_reading_file(import_path, f" ({i + 1}/{total})")
-        if os.path.exists(import_path):
-            PageXmlFixer(
-                import_path,
-                output_directory,
-                [],
-                "gt_fix_reading_order2.py"
-            ).fix()
-        else:
-            logger.warning(f"missing file: {import_path}")
+        pagexml_paths.extend(list_pagexml_files(pagexml_dir))
+    fix_pagexml_files(pagexml_paths, output_directory, "gt_fix_reading_order2.py", workers=workers)
 
 
 def list_pagexml_files(directory: str):
@@ -62,8 +55,9 @@ def list_pagexml_files(directory: str):
 
 def main() -> None:
     args = get_arguments()
+    provenance.start_run()
     if args.input_directory:
-        fix_reading_order(args.input_directory, args.output_directory, args.inventory_numbers)
+        fix_reading_order(args.input_directory, args.output_directory, args.inventory_numbers, args.workers)
 
 
 if __name__ == '__main__':
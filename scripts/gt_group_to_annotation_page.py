@@ -10,7 +10,7 @@ from typing import Optional
 
 from loguru import logger
 
-import globalise_tools.git_tools as git
+import globalise_tools.provenance as provenance
 import globalise_tools.url_factory as uf
 from globalise_tools.creator import CreatorFactory
 from globalise_tools.logger_tools import log_writing_file, log_reading_file
@@ -108,11 +108,7 @@ def group_to_page(annotations_path: str, manifests_dir: str, git_commit: Optiona
         annotations = json.load(f)
 
     groups = groupby(annotations, lambda x: page_id(x))
-    if git_commit:
-        commit_id = git_commit
-    else:
-        commit_id = git.read_current_commit_id(warn_on_uncommitted_changes=True)
-    cf = CreatorFactory(script_paths=[XMI_TO_WA_SCRIPT_PATH, THIS_SCRIPT_PATH], commit_id=commit_id)
+    cf = CreatorFactory(script_paths=[XMI_TO_WA_SCRIPT_PATH, THIS_SCRIPT_PATH], commit_id=git_commit)
     creator = cf.creator(
         label="Creation of Web Annotations from NER output in XMI format (generated by the GLOBALISE NER model).")
     for pgid, page_annotations in groups:
@@ -129,6 +125,7 @@ def main() -> None:
     if not args.verbose:
         logger.remove()
         logger.add(sink=sys.stderr, level="WARNING")
+    provenance.start_run(commit_id=args.git_commit)
     group_to_page(args.annotations, args.manifests_dir, args.git_commit)
 
 
@@ -6,12 +6,12 @@ import os.path
 import re
 import subprocess
 import sys
+import threading
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 
 import hydra
-import spacy
 from cassis import *
 from cassis.typesystem import TYPE_NAME_STRING
 from icecream import ic
@@ -23,7 +23,6 @@ from pagexml.parser import parse_pagexml_file
 from provenance.client import (ProvenanceClient, ProvenanceData, ProvenanceHow,
                                ProvenanceResource, ProvenanceWhy)
 from pycaprio.core.mappings import InceptionFormat
-from spacy import Language
 from textrepo.client import TextRepoClient
 from uri import URI
 
@@ -31,16 +30,19 @@ import globalise_tools.textrepo_tools as tt
 import globalise_tools.url_factory as uf
 from globalise_tools.document_metadata import (DocumentMetadata,
                                                read_document_selection)
+from globalise_tools.document_data_store import migrate_document_data
+from globalise_tools.http_client import HttpClient
 from globalise_tools.inception_client import InceptionClient
 from globalise_tools.logger_tools import log_reading_file, log_writing_file
 from globalise_tools.model import (CAS_SENTENCE, CAS_TOKEN, AnnotationEncoder,
                                    ScanCoords)
+from globalise_tools.tokenization import Tokenizer
 from globalise_tools.tools import (is_header, is_marginalia, is_paragraph,
                                    is_signature, paragraph_text)
 
 typesystem_xml = 'data/typesystem.xml'
-spacy_core = "nl_core_news_lg"
 document_data_path = "out/document_data.json"
+document_data_store_path = "out/document_data"
 
 """
 script to generate xmi from sets of pagexml files from a document definition, and upload the xmi to inception
@@ -68,6 +70,14 @@ class DocumentsProcessor:
                  provenance_client: ProvenanceClient, base_provenance: ProvenanceData, project_id: int,
                  project_name: str, typesystem) -> None:
         self.textrepo_client = textrepo_client
+        # pooled connections and retries for the textrepo calls, which are done for several pages at a time
+        self.http_client = HttpClient()
+        self.http_client.mount_on(textrepo_client.session)
+        # a requests.Session is not thread-safe: the page fetching threads each get a client of their own, whose
+        # session is mounted with the connection pool of http_client, as the sessions of http_client itself are
+        self._thread_local = threading.local()
+        self._thread_textrepo_clients: list[TextRepoClient] = []
+        self._thread_textrepo_clients_lock = threading.Lock()
         self.inception_client = inception_client
         self.provenance_client = provenance_client
         self.base_provenance = base_provenance
@@ -76,8 +86,7 @@ class DocumentsProcessor:
         self.plain_text_file_type = tt.get_plain_text_file_type(self.textrepo_client)
         self.document_data = read_document_data()
 
-        logger.info(f"loading {spacy_core}")
-        self.nlp: Language = spacy.load(spacy_core)
+        self.tokenizer = Tokenizer()
 
         self.itree = IntervalTree()
         self.document_id_idx = {}
@@ -85,12 +94,16 @@ class DocumentsProcessor:
         self.project_id = project_id
         self.project_name = project_name
         self.typesystem = typesystem
+        self.typesystem_written = False
 
     def __enter__(self) -> "DocumentsProcessor":
         return self
 
     def __exit__(self, *args) -> bool | None:
         self.textrepo_client.close()
+        for client in self._thread_textrepo_clients:
+            client.close()
+        self.http_client.close()
         self.inception_client.close()
         self.provenance_client.close()
         self.results['document_id_idx'] = self.document_id_idx
@@ -216,6 +229,19 @@ class DocumentsProcessor:
                                  value=metadata.esta_subvoyage_id)
         return document_identifier
 
+    def _thread_textrepo_client(self) -> TextRepoClient:
+        """the TextRepoClient of the current thread, with a session of its own on the shared connection policy"""
+        client = getattr(self._thread_local, "textrepo_client", None)
+        if client is None:
+            trc = self.textrepo_client
+            client = TextRepoClient(trc.base_uri, verbose=trc.verbose, timeout_in_seconds=trc.timeout,
+                                    api_key=trc.api_key)
+            self.http_client.mount_on(client.session)
+            self._thread_local.textrepo_client = client
+            with self._thread_textrepo_clients_lock:
+                self._thread_textrepo_clients.append(client)
+        return client
+
     def _generate_xmi(self, document_id: str, inventory_id: str, pagexml_ids: list[str], links: dict[str, object]) -> \
             tuple[str, ProvenanceData, str]:
         provenance = dataclasses.replace(self.base_provenance, sources=[], targets=[])
@@ -230,9 +256,12 @@ class DocumentsProcessor:
         # MarginaliumAnnotation = cas.typesystem.get_type(CAS_MARGINALIUM)
         # HeaderAnnotation = cas.typesystem.get_type(CAS_HEADER)
 
-        typesystem_path = "out/typesystem.xml"
-        log_writing_file(typesystem_path)
-        self.typesystem.to_xml(typesystem_path)
+        if not self.typesystem_written:
+            # the same for every document
+            typesystem_path = "out/typesystem.xml"
+            log_writing_file(typesystem_path)
+            self.typesystem.to_xml(typesystem_path)
+            self.typesystem_written = True
 
         scan_links = {}
 
@@ -240,16 +269,20 @@ class DocumentsProcessor:
         document_headers = []
         document_paragraphs = []
 
-        textrepo_client = self.textrepo_client
-
-        for external_id in pagexml_ids:
+        def fetch_page(external_id: str) -> tuple[str, str, str]:
+            textrepo_client = self._thread_textrepo_client()
+            with self.http_client.slot():
+                page_xml_path = download_page_xml(inventory_id, external_id, textrepo_client)
+                version_identifier = textrepo_client.find_latest_version(external_id, "pagexml")
+                version_location = textrepo_client.version_uri(version_identifier.id)
+                iiif_url = get_iiif_url(external_id, textrepo_client)
+            return page_xml_path, version_location, iiif_url
+
+        fetched_pages = self.http_client.map(fetch_page, pagexml_ids)
+        for external_id, (page_xml_path, version_location, iiif_url) in zip(pagexml_ids, fetched_pages):
             page_links = {}
-            page_xml_path = download_page_xml(inventory_id, external_id, textrepo_client)
-            version_identifier = textrepo_client.find_latest_version(external_id, "pagexml")
-            version_location = textrepo_client.version_uri(version_identifier.id)
             provenance.sources.append(ProvenanceResource(resource=URI(version_location), relation="primary"))
 
-            iiif_url = get_iiif_url(external_id, textrepo_client)
             canvas_id = self._get_canvas_id(external_id)
             logger.info(f"iiif_url={iiif_url}")
             page_links['iiif_url'] = iiif_url
@@ -292,12 +325,9 @@ class DocumentsProcessor:
             logger.error('double space in text')
 
         cas.sofa_string = document_text
-        doc = self.nlp(document_text)
-        for sentence in doc.sents:
-            for token in [t for t in sentence if t.text != "\n"]:
-                begin = token.idx
-                end = begin + len(token.text)
-                cas.add(TokenAnnotation(begin=begin, end=end))
+        for sentence in self.tokenizer.tokenize_text(document_text):
+            for token in sentence.tokens:
+                cas.add(TokenAnnotation(begin=token.begin, end=token.end))
 
         ranges = marginalia_ranges
         if header_range:
@@ -324,6 +354,8 @@ class DocumentsProcessor:
         log_writing_file(document_data_path)
         with open(document_data_path, "w") as f:
             json.dump(self.document_data, fp=f, ensure_ascii=False, cls=AnnotationEncoder)
+        # the json is kept, as it is read back for the next import; the store is what the annotation scripts read
+        migrate_document_data(document_data_path, document_data_store_path)
 
     @staticmethod
     def _get_canvas_id(page_id) -> str:
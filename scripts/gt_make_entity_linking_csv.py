@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 import argparse
-import os
 from argparse import Namespace
 from typing import Any, NamedTuple
 
 from loguru import logger
 
 import globalise_tools.io_tools as rw
+from globalise_tools.page_archives import DirectoryPageSource, PageSource, open_page_source
+from globalise_tools.url_factory import AnnotationPageType
 
 
 # headers = ["annotation_id","status_id","annotation_entity_type","entity_id","offset_inventory","offset_scan,prefix","exact","suffix",classified_as,entity_uri,entity_type,entity_label,concept_uri,concept_label,begin_of_the_begin,end_of_the_end]
@@ -37,9 +38,10 @@ class Record(NamedTuple):
 
 class EntityLinkFactory:
 
-    def __init__(self, inventory_number: str, document: dict[str, Any]):
+    def __init__(self, inventory_number: str, document: dict[str, Any], page_source: PageSource | None = None):
         self.inventory_number = inventory_number
         self.document = document
+        self.page_source = page_source or DirectoryPageSource(f"work/{inventory_number}")
         self.records = []
         self.annotations_parsed = 0
         self.document_offset = self._read_document_offset_mapping()
@@ -74,10 +76,8 @@ class EntityLinkFactory:
         return list(self.records[0]._asdict().keys())
 
     def _process_page(self, page_id: str):
-        possible_entities_page_path = f"work/{self.inventory_number}/entities/{page_id}.json"
-        if os.path.exists(possible_entities_page_path):
-            entities_page_path = possible_entities_page_path
-            page = rw.read_json(entities_page_path, quiet=True)
+        page = self.page_source.read_json(AnnotationPageType.ENTITIES, page_id)
+        if page is not None:
             items = page["items"]
             for annotation in items:
                 self._process_annotation(annotation, page_id)
@@ -155,6 +155,12 @@ def get_arguments() -> Namespace:
     parser = argparse.ArgumentParser(
         description="Create an entity linking csv for the given inventory number",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--pages",
+                        help="The directory or archive (.zip, .tar.gz or .jsonl) with the annotation pages of the"
+                             " inventory, where {inventory_number} is replaced by the inventory number",
+                        type=str,
+                        default="work/{inventory_number}"
+                        )
     parser.add_argument("inventory_number",
                         help="The inventory number to process",
                         type=str,
@@ -174,7 +180,8 @@ def main():
     for inventory_number in inventory_numbers:
         if inventory_number in document_idx:
             document = document_idx[inventory_number]
-            EntityLinkFactory(inventory_number, document).make_entity_link_csv()
+            with open_page_source(args.pages.format(inventory_number=inventory_number)) as page_source:
+                EntityLinkFactory(inventory_number, document, page_source).make_entity_link_csv()
         else:
             logger.warning(f"invalid inventory number: {inventory_number} (not found in {globalise_documents_path})")
 
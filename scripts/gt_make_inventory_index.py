@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 import argparse
 import itertools
-import os
 from argparse import Namespace
 from dataclasses import dataclass
 from typing import NamedTuple, Any, List
 
 import globalise_tools.io_tools as rw
+import globalise_tools.provenance as provenance
 import globalise_tools.url_factory as uf
-from Levenshtein import distance
+from globalise_tools.build_manifest import ANNOTATION_PAGES, INVENTORY_INDEX, BuildManifest, data_digest, file_digest
+from globalise_tools.fuzzy_index import FuzzyIndex
+from globalise_tools.page_archives import DirectoryPageSource, PageSource, open_page_source
 from dataclasses_json import dataclass_json
 from globalise_tools.url_factory import AnnotationPageType
 from icecream import ic
@@ -16,6 +18,9 @@ from jsondataclass import from_dict
 from jsonpath_ng import parse
 from loguru import logger
 
+MAX_PLACENAME_DISTANCE = 4
+INDEX_BUILD_NAME = "index.json"
+
 # globalise issue:
 # https://github.com/globalise-huygens/glob-portal-infomodel/issues/58
 
@@ -40,6 +45,17 @@ def get_arguments() -> Namespace:
                         type=str,
                         required=True,
                         )
+    parser.add_argument("--pages",
+                        help="The directory or archive (.zip, .tar.gz or .jsonl) with the annotation pages of the"
+                             " inventory, where {inventory_number} is replaced by the inventory number",
+                        type=str,
+                        default="work/{inventory_number}"
+                        )
+    parser.add_argument("--force",
+                        help="Rebuild the index, also when its inputs are unchanged since the last build",
+                        action="store_true",
+                        default=False
+                        )
     parser.add_argument("inventory_number",
                         help="The inventory number to process",
                         type=str,
@@ -94,6 +110,60 @@ items_expr = parse("items")
 body_expr = parse("body")
 
 
+class PageText(NamedTuple):
+    text: str
+    has_body: bool
+
+
+class PageStore:
+    """
+    Reads the transcription, entities and events AnnotationPages of an inventory (from the page source,
+    by default the files in work/<inventory_number>, or else from the url).
+    The transcription pages are read at most once each, for use by both the InventoryProcessor and the
+    DocumentProcessors, and only their normalized page text is kept; the entities and events pages are only read by
+    the DocumentProcessor of their document, so they are read when asked for, and not kept.
+    """
+
+    def __init__(self, inventory_number: str, page_source: PageSource | None = None) -> None:
+        self.inventory_number = inventory_number
+        self.page_source = page_source or DirectoryPageSource(f"work/{inventory_number}")
+        self._page_texts: dict[str, PageText | None] = {}
+
+    def page_text(self, page_id: str) -> PageText | None:
+        """the normalized text of the page, or None if there is no transcription page"""
+        if page_id not in self._page_texts:
+            self._page_texts[page_id] = self._read_page_text(page_id)
+        return self._page_texts[page_id]
+
+    def entity_annotations(self, page_id: str) -> list[dict[str, Any]] | None:
+        return self._page_items(AnnotationPageType.ENTITIES, page_id)
+
+    def event_annotations(self, page_id: str) -> list[dict[str, Any]] | None:
+        return self._page_items(AnnotationPageType.EVENTS, page_id)
+
+    def _read_page_text(self, page_id: str) -> PageText | None:
+        transcription_page = self._read_page(AnnotationPageType.TRANSCRIPTIONS, page_id)
+        if not transcription_page or "items" not in transcription_page:
+            return None
+        items = transcription_page["items"]
+        normalized_page_annotation = [i for i in items if i["id"].endswith("#page-normalized")][0]
+        if "body" in normalized_page_annotation:
+            return PageText(normalized_page_annotation["body"][0]["value"], has_body=True)
+        return PageText("", has_body=False)
+
+    def _page_items(self, page_type: AnnotationPageType, page_id: str) -> list[dict[str, Any]] | None:
+        page = self._read_page(page_type, page_id)
+        return page["items"] if page is not None else None
+
+    def _read_page(self, page_type: AnnotationPageType, page_id: str) -> Any:
+        page = self.page_source.read_json(page_type, page_id)
+        if page is not None:
+            return page
+        if page_type == AnnotationPageType.TRANSCRIPTIONS:
+            logger.warning(f"Transcription page not found: {page_id}, reading from url")
+        return rw.get_json(uf.annotation_page_url(page_type, page_id), quiet=True)
+
+
 class DocumentProcessor:
 
     def __init__(self,
@@ -101,20 +171,24 @@ class DocumentProcessor:
                  document_id: str,
                  document: dict[str, Any],
                  preferred_placenames,
+                 placename_index: FuzzyIndex,
                  start_data_position: dict[str, int],
                  end_data_position: dict[str, int],
                  concepts_per_page: dict[str, dict[str, Any]],
                  annotation_enhancements: dict[str, dict[str, str]],
-                 ead_identifier_lists: list[list[str]]
+                 ead_identifier_lists: list[list[str]],
+                 page_store: PageStore
                  ) -> None:
         self.inventory_number = inventory_number
         self.document_id = document_id
         self.document = document
         self.document_text = ""
+        self.page_store = page_store
         self.concepts_per_page = concepts_per_page
         self.document_concepts = set()
         self.annotation_enhancements = annotation_enhancements
         self.preferred_placenames = preferred_placenames
+        self.placename_index = placename_index
         self.place_annotation_count = 0
         self.places_identified = 0
         self.profession_annotation_count = 0
@@ -134,8 +208,14 @@ class DocumentProcessor:
         else:
             # TODO: handle divergent page numbering in 9817 and 10090
             page_ids = [f"NL-HaNA_1.04.02_{self.inventory_number}_{i:04d}" for i in range(first_page, last_page + 1)]
+            page_texts = []
+            page_offset = 0
             for page_id in page_ids:
-                self._process_page(page_id)
+                page_text = self._process_page(page_id, page_offset)
+                if page_text is not None:
+                    page_texts.append(page_text)
+                    page_offset += len(page_text)
+            self.document_text = "".join(page_texts)
             self._enrich_place_and_profession_annotations()
             return self._make_doc(page_ids)
 
@@ -279,62 +359,27 @@ class DocumentProcessor:
             doc["hierarchies"].extend(concept_hierarchies)
         return doc
 
-    def _process_page(self, page_id: str) -> None:
-        transcription_page = self._read_transcription_page(page_id)
+    def _process_page(self, page_id: str, page_offset: int) -> str | None:
+        """process the annotations of the page, and return the page text to add to the document text, if any"""
+        page_text = self.page_store.page_text(page_id)
         if page_id in self.concepts_per_page:
             page_concepts = [from_dict(c, Concept) for c in self.concepts_per_page[page_id]]
             self.document_concepts.update(page_concepts)
 
-        if transcription_page and "items" in transcription_page:
-            items = transcription_page["items"]
-            normalized_page_annotation = [i for i in items if i["id"].endswith("#page-normalized")][0]
-            if "body" in normalized_page_annotation:
-                page_text = normalized_page_annotation["body"][0]["value"]
-                page_offset = len(self.document_text)
-                self.document_text += page_text
-
-                entities_page = self._read_entities_page(page_id)
-                if entities_page is not None:
-                    items = entities_page["items"]
-                    for annotation in items:
-                        self._process_entity_annotation(annotation, page_id, page_offset)
-                        self.annotations_parsed += 1
-                events_page = self._read_events_page(page_id)
-                if events_page is not None:
-                    items = events_page["items"]
-                    for annotation in items:
-                        self._process_event_annotation(annotation, page_id, page_offset)
-                        self.annotations_parsed += 1
-            # else:
-            #     logger.warning(f"expected body in annotation {normalized_page_annotation}")
-
-    def _read_transcription_page(self, page_id: str) -> Any:
-        transcription_page_path = f"work/{self.inventory_number}/transcriptions/{page_id}.json"
-        if os.path.exists(transcription_page_path):
-            transcription_page = rw.read_json(transcription_page_path, quiet=True)
-        else:
-            logger.warning(f"Transcription page not found: {page_id}, reading from url")
-            transcription_page_url = uf.annotation_page_url(AnnotationPageType.TRANSCRIPTIONS, page_id)
-            transcription_page = rw.get_json(transcription_page_url, quiet=True)
-        return transcription_page
-
-    def _read_entities_page(self, page_id: str) -> Any:
-        entities_page_path = f"work/{self.inventory_number}/entities/{page_id}.json"
-        if os.path.exists(entities_page_path):
-            entities_page = rw.read_json(entities_page_path, quiet=True)
-        else:
-            entities_page_url = uf.annotation_page_url(AnnotationPageType.ENTITIES, page_id)
-            entities_page = rw.get_json(entities_page_url, quiet=True)
-        return entities_page
-
-    def _read_events_page(self, page_id: str) -> Any:
-        events_page_path = f"work/{self.inventory_number}/events/{page_id}.json"
-        if os.path.exists(events_page_path):
-            events_page = rw.read_json(events_page_path, quiet=True)
-        else:
-            events_page_url = uf.annotation_page_url(AnnotationPageType.EVENTS, page_id)
-            events_page = rw.get_json(events_page_url, quiet=True)
-        return events_page
+        if page_text is None or not page_text.has_body:
+            return None
+
+        entity_annotations = self.page_store.entity_annotations(page_id)
+        if entity_annotations is not None:
+            for annotation in entity_annotations:
+                self._process_entity_annotation(annotation, page_id, page_offset)
+                self.annotations_parsed += 1
+        event_annotations = self.page_store.event_annotations(page_id)
+        if event_annotations is not None:
+            for annotation in event_annotations:
+                self._process_event_annotation(annotation, page_id, page_offset)
+                self.annotations_parsed += 1
+        return page_text.text
 
     def _process_entity_annotation(self, annotation: dict[str, Any], page_id: str, page_offset: int):
         annotation_id = annotation["id"]
@@ -406,6 +451,9 @@ class DocumentProcessor:
     def _process_event_annotation(self, annotation: dict[str, Any], page_id: str, page_offset: int):
         annotation_id = annotation["id"]
         bodies = annotation["body"]
+        if not isinstance(bodies, list):
+            # the event argument annotations have a single body, without an event type
+            return
         for body in bodies:
             tag = body["type"]
             label = body["_label"]
@@ -453,21 +501,7 @@ class DocumentProcessor:
         return record
 
     def _matching_preferred_placename(self, record: NerRecord) -> str | None:
-        key = record.text.lower()
-        if key in self.preferred_placenames:
-            return key
-
-        original_length = len(key)
-        best_match = None
-        best_distance = 5
-        for k in self.preferred_placenames:
-            other_length = len(k)
-            d = distance(key, k, score_cutoff=best_distance - 1)
-            if d < best_distance and d < min(original_length, other_length):
-                best_match = k
-                best_distance = d
-
-        return best_match
+        return self.placename_index.closest(record.text.lower(), max_distance=MAX_PLACENAME_DISTANCE)
 
     def _enrich_profession_annotation(self, record: NerRecord) -> NerRecord:
         if record.tag == "Person":
@@ -510,11 +544,13 @@ class DocumentProcessor:
 
 class InventoryProcessor:
 
-    def __init__(self, inventory_number: str, inventory: dict[str, Any], document_definitions, preferred_placenames):
+    def __init__(self, inventory_number: str, inventory: dict[str, Any], document_definitions, preferred_placenames,
+                 placename_index: FuzzyIndex, page_source: PageSource | None = None):
         self.inventory_number = inventory_number
         self.inventory = inventory
         self.document_definitions = document_definitions
         self.preferred_placenames = preferred_placenames
+        self.placename_index = placename_index
         self.records_extracted = 0
         self.place_annotation_count = 0
         self.places_identified = 0
@@ -522,6 +558,7 @@ class InventoryProcessor:
         self.professions_identified = 0
         self.annotations_parsed = 0
         self.documents = []
+        self.page_store = PageStore(inventory_number, page_source)
         self.inventory_text, self.start_data_position, self.end_data_position = self._process_all_pages()
         self.concept_hierarchies_per_page = rw.read_json(f"work/{inventory_number}/entity_hierarchy.json")
         self.annotation_enhancements = rw.read_json(f"work/{inventory_number}/annotation_enhancements.json")
@@ -551,11 +588,13 @@ class InventoryProcessor:
                     doc_id,
                     document,
                     self.preferred_placenames,
+                    self.placename_index,
                     self.start_data_position,
                     self.end_data_position,
                     self.concept_hierarchies_per_page,
                     self.annotation_enhancements,
-                    self.ead_identifier_lists
+                    self.ead_identifier_lists,
+                    self.page_store
                 )
                 doc = dp.process()
                 if doc:
@@ -596,24 +635,18 @@ class InventoryProcessor:
         logger.info(f"calculating offsets for {len(page_ids)} pages ...")
         start_data_position = {}
         end_data_position = {}
-        inventory_text = ""
+        page_texts = []
         inventory_text_data_size = 0
         for i in page_ids:
-            transcription_page = self._read_transcription_page(i)
-            if transcription_page and "items" in transcription_page:
-                items = transcription_page["items"]
-                normalized_page_annotation = [i for i in items if i["id"].endswith("#page-normalized")][0]
-                if "body" in normalized_page_annotation:
-                    normalized_page_text = normalized_page_annotation["body"][0]["value"]
-                else:
-                    normalized_page_text = ""
-                normalized_page_text_bytesize = self._utf8len(normalized_page_text)
+            page_text = self.page_store.page_text(i)
+            if page_text is not None:
+                normalized_page_text_bytesize = self._utf8len(page_text.text)
                 start_data_position[i] = inventory_text_data_size
                 end_data_position[i] = inventory_text_data_size + normalized_page_text_bytesize
                 inventory_text_data_size += normalized_page_text_bytesize
-                inventory_text += normalized_page_text
+                page_texts.append(page_text.text)
 
-        return inventory_text, start_data_position, end_data_position
+        return "".join(page_texts), start_data_position, end_data_position
 
     # Source - https://stackoverflow.com/a/30686735
     # Posted by Kris, modified by community. See post 'Timeline' for change history
@@ -623,15 +656,6 @@ class InventoryProcessor:
     def _utf8len(s: str) -> int:
         return len(s.encode('utf-8'))
 
-    def _read_transcription_page(self, page_id: str) -> Any:
-        transcription_page_path = f"work/{self.inventory_number}/transcriptions/{page_id}.json"
-        if os.path.exists(transcription_page_path):
-            transcription_page = rw.read_json(transcription_page_path, quiet=True)
-        else:
-            transcription_page_url = uf.annotation_page_url(AnnotationPageType.TRANSCRIPTIONS, page_id)
-            transcription_page = rw.get_json(transcription_page_url, quiet=True)
-        return transcription_page
-
     def _export(self):
         data = self.inventory.copy()
         default_start_date = self.inventory["date_start"]
@@ -675,6 +699,7 @@ def main():
         preferred_placenames = rw.read_json(args.placename_alternatives_file)
     else:
         preferred_placenames = {}
+    placename_index = FuzzyIndex(preferred_placenames)
 
     if args.document_definitions_file is not None:
         document_definitions_per_inventory = rw.read_json(args.document_definitions_file)
@@ -690,11 +715,39 @@ def main():
         if inventory_number in inventory_idx:
             inventory = inventory_idx[inventory_number]
             document_definitions = document_definitions_per_inventory[inventory_number]
-            InventoryProcessor(inventory_number, inventory, document_definitions, preferred_placenames).process()
+            inventory_dir = f"work/{inventory_number}"
+            commit_id = provenance.current_run().commit_id
+            build_manifest = BuildManifest(inventory_dir, commit_id, INVENTORY_INDEX)
+            pages_manifest = BuildManifest(inventory_dir, commit_id, ANNOTATION_PAGES)
+            inputs = _index_inputs(pages_manifest, inventory, document_definitions, args.placename_alternatives_file)
+            if not args.force and inputs["pages"] and build_manifest.is_up_to_date(INDEX_BUILD_NAME, inputs):
+                logger.info(f"the index of {inventory_number} is up to date with its annotation pages, skipping")
+                continue
+            with open_page_source(args.pages.format(inventory_number=inventory_number)) as page_source:
+                InventoryProcessor(inventory_number, inventory, document_definitions, preferred_placenames,
+                                   placename_index, page_source).process()
+            # without all pages in the build manifest, there's no telling when the index is up to date
+            if inputs["pages"]:
+                build_manifest.record(INDEX_BUILD_NAME, inputs, ["index.json", "document.txt"])
+                build_manifest.save()
         else:
             logger.warning(f"invalid inventory number: {inventory_number} (not found in {globalise_inventories_path})")
 
 
+def _index_inputs(pages_manifest: BuildManifest, inventory: dict[str, Any], document_definitions,
+                  placename_alternatives_path: str) -> dict[str, str | None]:
+    """the hashes of what the index is built from; the pages by their entries in the annotation pages' manifest"""
+    inventory_dir = pages_manifest.directory
+    return {
+        "pages": pages_manifest.digest(inventory["documents"][0]["page_ids"]),
+        "inventory": data_digest(inventory),
+        "document_definitions": data_digest(document_definitions),
+        "placename_alternatives": file_digest(placename_alternatives_path),
+        "entity_hierarchy": file_digest(f"{inventory_dir}/entity_hierarchy.json"),
+        "annotation_enhancements": file_digest(f"{inventory_dir}/annotation_enhancements.json"),
+    }
+
+
 def _load_inventory_idx(globalise_documents_path: str) -> dict[Any, Any]:
     document_data = rw.read_json(globalise_documents_path)
     document_idx = {r["inventory_number"]: r for r in document_data}
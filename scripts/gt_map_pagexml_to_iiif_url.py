@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 import argparse
 import csv
+import os
 import xml.etree.ElementTree as ET
 from argparse import Namespace
 from dataclasses import dataclass
 from pathlib import Path
 from xml.etree.ElementTree import Element
 
+import multiprocess as mp
 from loguru import logger
 from tqdm import tqdm
 
+METS_NS = "{http://www.loc.gov/METS/}"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
 
 @dataclass
 class Div:
@@ -26,12 +31,18 @@ def base_name(label: str) -> str:
     return label.replace('.tif', '').replace('.jpg', '').split('/')[-1]
 
 
-def iiif_base_url(file_id: str, root) -> str:
-    return root \
-        .find(".//{http://www.loc.gov/METS/}file[@ID='" + file_id + "']") \
-        .find(".//{http://www.loc.gov/METS/}FLocat") \
-        .get('{http://www.w3.org/1999/xlink}href') \
-        .replace('/info.json', '')
+def file_locations(root: Element) -> dict[str, Element | None]:
+    """the first FLocat of every file, by file ID, collected in one pass over the METS document"""
+    locations = {}
+    for file in root.iter(f"{METS_NS}file"):
+        file_id = file.get("ID")
+        if file_id is not None and file_id not in locations:
+            locations[file_id] = file.find(f".//{METS_NS}FLocat")
+    return locations
+
+
+def iiif_base_url(file_id: str, locations: dict[str, Element | None]) -> str:
+    return locations[file_id].get(XLINK_HREF).replace('/info.json', '')
 
 
 def na_url(file_path) -> str:
@@ -52,9 +63,9 @@ def to_mets_id(url: str) -> str:
     return url.split('/')[-1]
 
 
-def to_mapping_pair(div: Div, root: Element) -> (str, str):
+def to_mapping_pair(div: Div, locations: dict[str, Element | None]) -> (str, str):
     b = base_name(div.label)
-    u = iiif_base_url(div.id + "IIP", root)
+    u = iiif_base_url(div.id + "IIP", locations)
     return b, u
 
 
@@ -62,13 +73,20 @@ def get_mappings(file_path: str) -> list:
     with open(file_path) as f:
         xml = f.read()
     root = ET.fromstring(xml)
-    divs = [to_div(e) for e in root.findall(".//{http://www.loc.gov/METS/}div[@ORDERLABEL='record (item)']")]
+    locations = file_locations(root)
+    divs = [to_div(e) for e in root.findall(f".//{METS_NS}div[@ORDERLABEL='record (item)']")]
     mappings = []
     for d in divs:
-        mappings.append(to_mapping_pair(d, root))
+        mappings.append(to_mapping_pair(d, locations))
     return mappings
 
 
+def get_mappings_if_present(file_path: str) -> list | None:
+    if Path(file_path).is_file():
+        return get_mappings(file_path)
+    return None
+
+
 def print_missing_files(missing_files) -> None:
     if len(missing_files) > 0:
         print("missing mets files:")
@@ -77,30 +95,26 @@ def print_missing_files(missing_files) -> None:
 
 
 @logger.catch
-def map_pagexml_to_iiif_url(data_dir: str) -> None:
+def map_pagexml_to_iiif_url(data_dir: str, workers: int = 1) -> None:
     mets_csv = f"{data_dir}/NL-HaNA_1.04.02_mets.csv"
     mapping_csv = f"{data_dir}/iiif-url-mapping.csv"
     print(f"reading {mets_csv}...")
     with open(mets_csv) as f:
         records = [r for r in csv.DictReader(f) if r['METS link'] != '']
+    file_paths = [f"{data_dir}/mets/{to_mets_id(r['METS link'])}.xml" for r in records]
 
     missing_files = []
-    print(f"writing {mapping_csv}...")
-    with open(mapping_csv, "w") as f:
+    print(f"writing {mapping_csv} using {workers} workers...")
+    with open(mapping_csv, "w") as f, mp.Pool(workers) as pool:
         writer = csv.writer(f)
         writer.writerow(["pagexml_id", "iiif_base_url"])
-        bar = tqdm(range(len(records)))
-        for i in bar:
-            r = records[i]
-            url = r['METS link']
-            mets_id = to_mets_id(url)
-            bar.set_description(f"processing {mets_id}...")
-            file_path = f'{data_dir}/mets/{mets_id}.xml'
-            if Path(file_path).is_file():
-                for m in get_mappings(file_path):
-                    writer.writerow(m)
-            else:
+        # imap returns the mappings in the order of the records, so the csv is the same for any number of workers
+        results = pool.imap(get_mappings_if_present, file_paths, chunksize=4)
+        for file_path, mappings in tqdm(zip(file_paths, results), total=len(file_paths)):
+            if mappings is None:
                 missing_files.append(file_path)
+            else:
+                writer.writerows(mappings)
     print_missing_files(missing_files)
 
 
@@ -114,6 +128,11 @@ def get_arguments() -> Namespace:
                         help="The data directory.",
                         type=str,
                         metavar="data_dir")
+    parser.add_argument("-w",
+                        "--workers",
+                        help="The number of worker processes to read the METS files with",
+                        type=int,
+                        default=os.cpu_count())
     return parser.parse_args()
 
 
@@ -121,7 +140,7 @@ def get_arguments() -> Namespace:
 def main():
     args = get_arguments()
     if args.data_dir:
-        map_pagexml_to_iiif_url(args.data_dir)
+        map_pagexml_to_iiif_url(args.data_dir, args.workers)
 
 
 if __name__ == '__main__':
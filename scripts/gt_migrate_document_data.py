@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import argparse
+from argparse import Namespace
+
+from loguru import logger
+
+from globalise_tools.document_data_store import migrate_document_data
+from scripts.gt_ner_xmi_to_wa import DOCUMENT_DATA_PATH, DOCUMENT_DATA_STORE_PATH
+
+
+def get_arguments() -> Namespace:
+    parser = argparse.ArgumentParser(
+        description="Convert a document_data json file to a sharded document data store, which the annotation"
+                    " scripts read the documents they need from, instead of loading the whole json",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-i", "--input",
+                        help="The document_data json file to convert",
+                        type=str,
+                        default=DOCUMENT_DATA_PATH
+                        )
+    parser.add_argument("-o", "--output-dir",
+                        help="The directory to write the store to (replacing the store there)",
+                        type=str,
+                        default=DOCUMENT_DATA_STORE_PATH
+                        )
+    parser.add_argument("-s", "--shards",
+                        help="The number of shards (1-256)",
+                        type=int,
+                        default=16
+                        )
+    return parser.parse_args()
+
+
+@logger.catch
+def main():
+    args = get_arguments()
+    migrate_document_data(args.input, args.output_dir, args.shards)
+
+
+if __name__ == '__main__':
+    main()
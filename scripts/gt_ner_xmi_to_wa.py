@@ -9,29 +9,33 @@ import sys
 import time
 import urllib.parse
 import uuid
+from collections import ChainMap
 from dataclasses import dataclass
-from datetime import datetime
 from functools import cache
 from itertools import groupby
 from multiprocessing import Value
 from typing import Tuple, Any, Optional
 
-import cassis as cas
-import globalise_tools.git_tools as git
 import globalise_tools.tools as gt
 import globalise_tools.url_factory as uf
+import globalise_tools.page_model as pm
+import globalise_tools.provenance as provenance
 import multiprocess as mp
 import orjson
-import pagexml.parser as px
 from cassis.typesystem import FeatureStructure
+from globalise_tools.cas_index import CasTypeIndex
+from globalise_tools.cas_loading import load_cas, load_typesystem
 from globalise_tools.creator import CreatorFactory
+from globalise_tools.document_data_store import DocumentDataStore
 from globalise_tools.events import (NER_DATA_DICT, place_roles, time_roles,
-                                    wiki_base, NerData, THESAURUS_LABEL_TO_URI)
+                                    wiki_base, NerData, THESAURUS_LABEL_TO_URI, NAMED_ENTITY_LAYER_NAME,
+                                    EVENT_LAYER_NAME)
 from globalise_tools.logger_tools import log_writing_file, log_reading_file
 from globalise_tools.model import ImageData, Offset
+from globalise_tools.page_model import PageModel
 from globalise_tools.tools import inv_nr_sort_key
+from globalise_tools.word_span_index import WordSpanIndex
 from icecream import ic
-from intervaltree import Interval, IntervalTree
 from loguru import logger
 from tqdm import tqdm
 
@@ -40,7 +44,6 @@ GLOBALISE_TEAM = "https://globalise.huygens.knaw.nl/team/"
 THIS_SCRIPT_PATH = "scripts/" + os.path.basename(__file__)
 
 counter = Value('i', 0)
-id_counter = Value('i', 1)
 total = Value('i', 0)
 start_time = Value('f', 0)
 
@@ -48,6 +51,10 @@ start_time = Value('f', 0)
 MANIFEST_BASE_URL = "https://globalise-mirador.tt.di.huc.knaw.nl/globalise"
 # MANIFEST_BASE_URL = "http://localhost:8000/globalise"
 PRESENTATION_VERSION = 3
+DOCUMENT_DATA_PATH = "data/document_data.json"
+# made from DOCUMENT_DATA_PATH with gt-migrate-document-data; used instead of it when present
+DOCUMENT_DATA_STORE_PATH = "data/document_data"
+TIMESPAN_PATH = "data/inventory2timespan.json"
 
 
 @dataclass
@@ -78,6 +85,7 @@ class XMIProcessor:
             self,
             typesystem,
             document_data,
+            document_key_for_md5: dict[str, str],
             commit_id: str,
             xmi_path: str,
             htr_offset: dict[str, Offset],
@@ -92,13 +100,13 @@ class XMIProcessor:
         self.xmi_path = xmi_path
         self.commit_id = commit_id
         self.presentation_version = presentation_version
-        log_reading_file(xmi_path)
-        with open(xmi_path, 'rb') as f:
-            self.cas = cas.load_cas_from_xmi(f, typesystem=self.typesystem)
+        self.cas = load_cas(xmi_path, self.typesystem)
+        self.annotations = CasTypeIndex(self.cas)
         self.text = self.cas.get_sofa().sofaString
         self.text_len = len(self.text)
         self.htr_word_offset = htr_offset
         self.normalized_word_offset = {}
+        self.id_number = 0
         self.creator_factory = CreatorFactory(script_paths=[THIS_SCRIPT_PATH], commit_id=commit_id)
         md5 = hashlib.md5(self.text.encode()).hexdigest()
         # ic(md5)
@@ -108,16 +116,16 @@ class XMIProcessor:
 
         self.document_id = base_name
         self.inventory_id = self.document_id.split("_")[2]
-        for k, v in document_data.items():
-            if v['plain_text_md5'] == md5:
-                self.document_id = k
-                data = v
+        document_key = document_key_for_md5.get(md5)
+        if document_key:
+            self.document_id = document_key
+            data = document_data[self.document_id]
         self.event_argument_entity_dict = {}
         # source_list = [d['plain_text_source'] for d in document_data.values() if d['plain_text_md5'] == md5]
         if data:
             self.plain_text_source = data['plain_text_source']
             self.htr_text_source = data['plain_text_source'].replace("page-normalized", "page-htr")
-            self.itree = IntervalTree([Interval(*iv) for iv in data['text_intervals']])
+            self.itree = WordSpanIndex.of(data['text_intervals'])
         else:
             # logger.error(f"No document data found for {xmi_path}, using placeholder target source")
             raise Exception(f"No document data found for {xmi_path}")
@@ -129,8 +137,7 @@ class XMIProcessor:
         return self.text
 
     def get_named_entity_annotations(self) -> list:
-        entity_annotations = [a for a in self.cas.views[0].get_all_annotations() if
-                              a.type.name == "de.tudarmstadt.ukp.dkpro.core.api.ner.type.NamedEntity" and a.value]
+        entity_annotations = [a for a in self.annotations.select(NAMED_ENTITY_LAYER_NAME) if a.value]
         web_annotations = []
         for a in entity_annotations:
             named_entity_annotation = self._as_web_annotation(a, self._named_entity_body(a), is_entity_annotation=True)
@@ -160,8 +167,7 @@ class XMIProcessor:
     #     return iiif_annotations
 
     def get_event_annotations(self) -> list:
-        event_annotations = [a for a in self.cas.views[0].get_all_annotations() if
-                             a.type.name == "webanno.custom.SemPredGLOB"]
+        event_annotations = self.annotations.select(EVENT_LAYER_NAME)
         web_annotations = []
         for event_annotation in event_annotations:
             event_argument_annotation_ids = []
@@ -209,8 +215,7 @@ class XMIProcessor:
 
     def get_event_argument_annotations(self) -> list:
         return [self._as_web_annotation(a, self._event_argument_body(), is_entity_annotation=False)
-                for a in self.cas.views[0].get_all_annotations()
-                if a.type.name == "webanno.custom.SemPredGLOBArgumentsLink"]
+                for a in self.annotations.select("webanno.custom.SemPredGLOBArgumentsLink")]
 
     def store_normalized_word_offsets(self, path: str) -> None:
         log_writing_file(path)
@@ -293,7 +298,7 @@ class XMIProcessor:
         htr_end = 0
         overlapping_word_ids = []
         overlapping_word_lengths = {}
-        for iv in sorted(list(overlapping_intervals)):
+        for iv in overlapping_intervals:  # sorted by begin
             iv_begin, iv_end, iv_data = iv
             # logger.info(f"overlapping interval: [{iv_begin},{iv_end}]")
             # canvas_id = iv_data["canvas_id"]
@@ -395,7 +400,7 @@ class XMIProcessor:
             ],
             "id": anno_id,
             "type": ["Annotation", "DigitalObject"],
-            "created": datetime.today().isoformat(),
+            "created": provenance.current_run().timestamp,
             "created_by": self.creator_factory.creator(
                 label="Creation of Web Annotations from NER output in XMI format (generated by the GLOBALISE NER model)."),
             "motivation": "classifying",
@@ -421,7 +426,7 @@ class XMIProcessor:
         overlap_size = len(overlapping_intervals)
         # ic(feature_structure_begin, feature_structure_end, overlap_size)
         image_data_list = []
-        for iv in sorted(list(overlapping_intervals)):
+        for iv in overlapping_intervals:  # sorted by begin
             iv_begin, iv_end, iv_data = iv
             # logger.info(f"overlapping interval: [{iv_begin},{iv_end}]")
             canvas_id = iv_data["canvas_id"]
@@ -794,7 +799,7 @@ class XMIProcessor:
             "@context": "http://www.w3.org/ns/anno.jsonld",
             "id": self._annotation_id(f"{target1_num}-{target2_num}"),
             "type": "Annotation",
-            "generated": datetime.today().isoformat(),
+            "generated": provenance.current_run().timestamp,
             "generator": self.creator_factory.generator(),
             "motivation": "linking",
             "body": {
@@ -1040,11 +1045,10 @@ class XMIProcessor:
         base = uf.annotation_page_url(uf.AnnotationPageType.ENTITIES, self.document_id)
         return f"{base}#{id_type.lower()}:{self._next_id_number():06d}"
 
-    @staticmethod
-    def _next_id_number() -> int:
-        num = id_counter.value
-        id_counter.value += 1
-        return num
+    def _next_id_number(self) -> int:
+        # numbered per page, so the ids do not depend on which pages were processed before this one
+        self.id_number += 1
+        return self.id_number
 
     @staticmethod
     def _load_word_offsets(offsets_path: str) -> dict[str, Offset]:
@@ -1060,20 +1064,34 @@ class XMIProcessorFactory:
                  typesystem_path: str,
                  timespan4inventory: dict[str, dict[str, str]],
                  event_mapping: dict[str, Any],
-                 git_commit_id: Optional[str] = None
+                 git_commit_id: Optional[str] = None,
+                 document_data_path: Optional[str] = None
                  ) -> None:
-        log_reading_file(typesystem_path)
-        with open(typesystem_path, 'rb') as f:
-            self.typesystem = cas.load_typesystem(f)
-        self.document_data = self._read_document_data()
+        """
+        document_data_path is a document_data json file, or a document data store directory;
+        by default the store in DOCUMENT_DATA_STORE_PATH if there is one, else DOCUMENT_DATA_PATH
+        """
+        self.typesystem_path = typesystem_path
+        self.typesystem = load_typesystem(typesystem_path)
+        self._open_document_data(document_data_path)
         if git_commit_id:
             self.commit_id = git_commit_id
         else:
-            self.commit_id = git.read_current_commit_id(warn_on_uncommitted_changes=True)
+            self.commit_id = provenance.current_run().commit_id
         self.timespan4inventory = timespan4inventory
         self.event_mapping = event_mapping
         self.errors = []
 
+    def __getstate__(self) -> dict[str, Any]:
+        # the workers get the typesystem from load_typesystem: forked ones share the one parsed here
+        state = self.__dict__.copy()
+        del state["typesystem"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.typesystem = load_typesystem(self.typesystem_path)
+
     def get_xmi_processor(self, xmi_path: str, htr_offset: dict[str, Offset],
                           presentation_version: int = 2) -> XMIProcessor:
         inv_nr = xmi_path.split('/')[1]
@@ -1081,6 +1099,7 @@ class XMIProcessorFactory:
         return XMIProcessor(
             self.typesystem,
             self.document_data,
+            self.document_key_for_md5,
             self.commit_id,
             xmi_path,
             htr_offset,
@@ -1102,9 +1121,60 @@ class XMIProcessorFactory:
             self.errors.append(f"no timespan found for inv.nr. {inv_nr}")
             return {"type": "TimeSpan"}
 
+    def put_document_data(self, document_key: str, data: dict[str, Any]) -> None:
+        previous = self.document_data.get(document_key)
+        if previous and self.document_key_for_md5.get(previous['plain_text_md5']) == document_key:
+            # with a store, the ChainMap only pops the md5 from the dict in front of it
+            self.document_key_for_md5.pop(previous['plain_text_md5'], None)
+            if self.document_key_for_md5.get(previous['plain_text_md5']) == document_key:
+                # the store still maps it: mask it
+                self.document_key_for_md5[previous['plain_text_md5']] = None
+        self.document_data[document_key] = data
+        self.document_key_for_md5[data['plain_text_md5']] = document_key
+
+    def evict_document_data(self, document_key: str) -> None:
+        """forget the document data of a page that has been processed, so it doesn't accumulate over an inventory"""
+        data = self.document_data.pop(document_key, None)
+        if data and self.document_key_for_md5.get(data['plain_text_md5']) == document_key:
+            self.document_key_for_md5.pop(data['plain_text_md5'], None)
+        stored = self.document_data.get(document_key)
+        if stored and isinstance(self.document_key_for_md5, ChainMap):
+            # the stored data is visible again: drop the mask put_document_data may have put over its md5
+            overlay = self.document_key_for_md5.maps[0]
+            if stored['plain_text_md5'] in overlay and overlay[stored['plain_text_md5']] is None:
+                del overlay[stored['plain_text_md5']]
+
+    def _open_document_data(self, path: Optional[str]) -> None:
+        """
+        with a store, document_data and document_key_for_md5 are ChainMaps of a dict with the pages put
+        (see put_document_data) in front of the store, which is only read from. The default store is only used
+        when it was made from the current document_data.json.
+        """
+        if path is None:
+            path = DOCUMENT_DATA_STORE_PATH if DocumentDataStore.exists(DOCUMENT_DATA_STORE_PATH) \
+                else DOCUMENT_DATA_PATH
+        if path == DOCUMENT_DATA_STORE_PATH and DocumentDataStore(path).is_stale(DOCUMENT_DATA_PATH):
+            logger.warning(f"{DOCUMENT_DATA_PATH} changed since {path} was made from it, so it is read instead;"
+                           f" run gt-migrate-document-data to update the store")
+            path = DOCUMENT_DATA_PATH
+        if os.path.isdir(path):
+            store = DocumentDataStore(path)
+            self.document_data = ChainMap({}, store.by_id)
+            self.document_key_for_md5 = ChainMap({}, store.id_for_md5)
+            # the file to hash for the inputs of a build
+            self.document_data_path = store.manifest_path
+        else:
+            self.document_data = self._read_document_data(path)
+            self.document_key_for_md5 = self._index_document_data(self.document_data)
+            self.document_data_path = path
+
+    @staticmethod
+    def _index_document_data(document_data: dict[str, Any]) -> dict[str, str]:
+        # when several documents share a text, the last one wins, as it did with the linear scan
+        return {v['plain_text_md5']: k for k, v in document_data.items()}
+
     @staticmethod
-    def _read_document_data() -> dict[str, object]:
-        path = "data/document_data.json"
+    def _read_document_data(path: str) -> dict[str, object]:
         log_reading_file(path)
         with open(path) as f:
             return orjson.loads(f.read())
@@ -1290,7 +1360,7 @@ def extract_ner_web_annotations(
 
 
 def load_timespan_dict() -> dict[str, dict[str, str]]:
-    path = "data/inventory2timespan.json"
+    path = TIMESPAN_PATH
     log_reading_file(path)
     with open(path) as f:
         return orjson.loads(f.read())
@@ -1494,11 +1564,12 @@ def handle_page_xml(
         page_xml_path: str,
         xpf: XMIProcessorFactory,
         iiif_base_uri_for_base_name: dict[str, str],
-        canvas_id_for_base_name: dict[str, str]) -> str:
+        canvas_id_for_base_name: dict[str, str],
+        page: Optional[PageModel] = None) -> str:
     base_name = get_base_name(xmi_path)
     # page_xml_path = get_page_xml_path(xmi_path, pagexml_dir)
     # make_transcription_annotation_page(page_xml_path)
-    scan_doc = px.parse_pagexml_file(pagexml_file=page_xml_path)
+    scan_doc = page if page else pm.read_page_xml(page_xml_path)
     if base_name in iiif_base_uri_for_base_name:
         iiif_base_uri = iiif_base_uri_for_base_name[base_name]
         canvas_id = canvas_id_for_base_name[base_name]
@@ -1506,19 +1577,21 @@ def handle_page_xml(
         logger.warning(f"base_name {base_name} not found in manifest")
         iiif_base_uri = f"http://canvas-{base_name}-not-found-in-manifest"
         canvas_id = f"http://canvas-{base_name}-not-found-in-manifest"
-    text, marginalia_ranges, header_range, paragraph_ranges, word_interval_tree = gt.extract_paragraph_text(scan_doc,
-                                                                                                            iiif_base_uri=iiif_base_uri,
-                                                                                                            canvas_id=canvas_id)
+    text, marginalia_ranges, header_range, paragraph_ranges, word_span_index = gt.extract_paragraph_text(
+        scan_doc,
+        iiif_base_uri=iiif_base_uri,
+        canvas_id=canvas_id
+    )
 
     plain_text = text
     plain_text_source = f"{uf.URI_BASE_PATTERN}annotations:transcriptions:{base_name}#page-normalized"
 
     md5 = hashlib.md5(plain_text.encode()).hexdigest()
-    xpf.document_data[base_name] = {
+    xpf.put_document_data(base_name, {
         "plain_text_source": plain_text_source,
         "plain_text_md5": md5,
-        "text_intervals": list(word_interval_tree)
-    }
+        "text_intervals": word_span_index
+    })
     return plain_text_source
 
 
@@ -1539,6 +1612,7 @@ def main() -> None:
     else:
         logger.add(sink=sys.stderr, level="WARNING")
 
+    provenance.start_run(commit_id=args.git_commit)
     if args.xmi_dir:
         extract_ner_web_annotations(
             args.pagexml_dir,
@@ -2,8 +2,8 @@
 import argparse
 import sys
 from argparse import Namespace
+from typing import Optional
 
-import spacy
 from cassis import *
 from loguru import logger
 from pagexml.parser import parse_pagexml_file
@@ -12,16 +12,13 @@ import globalise_tools.tools as gt
 from globalise_tools.logger_tools import log_writing_file, log_reading_file
 from globalise_tools.model import (CAS_HEADER, CAS_MARGINALIUM, CAS_PARAGRAPH,
                                    CAS_SENTENCE, CAS_TOKEN)
+from globalise_tools.tokenization import Tokenizer
 
 typesystem_xml = 'data/typesystem.xml'
-spacy_core = "nl_core_news_lg"
 
 logger.remove()
 logger.add(sys.stdout, level="WARNING")
 
-logger.info(f"loading {spacy_core}")
-nlp = spacy.load(spacy_core)
-
 
 def get_arguments() -> Namespace:
     parser = argparse.ArgumentParser(
@@ -32,6 +29,18 @@ def get_arguments() -> Namespace:
                         required=False,
                         help="The directory to save the xmi file(s) to",
                         type=str)
+    parser.add_argument("-b",
+                        "--batch-size",
+                        required=False,
+                        help="The number of page texts spaCy processes at a time",
+                        type=int,
+                        default=64)
+    parser.add_argument("-n",
+                        "--n-process",
+                        required=False,
+                        help="The number of processes spaCy uses",
+                        type=int,
+                        default=1)
     parser.add_argument("page_xml_path",
                         nargs='+',
                         help="The path to the pagexml file.",
@@ -44,11 +53,44 @@ def output_path(page_xml_path: str, output_directory: str) -> str:
     return f"{output_directory}/{base}.xmi"
 
 
-def convert(page_xml_paths: list[str], output_directory: str = "out") -> None:
+def convert(page_xml_paths: list[str], output_directory: str = "out", tokenizer: Optional[Tokenizer] = None) -> None:
     log_reading_file(typesystem_xml)
     with open(typesystem_xml, 'rb') as f:
         typesystem = load_typesystem(f)
-
+    tokenizer = tokenizer or Tokenizer()
+
+    for sentences, (page_xml_path, ranges) in tokenizer.tokenize_with_context(page_texts(page_xml_paths)):
+        text, marginalia_ranges, header_range, paragraph_ranges = ranges
+        cas = Cas(typesystem=typesystem)
+        cas.sofa_string = text
+        cas.sofa_mime = "text/plain"
+
+        SentenceAnnotation = cas.typesystem.get_type(CAS_SENTENCE)
+        TokenAnnotation = cas.typesystem.get_type(CAS_TOKEN)
+        ParagraphAnnotation = cas.typesystem.get_type(CAS_PARAGRAPH)
+        MarginaliumAnnotation = cas.typesystem.get_type(CAS_MARGINALIUM)
+        HeaderAnnotation = cas.typesystem.get_type(CAS_HEADER)
+        for sentence in sentences:
+            cas.add(SentenceAnnotation(begin=sentence.begin, end=sentence.end))
+            for token in sentence.tokens:
+                cas.add(TokenAnnotation(begin=token.begin, end=token.end))
+
+        for pr in marginalia_ranges:
+            cas.add(MarginaliumAnnotation(begin=pr[0], end=pr[1]))
+        if header_range:
+            cas.add(HeaderAnnotation(begin=header_range[0], end=header_range[1]))
+        for pr in paragraph_ranges:
+            cas.add(ParagraphAnnotation(begin=pr[0], end=pr[1]))
+
+        # print_annotations(cas)
+
+        cas_xmi = output_path(page_xml_path, output_directory)
+        log_writing_file(cas_xmi)
+        cas.to_xmi(cas_xmi, pretty_print=True)
+
+
+def page_texts(page_xml_paths: list[str]):
+    """(text, (path, ranges)) for every page with paragraph text, for Tokenizer.tokenize_with_context"""
     for page_xml_path in page_xml_paths:
         log_reading_file(page_xml_path)
         scan_doc = parse_pagexml_file(page_xml_path)
@@ -59,42 +101,15 @@ def convert(page_xml_paths: list[str], output_directory: str = "out") -> None:
         if not text:
             logger.warning(f"no paragraph text found in {page_xml_path}")
         else:
-            cas = Cas(typesystem=typesystem)
-            cas.sofa_string = text
-            cas.sofa_mime = "text/plain"
-
-            SentenceAnnotation = cas.typesystem.get_type(CAS_SENTENCE)
-            TokenAnnotation = cas.typesystem.get_type(CAS_TOKEN)
-            ParagraphAnnotation = cas.typesystem.get_type(CAS_PARAGRAPH)
-            MarginaliumAnnotation = cas.typesystem.get_type(CAS_MARGINALIUM)
-            HeaderAnnotation = cas.typesystem.get_type(CAS_HEADER)
-            doc = nlp(text)
-            for sentence in doc.sents:
-                cas.add(SentenceAnnotation(begin=sentence.start_char, end=sentence.end_char))
-                for token in [t for t in sentence if t.text != "\n"]:
-                    begin = token.idx
-                    end = token.idx + len(token.text)
-                    cas.add(TokenAnnotation(begin=begin, end=end))
-
-            for pr in marginalia_ranges:
-                cas.add(MarginaliumAnnotation(begin=pr[0], end=pr[1]))
-            if header_range:
-                cas.add(HeaderAnnotation(begin=header_range[0], end=header_range[1]))
-            for pr in paragraph_ranges:
-                cas.add(ParagraphAnnotation(begin=pr[0], end=pr[1]))
-
-            # print_annotations(cas)
-
-            cas_xmi = output_path(page_xml_path, output_directory)
-            log_writing_file(cas_xmi)
-            cas.to_xmi(cas_xmi, pretty_print=True)
+            yield text, (page_xml_path, (text, marginalia_ranges, header_range, paragraph_ranges))
 
 
 @logger.catch
 def main():
     args = get_arguments()
     if args.page_xml_path:
-        convert(args.page_xml_path, args.output_directory)
+        convert(args.page_xml_path, args.output_directory,
+                Tokenizer(batch_size=args.batch_size, n_process=args.n_process))
 
 
 if __name__ == '__main__':
@@ -8,6 +8,7 @@ import hydra
 from loguru import logger
 from omegaconf import DictConfig
 
+from globalise_tools.cas_index import CasTypeIndex
 from globalise_tools.events import (ENTITIES, EVENT_LAYER_NAME,
                                     NAMED_ENTITY_LAYER_NAME)
 
@@ -27,13 +28,10 @@ def main(cfg: DictConfig) -> None:
         with open(path, 'rb') as f:
             cas = cassis.load_cas_from_xmi(f, typesystem=typesystem)
         logger.info(f"{len(cas.views)} views")
-        main_view = cas.views[0]
-        named_entity_annotations = [a for a in main_view.get_all_annotations() if
-                                    a.type.name == NAMED_ENTITY_LAYER_NAME]
-        glob_annotations = [a for a in main_view.get_all_annotations() if
-                            a.type.name == EVENT_LAYER_NAME]
-        semarg_annotations = [a for a in main_view.get_all_annotations() if
-                              a.type.name == "de.tudarmstadt.ukp.dkpro.core.api.semantics.type.SemArg"]
+        annotations = CasTypeIndex(cas)
+        named_entity_annotations = annotations.select(NAMED_ENTITY_LAYER_NAME)
+        glob_annotations = annotations.select(EVENT_LAYER_NAME)
+        semarg_annotations = annotations.select("de.tudarmstadt.ukp.dkpro.core.api.semantics.type.SemArg")
         print(f"{len(named_entity_annotations)} ne annotations")
         if named_entity_annotations:
             print(named_entity_annotations[0])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import argparse
+import subprocess
+from argparse import Namespace
+
+from loguru import logger
+
+from globalise_tools.inventory_scheduler import InventoryScheduler, Stage, StageStateStore, estimate_sizes
+
+# the remote/Makefile targets of every stage, for inventory number {inv}
+STAGE_TARGETS = {
+    "unzip": [".make/pagexml-{inv}", ".make/xmicas-{inv}"],
+    "annotate": ["annotation-lists-{inv}"],
+    "n-quads": ["work/{inv}.nq.gz"],
+    "upload": ["upload-{inv}"],
+}
+# unzip downloads the zips from the hucdrive, which the Makefile's hucdrive-gate keeps sequential
+STAGE_MAX_CONCURRENT = {"unzip": 1}
+
+
+def get_arguments() -> Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run the stages of all inventories on a pool of workers, largest inventories first,"
+                    " keeping track of the finished stages so an interrupted run can be resumed",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-i", "--inventory-numbers-file",
+                        help="The file with the inventory numbers to process, one per line",
+                        type=str,
+                        default="work/inventorynumbers.lst"
+                        )
+    parser.add_argument("-m", "--manifest-dir",
+                        help="The directory with the manifests, to estimate the inventory sizes with",
+                        type=str,
+                        default="data/manifests"
+                        )
+    parser.add_argument("-s", "--state-file",
+                        help="The SQLite file with the state of every stage of every inventory",
+                        type=str,
+                        default="work/schedule.sqlite"
+                        )
+    parser.add_argument("-w", "--workers",
+                        help="The number of inventories to process at the same time",
+                        type=int,
+                        default=3
+                        )
+    parser.add_argument("--stages",
+                        help="The stages to run, in order",
+                        type=str,
+                        nargs="+",
+                        choices=list(STAGE_TARGETS),
+                        default=list(STAGE_TARGETS)
+                        )
+    return parser.parse_args()
+
+
+def make_stage(name: str) -> Stage:
+    def run(inventory_number: str) -> None:
+        targets = [t.format(inv=inventory_number) for t in STAGE_TARGETS[name]]
+        subprocess.run(["make", *targets], check=True)
+
+    return Stage(name, run, STAGE_MAX_CONCURRENT.get(name))
+
+
+def main():
+    args = get_arguments()
+    with open(args.inventory_numbers_file) as f:
+        inventory_numbers = [line.strip() for line in f if line.strip()]
+    sizes = estimate_sizes(inventory_numbers, args.manifest_dir)
+    logger.info(f"processing {len(sizes)} inventories ({sum(sizes.values())} pages) with {args.workers} workers")
+
+    def log_progress(inventory_number: str, done: int, total: int) -> None:
+        logger.info(f"{done}/{total} inventory {inventory_number} ({sizes[inventory_number]} pages) finished")
+
+    with StageStateStore(args.state_file) as state:
+        scheduler = InventoryScheduler([make_stage(s) for s in args.stages], state, workers=args.workers)
+        result = scheduler.run(sizes, on_inventory_done=log_progress)
+    logger.info(f"{len(result.completed)} inventories done in {result.makespan:.0f}s")
+    if result.failed:
+        logger.warning(f"{len(result.failed)} inventories failed: {result.failed}; run again to retry them")
+
+
+if __name__ == '__main__':
+    main()
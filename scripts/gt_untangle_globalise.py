@@ -25,6 +25,7 @@ from uri import URI
 import globalise_tools.lang_deduction as ld
 import globalise_tools.tools as gt
 import globalise_tools.url_factory as uf
+from globalise_tools.io_tools import CheckpointJournal
 from globalise_tools.lang_deduction import LangDeduction
 from globalise_tools.logger_tools import log_writing_file, log_reading_file
 from globalise_tools.model import (AnnotationEncoder, DocumentMetadata,
@@ -35,15 +36,25 @@ from globalise_tools.tools import Annotation, WebAnnotationFactory
 
 word_break_chars = '„¬-'
 
+processed_path = "out/processed.json"
+processed_journal_path = "out/processed.journal.jsonl"
+results_path = "out/results.json"
+results_journal_path = "out/results.journal.jsonl"
+
 
 @hydra.main(version_base=None)
 @logger.catch
 def main(cfg: DictConfig) -> None:
     # logger.level('warning')
-    results = {}
     page_lang = ld.read_lang_deduction_for_page(cfg.automated_page_langs_file)
     # ic(page_lang)
     processed = load_processed_files()
+    processed_journal = CheckpointJournal(processed_journal_path, compact=lambda _: store_processed_files(processed))
+    processed.update(processed_journal.records)
+    # a results journal is only left behind by a run that did not finish, so earlier results are only kept then
+    results_journal = CheckpointJournal(results_journal_path, compact=lambda _: store_results(results),
+                                        encoder=AnnotationEncoder)
+    results = {r['id']: r['links'] for r in results_journal.records}
 
     scan_url_mapping = read_scan_url_mapping()
 
@@ -73,13 +84,13 @@ def main(cfg: DictConfig) -> None:
     nav_provider = NavProvider()
 
     total = len(dm_selection)
-    with textrepo_client as trc, provenance_client as prc:
+    with textrepo_client as trc, provenance_client as prc, processed_journal, results_journal:
         for i, document_metadata in enumerate(dm_selection):
             logger.info(f"processing {document_metadata.external_id} [{i + 1}/{total}]")
             before = time.perf_counter()
             annotations_stored = process_na_file(document_metadata, base_provenance, prc, trc, webannotation_factory,
-                                                 scan_url_mapping, results, nav_provider=nav_provider,
-                                                 page_lang=page_lang)
+                                                 scan_url_mapping, results, results_journal,
+                                                 nav_provider=nav_provider, page_lang=page_lang)
             after = time.perf_counter()
             diff = after - before
             logger.debug(f"done in {diff} s = {diff / document_metadata.no_of_scans} s/pagexml")
@@ -87,10 +98,7 @@ def main(cfg: DictConfig) -> None:
                 logger.error(e)
             if annotations_stored and not results[document_metadata.external_id]['errors']:
                 processed.add(document_metadata.external_id)
-                path = "out/processed.json"
-                log_writing_file(path)
-                with open(path, "w") as f:
-                    json.dump(list(processed), fp=f)
+                processed_journal.append(document_metadata.external_id)
 
 
 def get_available_inv_nrs() -> set:
@@ -123,16 +131,21 @@ def read_scan_url_mapping() -> dict[str, str]:
 
 
 def load_processed_files() -> set:
-    processed_file = "out/processed.json"
-    if os.path.exists(processed_file):
-        log_reading_file(processed_file)
-        with open(processed_file) as f:
+    if os.path.exists(processed_path):
+        log_reading_file(processed_path)
+        with open(processed_path) as f:
             processed = set(json.load(f))
     else:
         processed = set()
     return processed
 
 
+def store_processed_files(processed: set) -> None:
+    log_writing_file(processed_path)
+    with open(processed_path, "w") as f:
+        json.dump(list(processed), fp=f)
+
+
 def process_na_file(
         document_metadata: DocumentMetadata,
         base_provenance: ProvenanceData,
@@ -141,6 +154,7 @@ def process_na_file(
         waf: WebAnnotationFactory,
         scan_url_mapping: dict[str, str],
         results: dict[str, object],
+        results_journal: CheckpointJournal,
         nav_provider: NavProvider,
         page_lang: dict[str, LangDeduction]
 ) -> bool:
@@ -176,8 +190,7 @@ def process_na_file(
     # prov_html_link = prov_json_link.replace('prov/', '#')
     # links['provenance_links'] = [prov_json_link, prov_html_link]
     results[document_metadata.external_id] = links
-
-    store_results(results)
+    results_journal.append({'id': document_metadata.external_id, 'links': links})
 
     if annotations:
         for a in annotations:
@@ -603,9 +616,8 @@ def download_page_xml(textrepo_client: TextRepoClient, external_id, output_direc
 
 
 def store_results(results: dict[str, object]) -> None:
-    path = "out/results.json"
-    log_writing_file(path)
-    with open(path, 'w') as f:
+    log_writing_file(results_path)
+    with open(results_path, 'w') as f:
         json.dump(results, fp=f, cls=AnnotationEncoder, indent=4, ensure_ascii=False)
 
 
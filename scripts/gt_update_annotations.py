@@ -10,11 +10,15 @@ from loguru import logger
 from omegaconf import DictConfig
 
 import globalise_tools.lang_deduction as ld
+from globalise_tools.annorepo_updater import BulkAnnotationUpdater
+from globalise_tools.io_tools import CheckpointJournal
 from globalise_tools.logger_tools import log_writing_file, log_reading_file
 
 page_id_field = "body.metadata.document"
 
 result_path = "out/gt-update-annnotations-missing-lang-detection.json"
+journal_path = "out/gt-update-annnotations-missing-lang-detection.journal.jsonl"
+dead_letter_path = "out/gt-update-annnotations-missing-lang-detection.dead-letter.jsonl"
 
 
 @dataclass_json
@@ -31,6 +35,8 @@ def main(cfg: DictConfig) -> None:
     ar = AnnoRepoClient(cfg.annorepo.base_uri, api_key=cfg.annorepo.api_key)
     ca = ar.container_adapter(cfg.annorepo.container_name)
     project_results = load_project_results()
+    journal = CheckpointJournal(journal_path, compact=lambda _: store_project_results(project_results))
+    project_results.pages_processed.update(journal.records)
     page_ids = lang_deduction_for_page.keys()
 
     indexes = ca.read_indexes()
@@ -38,39 +44,29 @@ def main(cfg: DictConfig) -> None:
         logger.info(f"indexing {page_id_field}")
         ca.create_index(field=page_id_field, index_type="hashed")
 
+    def add_lang(anno: dict) -> bool:
+        metadata = anno["body"]["metadata"]
+        if "lang" in metadata:
+            return False
+        lang_deduction = lang_deduction_for_page[metadata["document"]]
+        metadata["lang"] = lang_deduction.langs
+        metadata["langCorrected"] = lang_deduction.corrected
+        return True
+
+    def page_done(page_id: str) -> None:
+        project_results.pages_processed.add(page_id)
+        journal.append(page_id)
+
     unprocessed_page_ids = sorted(page_ids - project_results.pages_processed)
-    total = len(unprocessed_page_ids)
-    for i, page_id in enumerate(unprocessed_page_ids):
-        logger.info(f"examining page {page_id} ({i + 1}/{total})")
-        success = False
-        retry = 0
-        while not success:
-            try:
-                search_id = ca.create_search({'body.metadata.document': page_id})
-                for anno in ca.read_search_result_annotations(search_id.id):
-                    if "lang" not in anno["body"]["metadata"]:
-                        anno_url = anno["id"]
-                        anno_name = anno_url.split("/")[-1]
-                        anno_result = ca.read_annotation(anno_name)
-                        etag = anno_result.etag
-                        anno = anno_result.annotation
-                        lang_deduction = lang_deduction_for_page[page_id]
-                        # update the annotation dict
-                        anno["body"]["metadata"]["lang"] = lang_deduction.langs
-                        anno["body"]["metadata"]["langCorrected"] = lang_deduction.corrected
-                        logger.info(f"updating annotation {anno_url}")
-                        ca.update_annotation(anno_name, etag, anno)
-                    project_results.pages_processed.add(page_id)
-                    store_project_results(project_results)
-                success = True
-            except ConnectionError:
-                retry += 1
-                logger.warning(f"ConnectionError caught, retry={retry}")
-                success = False
-            except Exception:
-                retry += 1
-                logger.warning(f"Exception caught, retry={retry}")
-                success = False
+    logger.info(f"updating the annotations of {len(unprocessed_page_ids)} pages")
+    with journal, BulkAnnotationUpdater(cfg.annorepo.base_uri, cfg.annorepo.container_name,
+                                        dead_letter_path=dead_letter_path, api_key=cfg.annorepo.api_key,
+                                        concurrency=cfg.get("concurrency", 8)) as updater:
+        stats = updater.update_pages(unprocessed_page_ids, add_lang, page_id_field=page_id_field,
+                                     on_page_done=page_done)
+    logger.info(f"{stats}")
+    if stats.dead_lettered:
+        logger.warning(f"{stats.dead_lettered} updates failed, see {dead_letter_path}; run again to retry them")
 
 
 def load_project_results() -> ProjectResults:
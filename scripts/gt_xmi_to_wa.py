@@ -11,15 +11,16 @@ from itertools import groupby
 from typing import Any
 from typing import Tuple
 
-import cassis as cas
 from cassis.typesystem import FeatureStructure
 from icecream import ic
 from intervaltree import Interval, IntervalTree
 from loguru import logger
 
 import globalise_tools.git_tools as git
+from globalise_tools.cas_index import CasTypeIndex
+from globalise_tools.cas_loading import load_cas, load_typesystem
 from globalise_tools.events import (NER_DATA_DICT, place_roles, time_roles,
-                                    wiki_base)
+                                    wiki_base, NAMED_ENTITY_LAYER_NAME, EVENT_LAYER_NAME)
 from globalise_tools.logger_tools import log_writing_file, log_reading_file
 from globalise_tools.model import ImageData
 
@@ -34,9 +35,8 @@ class XMIProcessor:
         self.document_data = document_data
         self.xmi_path = xmi_path
         self.commit_id = commit_id
-        log_reading_file(xmi_path)
-        with open(xmi_path, 'rb') as f:
-            self.cas = cas.load_cas_from_xmi(f, typesystem=self.typesystem)
+        self.cas = load_cas(xmi_path, self.typesystem)
+        self.annotations = CasTypeIndex(self.cas)
         self.text = self.cas.get_sofa().sofaString
         self.text_len = len(self.text)
         md5 = hashlib.md5(self.text.encode()).hexdigest()
@@ -61,8 +61,7 @@ class XMIProcessor:
         return self.text
 
     def get_named_entity_annotations(self) -> list:
-        entity_annotations = [a for a in self.cas.views[0].get_all_annotations() if
-                              a.type.name == "de.tudarmstadt.ukp.dkpro.core.api.ner.type.NamedEntity" and a.value]
+        entity_annotations = [a for a in self.annotations.select(NAMED_ENTITY_LAYER_NAME) if a.value]
         web_annotations = []
         for a in entity_annotations:
             web_annotation = self._as_web_annotation(a, self._named_entity_body(a))
@@ -72,8 +71,7 @@ class XMIProcessor:
         return web_annotations
 
     def get_event_annotations(self, entity_ids: list[str]) -> list:
-        event_annotations = [a for a in self.cas.views[0].get_all_annotations() if
-                             a.type.name == "webanno.custom.SemPredGLOB"]
+        event_annotations = self.annotations.select(EVENT_LAYER_NAME)
         web_annotations = []
         for event_annotation in event_annotations:
             event_argument_annotation_ids = []
@@ -119,8 +117,7 @@ class XMIProcessor:
 
     def get_event_argument_annotations(self) -> list:
         return [self._as_web_annotation(a, self._event_argument_body())
-                for a in self.cas.views[0].get_all_annotations()
-                if a.type.name == "webanno.custom.SemPredGLOBArgumentsLink"]
+                for a in self.annotations.select("webanno.custom.SemPredGLOBArgumentsLink")]
 
     def _get_prefix(self, a) -> str:
         if not a:
@@ -529,9 +526,8 @@ class XMIProcessor:
 class XMIProcessorFactory:
 
     def __init__(self, typesystem_path: str) -> None:
-        log_reading_file(typesystem_path)
-        with open(typesystem_path, 'rb') as f:
-            self.typesystem = cas.load_typesystem(f)
+        self.typesystem_path = typesystem_path
+        self.typesystem = load_typesystem(typesystem_path)
         self.document_data = self._read_document_data()
         self.commit_id = git.read_current_commit_id(warn_on_uncommitted_changes=True)
 
@@ -0,0 +1,287 @@
+import json
+import random
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+
+from globalise_tools.annorepo_updater import BulkAnnotationUpdater
+
+CONTAINER = "test"
+
+
+class AnnoRepoStandIn(BaseHTTPRequestHandler):
+    """
+    POST /services/test/search : 201, Location /search/<n>; supports {field: {":isIn": [...]}}
+    GET  /search/<n>?page=<p>  : 5 annotations per page, with "next" if there are more
+    GET  /w3c/test/<name>      : the annotation, with its ETag
+    PUT  /w3c/test/<name>      : 412 unless If-Match is the current ETag, else 200 with a new ETag
+    Every request takes `latency` seconds, and fails with a random 429 or 503 with probability `error_rate`;
+    annotations in `conflicting` get a concurrent update after their first read, those in `failing` are always 503,
+    the first `slow[name]` requests for an annotation take `slow_latency` seconds, those in `malformed` aren't json,
+    and with `search_without_location` the search responses lack their Location.
+    """
+    annotations: dict[str, dict] = {}
+    etags: dict[str, int] = {}
+    searches: list[list[dict]] = []
+    requests = Counter()
+    conflicting: set[str] = set()
+    failing: set[str] = set()
+    slow = Counter()
+    slow_latency = 0.0
+    malformed: set[str] = set()
+    search_without_location = False
+    latency = 0.0
+    error_rate = 0.0
+    rng = random.Random(42)
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls, pages: int, annotations_per_page: int):
+        cls.annotations = {}
+        cls.etags = {}
+        cls.searches = []
+        cls.requests.clear()
+        cls.conflicting = set()
+        cls.failing = set()
+        cls.slow = Counter()
+        cls.slow_latency = 0.0
+        cls.malformed = set()
+        cls.search_without_location = False
+        cls.latency = 0.0
+        cls.error_rate = 0.0
+        cls.rng = random.Random(42)
+        for p in range(pages):
+            for a in range(annotations_per_page):
+                name = f"anno-{p}-{a}"
+                cls.annotations[name] = {"id": f"http://annorepo/w3c/{CONTAINER}/{name}",
+                                         "body": {"metadata": {"document": page_id(p)}}}
+                cls.etags[name] = 1
+
+    def do_POST(self):
+        if self._fail():
+            return
+        query = orjson.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        (field, condition), = query.items()
+        cls = AnnoRepoStandIn
+        with cls.lock:
+            cls.searches.append([a for a in cls.annotations.values()
+                                 if _field_value(a, field) in condition[":isIn"]])
+            location = f"http://{self.headers['Host']}/search/{len(cls.searches) - 1}"
+        self._respond(201, b"", {} if cls.search_without_location else {"Location": location})
+
+    def do_GET(self):
+        if self._fail():
+            return
+        cls = AnnoRepoStandIn
+        if self.path.startswith("/search/"):
+            path, page = self.path.split("?page=")
+            results = cls.searches[int(path.split("/")[-1])]
+            page = int(page)
+            result_page = {"items": results[page * 5:page * 5 + 5]}
+            if len(results) > page * 5 + 5:
+                result_page["next"] = f"{path}?page={page + 1}"
+            self._respond(200, orjson.dumps(result_page))
+        else:
+            name = self.path.split("/")[-1]
+            with cls.lock:
+                body = orjson.dumps(cls.annotations[name])
+                etag = cls.etags[name]
+                if name in cls.conflicting:
+                    cls.conflicting.remove(name)
+                    cls.etags[name] += 1
+            self._respond(200, b"<html>" if name in cls.malformed else body, {"ETag": str(etag)})
+
+    def do_PUT(self):
+        if self._fail():
+            return
+        cls = AnnoRepoStandIn
+        name = self.path.split("/")[-1]
+        annotation = orjson.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with cls.lock:
+            if self.headers["If-Match"] != str(cls.etags[name]):
+                status = 412
+            else:
+                cls.annotations[name] = annotation
+                cls.etags[name] += 1
+                status = 200
+            etag = cls.etags[name]
+        self._respond(status, b"", {"ETag": str(etag)})
+
+    def _fail(self) -> bool:
+        cls = AnnoRepoStandIn
+        name = self.path.split("/")[-1]
+        with cls.lock:
+            slow = cls.slow[name] > 0
+            cls.slow[name] -= slow
+        time.sleep(cls.slow_latency if slow else cls.latency)
+        with cls.lock:
+            cls.requests[self.command] += 1
+            failing = self.path.split("/")[-1] in cls.failing
+            error = failing or cls.rng.random() < cls.error_rate
+            status = 503 if failing else cls.rng.choice([429, 503])
+        if error:
+            self._respond(status, b"busy", {"Retry-After": "0"} if status == 429 else {})
+        return error
+
+    def _respond(self, status: int, body: bytes, headers: dict[str, str] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def page_id(p: int) -> str:
+    return f"NL-HaNA_1.04.02_{1092 + p % 2}_{p:04d}"
+
+
+def _field_value(annotation: dict, field: str):
+    value = annotation
+    for key in field.split("."):
+        value = value.get(key, {})
+    return value
+
+
+def add_lang(annotation: dict) -> bool:
+    metadata = annotation["body"]["metadata"]
+    if "lang" in metadata:
+        return False
+    metadata["lang"] = ["nl"]
+    return True
+
+
+class BulkAnnotationUpdaterTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), AnnoRepoStandIn)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dead_letter_path = f"{self.tmp_dir.name}/dead-letter.jsonl"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def updater(self, concurrency: int = 4, **kwargs) -> BulkAnnotationUpdater:
+        return BulkAnnotationUpdater(self.base_url, CONTAINER, dead_letter_path=self.dead_letter_path,
+                                     concurrency=concurrency, backoff_factor=0.001, **kwargs)
+
+    def test_updates_all_annotations_despite_errors_and_conflicts(self):
+        AnnoRepoStandIn.reset(pages=6, annotations_per_page=3)
+        AnnoRepoStandIn.annotations["anno-0-0"]["body"]["metadata"]["lang"] = ["la"]
+        AnnoRepoStandIn.conflicting = {"anno-1-1", "anno-2-2"}
+        AnnoRepoStandIn.error_rate = 0.2
+        done = []
+        with self.updater(max_attempts=10, search_batch_size=2) as updater:
+            stats = updater.update_pages([page_id(p) for p in range(6)], add_lang, on_page_done=done.append)
+
+        self.assertEqual(sorted(page_id(p) for p in range(6)), sorted(done))
+        self.assertEqual(["la"], AnnoRepoStandIn.annotations["anno-0-0"]["body"]["metadata"]["lang"])
+        for annotation in AnnoRepoStandIn.annotations.values():
+            self.assertIn("lang", annotation["body"]["metadata"])
+        self.assertEqual(18, stats.annotations_found)
+        self.assertEqual(17, stats.annotations_updated)
+        self.assertEqual(2, stats.conflicts)
+        self.assertGreater(stats.retries, 0)
+        self.assertEqual(0, stats.dead_lettered)
+        # one search per inventory per batch of 2 pages: 3 pages of inventories 1092 and 1093
+        self.assertEqual(4, len(AnnoRepoStandIn.searches))
+
+    def test_threads_have_their_own_session_on_one_pool(self):
+        barrier = threading.Barrier(4)
+
+        def session(_):
+            barrier.wait(timeout=5)
+            return updater.session
+
+        with self.updater(api_key="secret") as updater, ThreadPoolExecutor(max_workers=4) as executor:
+            sessions = list(executor.map(session, range(4)))
+            self.assertEqual(4, len({id(s) for s in sessions}))
+            self.assertEqual(1, len({id(s.get_adapter(self.base_url)) for s in sessions}))
+            self.assertTrue(all(s.headers["Authorization"] == "Bearer secret" for s in sessions))
+
+    def test_failing_updates_go_to_the_dead_letter_file(self):
+        AnnoRepoStandIn.reset(pages=2, annotations_per_page=2)
+        AnnoRepoStandIn.failing = {"anno-1-0"}
+        done = []
+        with self.updater(max_attempts=3) as updater:
+            stats = updater.update_pages([page_id(0), page_id(1)], add_lang, on_page_done=done.append)
+
+        self.assertEqual([page_id(0)], done)
+        self.assertEqual(1, stats.dead_lettered)
+        with open(self.dead_letter_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([f"http://annorepo/w3c/{CONTAINER}/anno-1-0"], [r["annotation_id"] for r in records])
+        self.assertNotIn("lang", AnnoRepoStandIn.annotations["anno-1-0"]["body"]["metadata"])
+        self.assertIn("lang", AnnoRepoStandIn.annotations["anno-1-1"]["body"]["metadata"])
+
+    def test_timeouts_are_retried(self):
+        AnnoRepoStandIn.reset(pages=2, annotations_per_page=2)
+        AnnoRepoStandIn.slow["anno-1-0"] = 2
+        AnnoRepoStandIn.slow_latency = 0.5
+        done = []
+        with self.updater(max_attempts=3, timeout=0.1) as updater:
+            stats = updater.update_pages([page_id(0), page_id(1)], add_lang, on_page_done=done.append)
+
+        self.assertEqual([page_id(0), page_id(1)], sorted(done))
+        self.assertEqual(4, stats.annotations_updated)
+        self.assertEqual(2, stats.retries)
+        self.assertEqual(0, stats.dead_lettered)
+        self.assertIn("lang", AnnoRepoStandIn.annotations["anno-1-0"]["body"]["metadata"])
+
+    def test_other_failures_go_to_the_dead_letter_file(self):
+        AnnoRepoStandIn.reset(pages=4, annotations_per_page=2)
+        AnnoRepoStandIn.malformed = {"anno-0-1"}
+        AnnoRepoStandIn.slow["anno-2-0"] = 3
+        AnnoRepoStandIn.slow_latency = 0.5
+        done = []
+        with self.updater(max_attempts=3, timeout=0.1, search_batch_size=1) as updater:
+            stats = updater.update_pages([page_id(p) for p in range(4)], add_lang, on_page_done=done.append)
+
+        self.assertEqual([page_id(1), page_id(3)], sorted(done))
+        self.assertEqual(6, stats.annotations_updated)
+        with open(self.dead_letter_path) as f:
+            errors = {r["annotation_id"].split("/")[-1]: r["error"] for r in map(json.loads, f)}
+        self.assertEqual(["anno-0-1", "anno-2-0"], sorted(errors))
+        self.assertIn("JSONDecodeError", errors["anno-0-1"])
+        self.assertIn("ReadTimeout", errors["anno-2-0"])
+
+        AnnoRepoStandIn.search_without_location = True
+        with self.updater() as updater:
+            stats = updater.update_pages([page_id(0)], add_lang)
+        self.assertEqual(1, stats.dead_lettered)
+        with open(self.dead_letter_path) as f:
+            self.assertEqual([page_id(0)], json.loads(f.readlines()[-1])["page_ids"])
+
+    def test_throughput_scales_with_concurrency(self):
+        seconds = {}
+        for concurrency in [1, 8]:
+            AnnoRepoStandIn.reset(pages=4, annotations_per_page=6)
+            AnnoRepoStandIn.latency = 0.02
+            tic = time.perf_counter()
+            with self.updater(concurrency=concurrency) as updater:
+                stats = updater.update_pages([page_id(p) for p in range(4)], add_lang)
+            seconds[concurrency] = time.perf_counter() - tic
+            self.assertEqual(24, stats.annotations_updated)
+        self.assertGreater(seconds[1] / seconds[8], 2.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,248 @@
+import os
+import resource
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import orjson
+from loguru import logger
+
+import globalise_tools.io_tools as rw
+import globalise_tools.provenance as provenance
+import scripts.gt_ner_xmi_to_wa as nx
+from globalise_tools.annotation_page_factory import AnnotationPageFactory
+from globalise_tools.build_manifest import ANNOTATION_PAGES, INVENTORY_INDEX, BuildManifest
+from globalise_tools.page_archives import DirectoryPageSink, PageFormat, open_page_sink, open_page_source
+from globalise_tools.url_factory import AnnotationPageType
+
+DATA_DIR = Path(__file__).parent / "data"
+TEMPLATE_PAGE_IDS = ["NL-HaNA_1.04.02_1092_0017", "NL-HaNA_1.04.02_1092_0018", "NL-HaNA_1.04.02_1092_0019"]
+# the most a 5000 page inventory may add to the rss of the process building it; keeping all its pages in memory
+# instead of streaming them takes about 500 MB
+RSS_BUDGET_MB = 100
+
+
+class AnnotationPageFactoryTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.remove()
+        provenance.start_run(commit_id="test", timestamp="2024-01-01T12:00:00")
+
+    def build(self, workers: int) -> AnnotationPageFactory:
+        xpf = nx.XMIProcessorFactory(
+            "data/typesystem.xml", {}, rw.read_json(str(DATA_DIR / "eventmapping.json")), git_commit_id="test"
+        )
+        apf = AnnotationPageFactory(
+            inventory_number="1092",
+            pagexml_dir=str(DATA_DIR / "pagexml"),
+            xmi_dir=str(DATA_DIR / "xmi"),
+            xmi_processor_factory=xpf,
+            manifest_path=str(DATA_DIR / "manifests" / "1092.json"),
+            script_path="scripts/gt_create_annotation_lists_for_inventory_number.py",
+            workers=workers
+        )
+        apf.build_annotation_pages()
+        return apf
+
+    def test_sequential_build(self):
+        apf = self.build(workers=1)
+        self.assertEqual([], apf.errors)
+        self.assertEqual(["NL-HaNA_1.04.02_1092_0017", "NL-HaNA_1.04.02_1092_0018", "NL-HaNA_1.04.02_1092_0019"],
+                         list(apf.transcription_pages.keys()))
+        self.assertEqual(["NL-HaNA_1.04.02_1092_0017", "NL-HaNA_1.04.02_1092_0018"], list(apf.entity_pages.keys()))
+        entity_page = orjson.loads(apf.entity_pages["NL-HaNA_1.04.02_1092_0017"])
+        self.assertEqual("Entities of NL-HaNA_1.04.02_1092_0017.jpg", entity_page["label"])
+        self.assertTrue(entity_page["items"])
+
+    def test_pages_share_the_run_provenance(self):
+        apf = self.build(workers=2)
+        for pages in [apf.transcription_pages, apf.entity_pages]:
+            for page in pages.values():
+                timespan = orjson.loads(page)["created_by"]["timespan"]
+                self.assertEqual("2024-01-01T12:00:00", timespan["end_of_the_begin"])
+
+    def test_parallel_build_equals_sequential_build(self):
+        sequential = self.build(workers=1)
+        parallel = self.build(workers=2)
+        self.assertEqual(sequential.transcription_pages, parallel.transcription_pages)
+        self.assertEqual(sequential.entity_pages, parallel.entity_pages)
+        self.assertEqual(sequential.event_pages, parallel.event_pages)
+        self.assertEqual(sequential.xmi_processor_factory.errors, parallel.xmi_processor_factory.errors)
+
+    def test_streamed_pages_equal_the_pages_kept(self):
+        kept = self.build(workers=1)
+        xpf = nx.XMIProcessorFactory(
+            "data/typesystem.xml", {}, rw.read_json(str(DATA_DIR / "eventmapping.json")), git_commit_id="test"
+        )
+        document_keys = set(xpf.document_data)
+        streamed = AnnotationPageFactory("1092", str(DATA_DIR / "pagexml"), str(DATA_DIR / "xmi"), xpf,
+                                         str(DATA_DIR / "manifests" / "1092.json"),
+                                         "scripts/gt_create_annotation_lists_for_inventory_number.py")
+        with tempfile.TemporaryDirectory() as output_dir:
+            with open_page_sink(output_dir, "1092", PageFormat.JSONL) as sink:
+                streamed.build_annotation_pages(sink)
+            self.assertEqual({}, streamed.transcription_pages)
+            self.assertEqual(7, sink.pages_written)
+            with open_page_source(sink.path) as source:
+                for page_type, pages in [(AnnotationPageType.TRANSCRIPTIONS, kept.transcription_pages),
+                                         (AnnotationPageType.ENTITIES, kept.entity_pages),
+                                         (AnnotationPageType.EVENTS, kept.event_pages)]:
+                    for page_id, page in pages.items():
+                        self.assertEqual(page, source.read(page_type, page_id))
+        self.assertEqual(
+            [AnnotationPageType.TRANSCRIPTIONS, AnnotationPageType.ENTITIES, AnnotationPageType.EVENTS],
+            streamed.built_pages["NL-HaNA_1.04.02_1092_0017"]
+        )
+        # the document data of the pages is evicted once they are processed
+        self.assertTrue(set(xpf.document_data) <= document_keys)
+
+
+class MemoryCeilingTestCase(unittest.TestCase):
+    def test_a_large_inventory_is_built_within_the_rss_budget(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_synthetic_inventory(tmp_dir, pages=5000)
+            # in a fresh process, so its max rss is not that of the tests run before
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                pages_written, rss_growth_mb = executor.submit(build_streaming, tmp_dir).result()
+        self.assertEqual(5000 + 2 * 3334, pages_written)
+        self.assertLess(rss_growth_mb, RSS_BUDGET_MB)
+
+
+def write_synthetic_inventory(directory: str, pages: int) -> None:
+    """the fixtures in tests/data, repeated under new page ids: 2 of every 3 pages have an xmi, with entities and events"""
+    for d in ["pagexml", "xmi", "manifests"]:
+        os.makedirs(f"{directory}/{d}")
+    manifest = rw.read_json(str(DATA_DIR / "manifests" / "1092.json"))
+    templates = []
+    for template_id, canvas in zip(TEMPLATE_PAGE_IDS, manifest["items"]):
+        xmi_path = DATA_DIR / "xmi" / f"{template_id}.xmi"
+        templates.append((template_id, (DATA_DIR / "pagexml" / f"{template_id}.xml").read_bytes(),
+                          xmi_path.read_bytes() if xmi_path.exists() else None, orjson.dumps(canvas)))
+    items = []
+    for n in range(pages):
+        template_id, pagexml, xmi, canvas = templates[n % len(templates)]
+        page_id = f"NL-HaNA_1.04.02_1092_{n + 1:04d}"
+        with open(f"{directory}/pagexml/{page_id}.xml", "wb") as f:
+            f.write(pagexml.replace(template_id.encode(), page_id.encode()))
+        if xmi:
+            with open(f"{directory}/xmi/{page_id}.xmi", "wb") as f:
+                f.write(xmi)
+        items.append(orjson.loads(canvas.replace(template_id.encode(), page_id.encode())))
+    manifest["items"] = items
+    with open(f"{directory}/manifests/1092.json", "wb") as f:
+        f.write(orjson.dumps(manifest))
+
+
+def build_streaming(directory: str) -> tuple[int, float]:
+    """build the inventory in directory into a jsonl archive; the pages written, and the rss growth in MB"""
+    logger.remove()
+    provenance.start_run(commit_id="test", timestamp="2024-01-01T12:00:00")
+    xpf = nx.XMIProcessorFactory(
+        "data/typesystem.xml", {}, rw.read_json(str(DATA_DIR / "eventmapping.json")), git_commit_id="test"
+    )
+    apf = AnnotationPageFactory("1092", f"{directory}/pagexml", f"{directory}/xmi", xpf,
+                                f"{directory}/manifests/1092.json",
+                                "scripts/gt_create_annotation_lists_for_inventory_number.py")
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open_page_sink(directory, "1092", PageFormat.JSONL) as sink:
+        apf.build_annotation_pages(sink)
+    return sink.pages_written, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+
+
+class IncrementalBuildTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.remove()
+        provenance.start_run(commit_id="test", timestamp="2024-01-01T12:00:00")
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pagexml_dir = f"{self.tmp_dir.name}/pagexml"
+        self.xmi_dir = f"{self.tmp_dir.name}/xmi"
+        self.output_dir = f"{self.tmp_dir.name}/out"
+        shutil.copytree(DATA_DIR / "pagexml", self.pagexml_dir)
+        shutil.copytree(DATA_DIR / "xmi", self.xmi_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def build(self, commit_id: str = "test") -> AnnotationPageFactory:
+        xpf = nx.XMIProcessorFactory(
+            "data/typesystem.xml", {}, rw.read_json(str(DATA_DIR / "eventmapping.json")), git_commit_id=commit_id
+        )
+        apf = AnnotationPageFactory(
+            inventory_number="1092",
+            pagexml_dir=self.pagexml_dir,
+            xmi_dir=self.xmi_dir,
+            xmi_processor_factory=xpf,
+            manifest_path=str(DATA_DIR / "manifests" / "1092.json"),
+            script_path="scripts/gt_create_annotation_lists_for_inventory_number.py",
+            build_manifest=BuildManifest(self.output_dir, commit_id=commit_id, tool=ANNOTATION_PAGES),
+            shared_inputs={"event_mapping": "abc"}
+        )
+        with DirectoryPageSink(self.output_dir) as sink:
+            apf.build_annotation_pages(sink)
+        apf.record_built_pages()
+        return apf
+
+    def test_unchanged_pages_are_skipped(self):
+        first = self.build()
+        self.assertEqual(3, len(first.built_pages))
+        self.assertEqual([], first.skipped_pages)
+
+        second = self.build()
+        self.assertEqual({}, second.built_pages)
+        self.assertEqual(["NL-HaNA_1.04.02_1092_0017", "NL-HaNA_1.04.02_1092_0018", "NL-HaNA_1.04.02_1092_0019"],
+                         second.skipped_pages)
+
+    def test_changing_one_input_rebuilds_only_that_page(self):
+        self.build()
+        xmi_path = f"{self.xmi_dir}/NL-HaNA_1.04.02_1092_0018.xmi"
+        # a newer modification time alone doesn't make a page out of date
+        os.utime(xmi_path)
+        self.assertEqual({}, self.build().built_pages)
+
+        with open(xmi_path, "ab") as f:
+            f.write(b"\n")
+        apf = self.build()
+        self.assertEqual(["NL-HaNA_1.04.02_1092_0018"], list(apf.built_pages))
+        self.assertEqual(["NL-HaNA_1.04.02_1092_0017", "NL-HaNA_1.04.02_1092_0019"], apf.skipped_pages)
+
+    def test_pages_are_rebuilt_when_their_outputs_are_gone_or_the_code_changed(self):
+        self.build()
+        os.remove(f"{self.output_dir}/entities/NL-HaNA_1.04.02_1092_0017.json")
+        self.assertEqual(["NL-HaNA_1.04.02_1092_0017"], list(self.build().built_pages))
+        self.assertEqual(3, len(self.build(commit_id="other").built_pages))
+
+    def test_outputs_of_removed_pages_are_removed(self):
+        self.build()
+        os.remove(f"{self.pagexml_dir}/NL-HaNA_1.04.02_1092_0017.xml")
+        self.build()
+        self.assertFalse(os.path.exists(f"{self.output_dir}/transcriptions/NL-HaNA_1.04.02_1092_0017.json"))
+        self.assertFalse(os.path.exists(f"{self.output_dir}/entities/NL-HaNA_1.04.02_1092_0017.json"))
+        manifest = BuildManifest(self.output_dir, commit_id="test", tool=ANNOTATION_PAGES)
+        self.assertEqual(["NL-HaNA_1.04.02_1092_0018", "NL-HaNA_1.04.02_1092_0019"], sorted(manifest.entries))
+
+    def test_outputs_of_other_tools_in_the_directory_are_kept(self):
+        self.build()
+        # as gt-make-inventory-index records the index it makes in the same directory
+        index_manifest = BuildManifest(self.output_dir, commit_id="test", tool=INVENTORY_INDEX)
+        index_manifest.record("index.json", {"pages": "1"}, ["index.json", "document.txt"])
+        index_manifest.save()
+        for output in ["index.json", "document.txt"]:
+            with open(f"{self.output_dir}/{output}", "w") as f:
+                f.write("{}")
+
+        os.remove(f"{self.pagexml_dir}/NL-HaNA_1.04.02_1092_0017.xml")
+        self.build()
+        self.assertFalse(os.path.exists(f"{self.output_dir}/transcriptions/NL-HaNA_1.04.02_1092_0017.json"))
+        self.assertTrue(os.path.exists(f"{self.output_dir}/index.json"))
+        self.assertTrue(os.path.exists(f"{self.output_dir}/document.txt"))
+        self.assertTrue(BuildManifest(self.output_dir, commit_id="test", tool=INVENTORY_INDEX)
+                        .is_up_to_date("index.json", {"pages": "1"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
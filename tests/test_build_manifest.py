@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from globalise_tools.build_manifest import BuildManifest, data_digest, file_digest
+
+
+class BuildManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+        with open(f"{self.directory}/index.json", "w") as f:
+            f.write("{}")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_saved_entries_are_up_to_date_for_the_same_commit_and_inputs(self):
+        manifest = BuildManifest(self.directory, commit_id="abc", tool="test")
+        manifest.record("index.json", {"pages": "1"}, ["index.json"])
+        manifest.save()
+
+        reloaded = BuildManifest(self.directory, commit_id="abc", tool="test")
+        self.assertTrue(reloaded.is_up_to_date("index.json", {"pages": "1"}))
+        self.assertFalse(reloaded.is_up_to_date("index.json", {"pages": "2"}))
+        self.assertFalse(BuildManifest(self.directory, commit_id="def", tool="test").is_up_to_date("index.json", {"pages": "1"}))
+        os.remove(f"{self.directory}/index.json")
+        self.assertFalse(reloaded.is_up_to_date("index.json", {"pages": "1"}))
+
+    def test_stale_outputs(self):
+        manifest = BuildManifest(self.directory, commit_id="abc", tool="test")
+        manifest.record("p1", {}, ["transcriptions/p1.json", "entities/p1.json"])
+        manifest.record("p2", {}, ["transcriptions/p2.json"])
+        self.assertEqual(["entities/p1.json"], manifest.record("p1", {}, ["transcriptions/p1.json"]))
+        self.assertEqual(["transcriptions/p2.json"], manifest.retain(["p1"]))
+        self.assertEqual(["p1"], list(manifest.entries))
+
+    def test_tools_keep_their_own_entries(self):
+        pages = BuildManifest(self.directory, commit_id="abc", tool="pages")
+        pages.record("p1", {}, ["transcriptions/p1.json"])
+        pages.save()
+        index = BuildManifest(self.directory, commit_id="abc", tool="index")
+        index.record("index.json", {"pages": pages.digest(["p1"])}, ["index.json"])
+        index.save()
+
+        self.assertEqual(["transcriptions/p1.json"], BuildManifest(self.directory, "abc", "pages").retain([]))
+        self.assertEqual(["index.json"], list(BuildManifest(self.directory, "abc", "index").entries))
+
+    def test_digest_depends_on_the_builds_of_all_names(self):
+        manifest = BuildManifest(self.directory, commit_id="abc", tool="test")
+        manifest.record("p1", {"xmi": "1"}, [])
+        self.assertIsNone(manifest.digest(["p1", "p2"]))
+        manifest.record("p2", {"xmi": "2"}, [])
+        digest = manifest.digest(["p1", "p2"])
+        manifest.record("p2", {"xmi": "3"}, [])
+        self.assertNotEqual(digest, manifest.digest(["p1", "p2"]))
+
+    def test_digests(self):
+        self.assertIsNone(file_digest(f"{self.directory}/missing.json"))
+        self.assertEqual("44136fa355b3678a1146ad16f7e8649e94fb4fc21fe77e8310c060f61caaff8a",
+                         file_digest(f"{self.directory}/index.json"))
+        self.assertEqual(data_digest({"a": 1, "b": 2}), data_digest({"b": 2, "a": 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from pathlib import Path
+
+import cassis
+
+from globalise_tools.cas_index import CasTypeIndex
+from globalise_tools.events import EVENT_LAYER_NAME, NAMED_ENTITY_LAYER_NAME
+
+DATA_DIR = Path(__file__).parent / "data"
+TYPE_NAMES = [
+    NAMED_ENTITY_LAYER_NAME,
+    EVENT_LAYER_NAME,
+    "webanno.custom.SemPredGLOBArgumentsLink",
+    "de.tudarmstadt.ukp.dkpro.core.api.semantics.type.SemArg",
+    "de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Token",
+    "de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Sentence",
+    "no.such.Type"
+]
+
+
+class CasTypeIndexTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("data/typesystem.xml", "rb") as f:
+            cls.typesystem = cassis.load_typesystem(f)
+
+    def test_select_equals_filtering_all_annotations(self):
+        for xmi_path in sorted((DATA_DIR / "xmi").glob("*.xmi")):
+            with open(xmi_path, "rb") as f:
+                cas = cassis.load_cas_from_xmi(f, typesystem=self.typesystem)
+            index = CasTypeIndex(cas)
+            all_annotations = cas.views[0].get_all_annotations()
+            self.assertEqual(len(all_annotations), len(index))
+            for type_name in TYPE_NAMES:
+                expected = [a for a in all_annotations if a.type.name == type_name]
+                self.assertEqual(expected, index.select(type_name), f"{xmi_path.name}: {type_name}")
+
+            tokens = index.select("de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Token")
+            self.assertTrue(tokens)
+            self.assertEqual(sorted((t.begin, t.end) for t in tokens), [(t.begin, t.end) for t in tokens])
+            # the argument links are not annotations, so they were never selected
+            self.assertEqual([], index.select("webanno.custom.SemPredGLOBArgumentsLink"))
+
+
+if __name__ == '__main__':
+    unittest.main()
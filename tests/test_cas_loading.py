@@ -0,0 +1,97 @@
+import gc
+import pickle
+import tempfile
+import unittest
+import weakref
+from pathlib import Path
+from unittest import mock
+
+import cassis
+
+import scripts.gt_ner_xmi_to_wa as nx
+from globalise_tools import cas_loading
+from globalise_tools.cas_loading import CasLoader, UnsupportedXmi, load_cas, load_typesystem
+
+DATA_DIR = Path(__file__).parent / "data"
+TYPESYSTEM_PATH = "data/typesystem.xml"
+
+
+def cassis_load(xmi_path: str, typesystem: cassis.TypeSystem) -> cassis.Cas:
+    with open(xmi_path, "rb") as f:
+        return cassis.load_cas_from_xmi(f, typesystem=typesystem)
+
+
+class CasLoadingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.typesystem = load_typesystem(TYPESYSTEM_PATH)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fast_path_loads_the_same_cas_as_cassis(self):
+        loader = CasLoader(self.typesystem)
+        for xmi_path in sorted((DATA_DIR / "xmi").glob("*.xmi")):
+            cas = loader._load(str(xmi_path))
+            expected = cassis_load(str(xmi_path), self.typesystem)
+            self.assertEqual(expected.to_xmi(), cas.to_xmi(), xmi_path.name)
+            events = cas.select("webanno.custom.SemPredGLOB")
+            arguments = [a for e in events if e.arguments for a in e.arguments.elements]
+            self.assertTrue(arguments)
+            self.assertTrue(all(a.target.get_covered_text() for a in arguments))
+            # new feature structures get new ids
+            token = self.typesystem.get_type("de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Token")
+            cas.add(token(begin=0, end=1))
+            self.assertEqual(1, len([fs for fs in cas.select_all_fs() if fs.xmiID > max_id(expected)]))
+
+    def test_falls_back_to_cassis(self):
+        # offsets that count UTF-16 code units differ from the python ones after this emoji
+        cas = cassis.Cas(typesystem=self.typesystem, sofa_string="🚢 de Hoop")
+        entity = self.typesystem.get_type("de.tudarmstadt.ukp.dkpro.core.api.ner.type.NamedEntity")
+        cas.add(entity(begin=2, end=9, value="SHIP"))
+        xmi_path = f"{self.tmp_dir.name}/emoji.xmi"
+        cas.to_xmi(xmi_path)
+
+        with self.assertRaises(UnsupportedXmi):
+            CasLoader(self.typesystem)._load(xmi_path)
+        loaded = load_cas(xmi_path, self.typesystem)
+        self.assertEqual(["de Hoop"], [e.get_covered_text() for e in loaded.select(entity)])
+
+    def test_falls_back_to_cassis_without_its_private_id_generators(self):
+        xmi_path = str(sorted((DATA_DIR / "xmi").glob("*.xmi"))[0])
+        expected = cassis_load(xmi_path, self.typesystem).to_xmi()
+        with mock.patch.object(cas_loading, "_IdGenerator", None):
+            with self.assertRaises(UnsupportedXmi):
+                CasLoader(self.typesystem)._load(xmi_path)
+            self.assertEqual(expected, CasLoader(self.typesystem).load(xmi_path).to_xmi())
+        with mock.patch.object(cas_loading, "_ID_GENERATOR_ATTRIBUTES", ("_no_such_generator",)):
+            with self.assertRaises(UnsupportedXmi):
+                CasLoader(self.typesystem)._load(xmi_path)
+
+    def test_loader_lives_as_long_as_its_typesystem(self):
+        with open(TYPESYSTEM_PATH, "rb") as f:
+            typesystem = cassis.load_typesystem(f)
+        xmi_path = str(sorted((DATA_DIR / "xmi").glob("*.xmi"))[0])
+        load_cas(xmi_path, typesystem)
+        loader = getattr(typesystem, cas_loading.LOADER_ATTRIBUTE)
+        load_cas(xmi_path, typesystem)
+        self.assertIs(loader, getattr(typesystem, cas_loading.LOADER_ATTRIBUTE))
+        typesystem_ref = weakref.ref(typesystem)
+        del typesystem, loader
+        gc.collect()
+        self.assertIsNone(typesystem_ref())
+
+    def test_typesystem_is_parsed_once_and_not_pickled(self):
+        self.assertIs(self.typesystem, load_typesystem(f"./{TYPESYSTEM_PATH}"))
+        xpf = nx.XMIProcessorFactory(TYPESYSTEM_PATH, {}, {}, git_commit_id="test")
+        self.assertIs(self.typesystem, xpf.typesystem)
+        self.assertNotIn(b"NamedEntity", pickle.dumps(xpf))
+        self.assertIs(self.typesystem, pickle.loads(pickle.dumps(xpf)).typesystem)
+
+
+def max_id(cas: cassis.Cas) -> int:
+    return max(fs.xmiID for fs in cas.select_all_fs())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+
+from globalise_tools.io_tools import CheckpointJournal, FsyncPolicy
+
+
+class CheckpointJournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "journal.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resumes_after_an_interrupted_run(self):
+        with self.assertRaises(KeyboardInterrupt):
+            with CheckpointJournal(self.path) as journal:
+                journal.append("doc-1")
+                journal.append({"id": "doc-2", "errors": []})
+                raise KeyboardInterrupt
+        with CheckpointJournal(self.path, fsync=FsyncPolicy.NEVER) as journal:
+            self.assertEqual(["doc-1", {"id": "doc-2", "errors": []}], journal.records)
+            journal.append("doc-3")
+        with CheckpointJournal(self.path) as journal:
+            self.assertEqual(["doc-1", {"id": "doc-2", "errors": []}, "doc-3"], journal.records)
+
+    def test_drops_a_torn_last_record(self):
+        with open(self.path, "wb") as f:
+            f.write(b'"doc-1"\n"doc-2"\n{"id": "do')
+        journal = CheckpointJournal(self.path, fsync=FsyncPolicy.INTERVAL)
+        self.assertEqual(["doc-1", "doc-2"], journal.records)
+        journal.append("doc-3")
+        journal.close(compact=False)
+        self.assertEqual(["doc-1", "doc-2", "doc-3"], self._journal_records())
+
+    def test_compacts_on_close(self):
+        snapshot_path = os.path.join(self.tmp_dir.name, "processed.json")
+
+        def compact(records):
+            with open(snapshot_path, "w") as f:
+                json.dump(list(records), f)
+
+        with CheckpointJournal(self.path, compact=compact) as journal:
+            for i in range(3):
+                journal.append(f"doc-{i}")
+        with open(snapshot_path) as f:
+            self.assertEqual(["doc-0", "doc-1", "doc-2"], json.load(f))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_starts_empty_without_resume(self):
+        with CheckpointJournal(self.path) as journal:
+            journal.append("doc-1")
+        with CheckpointJournal(self.path, resume=False) as journal:
+            self.assertEqual([], journal.records)
+            journal.append("doc-2")
+        self.assertEqual(["doc-2"], self._journal_records())
+
+    def _journal_records(self) -> list:
+        journal = CheckpointJournal(self.path)
+        journal.close(compact=False)
+        return journal.records
+
+
+if __name__ == '__main__':
+    unittest.main()
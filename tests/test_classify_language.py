@@ -0,0 +1,87 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+
+from benchmarks.bench_classify_language import classify_file_rowwise
+from scripts.gt_classify_language import LANGS, classify_file
+
+HEADER = ["inv_nr", "page_no", "textregion_id", "textregion_type", "line_id", "lang", "confidence", "line_text",
+          *LANGS, "total"]
+
+
+def row(inv_nr, page_no, region, region_type, line_id, lang, confidence, text, **scores) -> list[str]:
+    return [inv_nr, page_no, region, region_type, line_id, lang, confidence, text,
+            *(scores.get(lang, "0") for lang in LANGS), "10"]
+
+
+class ClassifyLanguageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "1234-lines.lang.tsv")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_edge_cases_match_row_wise_classification(self):
+        self._write([
+            row("1234", "0001", "r1", "paragraph", "l1", "nl", "0.9", "de schip van de Compagnie", nl_voc="0.5"),
+            row("1234", "0001", "r1", "paragraph", "l2", "fr", "0.6", "le vaisseau et la mer", fr="0.5", la="0.5"),
+            row("1234", "0001", "r1", "paragraph", "l3", "en", "0.95", "Compagnie", en="0.2"),
+            row("1234", "0001", "r1", "paragraph", "l4", "de", "0.3", "½ das Schiff und", de="0.75", nl="0.75"),
+            row("1234", "0001", "r2", "marginalia", "l5", "la", "0.99", "navis cum aqua"),
+            row("1234", "0001", "r3", "paragraph", "l6", "da", "0.95", "skibet og havet", da="nan"),
+            row("1234", "0001", "r3", "paragraph", "l7", "la", "0.4", "ab", la="1"),
+            row("", "0002", "r4", "paragraph", "l8", "en", "0.8", "the ship and the sea", en="0.8"),
+            row("1234", "0003", "r5", "paragraph", "l9", "pt", "0.7", "o navio e o mar", pt="0.6", es="0.6"),
+            row("1234", "0003", "r5", "paragraph", "l10", "pt", "0.7", "o navio e o mar", pt="0.6", es="0.6"),
+            row("1234", "0003", "r5", "paragraph", "l11", "pt", "0.7", "o navio e o mar", pt="0.6", es="0.6"),
+            row("1234", "0003", "r6", "header", "l12", "nl", "1.0", "Batavia"),
+            row("1234", "0001", "r1", "paragraph", "l13", "it", "0.92", "la nave e il mare", it="0.1"),
+        ])
+        self.assertEqual(self._row_wise_output(), self._columnar_output())
+
+    def test_random_input_matches_row_wise_classification(self):
+        rng = random.Random(1)
+        words = ["de", "van", "schip", "the", "ship", "le", "navis", "Schiff", "½", "1687", "Ao", "f"]
+        rows = []
+        for i in range(2000):
+            page, region = i // 100, i // rng.choice([3, 7, 11])
+            rows.append(row("1234", f"{page:04d}", f"r{region}", rng.choice(["paragraph", "paragraph", "other"]),
+                            f"l{i}", rng.choice(["nl", "en", "fr", "de", "la", "unknown"]),
+                            rng.choice(["0.1", "0.5", "0.9", "0.95"]),
+                            " ".join(rng.choice(words) for _ in range(rng.randint(1, 6))),
+                            **{lang: rng.choice(["0", "0", "0.5", "0.3333333333333333", "1"]) for lang in LANGS}))
+        self._write(rows)
+        self.assertEqual(self._row_wise_output(), self._columnar_output())
+
+    def test_invalid_language_is_refused(self):
+        self._write([row("1234", "0001", "r1", "paragraph", "l1", "sv", "0.99", "skeppet och havet")])
+        with self.assertRaises(Exception):
+            self._row_wise_output()
+        with self.assertRaisesRegex(Exception, "Invalid language: sv"):
+            self._columnar_output()
+
+    def test_header_only(self):
+        self._write([])
+        self.assertEqual("", self._columnar_output())
+
+    def _write(self, rows: list[list[str]]) -> None:
+        with open(self.path, "w") as f:
+            for r in [HEADER] + rows:
+                f.write("\t".join(r) + "\n")
+
+    def _row_wise_output(self) -> str:
+        out = io.StringIO()
+        classify_file_rowwise(self.path, out)
+        return out.getvalue()
+
+    def _columnar_output(self) -> str:
+        out = io.StringIO()
+        classify_file(self.path, out)
+        return out.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
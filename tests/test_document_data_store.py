@@ -0,0 +1,124 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import orjson
+
+import globalise_tools.io_tools as rw
+import scripts.gt_ner_xmi_to_wa as nx
+from globalise_tools.document_data_store import DocumentDataStore, migrate_document_data, write_document_data_store
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def md5(text: str) -> str:
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+DOCUMENT_DATA = {
+    f"NL-HaNA_1.04.02_1092_{n:04d}": {
+        "plain_text_source": f"urn:example:{n}#page-normalized",
+        "plain_text_md5": md5(f"text {n % 40}"),
+        "text_intervals": [[0, 4, {"iiif_base_uri": "urn:iiif", "canvas_id": f"urn:canvas:{n}", "coords": [[1, 2]]}]]
+    }
+    for n in range(50)
+}
+
+
+class DocumentDataStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = f"{self.tmp_dir.name}/document_data"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lookups_equal_those_in_the_json(self):
+        write_document_data_store(DOCUMENT_DATA, self.directory, shards=4)
+        store = DocumentDataStore(self.directory)
+        for document_id, data in DOCUMENT_DATA.items():
+            self.assertEqual(data, store.by_id[document_id])
+        self.assertNotIn("NL-HaNA_1.04.02_1092_9999", store.by_id)
+        self.assertEqual(sorted(DOCUMENT_DATA), sorted(store.by_id))
+        self.assertEqual(50, len(store.by_id))
+
+        # when several documents share a text, the last one wins, as in XMIProcessorFactory
+        expected = {v["plain_text_md5"]: k for k, v in DOCUMENT_DATA.items()}
+        self.assertEqual(expected, dict(store.id_for_md5))
+        self.assertEqual("NL-HaNA_1.04.02_1092_0041", store.id_for_md5[md5("text 1")])
+        self.assertIsNone(store.id_for_md5.get(md5("no such text")))
+        self.assertIsNone(store.id_for_md5.get("not an md5"))
+
+    def test_pickled_store_reopens_lazily(self):
+        write_document_data_store(DOCUMENT_DATA, self.directory, shards=4)
+        store = DocumentDataStore(self.directory)
+        store.by_id["NL-HaNA_1.04.02_1092_0001"]
+        self.assertTrue(store._maps)
+        unpickled = pickle.loads(pickle.dumps(store.by_id))
+        self.assertEqual({}, unpickled.store._maps)
+        self.assertEqual(DOCUMENT_DATA["NL-HaNA_1.04.02_1092_0001"], unpickled["NL-HaNA_1.04.02_1092_0001"])
+
+    def test_migration_replaces_the_store_and_notes_its_source(self):
+        json_path = f"{self.tmp_dir.name}/document_data.json"
+        with open(json_path, "wb") as f:
+            f.write(orjson.dumps(DOCUMENT_DATA))
+        write_document_data_store({"old": DOCUMENT_DATA["NL-HaNA_1.04.02_1092_0001"]}, self.directory)
+        migrate_document_data(json_path, self.directory, shards=2)
+        store = DocumentDataStore(self.directory)
+        self.assertNotIn("old", store.by_id)
+        self.assertEqual(50, len(store))
+        self.assertFalse(store.is_stale(json_path))
+        # a copy, with other timestamps but the same content, is not stale
+        os.utime(json_path, ns=(0, 0))
+        self.assertFalse(store.is_stale(json_path))
+        changed = dict(DOCUMENT_DATA, **{"NL-HaNA_1.04.02_1092_0001": DOCUMENT_DATA["NL-HaNA_1.04.02_1092_0002"]})
+        with open(json_path, "wb") as f:
+            f.write(orjson.dumps(changed))
+        self.assertTrue(store.is_stale(json_path))
+
+    def test_refuses_md5s_that_are_not_hex(self):
+        data = {"doc": dict(DOCUMENT_DATA["NL-HaNA_1.04.02_1092_0001"], plain_text_md5="not an md5")}
+        with self.assertRaisesRegex(ValueError, "doc: plain_text_md5 'not an md5' is not a hex md5"):
+            write_document_data_store(data, self.directory)
+        self.assertFalse(DocumentDataStore.exists(self.directory))
+
+    def test_stale_default_store_falls_back_to_the_json(self):
+        json_path = f"{self.tmp_dir.name}/document_data.json"
+        with open(json_path, "wb") as f:
+            f.write(orjson.dumps(DOCUMENT_DATA))
+        migrate_document_data(json_path, self.directory)
+        with mock.patch.multiple(nx, DOCUMENT_DATA_PATH=json_path, DOCUMENT_DATA_STORE_PATH=self.directory):
+            xpf = nx.XMIProcessorFactory("data/typesystem.xml", {}, {}, git_commit_id="test")
+            self.assertEqual(f"{self.directory}/manifest.json", xpf.document_data_path)
+
+            with open(json_path, "wb") as f:
+                f.write(orjson.dumps({"new": DOCUMENT_DATA["NL-HaNA_1.04.02_1092_0001"]}))
+            xpf = nx.XMIProcessorFactory("data/typesystem.xml", {}, {}, git_commit_id="test")
+            self.assertEqual(json_path, xpf.document_data_path)
+            self.assertEqual(["new"], list(xpf.document_data))
+
+    def test_xmi_processor_factory_reads_from_the_store(self):
+        write_document_data_store(DOCUMENT_DATA, self.directory, shards=4)
+        xpf = nx.XMIProcessorFactory("data/typesystem.xml", {}, rw.read_json(str(DATA_DIR / "eventmapping.json")),
+                                     git_commit_id="test", document_data_path=self.directory)
+        self.assertEqual(f"{self.directory}/manifest.json", xpf.document_data_path)
+        self.assertEqual("NL-HaNA_1.04.02_1092_0041", xpf.document_key_for_md5[md5("text 1")])
+
+        # a page put over a stored document hides its old text, and is forgotten again on eviction
+        new_data = {"plain_text_source": "urn:new", "plain_text_md5": md5("new text"), "text_intervals": []}
+        xpf.put_document_data("NL-HaNA_1.04.02_1092_0041", new_data)
+        self.assertIsNone(xpf.document_key_for_md5.get(md5("text 1")))
+        self.assertEqual("NL-HaNA_1.04.02_1092_0041", xpf.document_key_for_md5[md5("new text")])
+        xpf.evict_document_data("NL-HaNA_1.04.02_1092_0041")
+        self.assertIsNone(xpf.document_key_for_md5.get(md5("new text")))
+        self.assertEqual("NL-HaNA_1.04.02_1092_0041", xpf.document_key_for_md5[md5("text 1")])
+        self.assertEqual(DOCUMENT_DATA["NL-HaNA_1.04.02_1092_0041"],
+                         xpf.document_data["NL-HaNA_1.04.02_1092_0041"])
+
+
+if __name__ == '__main__':
+    unittest.main()
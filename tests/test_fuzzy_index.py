@@ -0,0 +1,49 @@
+import random
+import unittest
+
+from Levenshtein import distance
+
+from globalise_tools.fuzzy_index import FuzzyIndex
+
+
+def brute_force_closest(key: str, words: list[str], max_distance: int) -> str | None:
+    if key in words:
+        return key
+    best_match = None
+    best_distance = max_distance + 1
+    for k in words:
+        d = distance(key, k, score_cutoff=best_distance - 1)
+        if d < best_distance and d < min(len(key), len(k)):
+            best_match = k
+            best_distance = d
+    return best_match
+
+
+class FuzzyIndexTestCase(unittest.TestCase):
+    def test_closest_matches_brute_force(self):
+        rng = random.Random(3)
+        alphabet = "abdegiklmnorstu "
+        words = list(dict.fromkeys(
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(2000)))
+        index = FuzzyIndex(words)
+        queries = [w[:rng.randint(0, len(w))] + rng.choice(alphabet) + w[rng.randint(0, len(w)):] for w in
+                   rng.sample(words, 300)]
+        queries += ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 10))) for _ in range(300)]
+        for query in queries:
+            for max_distance in [1, 2, 4]:
+                self.assertEqual(brute_force_closest(query, words, max_distance), index.closest(query, max_distance),
+                                 f"{query!r} within {max_distance}")
+
+    def test_ties_go_to_the_first_added_word(self):
+        index = FuzzyIndex(["batavia", "batavie", "bataviaa"])
+        self.assertEqual("batavia", index.closest("batavix", 4))
+        self.assertEqual("batavia", index.closest("batavia", 4))
+
+    def test_short_words_do_not_match(self):
+        index = FuzzyIndex(["ab", "goa"])
+        self.assertIsNone(index.closest("xy", 4))
+        self.assertEqual("goa", index.closest("gao", 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
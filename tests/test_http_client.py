@@ -0,0 +1,135 @@
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from globalise_tools.http_client import HttpClient
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    /ok/<id>      : 200 with a json body
+    /flaky/<id>   : 503 for the first 2 requests, then 200
+    /down/<id>    : always 503
+    /missing/<id> : 404
+    /slow/<id>    : 200 after 50 ms
+    """
+    requests_per_path = Counter()
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = StandInHandler
+        with cls.lock:
+            cls.requests_per_path[self.path] += 1
+            count = cls.requests_per_path[self.path]
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            kind = self.path.split("/")[1]
+            if kind == "slow":
+                time.sleep(0.05)
+            if kind == "down" or (kind == "flaky" and count <= 2):
+                self._respond(503, b"unavailable")
+            elif kind == "missing":
+                self._respond(404, b"not found")
+            else:
+                self._respond(200, f'{{"path": "{self.path}", "count": {count}}}'.encode())
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _respond(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInHandler.requests_per_path.clear()
+        StandInHandler.max_in_flight = 0
+        self.client = HttpClient(max_connections=4, retries=3, backoff_factor=0.01)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_get_json(self):
+        self.assertEqual({"path": "/ok/1", "count": 1}, self.client.get_json(f"{self.base_url}/ok/1"))
+
+    def test_retries_on_5xx(self):
+        self.assertEqual({"path": "/flaky/1", "count": 3}, self.client.get_json(f"{self.base_url}/flaky/1"))
+
+    def test_gives_up_after_retries(self):
+        self.assertIsNone(self.client.get_json(f"{self.base_url}/down/1"))
+        self.assertEqual(4, StandInHandler.requests_per_path["/down/1"])
+
+    def test_missing_is_none_and_not_retried(self):
+        self.assertIsNone(self.client.get_json(f"{self.base_url}/missing/1"))
+        self.assertEqual(1, StandInHandler.requests_per_path["/missing/1"])
+
+    def test_map_is_bounded_and_ordered(self):
+        urls = [f"{self.base_url}/slow/{i}" for i in range(20)]
+        results = list(self.client.map(self.client.get_json, urls, max_workers=10))
+        self.assertEqual([f"/slow/{i}" for i in range(20)], [r["path"] for r in results])
+        self.assertLessEqual(StandInHandler.max_in_flight, 4)
+        self.assertGreater(StandInHandler.max_in_flight, 1)
+
+    def test_threads_have_their_own_session_on_one_pool(self):
+        barrier = threading.Barrier(4)
+
+        def session(_) -> requests.Session:
+            # all four threads take part
+            barrier.wait(timeout=5)
+            return self.client.session
+
+        sessions = list(self.client.map(session, range(8), max_workers=4))
+        self.assertEqual(4, len({id(s) for s in sessions}))
+        adapters = {id(s.get_adapter(self.base_url)) for s in sessions}
+        adapters.add(id(self.client.session.get_adapter(self.base_url)))
+        self.assertEqual(1, len(adapters))
+
+    def test_slot_bounds_requests_of_mounted_sessions(self):
+        def get_with_own_session(url: str) -> int:
+            with requests.Session() as session:
+                self.client.mount_on(session)
+                with self.client.slot():
+                    return session.get(url).status_code
+
+        urls = [f"{self.base_url}/slow/{i}" for i in range(12)]
+        self.assertEqual([200] * 12, list(self.client.map(get_with_own_session, urls, max_workers=8)))
+        self.assertLessEqual(StandInHandler.max_in_flight, 4)
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with HttpClient(cache_dir=cache_dir) as client:
+                first = client.get_json(f"{self.base_url}/ok/2")
+            with HttpClient(cache_dir=cache_dir) as client:
+                second = client.get_json(f"{self.base_url}/ok/2")
+                self.assertIsNone(client.get_json(f"{self.base_url}/missing/2"))
+        self.assertEqual(first, second)
+        self.assertEqual(1, StandInHandler.requests_per_path["/ok/2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+
+from globalise_tools.inventory_scheduler import (DONE, FAILED, InventoryScheduler, Stage, StageStateStore,
+                                                 estimate_sizes)
+
+# seconds of work per page
+PAGE_SECONDS = 0.001
+
+
+def skewed_sizes() -> dict[str, int]:
+    """30 inventories of 10 pages, with a huge one (150 pages) at the end of each batch of 10"""
+    return {str(1000 + i): 150 if i % 10 == 9 else 10 for i in range(30)}
+
+
+class FakeStages:
+    """annotate takes the page count of the inventory in time, upload a fixed time"""
+
+    def __init__(self, sizes: dict[str, int], failing: set[str] = frozenset()):
+        self.sizes = sizes
+        self.failing = set(failing)
+        self.runs = []
+        self.lock = threading.Lock()
+
+    def stages(self) -> list[Stage]:
+        return [Stage("annotate", self.annotate), Stage("upload", self.upload, max_concurrent=1)]
+
+    def annotate(self, inventory_number: str) -> None:
+        self._record("annotate", inventory_number)
+        if inventory_number in self.failing:
+            raise Exception("no xmi")
+        time.sleep(self.sizes[inventory_number] * PAGE_SECONDS)
+
+    def upload(self, inventory_number: str) -> None:
+        self._record("upload", inventory_number)
+        time.sleep(PAGE_SECONDS)
+
+    def _record(self, stage: str, inventory_number: str) -> None:
+        with self.lock:
+            self.runs.append((stage, inventory_number))
+
+
+class InventorySchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.state_path = f"{self.tmp_dir.name}/schedule.sqlite"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_longest_first_reduces_the_makespan_of_fixed_batches(self):
+        sizes = skewed_sizes()
+        inventories = list(sizes)
+
+        # what the shell drivers do: make --jobs 3 on batches of 10 inventories, in inventory number order
+        batched = 0.0
+        with StageStateStore(f"{self.tmp_dir.name}/batched.sqlite") as state:
+            scheduler = InventoryScheduler(FakeStages(sizes).stages(), state, workers=3)
+            for i in range(0, len(inventories), 10):
+                batch = {inv: sizes[inv] for inv in inventories[i:i + 10]}
+                batched += scheduler.run(batch, longest_first=False).makespan
+
+        with StageStateStore(self.state_path) as state:
+            scheduler = InventoryScheduler(FakeStages(sizes).stages(), state, workers=3)
+            result = scheduler.run(sizes)
+        self.assertEqual(30, len(result.completed))
+        self.assertEqual(["1029", "1019", "1009"], sorted(result.completed[:3], reverse=True))
+        # batched: 3 x (the huge inventory after 3 rounds of small ones) ~ 3 x 0.18s;
+        # longest first: the huge ones in parallel, the small ones in the gaps ~ 0.24s
+        self.assertLess(result.makespan, 0.7 * batched)
+
+    def test_resumes_from_the_stored_state(self):
+        sizes = {"1001": 1, "1002": 2, "1003": 3}
+        stages = FakeStages(sizes, failing={"1002"})
+        with StageStateStore(self.state_path) as state:
+            done = []
+            result = InventoryScheduler(stages.stages(), state, workers=2).run(
+                sizes, on_inventory_done=lambda inv, n, total: done.append((n, total)))
+            self.assertEqual({"1002": "annotate: no xmi"}, result.failed)
+            self.assertEqual([(1, 3), (2, 3), (3, 3)], done)
+            self.assertEqual({("annotate", DONE): 2, ("annotate", FAILED): 1, ("upload", DONE): 2}, state.counts())
+
+        stages.failing.clear()
+        stages.runs.clear()
+        with StageStateStore(self.state_path) as state:
+            result = InventoryScheduler(stages.stages(), state, workers=2).run(sizes)
+            self.assertEqual(["1001", "1002", "1003"], sorted(result.completed))
+            self.assertEqual([("annotate", "1002"), ("upload", "1002")], stages.runs)
+            self.assertEqual({("annotate", DONE): 3, ("upload", DONE): 3}, state.counts())
+
+    def test_estimate_sizes_from_manifests(self):
+        with open(f"{self.tmp_dir.name}/1001.json", "w") as f:
+            json.dump({"items": [{"id": "c1"}, {"id": "c2"}]}, f)
+        with open(f"{self.tmp_dir.name}/1002.json", "w") as f:
+            json.dump({"items": [{"id": "c1"}]}, f)
+        self.assertEqual({"1001": 2, "1002": 1, "1003": 2}, estimate_sizes(["1001", "1002", "1003"], self.tmp_dir.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import json
+import socket
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from pyld import jsonld
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from globalise_tools.jsonld_contexts import ContextRegistry, register_document_loader
+
+ENTITY_ANNOTATION = {
+    "@context": [
+        "https://linked.art/ns/v1/linked-art.json",
+        "https://ns.huc.knaw.nl/globalise.jsonld",
+        "http://www.w3.org/ns/anno.jsonld",
+        {"iiif": "http://iiif.io/api/presentation/3#"}
+    ],
+    "id": "urn:anno:1",
+    "type": "Annotation",
+    "motivation": "classifying",
+    "body": {"id": "urn:body:1", "type": "SpecificResource", "source": "urn:person:1"},
+    "target": [
+        {"source": "urn:text:1", "type": "Text",
+         "selector": {"type": "TextPositionSelector", "start": 10, "end": 20}},
+        {"source": "https://service.archief.nl/iip/scan.jpg/full/max/0/default.jpg", "type": "Image"}
+    ]
+}
+
+
+class ContextServer:
+    """serves {"@context": {...}} documents on localhost, and counts the requests"""
+
+    def __init__(self, contexts: dict[str, dict]) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps({"@context": contexts[self.path]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/ld+json")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def refuse_connection(*args, **kwargs):
+    raise OSError("network access is disabled in this test")
+
+
+class ContextRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.original_loader = jsonld.get_document_loader()
+        jsonld._resolved_context_cache.clear()
+
+    def tearDown(self):
+        jsonld.set_document_loader(self.original_loader)
+
+    def test_converts_annotations_without_network(self):
+        with mock.patch.object(socket.socket, "connect", refuse_connection):
+            registry = register_document_loader(ContextRegistry(allow_remote=False))
+            quads = jsonld.to_rdf(ENTITY_ANNOTATION, {"format": "application/n-quads"})
+            graph = Graph().parse(data=json.dumps(registry.inline_contexts(ENTITY_ANNOTATION)), format="json-ld")
+        self.assertIn("<urn:anno:1> <http://www.w3.org/ns/oa#hasBody> <urn:body:1>", quads)
+        self.assertIn('"10"^^<http://www.w3.org/2001/XMLSchema#nonNegativeInteger>', quads)
+        self.assertTrue(isomorphic(Graph().parse(data=quads, format="nquads"), graph))
+
+    def test_image_api_selectors_convert_without_network(self):
+        selector = {"@context": "http://iiif.io/api/annex/openannotation/context.json",
+                    "@id": "urn:selector:1", "@type": "iiif:ImageApiSelector", "region": "1,2,3,4"}
+        with mock.patch.object(socket.socket, "connect", refuse_connection):
+            register_document_loader(ContextRegistry(allow_remote=False))
+            quads = jsonld.to_rdf(selector, {"format": "application/n-quads"})
+        self.assertIn("<urn:selector:1> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+                      " <http://iiif.io/api/annex/openannotation/#ImageApiSelector>", quads)
+        self.assertIn('<http://iiif.io/api/annex/openannotation/#region> "1,2,3,4"', quads)
+
+    def test_resolves_http_and_https_variants_and_fragments(self):
+        registry = ContextRegistry(allow_remote=False)
+        anno = registry.get("http://www.w3.org/ns/anno.jsonld")
+        self.assertIs(anno, registry.get("https://www.w3.org/ns/anno.jsonld"))
+        self.assertIs(anno, registry.get("http://www.w3.org/ns/anno.jsonld#"))
+
+    def test_unknown_context_without_remote_access(self):
+        register_document_loader(ContextRegistry(allow_remote=False))
+        with self.assertRaises(jsonld.JsonLdError):
+            jsonld.expand({"@context": "http://example.org/unknown.jsonld", "@id": "urn:x"})
+
+    def test_fetched_contexts_are_cached_on_disk(self):
+        server = ContextServer({"/ctx.json": {"name": "http://schema.org/name"}})
+        url = f"{server.url}/ctx.json"
+        try:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                registry = ContextRegistry(cache_dir=cache_dir)
+                registry.get(url)
+                registry.get(url)
+                self.assertEqual(1, server.requests)
+                self.assertEqual(1, registry.remote_fetches)
+                offline = register_document_loader(ContextRegistry(cache_dir=cache_dir, allow_remote=False))
+                expanded = jsonld.expand({"@context": url, "@id": "urn:x", "name": "y"})
+                self.assertEqual([{"@id": "urn:x", "http://schema.org/name": [{"@value": "y"}]}], expanded)
+                self.assertEqual(0, offline.remote_fetches)
+                self.assertEqual(1, server.requests)
+        finally:
+            server.close()
+
+    def test_least_recently_used_contexts_are_evicted(self):
+        registry = ContextRegistry(allow_remote=False, max_in_memory=2)
+        anno = registry.get("http://www.w3.org/ns/anno.jsonld")
+        linked_art = registry.get("https://linked.art/ns/v1/linked-art.json")
+        self.assertIs(anno, registry.get("http://www.w3.org/ns/anno.jsonld"))
+        registry.get("https://ns.huc.knaw.nl/globalise.jsonld")
+        self.assertIs(anno, registry.get("http://www.w3.org/ns/anno.jsonld"))
+        self.assertIsNot(linked_art, registry.get("https://linked.art/ns/v1/linked-art.json"))
+
+
+if __name__ == '__main__':
+    unittest.main()
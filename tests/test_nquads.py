@@ -0,0 +1,143 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pagexml.parser import parse_pagexml_file
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+import globalise_tools.tools as gt
+from globalise_tools.jsonld_contexts import ContextRegistry
+from globalise_tools.nquads import GLOBALISE_NS, JsonLdContext, NQuadsEmitter, NQuadsWriter
+from tests.test_jsonld_contexts import ENTITY_ANNOTATION
+
+PAGE_IDS = ["NL-HaNA_1.04.02_1092_0017", "NL-HaNA_1.04.02_1092_0018"]
+ANNO_CONTEXT_URL = "http://www.w3.org/ns/anno.jsonld"
+# a stand-in for the context of WebAnnotationFactory, which is not packaged
+TEAM_TEXT_CONTEXT = {"@context": [ANNO_CONTEXT_URL, {
+    "tt": "https://knaw-huc.github.io/ns/team-text#",
+    "Canvas": "http://iiif.io/api/presentation/3#Canvas",
+}]}
+
+
+def offline_registry(cache_dir: str) -> ContextRegistry:
+    registry = ContextRegistry(cache_dir=cache_dir, allow_remote=False)
+    with open(registry._cache_path(gt.WebAnnotationFactory.ANNO_CONTEXT), "w") as f:
+        json.dump(TEAM_TEXT_CONTEXT, f)
+    return registry
+
+
+def fixture_web_annotations(tmp_dir: str) -> list[dict]:
+    mapping_path = os.path.join(tmp_dir, "iiif-url-mapping.csv")
+    with open(mapping_path, "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(["pagexml_id", "iiif_base_url"])
+        writer.writerows([[p, f"https://service.archief.nl/iip/{p}"] for p in PAGE_IDS])
+    factory = gt.WebAnnotationFactory(mapping_path, "https://textrepo.example.org")
+    annotations = []
+    for page_id in PAGE_IDS:
+        scan_doc = parse_pagexml_file(f"tests/data/pagexml/{page_id}.xml")
+        prefix = gt.make_id_prefix(scan_doc)
+        for i, tr in enumerate(scan_doc.get_text_regions_in_reading_order()):
+            text_region = gt.PXTextRegion(id=tr.id, page_id=page_id, coords=tr.coords, first_line_id=None,
+                                          last_line_id=None, first_word_id=None, last_word_id=None,
+                                          segment_length=0, structure_type=tr.type[-1], text=tr.text or "")
+            span = gt.TextSpan(begin_anchor=i, end_anchor=i + 2, char_start=1, char_end_exclusive=4,
+                               textrepo_version_id="v1")
+            annotations.append(gt.text_region_annotation(text_region, prefix, span, span))
+            for j, line in enumerate([line for line in tr.lines if line.text]):
+                text_line = gt.PXTextLine(id=line.id, text_region_id=tr.id, page_id=page_id, coords=line.coords,
+                                          first_word_id=None, last_word_id=None, text=line.text)
+                span = gt.TextSpan(begin_anchor=j, end_anchor=j, textrepo_version_id="v2")
+                annotations.append(gt.text_line_annotation(text_line, prefix, span, span))
+        annotations.append(gt.Annotation(type=gt.PAGE_TYPE, id=prefix, page_id=page_id,
+                                         metadata={"document": page_id, "n": page_id[-4:]}))
+    return [gt.to_web_annotation(a, factory).wrapped() for a in annotations]
+
+
+def rdflib_graph(documents: list[dict], registry: ContextRegistry) -> Graph:
+    graph = Graph()
+    for d in documents:
+        graph.parse(data=json.dumps(registry.inline_contexts(d)), format="json-ld", base=GLOBALISE_NS)
+    return graph
+
+
+class NQuadsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.registry = offline_registry(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_matches_rdflib(self, documents: list[dict]):
+        emitter = NQuadsEmitter(JsonLdContext(registry=self.registry))
+        quads = [q for d in documents for q in emitter.quads(d)]
+        expected = rdflib_graph(documents, self.registry)
+        self.assertTrue(isomorphic(expected, Graph().parse(data="".join(quads), format="nt")))
+
+    def test_fixture_annotations_match_rdflib(self):
+        annotations = fixture_web_annotations(self.tmp_dir.name)
+        self.assert_matches_rdflib(annotations)
+        quads = "".join(NQuadsEmitter(JsonLdContext(registry=self.registry)).quads(annotations))
+        self.assertIn('<http://iiif.io/api/annex/openannotation/#ImageApiSelector>', quads)
+        self.assertIn('<http://iiif.io/api/annex/openannotation/#region> "', quads)
+
+    def test_json_ld_features_match_rdflib(self):
+        document = {
+            "@context": [ANNO_CONTEXT_URL, {
+                "ex": "http://example.org/",
+                "wasDerivedFrom": {"@id": "http://www.w3.org/ns/prov#wasDerivedFrom", "@type": "@id"},
+                "langs": {"@id": "ex:langs", "@container": "@list"},
+            }],
+            "id": "urn:a",
+            "type": ["Annotation", "ex:Extra"],
+            "motivation": "tagging",
+            "ex:score": [1.5, 2, True],
+            "langs": ["nl", "en"],
+            "items": [{"id": "urn:i1"}, {"id": "urn:i2", "label": "x"}],
+            "body": {"id": "_:b0", "type": "ex:Event", "wasDerivedFrom": "urn:x", "label": None,
+                     "ex:note": {"@value": "hallo", "@language": "nl"},
+                     "value": "tab\there \"quoted\" back\\slash\nnew line é"},
+            "target": [{"id": "_:b0"}, "urn:t", {"source": "urn:s", "start": 3, "end": 4, "created": "2024-01-01"}],
+            "undefinedTerm": "dropped",
+        }
+        self.assert_matches_rdflib([document])
+
+    def test_writer_skips_duplicate_quads(self):
+        document = {"@context": ANNO_CONTEXT_URL, "id": "urn:a", "type": "Annotation", "bodyValue": "x"}
+        path = os.path.join(self.tmp_dir.name, "out.nq.gz")
+        with NQuadsWriter(path, registry=self.registry) as writer:
+            self.assertEqual(2, writer.write_all([document, document]))
+        with gzip.open(path, "rt") as f:
+            lines = f.readlines()
+        self.assertEqual(2, writer.duplicates_skipped)
+        self.assertEqual(['<urn:a> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/ns/oa#Annotation> .\n',
+                          '<urn:a> <http://www.w3.org/ns/oa#bodyValue> "x" .\n'], lines)
+
+    def test_unsupported_features_are_converted_by_pyld(self):
+        language_map = {"@context": {"label": {"@id": "http://example.org/label", "@container": "@language"}},
+                        "@id": "urn:a", "label": {"nl": "x", "en": "y"}}
+        # the linked-art context has scoped contexts
+        self.assert_matches_rdflib([language_map, ENTITY_ANNOTATION, language_map])
+
+    def test_other_errors_are_not_converted_by_pyld(self):
+        emitter = NQuadsEmitter(JsonLdContext(registry=self.registry))
+        with mock.patch.object(JsonLdContext, "_processed", side_effect=NotImplementedError("a bug")), \
+                mock.patch.object(emitter, "_processor_quads") as processor_quads:
+            with self.assertRaises(NotImplementedError):
+                emitter.quads({"@context": {"label": "http://example.org/label"}, "@id": "urn:a", "label": "x"})
+        processor_quads.assert_not_called()
+
+    def test_unknown_remote_contexts_are_refused(self):
+        with self.assertRaises(LookupError):
+            NQuadsEmitter(JsonLdContext(registry=self.registry)).quads(
+                {"@context": "http://example.org/unknown.jsonld", "@id": "urn:a", "label": "x"})
+
+
+if __name__ == '__main__':
+    unittest.main()
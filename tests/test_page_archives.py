@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+import orjson
+
+from globalise_tools.page_archives import (DirectoryPageSource, PageFormat, PageSink, PageSource, open_page_sink,
+                                           open_page_source, page_archive_path)
+from globalise_tools.url_factory import AnnotationPageType
+from scripts.gt_make_inventory_index import PageStore
+
+PAGES = {
+    (AnnotationPageType.TRANSCRIPTIONS, "NL-HaNA_1.04.02_1092_0017"): {
+        "items": [{"id": "x#page-normalized", "body": [{"value": "Het schip\nde Hoop"}]}]},
+    (AnnotationPageType.TRANSCRIPTIONS, "NL-HaNA_1.04.02_1092_0018"): {
+        "items": [{"id": "y#page-normalized", "body": [{"value": "kwam aan"}]}]},
+    (AnnotationPageType.ENTITIES, "NL-HaNA_1.04.02_1092_0017"): {"items": [{"id": "e1", "body": []}]},
+}
+
+
+class PageArchivesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_pages(self, page_format: PageFormat) -> str:
+        with open_page_sink(self.output_dir, "1092", page_format) as sink:
+            for (page_type, page_id), page in PAGES.items():
+                sink.write(page_type, page_id, orjson.dumps(page))
+        self.assertEqual(3, sink.pages_written)
+        return page_archive_path(self.output_dir, "1092", page_format)
+
+    def test_every_format_returns_the_pages_written(self):
+        for page_format in PageFormat:
+            with self.subTest(page_format=page_format):
+                path = self.write_pages(page_format)
+                with open_page_source(path) as source:
+                    for (page_type, page_id), page in PAGES.items():
+                        self.assertEqual(page, source.read_json(page_type, page_id))
+                    self.assertIsNone(source.read(AnnotationPageType.ENTITIES, "NL-HaNA_1.04.02_1092_0018"))
+
+    def test_archive_layout(self):
+        self.assertEqual(self.output_dir, self.write_pages(PageFormat.DIRECTORY))
+        self.assertTrue(os.path.exists(f"{self.output_dir}/entities/NL-HaNA_1.04.02_1092_0017.json"))
+        path = self.write_pages(PageFormat.JSONL)
+        self.assertEqual(f"{self.output_dir}/1092-annotation-lists.jsonl", path)
+        with open(path, "rb") as f:
+            self.assertEqual([PAGES[k] for k in PAGES], [orjson.loads(line) for line in f])
+        self.assertIsInstance(open_page_source(f"{self.output_dir}/missing"), DirectoryPageSource)
+
+    def test_page_store_reads_from_an_archive(self):
+        with open_page_source(self.write_pages(PageFormat.ZIP)) as source:
+            page_store = PageStore("1092", source)
+            self.assertEqual("kwam aan", page_store.page_text("NL-HaNA_1.04.02_1092_0018").text)
+            self.assertEqual([{"id": "e1", "body": []}], page_store.entity_annotations("NL-HaNA_1.04.02_1092_0017"))
+
+    def test_sinks_and_sources_must_implement_write_and_read(self):
+        class NoWriteSink(PageSink):
+            pass
+
+        class NoReadSource(PageSource):
+            pass
+
+        for cls in (PageSink, PageSource, NoWriteSink, NoReadSource):
+            with self.assertRaises(TypeError):
+                cls(self.tmp_dir.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
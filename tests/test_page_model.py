@@ -0,0 +1,48 @@
+import unittest
+from pathlib import Path
+
+import pagexml.parser as px
+
+import globalise_tools.page_model as pm
+import globalise_tools.tools as gt
+from globalise_tools.pagexml_tools import TranscriptionAnnotationPageBuilder
+
+PAGEXML_PATH = Path(__file__).parent / "data" / "pagexml" / "NL-HaNA_1.04.02_1092_0017.xml"
+
+
+class PageModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.page = pm.read_page_xml(PAGEXML_PATH)
+
+    def test_page_structure(self):
+        self.assertEqual("NL-HaNA_1.04.02_1092_0017.jpg", self.page.image_filename)
+        self.assertEqual(4000, self.page.image_width)
+        self.assertEqual(3000, self.page.image_height)
+        self.assertEqual(6, len(self.page.regions))
+        region = self.page.regions[0]
+        self.assertEqual("paragraph", region.structure_type)
+        self.assertEqual("Edele Hoog Agtbare Heeren Mijne Heeren„", region.lines[0].text)
+        self.assertEqual("Edele", region.lines[0].words[0].text)
+        self.assertEqual([(300, 100), (400, 100), (400, 140), (300, 140)], region.lines[0].words[0].coords.points)
+
+    def test_reading_order(self):
+        region_ids = [r.id for r in self.page.get_text_regions_in_reading_order()]
+        self.assertEqual(["r_marg", "r_header", "r_para1", "r_para2", "r_sig", "r_pnum"], region_ids)
+
+    def test_paragraph_text_matches_pagexml_tools(self):
+        scan_doc = px.parse_pagexml_file(str(PAGEXML_PATH))
+        expected = gt.extract_paragraph_text(scan_doc, iiif_base_uri="iiif", canvas_id="canvas")
+        actual = gt.extract_paragraph_text(self.page, iiif_base_uri="iiif", canvas_id="canvas")
+        self.assertEqual(expected[:4], actual[:4])
+        self.assertEqual(sorted(expected[4]), sorted(actual[4]))
+
+    def test_builder_accepts_page_model(self):
+        xml_string = PAGEXML_PATH.read_text(encoding="utf-8")
+        from_string = TranscriptionAnnotationPageBuilder(xml_string=xml_string, commit_id="test")
+        from_model = TranscriptionAnnotationPageBuilder(page=self.page, commit_id="test")
+        self.assertEqual(from_string.htr_word_offsets, from_model.htr_word_offsets)
+        self.assertEqual(len(from_string.build()["items"]), len(from_model.build()["items"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
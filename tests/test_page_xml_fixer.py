@@ -0,0 +1,108 @@
+import glob
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from lxml import etree
+
+import globalise_tools.provenance as provenance
+from globalise_tools.page_xml_fixer import PageXmlFixer, fix_pagexml_files
+
+DATA_DIR = Path(__file__).parent / "data" / "page_xml_fixer"
+SCRIPT = "gt_fix_reading_order2.py"
+
+
+def _canonical(path: str) -> str:
+    """the file in canonical XML, without indentation and with a fixed LastChange"""
+    tree = etree.parse(path, etree.XMLParser(remove_blank_text=True))
+    for last_change in tree.iter("{*}LastChange"):
+        last_change.text = "LAST_CHANGE"
+    return etree.canonicalize(etree.tostring(tree, encoding="unicode"), strip_text=True)
+
+
+class PageXmlFixerTestCase(unittest.TestCase):
+    def setUp(self):
+        provenance.start_run(commit_id="0123abc", timestamp="2024-01-01T00:00:00")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_directory = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_output_is_semantically_equal_to_the_xmltodict_minidom_fixer(self):
+        # the expected files were written by the fixer that parsed with pagexml-tools and pretty-printed with minidom
+        for import_path in sorted(glob.glob(f"{DATA_DIR}/in/*.xml")):
+            PageXmlFixer(import_path, self.output_directory, "", SCRIPT).fix()
+        expected_files = sorted(os.listdir(DATA_DIR / "expected"))
+        self.assertEqual(expected_files, sorted(os.listdir(self.output_directory)))
+        for file in expected_files:
+            self.assertEqual(_canonical(f"{DATA_DIR}/expected/{file}"), _canonical(f"{self.output_directory}/{file}"),
+                             file)
+
+    def test_error_codes(self):
+        def error_codes(file: str) -> set[str]:
+            return PageXmlFixer(f"{DATA_DIR}/in/{file}", self.output_directory, "", SCRIPT).fix()
+
+        self.assertEqual({"3.1.2", "3.2"}, error_codes("NL-HaNA_1.04.02_1092_0017.xml"))
+        self.assertEqual({"3.1.1"}, error_codes("NL-HaNA_1.04.02_1092_0017_portrait.xml"))
+        self.assertEqual(set(), error_codes("NL-HaNA_1.04.02_1092_0018.xml"))
+        self.assertEqual({"3.2"}, error_codes("NL-HaNA_1.04.02_1092_0019.xml"))
+
+    def test_parallel_driver_writes_the_same_files_and_a_manifest(self):
+        paths = sorted(glob.glob(f"{DATA_DIR}/in/*.xml")) + [f"{DATA_DIR}/in/missing.xml"]
+        sequential_dir = f"{self.output_directory}/sequential"
+        parallel_dir = f"{self.output_directory}/parallel"
+        sequential = fix_pagexml_files(paths, sequential_dir, SCRIPT)
+        parallel = fix_pagexml_files(paths, parallel_dir, SCRIPT, workers=2)
+
+        self.assertEqual(["fixed", "fixed", "unchanged", "fixed", "missing"], [r["status"] for r in parallel])
+        self.assertEqual([r["error_codes"] for r in sequential], [r["error_codes"] for r in parallel])
+        for file in os.listdir(DATA_DIR / "expected"):
+            self.assertEqual(_canonical(f"{sequential_dir}/{file}"), _canonical(f"{parallel_dir}/{file}"))
+        with open(f"{parallel_dir}/reading-order-fixes.tsv") as f:
+            manifest = [line.rstrip("\n").split("\t") for line in f]
+        self.assertEqual(["pagexml_path", "status", "error_codes", "export_path", "message"], manifest[0])
+        self.assertEqual([paths[0], "fixed", "3.1.2,3.2", f"{parallel_dir}/NL-HaNA_1.04.02_1092_0017.xml", ""],
+                         manifest[1])
+        self.assertFalse(os.path.exists(f"{parallel_dir}/reading-order-fixes.tsv.journal.jsonl"))
+
+    def test_interrupted_run_is_resumed(self):
+        paths = sorted(glob.glob(f"{DATA_DIR}/in/*.xml"))
+        first_run = fix_pagexml_files(paths[:2], self.output_directory, SCRIPT)
+        # an unfinished run leaves its journal, instead of the manifest
+        manifest_path = f"{self.output_directory}/reading-order-fixes.tsv"
+        os.remove(manifest_path)
+        with open(f"{manifest_path}.journal.jsonl", "w") as journal:
+            journal.writelines(json.dumps(record) + "\n" for record in first_run)
+
+        records = fix_pagexml_files(paths, self.output_directory, SCRIPT)
+        self.assertEqual(first_run, records[:2])
+        self.assertEqual(paths, [r["pagexml_path"] for r in records])
+        self.assertTrue(os.path.exists(manifest_path))
+
+    def test_failed_files_are_retried_on_resume(self):
+        paths = sorted(glob.glob(f"{DATA_DIR}/in/*.xml"))
+        manifest_path = f"{self.output_directory}/reading-order-fixes.tsv"
+        # a run that failed on the first file (say the disk was full), and was interrupted after the second one
+        failed = {"pagexml_path": paths[0], "status": "failed", "error_codes": "", "export_path": "",
+                  "message": "No space left on device"}
+        unchanged = fix_pagexml_files(paths[2:3], self.output_directory, SCRIPT)[0]
+        os.remove(manifest_path)
+        with open(f"{manifest_path}.journal.jsonl", "w") as journal:
+            journal.writelines(json.dumps(record) + "\n" for record in [failed, unchanged])
+
+        records = fix_pagexml_files(paths, self.output_directory, SCRIPT)
+        self.assertEqual(paths[0], records[0]["pagexml_path"])
+        self.assertEqual("fixed", records[0]["status"])
+        self.assertEqual(unchanged, records[1])
+        self.assertEqual(sorted(paths), sorted(r["pagexml_path"] for r in records))
+        with open(manifest_path) as f:
+            rows = [line.rstrip("\n").split("\t") for line in f][1:]
+        self.assertEqual(len(paths), len(rows))
+        self.assertEqual([paths[0], "fixed"], rows[0][:2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+import spacy
+
+from globalise_tools.tokenization import Sentence, Token, Tokenizer
+
+
+class TokenizerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tokenizer = Tokenizer(spacy.blank("nl"), batch_size=2)
+
+    def test_sentence_and_token_offsets(self):
+        text = "Het schip is aangekomen. De lading\nwas goed."
+        sentences = self.tokenizer.tokenize_text(text)
+        self.assertEqual([(0, 24), (25, len(text))], [(s.begin, s.end) for s in sentences])
+        self.assertEqual(Token("schip", "schip ", 4), sentences[0].tokens[1])
+        self.assertNotIn("\n", [t.text for s in sentences for t in s.tokens])
+        for token in [t for s in sentences for t in s.tokens]:
+            self.assertEqual(token.text, text[token.begin:token.end])
+
+    def test_batches_give_the_same_result_as_single_texts(self):
+        texts = [f"Brief nummer {i}. Aan de heren XVII." for i in range(7)] + ["", "één"]
+        batched = list(self.tokenizer.tokenize(texts))
+        self.assertEqual([self.tokenizer.tokenize_text(t) for t in texts], batched)
+        self.assertEqual([], batched[7])
+        self.assertEqual([Sentence(0, 3, [Token("één", "één", 0)])], batched[8])
+
+    def test_context_is_kept_with_its_text(self):
+        items = [("Eerste pagina.", "p1"), ("Tweede pagina.", "p2")]
+        results = list(self.tokenizer.tokenize_with_context(items))
+        self.assertEqual(["p1", "p2"], [context for _, context in results])
+        self.assertEqual("Tweede", results[1][0][0].tokens[0].text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,32 @@
 import json
+import os
+import tempfile
 import unittest
 
-from globalise_tools.webanno_tsv_reader import read_webanno_tsv, _split_dict
+from benchmarks.bench_webanno_tsv_reader import read_webanno_tsv_eagerly
+from globalise_tools.events import NAMED_ENTITY_LAYER_NAME
+from globalise_tools.webanno_tsv_reader import (Annotation, Sentence, Token, WebAnnoTsvParser, _split_dict,
+                                                iter_webanno_tsv, read_webanno_tsv)
+
+EXPORT = """#FORMAT=WebAnno TSV 3.3
+#T_SP=de.tudarmstadt.ukp.dkpro.core.api.ner.type.NamedEntity|identifier|value
+#T_SP=webanno.custom.SemPredGLOB|ROLE_webanno.custom.SemPredGLOB:Argument_webanno.custom.SemPredGLOBArgumentLink|webanno.custom.SemArgGLOB|category
+#T_SP=webanno.custom.SemArgGLOB|
+
+
+#Text=Het schip \\[de Hoop\\] kwam
+#Text=aan
+1-1	0-3	Het	_	_	_	_	_	_	
+1-2	4-9	schip	_	_	agent;location	1-3[8];1-6	Arriving	_	
+1-3	10-13	\\[de	*[7]	SHIP[7]	_	_	_	*[8]	
+1-4	14-19	Hoop\\]	*[7]	SHIP[7]	_	_	_	*[8]	
+1-5	20-24	kwam	*|*	PER|LOC	_	_	_	_	
+1-6	25-28	aan	_	_	_	_	_	*	
+
+#Text=f 1\\_2
+2-1	29-30	f	_	_	_	_	_	_	
+2-2	31-34	1\\_2	*	CMTY\\;	_	_	_	_	
+"""
 
 
 class MyEncoder(json.JSONEncoder):
@@ -46,5 +71,77 @@ class WebAnnoTsvReaderCase(unittest.TestCase):
         self.assertListEqual(expected, result)
 
 
+class WebAnnoTsvParserCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "export.tsv")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(EXPORT)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_items_are_yielded_in_file_order(self):
+        items = list(iter_webanno_tsv(self.path))
+        self.assertEqual(Sentence(idx=1, text="Het schip \\[de Hoop\\] kwam\faan"), items[0])
+        self.assertEqual([Token, Token, Annotation, Token, Annotation, Annotation, Token, Token, Annotation,
+                          Annotation, Token, Annotation, Sentence, Token, Token, Annotation],
+                         [type(i) for i in items[1:]])
+
+    def test_document_matches_the_eager_reader(self):
+        doc = read_webanno_tsv(self.path)
+        eager_doc = read_webanno_tsv_eagerly(self.path)
+        self.assertEqual(eager_doc.format, doc.format)
+        self.assertEqual(eager_doc.layers, doc.layers)
+        self.assertEqual(eager_doc.sentences, doc.sentences)
+        self.assertEqual(eager_doc.tokens, doc.tokens)
+        self.assertEqual([_as_tuple(a) for a in eager_doc.annotations], [_as_tuple(a) for a in doc.annotations])
+
+    def test_annotations_and_links(self):
+        doc = read_webanno_tsv(self.path)
+        event = doc.get_annotation_by_id("1-2")
+        self.assertEqual({"category": "Arriving"}, event.features)
+        arguments = [(al.label, doc.get_annotation_by_id(al.annotation_id).text) for al in event.linked_annotations]
+        self.assertEqual([("agent", "[de Hoop]"), ("location", "aan")], arguments)
+        ship = doc.get_annotation_by_id("1-3[7]")
+        self.assertEqual(("[de Hoop]", {"value": "SHIP"}, 7), (ship.text, ship.features, ship.label_id))
+        self.assertEqual(["PER", "LOC"], [a.features["value"] for a in doc.annotations if a.text == "kwam"])
+        self.assertEqual(("1_2", {"value": "CMTY;"}), (doc.tokens[-1].text, doc.annotations[-1].features))
+
+    def test_parser_indexes_while_parsing(self):
+        parser = WebAnnoTsvParser(index_annotations=True)
+        with open(self.path, encoding="utf-8") as f:
+            items = parser.parse(f)
+            next(i for i in items if isinstance(i, Annotation) and i.id == "1-3[7]")
+            self.assertEqual("WebAnno TSV 3.3", parser.format)
+            self.assertEqual(3, len(parser.layers))
+            self.assertEqual(["1-2", "1-3[7]", "1-3[8]"], list(parser.annotation_idx))
+            self.assertEqual(["[de"], parser.annotation_idx["1-3[7]"].token_texts)
+            list(items)
+        self.assertEqual(["[de", "Hoop]"], parser.annotation_idx["1-3[7]"].token_texts)
+        self.assertEqual(6, len(parser.annotation_idx))
+
+    def test_parser_forgets_closed_annotations(self):
+        parser = WebAnnoTsvParser()
+        with open(self.path, encoding="utf-8") as f:
+            items = parser.parse(f)
+            next(i for i in items if isinstance(i, Token) and i.text == "Hoop]")
+            self.assertEqual([f"{NAMED_ENTITY_LAYER_NAME}/7", "webanno.custom.SemArgGLOB/8"],
+                             list(parser._multi_token_annotations))
+            next(i for i in items if isinstance(i, Token) and i.text == "kwam")
+            self.assertEqual({}, parser._multi_token_annotations)
+            list(items)
+        self.assertEqual({}, parser.annotation_idx)
+
+    def test_escaped_backslashes_are_unescaped_once(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(EXPORT.replace("1\\_2", "1\\\\\\_2"))
+        self.assertEqual("1\\_2", read_webanno_tsv(self.path).tokens[-1].text)
+
+
+def _as_tuple(a: Annotation) -> tuple:
+    return a.id, a.layer, a.features, a.label_id, a.tokens, a.linked_annotations
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+import pickle
+import random
+import unittest
+
+from intervaltree import IntervalTree
+
+from globalise_tools.word_span_index import WordSpanIndex
+
+
+def word_data(n: int) -> dict:
+    return {
+        "word_id": f"w{n}",
+        "iiif_base_uri": "https://iiif.example.org/image",
+        "canvas_id": "https://example.org/canvas/1",
+        "coords": [(n, 10), (n + 5, 10), (n + 5, 20), (n, 20)]
+    }
+
+
+class WordSpanIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(42)
+        self.intervals = []
+        offset = 0
+        for n in range(500):
+            offset += rng.randint(0, 3)
+            length = rng.randint(1, 12)
+            self.intervals.append((offset, offset + length, word_data(n)))
+            offset += length
+        self.itree = IntervalTree.from_tuples(self.intervals)
+        self.index = WordSpanIndex()
+        for begin, end, data in self.intervals:
+            self.index.add(begin, end, data["word_id"], data["iiif_base_uri"], data["canvas_id"], data["coords"])
+
+    def assert_same_overlap(self, index: WordSpanIndex, begin: int, end: int):
+        expected = [(iv.begin, iv.end, iv.data) for iv in sorted(self.itree[begin:end])]
+        self.assertEqual(expected, [tuple(s) for s in index[begin:end]])
+
+    def test_overlap_matches_interval_tree(self):
+        text_len = self.intervals[-1][1]
+        rng = random.Random(7)
+        for _ in range(1000):
+            begin = rng.randint(-5, text_len + 5)
+            end = begin + rng.randint(0, 40)
+            self.assert_same_overlap(self.index, begin, end)
+
+    def test_sources_are_interned(self):
+        self.assertEqual(500, len(self.index))
+        self.assertEqual([("https://iiif.example.org/image", "https://example.org/canvas/1")], self.index.sources)
+
+    def test_round_trips(self):
+        for index in [WordSpanIndex.of(self.index.to_dict()),
+                      WordSpanIndex.of([list(iv) for iv in self.itree]),
+                      pickle.loads(pickle.dumps(self.index))]:
+            self.assertEqual(list(self.index), list(index))
+            self.assert_same_overlap(index, 100, 200)
+
+    def test_spans_must_be_added_in_order(self):
+        with self.assertRaises(ValueError):
+            self.index.add(0, 1, "w", "iiif", "canvas", [])
+
+
+if __name__ == '__main__':
+    unittest.main()